@@ -0,0 +1,248 @@
+"""
+awslimitchecker/catalog.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import json
+import logging
+import os
+from collections import OrderedDict
+
+import boto3
+
+from .connectable import ClientRegistry
+from .services import _services
+
+logger = logging.getLogger(__name__)
+
+#: Path to the limits catalog packaged with awslimitchecker.
+CATALOG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'limits_catalog.json'
+)
+
+#: AWS partitions whose regions are included in a generated catalog.
+CATALOG_PARTITIONS = ('aws', 'aws-cn', 'aws-us-gov')
+
+
+def catalog_regions(partitions=CATALOG_PARTITIONS):
+    """
+    Return the sorted names of all regions in the given partitions, as known
+    to the endpoint data bundled with botocore. This makes no network
+    connections.
+
+    :param partitions: names of the partitions to list regions of
+    :type partitions: tuple
+    :rtype: list
+    """
+    session = boto3.session.Session()
+    regions = set()
+    for partition in partitions:
+        regions.update(
+            session.get_available_regions('ec2', partition_name=partition)
+        )
+    return sorted(regions)
+
+
+def _region_defaults(region_name):
+    """
+    Return the default limits of every known service in one region, as a
+    dict of service name to dict of limit name to default value.
+
+    Each service class is instantiated with the region set in its
+    connection kwargs, so this is entirely offline.
+
+    :param region_name: the region to return default limits for
+    :type region_name: str
+    :rtype: dict
+    """
+    registry = ClientRegistry()
+    res = {}
+    for sname in _services:
+        svc = _services[sname](
+            80, 99, {'region_name': region_name}, None,
+            client_registry=registry
+        )
+        res[sname] = {
+            lname: lim.default_limit
+            for lname, lim in svc.get_limits().items()
+        }
+    return res
+
+
+def build_catalog(regions=None):
+    """
+    Build a limits catalog - a JSON-serializable dict of the default limits
+    of every known service in every given region - by instantiating each
+    service class offline.
+
+    For each service, the most common set of defaults is stored as
+    ``default``; every distinct set that differs from it is stored under
+    ``variants`` along with the list of regions it applies to.
+
+    The EC2 defaults depend on the ``USE_VCPU_LIMITS`` environment variable,
+    so it must not be set when building the catalog.
+
+    :param regions: the regions to include; defaults to the regions returned
+      by :py:func:`~.catalog_regions`
+    :type regions: list
+    :returns: the catalog
+    :rtype: dict
+    :raises: RuntimeError if ``USE_VCPU_LIMITS`` is set
+    """
+    if 'USE_VCPU_LIMITS' in os.environ:
+        raise RuntimeError(
+            'The limits catalog cannot be built with USE_VCPU_LIMITS set'
+        )
+    if regions is None:
+        regions = catalog_regions()
+    regions = sorted(regions)
+    # service name -> ordered dict of defaults JSON -> list of regions
+    grouped = {}
+    defaults = {}
+    for region in regions:
+        for sname, limits in _region_defaults(region).items():
+            key = json.dumps(limits, sort_keys=True)
+            defaults[key] = limits
+            grouped.setdefault(sname, OrderedDict()).setdefault(
+                key, []).append(region)
+    services = {}
+    for sname, variants in grouped.items():
+        common = max(variants, key=lambda k: len(variants[k]))
+        services[sname] = {
+            'default': defaults[common],
+            'variants': [
+                {'regions': regs, 'limits': defaults[key]}
+                for key, regs in variants.items() if key != common
+            ]
+        }
+    return {'regions': regions, 'services': services}
+
+
+def write_catalog(path=CATALOG_PATH, regions=None):
+    """
+    Build a limits catalog with :py:func:`~.build_catalog` and write it to
+    ``path`` as JSON.
+
+    :param path: the path to write to; defaults to :py:data:`~.CATALOG_PATH`
+    :type path: str
+    :param regions: the regions to include; see :py:func:`~.build_catalog`
+    :type regions: list
+    """
+    catalog = build_catalog(regions=regions)
+    with open(path, 'w') as fh:
+        json.dump(catalog, fh, sort_keys=True, indent=1)
+        fh.write('\n')
+    logger.info('Wrote limits catalog for %d regions to %s',
+                len(catalog['regions']), path)
+
+
+class LimitsCatalog(object):
+    """
+    Read-only view of a limits catalog as built by :py:func:`~.build_catalog`,
+    used to look up the default limits of services without instantiating
+    them or connecting to AWS.
+    """
+
+    def __init__(self, data):
+        """
+        :param data: the catalog, as returned by :py:func:`~.build_catalog`
+        :type data: dict
+        """
+        self._data = data
+
+    @classmethod
+    def load(cls, path=CATALOG_PATH):
+        """
+        Load a catalog from a JSON file.
+
+        :param path: the path to read; defaults to :py:data:`~.CATALOG_PATH`
+        :type path: str
+        :rtype: :py:class:`~.LimitsCatalog`
+        """
+        with open(path, 'r') as fh:
+            return cls(json.load(fh))
+
+    @property
+    def regions(self):
+        """
+        The regions the catalog was built for.
+
+        :rtype: list
+        """
+        return self._data['regions']
+
+    def service_names(self):
+        """
+        Return the sorted names of all services in the catalog.
+
+        :rtype: list
+        """
+        return sorted(self._data['services'].keys())
+
+    def has_region(self, region_name):
+        """
+        Return whether the catalog was built for ``region_name``.
+
+        :param region_name: the region name
+        :type region_name: str
+        :rtype: bool
+        """
+        return region_name in self._data['regions']
+
+    def default_limits(self, service_name, region_name=None):
+        """
+        Return the default limits of one service in one region.
+
+        :param service_name: the service name
+        :type service_name: str
+        :param region_name: the region name; if None or not in the catalog,
+          the most common defaults are returned
+        :type region_name: str
+        :returns: dict of limit name to default limit
+        :rtype: dict
+        :raises: KeyError if the service is not in the catalog
+        """
+        svc = self._data['services'][service_name]
+        for variant in svc['variants']:
+            if region_name in variant['regions']:
+                return dict(variant['limits'])
+        return dict(svc['default'])
+
+
+if __name__ == '__main__':  # pragma: no cover
+    logging.basicConfig(level=logging.INFO)
+    write_catalog()
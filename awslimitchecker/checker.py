@@ -37,14 +37,21 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
-from .connectable import ConnectableCredentials
+from .connectable import ConnectableCredentials, ClientRegistry
 from .services import _services
-from .trustedadvisor import TrustedAdvisor
+from .services.registry import ServiceInstances, loaded_services
+from .thresholds import evaluate_thresholds
+from .trustedadvisor import TrustedAdvisor, TrustedAdvisorResultCache
 from .version import _get_version_info
-from .utils import _get_latest_version
+from .utils import (
+    _get_latest_version, run_concurrently, call_with_timeout,
+    current_call_abandoned
+)
 from .quotas import ServiceQuotasClient
 import boto3
+import copy
 import sys
+import time
 import logging
 import warnings
 
@@ -65,14 +72,22 @@ class AwsLimitChecker(object):
                  role_partition='aws', region=None, external_id=None,
                  mfa_serial_number=None, mfa_token=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, ta_api_region='us-east-1',
-                 check_version=True, skip_quotas=False):
+                 check_version=True, skip_quotas=False, parallelism=1,
+                 service_timeout=None, service_timeouts=None,
+                 run_timeout=None, usage_store=None, quotas_cache=None,
+                 ta_poll_min_interval=5, ta_poll_max_interval=60,
+                 ta_cache=None, ta_cache_ttl=3600, sts_cache=None,
+                 sts_refresh_margin=300, scan_schedule=None,
+                 usage_source='api', resource_detail=False,
+                 usage_retention=None):
         """
         Main AwsLimitChecker class - this should be the only externally-used
         portion of awslimitchecker.
 
         Constructor builds ``self.services`` as a dict of service_name (str)
-        to :py:class:`~._AwsService` instance, and sets limit
-        thresholds.
+        to :py:class:`~._AwsService` instance (a
+        :py:class:`~.ServiceInstances`, which only creates each service when
+        it is first used), and sets limit thresholds.
 
         :param warning_threshold: the default warning threshold, as an
           integer percentage, for any limits without a specifically-set
@@ -135,11 +150,95 @@ class AwsLimitChecker(object):
           non GovCloud accounts.
         :type ta_api_region: str
         :param check_version: Whether or not to check for latest version of
-          awslimitchecker on PyPI during instantiation.
+          awslimitchecker on PyPI, before the first usage check (see
+          :py:meth:`~._check_latest_version`).
         :type check_version: bool
         :param skip_quotas: If set to True, do not connect to Service Quotas
           service or use it to obtain current limits.
         :type skip_quotas: bool
+        :param parallelism: The maximum number of services to query
+          concurrently in :py:meth:`~.get_limits`, :py:meth:`~.find_usage` and
+          :py:meth:`~.check_thresholds`. The default of 1 queries services
+          sequentially, one after another.
+        :type parallelism: int
+        :param service_timeout: The maximum number of seconds that the usage
+          check for any one service may take in :py:meth:`~.find_usage` and
+          :py:meth:`~.check_thresholds`. A service that takes longer is
+          abandoned; its limits have no usage and are marked as incomplete
+          (see :py:meth:`.AwsLimit.is_incomplete`), and the other services
+          are still checked. If None (the default), services are not timed.
+        :type service_timeout: float
+        :param service_timeouts: dict of service name to the maximum number of
+          seconds for that service, overriding ``service_timeout``.
+        :type service_timeouts: dict
+        :param run_timeout: The maximum number of seconds that a whole
+          :py:meth:`~.find_usage` or :py:meth:`~.check_thresholds` call may
+          take. Services that are still running when it expires are abandoned,
+          and services not yet started are skipped, as with
+          ``service_timeout``.
+        :type run_timeout: float
+        :param usage_store: If set, a snapshot of each service's usage is
+          saved to this store whenever it is checked, and
+          :py:meth:`~.find_usage` and :py:meth:`~.check_thresholds` can reuse
+          recent snapshots instead of querying AWS (see their ``max_age``
+          parameters).
+        :type usage_store: :py:class:`~.UsageSnapshotStore`
+        :param quotas_cache: If set, Service Quotas responses are read from
+          this persistent cache while they are younger than its TTL, instead
+          of being retrieved from AWS on every run.
+        :type quotas_cache: :py:class:`~.SqliteQuotasCache`
+        :param ta_poll_min_interval: When waiting for a Trusted Advisor check
+          refresh, the initial number of seconds between refresh status
+          polls; this doubles after each poll, up to ``ta_poll_max_interval``.
+        :type ta_poll_min_interval: float
+        :param ta_poll_max_interval: The maximum number of seconds between
+          Trusted Advisor check refresh status polls.
+        :type ta_poll_max_interval: float
+        :param ta_cache: If set, Trusted Advisor check results (for all
+          regions) are read from this persistent cache while they are younger
+          than ``ta_cache_ttl``, instead of being retrieved from AWS on every
+          run. Whether or not this is set, results are shared by all
+          per-region checkers created with :py:meth:`~.for_region`.
+        :type ta_cache: :py:class:`~.SqliteTrustedAdvisorCache`
+        :param ta_cache_ttl: The number of seconds that cached Trusted Advisor
+          check results remain valid for.
+        :type ta_cache_ttl: float
+        :param sts_cache: If set (and ``account_id`` is set), credentials for
+          the assumed role are read from this cache while they are valid,
+          and stored in it after assuming the role, so that it is not assumed
+          again by every run.
+        :type sts_cache: :py:class:`~.StsCredentialCache`
+        :param sts_refresh_margin: Assumed role credentials (whether cached or
+          in use) are treated as expired this number of seconds before their
+          actual expiration. :py:meth:`~.get_limits`,
+          :py:meth:`~.find_usage` and :py:meth:`~.check_thresholds` get new
+          credentials before starting if the current ones are due to expire.
+        :type sts_refresh_margin: float
+        :param scan_schedule: If set (along with ``usage_store``), when no
+          ``max_age`` is passed to :py:meth:`~.find_usage` or
+          :py:meth:`~.check_thresholds`, services are only scanned when this
+          schedule says that they are due, based on their utilization history
+          in ``usage_store``; the stored snapshot is used for the rest.
+        :type scan_schedule: :py:class:`~.ScanSchedule`
+        :param usage_source: where to find the usage of limits: ``api`` to
+          find all usage by querying each service's API, or ``cloudwatch`` to
+          take the usage of every limit whose quota has an ``AWS/Usage``
+          CloudWatch metric in Service Quotas from that metric instead (see
+          :py:meth:`._AwsService._find_current_usage`). The metrics of all
+          services are retrieved together, in as few requests as possible.
+        :type usage_source: str
+        :param resource_detail: If True, list individual resources to find
+          the usage of limits whose usage some services' account-level APIs
+          already return as a total (i.e. RDS DescribeAccountAttributes), so
+          that the usage of each resource is known. If False (the default),
+          those totals are used, and resources are only listed for limits
+          that have none (see :py:meth:`._AwsService._find_usage_counters`).
+        :type resource_detail: bool
+        :param usage_retention: If set, only keep this many of the usage
+          values below thresholds for each limit, plus all values that cross
+          a threshold; see :py:meth:`.AwsLimit.set_usage_retention`. If None
+          (the default), keep all usage values.
+        :type usage_retention: int
         """
         # ###### IMPORTANT license notice ##########
         # Pursuant to Sections 5(b) and 13 of the GNU Affero General Public
@@ -164,14 +263,7 @@ class AwsLimitChecker(object):
                 self.vinfo.url
             )
         )
-        if check_version:
-            latest_ver = _get_latest_version()
-            if latest_ver is not None:
-                logger.warning(
-                    'You are running awslimitchecker %s, but the latest version'
-                    ' is %s; please consider upgrading.', self.vinfo.release,
-                    latest_ver
-                )
+        self._check_version = check_version
         self._check_python_version()
         self.warning_threshold = warning_threshold
         self.critical_threshold = critical_threshold
@@ -183,24 +275,157 @@ class AwsLimitChecker(object):
         self.mfa_serial_number = mfa_serial_number
         self.mfa_token = mfa_token
         self.region = region
+        self.parallelism = parallelism
+        self.service_timeout = service_timeout
+        if service_timeouts is None:
+            service_timeouts = {}
+        self.service_timeouts = service_timeouts
+        self.run_timeout = run_timeout
+        self.usage_store = usage_store
+        self.quotas_cache = quotas_cache
+        self.scan_schedule = scan_schedule
+        if usage_source not in ['api', 'cloudwatch']:
+            raise ValueError(
+                'usage_source must be "api" or "cloudwatch", not "%s"' %
+                usage_source
+            )
+        self.usage_source = usage_source
+        self.resource_detail = resource_detail
+        self.usage_retention = usage_retention
+        self.ta_poll_min_interval = ta_poll_min_interval
+        self.ta_poll_max_interval = ta_poll_max_interval
+        self.ta_cache = ta_cache
+        self.sts_cache = sts_cache
+        self.sts_refresh_margin = sts_refresh_margin
+        self._sts_credentials = None
+        # shared with the checkers created by for_region(), so that Trusted
+        # Advisor is only polled once for all regions
+        self._ta_result_cache = TrustedAdvisorResultCache(
+            ttl=ta_cache_ttl, store=ta_cache
+        )
+        self.skip_quotas = skip_quotas
+        self.ta_refresh_mode = ta_refresh_mode
+        self.ta_refresh_timeout = ta_refresh_timeout
+        self.ta_api_region = ta_api_region
+        # a single boto3 Session and set of clients, shared by all services
+        session = None
+        if self.profile_name is not None and self.account_id is None:
+            session = boto3.Session(profile_name=self.profile_name)
+        self.client_registry = ClientRegistry(session=session)
+        self._init_services(self._boto_conn_kwargs)
 
-        self.services = {}
-
-        boto_conn_kwargs = self._boto_conn_kwargs
+    def _init_services(self, boto_conn_kwargs, skip_global=False):
+        """
+        Build ``self.services``, the Service Quotas client and the Trusted
+        Advisor instance, all connecting with ``boto_conn_kwargs`` and sharing
+        ``self.client_registry``.
+
+        :param boto_conn_kwargs: keyword arguments for boto3 connection
+          functions, as returned by :py:attr:`~._boto_conn_kwargs`
+        :type boto_conn_kwargs: dict
+        :param skip_global: if True, do not include services whose limits are
+          account-wide (see :py:attr:`._AwsService.is_global`)
+        :type skip_global: bool
+        """
+        self._conn_kwargs = boto_conn_kwargs
         self._quotas_client = None
-        if not skip_quotas:
-            self._quotas_client = ServiceQuotasClient(boto_conn_kwargs)
-        for sname, cls in _services.items():
-            self.services[sname] = cls(warning_threshold,
-                                       critical_threshold,
-                                       boto_conn_kwargs,
-                                       self._quotas_client)
-
-        self.ta = TrustedAdvisor(self.services,
-                                 boto_conn_kwargs,
-                                 ta_refresh_mode=ta_refresh_mode,
-                                 ta_refresh_timeout=ta_refresh_timeout,
-                                 ta_api_region=ta_api_region)
+        if not self.skip_quotas:
+            self._quotas_client = ServiceQuotasClient(
+                boto_conn_kwargs, client_registry=self.client_registry,
+                cache=self.quotas_cache, account_id=self.account_id
+            )
+        self.services = ServiceInstances(
+            [
+                sname for sname in _services
+                if not (skip_global and _services.is_global(sname))
+            ],
+            self._make_service
+        )
+
+        self.ta = TrustedAdvisor(
+            self.services,
+            boto_conn_kwargs,
+            ta_refresh_mode=self.ta_refresh_mode,
+            ta_refresh_timeout=self.ta_refresh_timeout,
+            ta_api_region=self.ta_api_region,
+            client_registry=self.client_registry,
+            ta_poll_min_interval=self.ta_poll_min_interval,
+            ta_poll_max_interval=self.ta_poll_max_interval,
+            result_cache=self._ta_result_cache,
+            account_id=self.account_id
+        )
+
+    def _make_service(self, sname):
+        """
+        Create the named service, connecting with the same arguments as this
+        instance's Service Quotas client and Trusted Advisor. Called by
+        ``self.services`` (a :py:class:`~.ServiceInstances`) the first time
+        each service is used.
+
+        :param sname: name of the service to create
+        :type sname: str
+        :rtype: :py:class:`~._AwsService`
+        """
+        svc = _services[sname](
+            self.warning_threshold,
+            self.critical_threshold,
+            self._conn_kwargs,
+            self._quotas_client,
+            client_registry=self.client_registry
+        )
+        svc.usage_from_cloudwatch = self.usage_source == 'cloudwatch'
+        svc.resource_detail = self.resource_detail
+        if self.usage_retention is not None:
+            svc.set_usage_retention(self.usage_retention)
+        return svc
+
+    def for_region(self, region, skip_global=False):
+        """
+        Return a new :py:class:`~.AwsLimitChecker` instance for ``region``,
+        with the same thresholds, credentials and Trusted Advisor and Service
+        Quotas settings as this one. The credentials and
+        :py:class:`~.ClientRegistry` of this instance are reused, so no STS
+        role is assumed, and neither the version check nor the license notice
+        are repeated. Limit and threshold overrides
+        are *not* copied to the new instance.
+
+        :param region: AWS region name for the new instance
+        :type region: str
+        :param skip_global: if True, do not include services whose limits are
+          account-wide (see :py:attr:`._AwsService.is_global`) in the new
+          instance
+        :type skip_global: bool
+        :returns: checker for ``region``
+        :rtype: :py:class:`~.AwsLimitChecker`
+        """
+        kwargs = dict(self._conn_kwargs)
+        kwargs['region_name'] = region
+        checker = copy.copy(self)
+        checker.region = region
+        # the version only needs to be checked once
+        checker._check_version = False
+        checker._init_services(kwargs, skip_global=skip_global)
+        return checker
+
+    def _check_latest_version(self):
+        """
+        If ``check_version`` was passed to the constructor, check PyPI for the
+        latest version of awslimitchecker and log a warning if it is newer
+        than the one running. This is done at most once per instance, from
+        the first :py:meth:`~.find_usage` or :py:meth:`~.check_thresholds`
+        call, so that constructing a checker (i.e. to list limits or their
+        defaults) makes no network requests.
+        """
+        if not self._check_version:
+            return
+        self._check_version = False
+        latest_ver = _get_latest_version()
+        if latest_ver is not None:
+            logger.warning(
+                'You are running awslimitchecker %s, but the latest version'
+                ' is %s; please consider upgrading.', self.vinfo.release,
+                latest_ver
+            )
 
     def _check_python_version(self):
         """
@@ -257,9 +482,10 @@ class AwsLimitChecker(object):
         latest/reference/services/sts.html#STS.Client.assume_role>`_ and include
         those credentials in the return value.
 
-        If ``self.profile_name`` is defined, this will call `boto3.Session()
-        <http://boto3.readthedocs.io/en/latest/reference/core/session.html>`
-        with that profile and include those credentials in the return value.
+        If ``self.profile_name`` is defined, this will include the credentials
+        of ``self.client_registry``'s `boto3.Session()
+        <http://boto3.readthedocs.io/en/latest/reference/core/session.html>`,
+        created for that profile, in the return value.
 
         :return: keyword arguments for boto3 connection functions
         :rtype: dict
@@ -274,9 +500,9 @@ class AwsLimitChecker(object):
             kwargs['aws_secret_access_key'] = credentials.secret_key
             kwargs['aws_session_token'] = credentials.session_token
         elif self.profile_name is not None:
-            # use boto3.Session to get credentials from the named profile
+            # the registry's Session was created for the named profile
             logger.debug("Using credentials profile: %s", self.profile_name)
-            session = boto3.Session(profile_name=self.profile_name)
+            session = self.client_registry.session
             credentials = session._session.get_credentials()
             kwargs['aws_access_key_id'] = credentials.access_key
             kwargs['aws_secret_access_key'] = credentials.secret_key
@@ -322,7 +548,8 @@ class AwsLimitChecker(object):
         """
         for sname in services_to_remove:
             logger.warning('Skipping service: %s', sname)
-            self.services.pop(sname, None)
+            if sname in self.services:
+                del self.services[sname]
 
     def get_limits(self, service=None, use_ta=True):
         """
@@ -340,18 +567,73 @@ class AwsLimitChecker(object):
           of limit name (string) to limit (:py:class:`~.AwsLimit`)
         :rtype: dict
         """
-        res = {}
         to_get = self.services
         if service is not None:
             to_get = dict((each, self.services[each]) for each in service)
+        self._refresh_sts_credentials()
+        if use_ta:
+            self.ta.start_update_limits()
+        self._prefetch_quotas(to_get)
         if use_ta:
             self.ta.update_limits()
-        for sname, cls in to_get.items():
-            if hasattr(cls, '_update_limits_from_api'):
-                cls._update_limits_from_api()
-            cls._update_service_quotas()
-            res[sname] = cls.get_limits()
-        return res
+
+        def _get(cls):
+            self._update_service_limits(cls)
+            return cls.get_limits()
+
+        return run_concurrently(
+            _get, to_get, self.parallelism, item_type='service'
+        )
+
+    def _prefetch_quotas(self, services):
+        """
+        Concurrently retrieve the Service Quotas for all of ``services`` (see
+        :py:meth:`.ServiceQuotasClient.prefetch`), so that they are not
+        retrieved one service at a time by :py:meth:`~._update_service_limits`.
+
+        :param services: dict of service name to :py:class:`~._AwsService`
+        :type services: dict
+        """
+        if self._quotas_client is None:
+            return
+        codes = []
+        for cls in services.values():
+            code = cls.quotas_service_code
+            if code is not None and code not in codes:
+                codes.append(code)
+        self._quotas_client.prefetch(codes)
+
+    def _register_usage_metrics(self, services):
+        """
+        Register the CloudWatch metrics that ``services`` will take usage
+        from (see :py:meth:`._AwsService._register_usage_metrics`) before any
+        of them is checked, so that the metrics of all services are retrieved
+        together.
+
+        :param services: dict of service name to :py:class:`~._AwsService`
+        :type services: dict
+        """
+        for sname, cls in sorted(services.items()):
+            try:
+                cls._register_usage_metrics()
+            except Exception:
+                logger.warning(
+                    'Unable to register CloudWatch usage metrics for %s',
+                    sname, exc_info=True
+                )
+
+    def _update_service_limits(self, cls):
+        """
+        Update the current limits of a single service from its own API (if it
+        has an ``_update_limits_from_api()`` method) and from the Service
+        Quotas service.
+
+        :param cls: the service to update limits for
+        :type cls: :py:class:`~._AwsService`
+        """
+        if hasattr(cls, '_update_limits_from_api'):
+            cls._update_limits_from_api()
+        cls._update_service_quotas()
 
     def get_service_names(self):
         """
@@ -366,7 +648,7 @@ class AwsLimitChecker(object):
         """
         Assume a role via STS and return the credentials.
 
-        First connect to STS via :py:func:`boto3.client`, then
+        First connect to STS via ``self.client_registry``, then
         assume a role using `boto3.STS.Client.assume_role <https://boto3.readthe
         docs.org/en/latest/reference/services/sts.html#STS.Client.assume_role>`_
         using ``self.account_id`` and ``self.account_role`` (and optionally
@@ -377,13 +659,26 @@ class AwsLimitChecker(object):
         :returns: STS assumed role credentials
         :rtype: :py:class:`~.ConnectableCredentials`
         """
-        logger.debug("Connecting to STS in region %s", self.region)
-        sts = boto3.client('sts', region_name=self.region)
         arn = "arn:%s:iam::%s:role/%s" % (
             self.role_partition,
             self.account_id,
             self.account_role
         )
+        if self.sts_cache is not None:
+            creds = self.sts_cache.get(
+                arn, external_id=self.external_id,
+                session_name='awslimitchecker',
+                margin=self.sts_refresh_margin
+            )
+            if creds is not None:
+                creds.account_id = self.account_id
+                logger.debug("Using cached STS credentials for role; "
+                             "access_key_id=%s (account_id=%s)",
+                             creds.access_key, creds.account_id)
+                self._sts_credentials = creds
+                return creds
+        logger.debug("Connecting to STS in region %s", self.region)
+        sts = self.client_registry.client('sts', region_name=self.region)
         logger.debug("STS assume role for %s", arn)
         assume_kwargs = {
             'RoleArn': arn,
@@ -402,9 +697,57 @@ class AwsLimitChecker(object):
 
         logger.debug("Got STS credentials for role; access_key_id=%s "
                      "(account_id=%s)", creds.access_key, creds.account_id)
+        if self.sts_cache is not None:
+            self.sts_cache.put(
+                arn, creds, external_id=self.external_id,
+                session_name='awslimitchecker'
+            )
+        self._sts_credentials = creds
         return creds
 
-    def find_usage(self, service=None, use_ta=True):
+    def _refresh_sts_credentials(self):
+        """
+        If connecting with assumed role credentials that expire within
+        ``self.sts_refresh_margin`` seconds, get new ones via
+        :py:meth:`~._get_sts_token` and switch the connections of all
+        services, the Service Quotas client and Trusted Advisor over to them,
+        so that long-running processes can keep using the same checker, and
+        discard the clients cached by ``self.client_registry`` for the old
+        credentials (see :py:meth:`.ClientRegistry.evict_clients`). If getting
+        new credentials fails, the error is logged and the current ones are
+        kept.
+        """
+        creds = self._sts_credentials
+        if creds is None or not creds.expires_within(self.sts_refresh_margin):
+            return
+        old_key = creds.access_key
+        logger.info('STS credentials for account %s expire at %s; '
+                    'refreshing', self.account_id, creds.expiration)
+        try:
+            creds = self._get_sts_token()
+        except Exception:
+            logger.error('Unable to refresh STS credentials for account %s',
+                         self.account_id, exc_info=True)
+            return
+        kwargs = {
+            'aws_access_key_id': creds.access_key,
+            'aws_secret_access_key': creds.secret_key,
+            'aws_session_token': creds.session_token
+        }
+        self._conn_kwargs.update(kwargs)
+        for obj in list(loaded_services(self.services).values()) + [
+            self._quotas_client, self.ta
+        ]:
+            if obj is None:
+                continue
+            obj._boto3_connection_kwargs.update(kwargs)
+            obj.conn = None
+            if hasattr(obj, 'resource_conn'):
+                obj.resource_conn = None
+        if creds.access_key != old_key:
+            self.client_registry.evict_clients(old_key)
+
+    def find_usage(self, service=None, use_ta=True, max_age=None):
         """
         For each limit in the specified service (or all services if
         ``service`` is ``None``), query the AWS API via ``boto3``
@@ -414,23 +757,230 @@ class AwsLimitChecker(object):
         :py:class:`~.AwsLimit` objects for each service, which can
         then be queried using :py:meth:`~.get_limits`.
 
+        If the usage check of one or more services raises an exception, the
+        usage of all other services is still found and Trusted Advisor limits
+        are still applied; the failed services' limits are marked as
+        incomplete (see :py:meth:`.AwsLimit.is_incomplete`), and then the
+        first exception is re-raised.
+
         :param service: list of :py:class:`~._AwsService` name(s), or ``None``
           to check all services.
         :type service: :py:obj:`None`, or :py:obj:`list` service names to get
         :param use_ta: check Trusted Advisor for information on limits
         :type use_ta: bool
+        :param max_age: if ``usage_store`` was passed to the constructor, use
+          the stored usage for services whose snapshot is no more than this
+          many seconds old instead of querying AWS for it
+        :type max_age: float
         """
+        self._check_latest_version()
         to_get = self.services
         if service is not None:
             to_get = dict((each, self.services[each]) for each in service)
+        self._refresh_sts_credentials()
+        # API responses are memoized within a single usage check only
+        self.client_registry.clear_cache(self.region)
+        deadline = self._run_deadline()
+        snap_key = self._snapshot_key(to_get)
         if use_ta:
-            self.ta.update_limits()
-        for cls in to_get.values():
-            if hasattr(cls, '_update_limits_from_api'):
-                cls._update_limits_from_api()
-            cls._update_service_quotas()
+            # poll Trusted Advisor while usage is being found
+            self.ta.start_update_limits()
+        self._prefetch_quotas(to_get)
+        self._register_usage_metrics(to_get)
+
+        def _find(cls):
+            self._update_service_limits(cls)
+            if self._load_usage_snapshot(cls, snap_key, max_age):
+                return
             logger.debug("Finding usage for service: %s", cls.service_name)
-            cls.find_usage()
+            cls._find_current_usage()
+            self._save_usage_snapshot(cls, snap_key)
+
+        errors = {}
+        run_concurrently(
+            lambda cls: self._run_with_budget(cls, _find, deadline),
+            to_get, self.parallelism, item_type='service', errors=errors
+        )
+        self._set_failed(to_get, errors)
+        if use_ta:
+            self.ta.update_limits()
+        if len(errors) > 0:
+            # the usage of the other services has been found; re-raise the
+            # first failure, in the order of the services
+            raise list(errors.values())[0]
+
+    def _snapshot_key(self, services):
+        """
+        Return the (account ID, region name) 2-tuple that usage snapshots for
+        ``services`` are stored under, or None if ``usage_store`` is not set
+        or the account ID cannot be determined.
+
+        :param services: dict of service name to :py:class:`~._AwsService`
+        :type services: dict
+        :rtype: :py:obj:`tuple` or :py:obj:`None`
+        """
+        if self.usage_store is None or len(services) == 0:
+            return None
+        try:
+            account_id = self.account_id
+            if account_id is None:
+                account_id = list(services.values())[0].current_account_id
+            return account_id, self.region_name
+        except Exception:
+            logger.warning(
+                'Unable to determine account ID; not using usage snapshots',
+                exc_info=True
+            )
+            return None
+
+    def _load_usage_snapshot(self, cls, snap_key, max_age):
+        """
+        If ``snap_key`` and ``max_age`` are set, try to load the usage of
+        service ``cls`` from a snapshot in ``usage_store``; see
+        :py:meth:`.UsageSnapshotStore.load_service`. If ``max_age`` is None
+        but ``scan_schedule`` is set, use the interval it returns for the
+        service's utilization history as ``max_age``.
+
+        :param cls: the service to load usage for
+        :type cls: :py:class:`~._AwsService`
+        :param snap_key: return value of :py:meth:`~._snapshot_key`
+        :type snap_key: :py:obj:`tuple` or :py:obj:`None`
+        :param max_age: maximum snapshot age, in seconds
+        :type max_age: :py:obj:`float` or :py:obj:`None`
+        :returns: whether usage was loaded from a snapshot
+        :rtype: bool
+        """
+        if snap_key is None:
+            return False
+        if max_age is None and self.scan_schedule is None:
+            return False
+        try:
+            if max_age is None:
+                history = self.usage_store.get_history(
+                    snap_key[0], snap_key[1], cls.service_name,
+                    time.time() - self.scan_schedule.window
+                )
+                max_age = self.scan_schedule.interval(history)
+                logger.debug('Scan schedule interval for %s: %.0fs',
+                             cls.service_name, max_age)
+            return self.usage_store.load_service(
+                snap_key[0], snap_key[1], cls, max_age
+            )
+        except Exception:
+            logger.warning(
+                'Unable to load usage snapshot for %s', cls.service_name,
+                exc_info=True
+            )
+            return False
+
+    def _save_usage_snapshot(self, cls, snap_key):
+        """
+        If ``snap_key`` is set, save a snapshot of the usage of service
+        ``cls`` to ``usage_store``, unless the usage check was abandoned
+        because it ran out of time.
+
+        :param cls: the service to save usage for
+        :type cls: :py:class:`~._AwsService`
+        :param snap_key: return value of :py:meth:`~._snapshot_key`
+        :type snap_key: :py:obj:`tuple` or :py:obj:`None`
+        """
+        if snap_key is None or current_call_abandoned():
+            return
+        try:
+            self.usage_store.save_service(snap_key[0], snap_key[1], cls)
+        except Exception:
+            logger.warning(
+                'Unable to save usage snapshot for %s', cls.service_name,
+                exc_info=True
+            )
+
+    def _run_deadline(self):
+        """
+        Return the time (as returned by :py:func:`time.time`) by which a run
+        must finish, according to ``run_timeout``, or None.
+
+        :rtype: :py:obj:`float` or :py:obj:`None`
+        """
+        if self.run_timeout is None:
+            return None
+        return time.time() + self.run_timeout
+
+    def _run_with_budget(self, cls, func, deadline, default=None):
+        """
+        Call ``func(cls)`` for service ``cls``, limited to the lesser of the
+        service's time budget (``service_timeouts`` or ``service_timeout``)
+        and the time remaining until ``deadline``. If it runs out of time (or
+        there is no time left to start it), abandon it, mark all of its limits
+        as incomplete and the service as not having usage (so that the next
+        check finds it again), log a warning and return ``default``.
+
+        :param cls: the service to run
+        :type cls: :py:class:`~._AwsService`
+        :param func: callable taking the service as its only argument
+        :type func: ``callable``
+        :param deadline: the run deadline, from :py:meth:`~._run_deadline`
+        :type deadline: :py:obj:`float` or :py:obj:`None`
+        :param default: value to return if the service is abandoned
+        :returns: the return value of ``func``, or ``default``
+        """
+        timeout = self.service_timeouts.get(
+            cls.service_name, self.service_timeout
+        )
+        if deadline is not None:
+            remaining = max(deadline - time.time(), 0)
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        if timeout is None:
+            return func(cls)
+        finished = False
+        if timeout > 0:
+            finished, res = call_with_timeout(
+                func, (cls,), timeout, name='alc-%s' % cls.service_name
+            )
+        if finished:
+            return res
+        reason = 'usage check did not finish within %s seconds' % timeout
+        if timeout <= 0:
+            reason = 'run time budget exhausted before usage check started'
+        logger.warning(
+            'Abandoning service %s: %s; its limits have incomplete usage',
+            cls.service_name, reason
+        )
+        self._set_incomplete(cls, reason)
+        return default
+
+    def _set_incomplete(self, cls, reason):
+        """
+        Mark all limits of service ``cls`` as incomplete (see
+        :py:meth:`.AwsLimit._set_incomplete`) and the service as not having
+        usage, so that the next check finds it again.
+
+        :param cls: the service
+        :type cls: :py:class:`~._AwsService`
+        :param reason: description of why the usage is incomplete
+        :type reason: str
+        """
+        for lim in cls.get_limits().values():
+            lim._set_incomplete(reason)
+        # an abandoned call can no longer set this (see
+        # _AwsService._have_usage)
+        cls._have_usage = False
+
+    def _set_failed(self, services, errors):
+        """
+        Mark the limits of each service in ``errors`` (as filled in by
+        :py:func:`~.run_concurrently`) as incomplete because its usage check
+        raised an exception.
+
+        :param services: dict of service name to :py:class:`~._AwsService`
+        :type services: dict
+        :param errors: dict of service name to the exception it raised
+        :type errors: dict
+        """
+        for sname, ex in errors.items():
+            self._set_incomplete(
+                services[sname], 'usage check failed: %s' % ex
+            )
 
     def set_limit_overrides(self, override_dict, override_ta=True):
         """
@@ -593,11 +1143,15 @@ class AwsLimitChecker(object):
             crit_count=crit_count
         )
 
-    def check_thresholds(self, service=None, use_ta=True):
+    def check_thresholds(self, service=None, use_ta=True, max_age=None):
         """
         Check all limits and current usage against their specified thresholds;
         return all :py:class:`~.AwsLimit` instances that have crossed
-        one or more of their thresholds.
+        one or more of their thresholds, along with all limits of any service
+        that was abandoned because it ran out of time (see ``service_timeout``
+        and ``run_timeout``) or whose usage check raised an exception (which
+        is logged), which have no usage and are marked as incomplete (see
+        :py:meth:`.AwsLimit.is_incomplete`).
 
         If ``service`` is specified, the returned dict has one element,
         the service name, whose value is a nested dict as described below;
@@ -609,30 +1163,75 @@ class AwsLimitChecker(object):
         (:py:meth:`~.AwsLimit.get_warnings` and
         :py:meth:`~.AwsLimit.get_criticals`).
 
-        See :py:meth:`.AwsLimit.check_thresholds`.
+        The limits of all services are evaluated together by
+        :py:func:`~.evaluate_thresholds`, which uses NumPy if it is installed;
+        see :py:meth:`.AwsLimit.check_thresholds`.
 
         :param service: the name(s) of one or more service(s) to return
           results for
         :type service: list
         :param use_ta: check Trusted Advisor for information on limits
         :type use_ta: bool
+        :param max_age: if ``usage_store`` was passed to the constructor, use
+          the stored usage for services whose snapshot is no more than this
+          many seconds old instead of querying AWS for it
+        :type max_age: float
         :returns: dict of service name (string) to nested dict
           of limit name (string) to limit (:py:class:`~.AwsLimit`)
         :rtype: dict
         """
+        self._check_latest_version()
         res = {}
         to_get = self.services
         if service is not None:
             to_get = dict((each, self.services[each]) for each in service)
+        self._refresh_sts_credentials()
+        self.client_registry.clear_cache(self.region)
+        deadline = self._run_deadline()
+        snap_key = self._snapshot_key(to_get)
+        if use_ta:
+            # poll Trusted Advisor while usage is being found
+            self.ta.start_update_limits()
+        self._prefetch_quotas(to_get)
+        self._register_usage_metrics(to_get)
+
+        def _find(cls):
+            self._update_service_limits(cls)
+            if not self._load_usage_snapshot(cls, snap_key, max_age):
+                # only snapshot usage that was actually found just now
+                need_usage = not cls._have_usage
+                cls._find_usage_if_needed()
+                if need_usage:
+                    self._save_usage_snapshot(cls, snap_key)
+            return True
+
+        errors = {}
+        found = run_concurrently(
+            lambda cls: self._run_with_budget(cls, _find, deadline, False),
+            to_get, self.parallelism, item_type='service', errors=errors
+        )
+        self._set_failed(to_get, errors)
+        # apply Trusted Advisor limits just before evaluating thresholds
         if use_ta:
             self.ta.update_limits()
-        for sname, cls in to_get.items():
-            if hasattr(cls, '_update_limits_from_api'):
-                cls._update_limits_from_api()
-            cls._update_service_quotas()
-            tmp = cls.check_thresholds()
-            if len(tmp) > 0:
-                res[sname] = tmp
+        # evaluate the limits of all services together
+        limits = [
+            (sname, lname, lim)
+            for sname, have_usage in found.items() if have_usage
+            for lname, lim in to_get[sname].get_limits().items()
+        ]
+        results = evaluate_thresholds([x[2] for x in limits])
+        for (sname, lname, lim), ok in zip(limits, results.ok):
+            if not ok:
+                res.setdefault(sname, {})[lname] = lim
+        # report the limits of abandoned and failed services, which were
+        # marked as incomplete, rather than leaving them out
+        incomplete = list(errors.keys()) + [
+            sname for sname, have_usage in found.items() if not have_usage
+        ]
+        for sname in incomplete:
+            for lname, lim in to_get[sname].get_limits().items():
+                res.setdefault(sname, {})[lname] = lim
         return res
 
     def get_required_iam_policy(self):
@@ -679,6 +1278,6 @@ class AwsLimitChecker(object):
         :return: AWS region name
         :rtype: str
         """
-        kwargs = self._boto_conn_kwargs
-        conn = boto3.client('ec2', **kwargs)
-        return conn._client_config.region_name
+        return self.client_registry.region_name(
+            self._conn_kwargs.get('region_name')
+        )
@@ -0,0 +1,208 @@
+"""
+awslimitchecker/cloudwatch.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from .utils import paginate_items
+
+logger = logging.getLogger(__name__)
+
+
+class UsageMetricsBatch(object):
+    """
+    Run-scoped, batched retrieval of the latest value of CloudWatch
+    ``AWS/Usage`` (or other) metrics, shared by every service connected to
+    CloudWatch with the same client.
+
+    Metrics are registered with :py:meth:`~.add`; the first call to
+    :py:meth:`~.get` after any metrics were added retrieves *all* metrics that
+    have not been retrieved yet, with as few ``GetMetricData`` calls as
+    possible (up to :py:attr:`~.MAX_QUERIES` metrics per call). Services that
+    run concurrently share the batch; access is thread-safe, and a call to
+    :py:meth:`~.get` while a retrieval is in progress waits for it instead of
+    making another request.
+
+    Instances should be obtained from :py:meth:`.ClientRegistry.usage_metrics`
+    rather than constructed directly.
+    """
+
+    #: maximum number of queries in one ``GetMetricData`` request
+    MAX_QUERIES = 500
+
+    def __init__(self, conn, lookback=3600):
+        """
+        :param conn: boto3 CloudWatch low-level client to retrieve metrics
+          with
+        :param lookback: number of seconds before now to look for data points
+          in
+        :type lookback: int
+        """
+        self.conn = conn
+        self.lookback = lookback
+        self._lock = threading.Lock()
+        #: list of the keys of metrics that have not been retrieved yet
+        self._pending = []
+        #: dict of metric key to its ``MetricStat`` query
+        self._queries = {}
+        #: dict of metric key to its latest value, or None if unavailable
+        self._values = {}
+
+    @staticmethod
+    def key(metric_name, dimensions, period=60, stat='Average',
+            namespace='AWS/Usage'):
+        """
+        Return the hashable key that identifies a metric query.
+
+        :param metric_name: metric name
+        :type metric_name: str
+        :param dimensions: list of dicts; dimensions of the metric, each with
+          ``Name`` and ``Value`` keys
+        :type dimensions: list
+        :param period: metric period
+        :type period: int
+        :param stat: statistic to retrieve
+        :type stat: str
+        :param namespace: metric namespace
+        :type namespace: str
+        :rtype: tuple
+        """
+        return (
+            namespace, metric_name,
+            tuple(sorted((d['Name'], d['Value']) for d in dimensions)),
+            period, stat
+        )
+
+    def add(self, metric_name, dimensions, period=60, stat='Average',
+            namespace='AWS/Usage'):
+        """
+        Register a metric to be retrieved with the next batch, unless it has
+        already been registered. See :py:meth:`~.key` for the parameters.
+
+        :returns: the metric's key, to pass to :py:meth:`~.get`
+        :rtype: tuple
+        """
+        key = self.key(
+            metric_name, dimensions, period=period, stat=stat,
+            namespace=namespace
+        )
+        with self._lock:
+            if key not in self._queries:
+                self._queries[key] = {
+                    'Metric': {
+                        'Namespace': namespace,
+                        'MetricName': metric_name,
+                        'Dimensions': dimensions
+                    },
+                    'Period': period,
+                    'Stat': stat
+                }
+                self._pending.append(key)
+        return key
+
+    def get(self, key):
+        """
+        Return the latest value of the metric with key ``key`` (as returned
+        by :py:meth:`~.add`), retrieving all pending metrics first if needed.
+
+        :param key: the metric key
+        :type key: tuple
+        :return: the metric value, or None if it has no data points or could
+          not be retrieved
+        :rtype: ``float, int or None``
+        """
+        with self._lock:
+            if len(self._pending) > 0:
+                pending = self._pending
+                self._pending = []
+                for i in range(0, len(pending), self.MAX_QUERIES):
+                    self._fetch(pending[i:i + self.MAX_QUERIES])
+            return self._values.get(key)
+
+    def _fetch(self, keys):
+        """
+        Retrieve the latest values of the metrics with the given keys (no
+        more than :py:attr:`~.MAX_QUERIES`) with ``GetMetricData``, and
+        store them in ``self._values``. Must be called with ``self._lock``
+        held.
+
+        :param keys: keys of the metrics to retrieve
+        :type keys: list
+        """
+        ids = {}
+        queries = []
+        for idx, key in enumerate(keys):
+            ids['m%d' % idx] = key
+            self._values[key] = None
+            queries.append({
+                'Id': 'm%d' % idx, 'MetricStat': self._queries[key]
+            })
+        end = datetime.utcnow()
+        logger.debug(
+            'Querying CloudWatch GetMetricData for %d metrics', len(queries)
+        )
+        found = set()
+        try:
+            for res in paginate_items(
+                self.conn.get_metric_data,
+                MetricDataQueries=queries,
+                StartTime=end - timedelta(seconds=self.lookback),
+                EndTime=end,
+                ScanBy='TimestampDescending',
+                alc_marker_path=['NextToken'],
+                alc_data_path=['MetricDataResults'],
+                alc_marker_param='NextToken'
+            ):
+                # data points are newest-first, so the first one seen for
+                # each query (possibly on an earlier page) is the latest
+                if res['Id'] in found or len(res['Values']) < 1:
+                    continue
+                found.add(res['Id'])
+                self._values[ids[res['Id']]] = res['Values'][0]
+                logger.debug(
+                    'CloudWatch metric %s returned value of %s with '
+                    'timestamp %s', ids[res['Id']], res['Values'][0],
+                    res['Timestamps'][0]
+                )
+        except Exception as ex:
+            logger.error(
+                'Error querying CloudWatch GetMetricData for %d metrics: %s',
+                len(queries), ex
+            )
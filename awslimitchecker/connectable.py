@@ -38,13 +38,397 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import os
+import hashlib
+import json
 import logging
+import tempfile
+import threading
+from copy import deepcopy
+from datetime import datetime, timedelta
+from functools import partial
 import boto3
 from botocore.config import Config
+from dateutil import parser
+from pytz import utc
+
+from .cloudwatch import UsageMetricsBatch
+from .inventory import Ec2Inventory
+from .ratelimit import rate_limiter as shared_rate_limiter
 
 logger = logging.getLogger(__name__)
 
 
+class ResponseCache(object):
+    """
+    Run-scoped memoization of read-only AWS API responses, so that identical
+    calls made more than once during a run (i.e. by both a service's
+    ``find_usage`` and its ``_update_limits_from_api``) are only sent to AWS
+    once.
+
+    Instances are attached to boto3 clients with :py:meth:`~.register`, which
+    hooks the clients' botocore ``before-call`` and ``after-call`` events.
+    Only successful responses to operations whose names start with one of
+    :py:attr:`~.cacheable_prefixes` are cached, keyed by the client they were
+    made with, region, operation and the serialized request parameters.
+    Callers always receive a deep copy of the cached response, so they may
+    modify it freely.
+
+    Pages of paginated listings are never cached: they are not repeated
+    within a run, and keeping them would hold every page of every listing
+    in memory until the cache is cleared. A call is treated as a page if its
+    request has one of :py:attr:`~.pagination_request_tokens`, or its
+    response has one of :py:attr:`~.pagination_response_tokens`, set. A
+    listing that fits in a single page is cached like any other response.
+    """
+
+    #: Prefixes of the names of read-only operations that may be cached.
+    cacheable_prefixes = ('Describe', 'Get', 'List')
+
+    #: Service IDs (hyphenized) that are never cached. Trusted Advisor check
+    #: results and refresh statuses are polled until they change.
+    uncacheable_services = ('support',)
+
+    #: Request parameters that ask for a page after the first.
+    pagination_request_tokens = (
+        'NextToken', 'nextToken', 'Marker', 'ContinuationToken', 'position',
+        'ExclusiveStartTableName', 'ExclusiveStartDeliveryStreamName',
+        'ExclusiveStartStreamName'
+    )
+
+    #: Response fields that indicate there are more pages.
+    pagination_response_tokens = (
+        'NextToken', 'nextToken', 'NextMarker', 'Marker', 'IsTruncated',
+        'NextContinuationToken', 'position', 'LastEvaluatedTableName',
+        'HasMoreDeliveryStreams', 'HasMoreStreams'
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        #: dict of region name to dict of cache key to (http, parsed) response
+        self._responses = {}
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, client, namespace):
+        """
+        Cache responses to read-only calls made with ``client``.
+
+        :param client: boto3 low-level client
+        :param namespace: hashable value identifying the client's credentials
+          and configuration; responses are only shared between clients with
+          the same namespace
+        """
+        client.meta.events.register(
+            'before-parameter-build.*.*', self._before_parameter_build
+        )
+        client.meta.events.register(
+            'before-call.*.*', partial(self._before_call, namespace)
+        )
+        client.meta.events.register('after-call.*.*', self._after_call)
+
+    def _key(self, namespace, model, params):
+        """
+        Return the cache key for a call of operation ``model`` with serialized
+        request ``params``, or None if the call should not be cached.
+        """
+        service_id = model.service_model.service_id.hyphenize()
+        if service_id in self.uncacheable_services:
+            return None
+        if not model.name.startswith(self.cacheable_prefixes):
+            return None
+        return (
+            namespace, service_id, model.name, params.get('url_path'),
+            repr(params.get('query_string')), repr(params.get('body'))
+        )
+
+    def _before_parameter_build(self, params=None, context=None, **kwargs):
+        """
+        botocore ``before-parameter-build`` event handler. If the (not yet
+        serialized) request ``params`` ask for a page after the first of a
+        paginated listing, mark the request ``context`` so that
+        :py:meth:`~._before_call` does not cache it.
+        """
+        if any(params.get(k) for k in self.pagination_request_tokens):
+            context['alc_paginated'] = True
+
+    def _before_call(self, namespace, model=None, params=None, context=None,
+                     **kwargs):
+        """
+        botocore ``before-call`` event handler. Return the cached response for
+        this call if we have one, which botocore then uses instead of sending
+        the request. Otherwise, store the cache key in the request
+        ``context`` for :py:meth:`~._after_call`.
+        """
+        if context.pop('alc_paginated', False):
+            return None
+        key = self._key(namespace, model, params)
+        if key is None:
+            return None
+        region = context.get('client_region')
+        with self._lock:
+            cached = self._responses.get(region, {}).get(key)
+            if cached is None:
+                self.misses += 1
+                context['alc_cache_key'] = key
+                return None
+            self.hits += 1
+        logger.debug(
+            'Using cached response for %s.%s in region %s',
+            key[1], model.name, region
+        )
+        return cached[0], deepcopy(cached[1])
+
+    def _after_call(self, http_response=None, parsed=None, context=None,
+                    **kwargs):
+        """
+        botocore ``after-call`` event handler; cache successful responses for
+        calls that :py:meth:`~._before_call` determined can be cached.
+        """
+        key = context.pop('alc_cache_key', None)
+        if key is None or http_response.status_code >= 300:
+            return
+        if any(parsed.get(k) for k in self.pagination_response_tokens):
+            # first page of a listing with more pages
+            return
+        with self._lock:
+            self._responses.setdefault(context.get('client_region'), {})[
+                key] = (http_response, deepcopy(parsed))
+
+    def clear(self, region_name=None):
+        """
+        Discard cached responses for ``region_name``, or for all regions if
+        None, and log the number of cache hits and misses since the last
+        time the cache was cleared.
+
+        :param region_name: region to discard cached responses for
+        :type region_name: str
+        """
+        with self._lock:
+            logger.debug(
+                'Clearing API response cache (region: %s); %d hits, %d '
+                'misses', region_name, self.hits, self.misses
+            )
+            if region_name is None:
+                self._responses = {}
+            else:
+                self._responses.pop(region_name, None)
+            self.hits = 0
+            self.misses = 0
+
+
+class ClientRegistry(object):
+    """
+    Holds a single :py:class:`boto3.session.Session` and the low-level clients
+    created from it, so that botocore's service models, endpoint data and
+    HTTP connection pools are loaded once per run instead of once per client.
+
+    A single instance is created by each :py:class:`~.AwsLimitChecker` and
+    shared by all of its services, Trusted Advisor and Service Quotas clients.
+    Clients are cached and reused for identical ``(api_name, region,
+    credentials, config)`` arguments; as boto3 clients are thread-safe, a
+    cached client may be used by services running concurrently. Clients
+    for replaced credentials are discarded by :py:meth:`~.evict_clients`.
+    boto3 resources are *not* thread-safe, so a new resource is returned on
+    every call to :py:meth:`~.resource`, though still built from the shared
+    Session.
+
+    Every client and resource is attached to the registry's
+    :py:class:`~.ResponseCache`, ``response_cache``, which
+    :py:class:`~.AwsLimitChecker` clears at the start of each usage check
+    with :py:meth:`~.clear_cache`. The registry also holds the run-scoped
+    :py:class:`~.Ec2Inventory` for each EC2 client, shared by the services
+    that use it (see :py:meth:`~.ec2_inventory`), and the run-scoped
+    :py:class:`~.UsageMetricsBatch` for each CloudWatch client (see
+    :py:meth:`~.usage_metrics`). Every request made with
+    the registry's clients is also throttled by its
+    :py:class:`~.RateLimiter`, ``rate_limiter``, which by default is the
+    single instance shared by the whole process.
+    """
+
+    def __init__(self, session=None, rate_limiter=None):
+        """
+        :param session: the Session to create clients and resources from. If
+          None, a new Session with default configuration is created the first
+          time it is needed.
+        :type session: :py:class:`boto3.session.Session`
+        :param rate_limiter: the rate limiter to throttle requests with. If
+          None, use the process-wide :py:data:`~.ratelimit.rate_limiter`.
+        :type rate_limiter: :py:class:`~.RateLimiter`
+        """
+        self._session = session
+        if rate_limiter is None:
+            rate_limiter = shared_rate_limiter
+        self.rate_limiter = rate_limiter
+        self._clients = {}
+        self.response_cache = ResponseCache()
+        #: dict of EC2 client to its :py:class:`~.Ec2Inventory`
+        self._inventories = {}
+        #: dict of CloudWatch client to its :py:class:`~.UsageMetricsBatch`
+        self._usage_metrics = {}
+        # boto3 Sessions are not thread-safe; serialize all use of ours
+        self._lock = threading.RLock()
+
+    @property
+    def session(self):
+        """
+        Return the shared Session, creating it if needed.
+
+        :rtype: :py:class:`boto3.session.Session`
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = boto3.session.Session()
+            return self._session
+
+    def region_name(self, region_name=None):
+        """
+        Return the region that clients created with ``region_name`` connect
+        to: ``region_name`` itself if it is not None, otherwise the default
+        region configured for the shared Session (i.e. by the
+        ``AWS_DEFAULT_REGION`` environment variable or the profile's config
+        file), which may also be None. Never creates a client or makes any
+        network connections.
+
+        :param region_name: explicitly-configured region name, or None
+        :type region_name: str
+        :rtype: str
+        """
+        if region_name is not None:
+            return region_name
+        with self._lock:
+            return self.session.region_name
+
+    @staticmethod
+    def _key(api_name, kwargs):
+        """
+        Return a hashable cache key for a client of ``api_name`` created with
+        keyword arguments ``kwargs``.
+        """
+        key = [api_name]
+        for k, v in sorted(kwargs.items()):
+            if isinstance(v, Config):
+                v = repr(sorted(v._user_provided_options.items()))
+            key.append((k, v))
+        return tuple(key)
+
+    def client(self, api_name, **kwargs):
+        """
+        Return a low-level client for ``api_name``, created from the shared
+        Session with ``kwargs`` (i.e. ``region_name``, credentials and
+        ``config``) if an identical one has not been created already.
+
+        :param api_name: name of the AWS API to connect to
+        :type api_name: str
+        :param kwargs: keyword arguments for
+          :py:meth:`boto3.session.Session.client`
+        :type kwargs: dict
+        :returns: boto3 low-level client
+        """
+        key = self._key(api_name, kwargs)
+        with self._lock:
+            if key not in self._clients:
+                logger.debug('Creating new %s client', api_name)
+                conn = self.session.client(api_name, **kwargs)
+                self.response_cache.register(conn, key)
+                self.rate_limiter.register(conn)
+                self._clients[key] = conn
+            return self._clients[key]
+
+    def resource(self, api_name, **kwargs):
+        """
+        Return a new boto3 resource for ``api_name``, created from the shared
+        Session with ``kwargs``.
+
+        :param api_name: name of the AWS API to connect to
+        :type api_name: str
+        :param kwargs: keyword arguments for
+          :py:meth:`boto3.session.Session.resource`
+        :type kwargs: dict
+        :returns: boto3 ServiceResource
+        """
+        with self._lock:
+            res = self.session.resource(api_name, **kwargs)
+        self.response_cache.register(
+            res.meta.client, self._key(api_name, kwargs)
+        )
+        self.rate_limiter.register(res.meta.client)
+        return res
+
+    def ec2_inventory(self, conn):
+        """
+        Return the :py:class:`~.Ec2Inventory` for EC2 client ``conn``, creating
+        it if needed. Services connected to EC2 with the same region,
+        credentials and configuration share a client, and therefore an
+        inventory.
+
+        :param conn: boto3 EC2 low-level client, from :py:meth:`~.client`
+        :rtype: :py:class:`~.Ec2Inventory`
+        """
+        with self._lock:
+            if conn not in self._inventories:
+                self._inventories[conn] = Ec2Inventory(conn)
+            return self._inventories[conn]
+
+    def usage_metrics(self, conn):
+        """
+        Return the :py:class:`~.UsageMetricsBatch` for CloudWatch client
+        ``conn``, creating it if needed. Like :py:meth:`~.ec2_inventory`,
+        services connected to CloudWatch with the same region, credentials and
+        configuration share a client, and therefore a batch.
+
+        :param conn: boto3 CloudWatch low-level client, from
+          :py:meth:`~.client`
+        :rtype: :py:class:`~.UsageMetricsBatch`
+        """
+        with self._lock:
+            if conn not in self._usage_metrics:
+                self._usage_metrics[conn] = UsageMetricsBatch(conn)
+            return self._usage_metrics[conn]
+
+    def evict_clients(self, aws_access_key_id):
+        """
+        Discard the cached clients created with access key
+        ``aws_access_key_id``, along with their EC2 inventories and
+        CloudWatch usage metrics. Called when assumed role credentials are
+        replaced (see :py:meth:`.AwsLimitChecker._refresh_sts_credentials`),
+        so that long-running processes do not keep a set of clients for
+        every set of credentials they have used.
+
+        :param aws_access_key_id: access key ID of the replaced credentials
+        :type aws_access_key_id: str
+        """
+        with self._lock:
+            for key in list(self._clients.keys()):
+                if ('aws_access_key_id', aws_access_key_id) not in key:
+                    continue
+                conn = self._clients.pop(key)
+                self._inventories.pop(conn, None)
+                self._usage_metrics.pop(conn, None)
+                logger.debug('Evicted %s client with expiring credentials',
+                             key[0])
+
+    def clear_cache(self, region_name=None):
+        """
+        Discard cached API responses, EC2 inventories and CloudWatch usage
+        metrics for ``region_name``.
+        See :py:meth:`.ResponseCache.clear`.
+
+        :param region_name: region to discard cached responses for; if None,
+          the shared Session's default region
+        :type region_name: str
+        """
+        if region_name is None:
+            region_name = self.session.region_name
+        self.response_cache.clear(region_name=region_name)
+        with self._lock:
+            for conn in list(self._inventories.keys()):
+                if conn.meta.region_name == region_name:
+                    del self._inventories[conn]
+            for conn in list(self._usage_metrics.keys()):
+                if conn.meta.region_name == region_name:
+                    del self._usage_metrics[conn]
+
+
 class ConnectableCredentials(object):
     """
     boto's (2.x) :py:meth:`boto.sts.STSConnection.assume_role` returns a
@@ -66,11 +450,152 @@ class ConnectableCredentials(object):
         self.assumed_role_arn = creds_dict['AssumedRoleUser']['Arn']
         self.account_id = None
 
+    def to_dict(self):
+        """
+        Return these credentials in the form of the ``assume_role`` response
+        they were created from, with ``Expiration`` as an ISO 8601 string so
+        that the result can be serialized as JSON.
+
+        :rtype: dict
+        """
+        return {
+            'Credentials': {
+                'AccessKeyId': self.access_key,
+                'SecretAccessKey': self.secret_key,
+                'SessionToken': self.session_token,
+                'Expiration': self.expiration.isoformat()
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': self.assumed_role_id,
+                'Arn': self.assumed_role_arn
+            }
+        }
+
+    def expires_within(self, seconds):
+        """
+        Return whether these credentials expire within ``seconds`` seconds
+        from now (or have already expired).
+
+        :param seconds: number of seconds from now
+        :type seconds: float
+        :rtype: bool
+        """
+        return self.expiration - datetime.now(utc) <= timedelta(
+            seconds=seconds
+        )
+
+
+class StsCredentialCache(object):
+    """
+    File-based cache of STS assumed role credentials, similar to the AWS
+    CLI's ``~/.aws/cli/cache``. Credentials are stored as JSON, one file
+    per (role ARN, external ID, session name), in the directory ``path``;
+    file names are a hash of those, so that the same role can be used by
+    many processes (i.e. consecutive or concurrent runs) without assuming
+    it again until its credentials are about to expire.
+
+    The directory is created (readable only by the current user) if it does
+    not exist, and each file is written atomically and is readable only by
+    the current user.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the cache directory
+        :type path: str
+        """
+        self.path = os.path.expanduser(path)
+
+    def _file_path(self, role_arn, external_id, session_name):
+        """
+        Return the path of the cache file for the given role.
+
+        :rtype: str
+        """
+        key = json.dumps(
+            [role_arn, external_id, session_name], separators=(',', ':')
+        )
+        return os.path.join(
+            self.path,
+            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json'
+        )
+
+    def get(self, role_arn, external_id=None, session_name='awslimitchecker',
+            margin=0):
+        """
+        Return the cached credentials for the given role, or None if there
+        are none (or they cannot be read) or they expire within ``margin``
+        seconds.
+
+        :param role_arn: ARN of the assumed role
+        :type role_arn: str
+        :param external_id: External ID used to assume the role, if any
+        :type external_id: str
+        :param session_name: role session name used to assume the role
+        :type session_name: str
+        :param margin: ignore credentials expiring within this number of
+          seconds
+        :type margin: float
+        :rtype: :py:class:`~.ConnectableCredentials` or :py:data:`None`
+        """
+        path = self._file_path(role_arn, external_id, session_name)
+        try:
+            with open(path, 'r') as fh:
+                data = json.loads(fh.read())
+            data['Credentials']['Expiration'] = parser.parse(
+                data['Credentials']['Expiration']
+            )
+            creds = ConnectableCredentials(data)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            logger.warning('Unable to read cached STS credentials from %s',
+                           path, exc_info=True)
+            return None
+        if creds.expires_within(margin):
+            logger.debug('Cached STS credentials for %s expire at %s; not '
+                         'using them', role_arn, creds.expiration)
+            return None
+        return creds
+
+    def put(self, role_arn, creds, external_id=None,
+            session_name='awslimitchecker'):
+        """
+        Cache credentials for the given role. Errors are logged, not raised.
+
+        :param role_arn: ARN of the assumed role
+        :type role_arn: str
+        :param creds: the credentials to cache
+        :type creds: :py:class:`~.ConnectableCredentials`
+        :param external_id: External ID used to assume the role, if any
+        :type external_id: str
+        :param session_name: role session name used to assume the role
+        :type session_name: str
+        """
+        path = self._file_path(role_arn, external_id, session_name)
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, 0o700)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as fh:
+                    fh.write(json.dumps(creds.to_dict()))
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except Exception:
+            logger.warning('Unable to cache STS credentials in %s', path,
+                           exc_info=True)
+
 
 class Connectable(object):
     """
     Mix-in helper class for connecting to AWS APIs. Centralizes logic of
     connecting via regions and/or STS.
+
+    Classes using this mix-in must set a ``_client_registry`` attribute to a
+    :py:class:`~.ClientRegistry` instance.
     """
 
     @property
@@ -105,7 +630,8 @@ class Connectable(object):
         Connect to an AWS API via boto3 low-level client and set ``self.conn``
         to the `boto3.client <https://boto3.readthed
         ocs.org/en/latest/reference/core/boto3.html#boto3.client>`_ object
-        (a ``botocore.client.*`` instance). If ``self.conn`` is not None,
+        (a ``botocore.client.*`` instance), obtained from
+        ``self._client_registry``. If ``self.conn`` is not None,
         do nothing. This connects to the API name given by ``self.api_name``.
 
         :returns: None
@@ -115,7 +641,7 @@ class Connectable(object):
         kwargs = dict(self._boto3_connection_kwargs)
         if self._max_retries_config is not None:
             kwargs['config'] = self._max_retries_config
-        self.conn = boto3.client(self.api_name, **kwargs)
+        self.conn = self._client_registry.client(self.api_name, **kwargs)
         logger.info("Connected to %s in region %s",
                     self.api_name, self.conn._client_config.region_name)
 
@@ -124,8 +650,8 @@ class Connectable(object):
         Connect to an AWS API via boto3 high-level resource connection and set
         ``self.resource_conn`` to the `boto3.resource <https://boto3.readthed
         ocs.org/en/latest/reference/core/boto3.html#boto3.resource>`_ object
-        (a ``boto3.resources.factory.*.ServiceResource`` instance).
-        If ``self.resource_conn`` is not None,
+        (a ``boto3.resources.factory.*.ServiceResource`` instance), obtained
+        from ``self._client_registry``. If ``self.resource_conn`` is not None,
         do nothing. This connects to the API name given by ``self.api_name``.
 
         :returns: None
@@ -135,6 +661,8 @@ class Connectable(object):
         kwargs = dict(self._boto3_connection_kwargs)
         if self._max_retries_config is not None:
             kwargs['config'] = self._max_retries_config
-        self.resource_conn = boto3.resource(self.api_name, **kwargs)
+        self.resource_conn = self._client_registry.resource(
+            self.api_name, **kwargs
+        )
         logger.info("Connected to %s (resource) in region %s", self.api_name,
                     self.resource_conn.meta.client._client_config.region_name)
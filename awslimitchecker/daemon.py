@@ -0,0 +1,520 @@
+"""
+awslimitchecker/daemon.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from .limit import (
+    SOURCE_DEFAULT, SOURCE_OVERRIDE, SOURCE_TA, SOURCE_API, SOURCE_QUOTAS
+)
+from .multiregion import MultiRegionChecker
+
+logger = logging.getLogger(__name__)
+
+#: names of the limit sources, as reported by :py:class:`~.LimitCheckerDaemon`
+LIMIT_SOURCE_NAMES = {
+    SOURCE_DEFAULT: 'default',
+    SOURCE_OVERRIDE: 'override',
+    SOURCE_TA: 'ta',
+    SOURCE_API: 'api',
+    SOURCE_QUOTAS: 'quotas',
+}
+
+#: threshold status names, and their values in the Prometheus metrics
+STATUS_VALUES = {
+    'ok': 0,
+    'warning': 1,
+    'critical': 2,
+    'incomplete': 3,
+}
+
+#: Content-Type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _prometheus_escape(value):
+    """
+    Escape a label value for the Prometheus text exposition format.
+
+    :param value: the label value
+    :type value: str
+    :rtype: str
+    """
+    return str(value).replace('\\', '\\\\').replace(
+        '"', '\\"').replace('\n', '\\n')
+
+
+class LimitCheckerDaemon(object):
+
+    def __init__(self, checker, interval=300, service_intervals=None,
+                 service=None, use_ta=True, max_age=None):
+        """
+        Long-running process that keeps a checker (and so its AWS clients and
+        caches) alive, re-checks each service's usage against its thresholds
+        every ``interval`` seconds (or the service's entry in
+        ``service_intervals``), and keeps the latest limits, usage and
+        threshold status in memory for :py:meth:`~.metrics_text` and
+        :py:meth:`~.json_text`. Both of those only read the results of the
+        last check, and never make any AWS API calls.
+
+        :param checker: the checker to check services with
+        :type checker: :py:class:`~.AwsLimitChecker` or
+          :py:class:`~.MultiRegionChecker`
+        :param interval: default number of seconds between checks of each
+          service
+        :type interval: float
+        :param service_intervals: dict of service name to the number of
+          seconds between checks of that service, overriding ``interval``
+        :type service_intervals: dict
+        :param service: the name(s) of the service(s) to check, or None to
+          check all services
+        :type service: list
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        :param max_age: passed through to the checker's ``check_thresholds``
+          method, to reuse stored usage snapshots up to this many seconds old
+        :type max_age: float
+        """
+        self.checker = checker
+        self.interval = interval
+        self.service_intervals = {}
+        if service_intervals is not None:
+            self.service_intervals = service_intervals
+        self.use_ta = use_ta
+        self.max_age = max_age
+        names = checker.get_service_names()
+        if service is not None:
+            names = [s for s in names if s in service]
+        self.services = sorted(names)
+        if isinstance(checker, MultiRegionChecker):
+            self._checkers = checker.checkers
+        else:
+            self._checkers = {checker.region_name: checker}
+        self._next_check = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._results = {}
+        self._last_check = None
+        self._last_check_duration = None
+        self._check_errors = 0
+        self._metrics_body = b''
+        self._json_body = b''
+        self._render()
+
+    def _interval_for(self, service_name):
+        """
+        Return the number of seconds between checks of a service.
+
+        :param service_name: the service name
+        :type service_name: str
+        :rtype: float
+        """
+        return float(self.service_intervals.get(service_name, self.interval))
+
+    def due_services(self, now):
+        """
+        Return the sorted list of names of the services that are due to be
+        checked at ``now``; every service is due before its first check.
+
+        :param now: the current time, as a float timestamp
+        :type now: float
+        :rtype: list
+        """
+        return [
+            s for s in self.services if self._next_check.get(s, 0) <= now
+        ]
+
+    def seconds_until_due(self, now):
+        """
+        Return the number of seconds until the next service is due to be
+        checked, or zero if one is already due.
+
+        :param now: the current time, as a float timestamp
+        :type now: float
+        :rtype: float
+        """
+        if len(self.services) == 0:
+            return float(self.interval)
+        soonest = min(self._next_check.get(s, 0) for s in self.services)
+        return max(0.0, soonest - now)
+
+    def check_due(self):
+        """
+        Find the usage of all services that are due (polling Trusted Advisor
+        again, if it is used) and check it against their thresholds, and
+        replace their entries in the in-memory results. If the check fails,
+        the error is logged and counted, the previous results are kept, and
+        the services are retried after their usual interval.
+
+        :returns: names of the services that were due
+        :rtype: list
+        """
+        start = time.time()
+        due = self.due_services(start)
+        if len(due) == 0:
+            return due
+        for svc in due:
+            self._next_check[svc] = start + self._interval_for(svc)
+        logger.info('Checking services: %s', ', '.join(due))
+        try:
+            self._expire(due)
+            self.checker.check_thresholds(
+                service=due, use_ta=self.use_ta, max_age=self.max_age
+            )
+            finished = time.time()
+            results = self._collect(due, finished)
+        except Exception:
+            logger.error(
+                'Error checking services: %s', ', '.join(due), exc_info=True
+            )
+            with self._lock:
+                self._check_errors += 1
+                self._render()
+            return due
+        with self._lock:
+            for region, svcs in results.items():
+                self._results.setdefault(region, {}).update(svcs)
+            self._last_check = finished
+            self._last_check_duration = finished - start
+            self._render()
+        return due
+
+    def _expire(self, services):
+        """
+        Make the next ``check_thresholds`` call find the usage of
+        ``services`` and poll Trusted Advisor again, instead of reusing what
+        the previous check found.
+
+        :param services: names of the services to expire
+        :type services: list
+        """
+        for checker in self._checkers.values():
+            if self.use_ta:
+                checker.ta.expire_limits()
+            for svc in services:
+                if svc in checker.services:
+                    checker.services[svc]._have_usage = False
+
+    def _collect(self, services, checked_at):
+        """
+        Copy the limits, usage and threshold status of ``services`` out of
+        the checker(s) into plain dicts, so that they can be served while
+        the next check is updating the checker's objects.
+
+        :param services: names of the services to collect
+        :type services: list
+        :param checked_at: time that the services were checked at
+        :type checked_at: float
+        :returns: dict of region name to dict of service name to service
+          results
+        :rtype: dict
+        """
+        res = {}
+        for region, checker in self._checkers.items():
+            for svc in services:
+                if svc not in checker.services:
+                    continue
+                limits = checker.services[svc].get_limits()
+                res.setdefault(region, {})[svc] = {
+                    'checked_at': checked_at,
+                    'limits': dict(
+                        (name, self._limit_result(lim))
+                        for name, lim in limits.items()
+                    )
+                }
+        return res
+
+    def _limit_result(self, limit):
+        """
+        Return the current value, usage and threshold status of a limit.
+
+        :param limit: the limit
+        :type limit: :py:class:`~.AwsLimit`
+        :rtype: dict
+        """
+        status = 'ok'
+        if len(limit.get_criticals()) > 0:
+            status = 'critical'
+        elif len(limit.get_warnings()) > 0:
+            status = 'warning'
+        elif limit.is_incomplete():
+            status = 'incomplete'
+        usage = [
+            {
+                'resource_id': u.resource_id,
+                'value': u.get_value(),
+                'maximum': u.get_maximum()
+            }
+            for u in limit.get_current_usage()
+        ]
+        max_usage = None
+        if len(usage) > 0:
+            max_usage = max(u['value'] for u in usage)
+        return {
+            'limit': limit.get_limit(),
+            'source': LIMIT_SOURCE_NAMES.get(limit.get_limit_source()),
+            'usage': usage,
+            'max_usage': max_usage,
+            'status': status,
+        }
+
+    def _render(self):
+        """
+        Render the in-memory results as JSON and as Prometheus metrics. Must
+        be called with ``self._lock`` held.
+        """
+        self._json_body = json.dumps({
+            'last_check': self._last_check,
+            'last_check_duration': self._last_check_duration,
+            'check_errors': self._check_errors,
+            'regions': self._results,
+        }, sort_keys=True).encode('utf-8')
+        self._metrics_body = self._render_prometheus().encode('utf-8')
+
+    def _render_prometheus(self):
+        """
+        Return the in-memory results in the Prometheus text exposition
+        format. Must be called with ``self._lock`` held.
+
+        :rtype: str
+        """
+        samples = {
+            'limit': [],
+            'usage': [],
+            'threshold_status': [],
+            'service_last_check_timestamp_seconds': [],
+        }
+        for region in sorted(self._results.keys(), key=str):
+            for svc in sorted(self._results[region].keys()):
+                res = self._results[region][svc]
+                labels = [('region', region), ('service', svc)]
+                samples['service_last_check_timestamp_seconds'].append(
+                    (labels, res['checked_at'])
+                )
+                for name in sorted(res['limits'].keys()):
+                    lim = res['limits'][name]
+                    lim_labels = labels + [('limit', name)]
+                    samples['limit'].append((lim_labels, lim['limit']))
+                    samples['usage'].append((lim_labels, lim['max_usage']))
+                    samples['threshold_status'].append(
+                        (lim_labels, STATUS_VALUES[lim['status']])
+                    )
+        metrics = [
+            ('limit', 'gauge', 'Current value of the limit'),
+            ('usage', 'gauge', 'Highest current usage of the limit'),
+            ('threshold_status', 'gauge',
+             'Threshold status of the limit (0=ok, 1=warning, 2=critical, '
+             '3=incomplete)'),
+            ('service_last_check_timestamp_seconds', 'gauge',
+             'Time that the service was last checked'),
+        ]
+        lines = []
+        for name, mtype, helptext in metrics:
+            lines.extend(self._prometheus_metric(
+                name, mtype, helptext, samples[name]
+            ))
+        lines.extend(self._prometheus_metric(
+            'check_errors_total', 'counter', 'Number of failed checks',
+            [([], self._check_errors)]
+        ))
+        lines.extend(self._prometheus_metric(
+            'last_check_timestamp_seconds', 'gauge',
+            'Time that the last successful check finished',
+            [([], self._last_check)]
+        ))
+        lines.extend(self._prometheus_metric(
+            'last_check_duration_seconds', 'gauge',
+            'Duration of the last successful check',
+            [([], self._last_check_duration)]
+        ))
+        return '\n'.join(lines) + '\n'
+
+    def _prometheus_metric(self, name, mtype, helptext, samples):
+        """
+        Return the lines for one metric in the Prometheus text exposition
+        format. Samples with a value of None are omitted.
+
+        :param name: metric name, without the ``awslimitchecker_`` prefix
+        :type name: str
+        :param mtype: metric type
+        :type mtype: str
+        :param helptext: metric help text
+        :type helptext: str
+        :param samples: list of (labels, value) tuples, where labels is a list
+          of (name, value) tuples
+        :type samples: list
+        :rtype: list
+        """
+        name = 'awslimitchecker_' + name
+        lines = [
+            '# HELP {n} {h}'.format(n=name, h=helptext),
+            '# TYPE {n} {t}'.format(n=name, t=mtype),
+        ]
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_str = ''
+            if len(labels) > 0:
+                label_str = '{%s}' % ','.join(
+                    '{k}="{v}"'.format(k=k, v=_prometheus_escape(v))
+                    for k, v in labels
+                )
+            lines.append('{n}{l} {v}'.format(n=name, l=label_str, v=value))
+        return lines
+
+    def metrics_text(self):
+        """
+        Return the results of the latest checks in the Prometheus text
+        exposition format.
+
+        :rtype: bytes
+        """
+        with self._lock:
+            return self._metrics_body
+
+    def json_text(self):
+        """
+        Return the results of the latest checks as JSON.
+
+        :rtype: bytes
+        """
+        with self._lock:
+            return self._json_body
+
+    def run_scheduler(self):
+        """
+        Check services as they become due, until :py:meth:`~.stop` is called.
+        """
+        while not self._stopping.is_set():
+            self.check_due()
+            self._stopping.wait(self.seconds_until_due(time.time()))
+
+    def stop(self):
+        """
+        Stop :py:meth:`~.run_scheduler` after the current check, if any.
+        """
+        self._stopping.set()
+
+    def make_server(self, address='127.0.0.1', port=9555):
+        """
+        Return an HTTP server for this daemon's results, listening on
+        ``address`` and ``port``. It serves :py:meth:`~.metrics_text` at
+        ``/metrics`` and :py:meth:`~.json_text` at ``/`` and ``/json``.
+
+        :param address: address to listen on
+        :type address: str
+        :param port: port to listen on
+        :type port: int
+        :rtype: :py:class:`http.server.HTTPServer`
+        """
+        return DaemonHTTPServer((address, port), self)
+
+    def serve(self, address='127.0.0.1', port=9555):
+        """
+        Run :py:meth:`~.run_scheduler` in a background thread, and serve the
+        results over HTTP (see :py:meth:`~.make_server`) until interrupted.
+
+        :param address: address to listen on
+        :type address: str
+        :param port: port to listen on
+        :type port: int
+        """
+        server = self.make_server(address, port)
+        scheduler = threading.Thread(
+            target=self.run_scheduler, name='awslimitchecker-scheduler'
+        )
+        scheduler.daemon = True
+        scheduler.start()
+        logger.info('Serving results on http://%s:%s/', address, port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info('Interrupted; shutting down')
+        finally:
+            self.stop()
+            server.server_close()
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve the in-memory results of a :py:class:`~.LimitCheckerDaemon`
+    (``self.server.limit_daemon``).
+    """
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = self.server.limit_daemon.metrics_text()
+            ctype = PROMETHEUS_CONTENT_TYPE
+        elif path in ['/', '/json']:
+            body = self.server.limit_daemon.json_text()
+            ctype = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', ctype)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+
+class DaemonHTTPServer(ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server for the results of a :py:class:`~.LimitCheckerDaemon`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, limit_daemon):
+        """
+        :param server_address: (address, port) tuple to listen on
+        :type server_address: tuple
+        :param limit_daemon: the daemon whose results to serve
+        :type limit_daemon: :py:class:`~.LimitCheckerDaemon`
+        """
+        self.limit_daemon = limit_daemon
+        HTTPServer.__init__(self, server_address, DaemonRequestHandler)
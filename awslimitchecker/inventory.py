@@ -0,0 +1,172 @@
+"""
+awslimitchecker/inventory.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import threading
+
+from .utils import paginate_items
+
+logger = logging.getLogger(__name__)
+
+
+class Ec2Inventory(object):
+    """
+    Lazily-populated, run-scoped inventory of EC2 networking resources that
+    are needed by more than one service (currently
+    :py:class:`~._Ec2Service` and :py:class:`~._VpcService`).
+
+    Each resource type is retrieved from the API in full, the first time it
+    is accessed, and then shared by every consumer of the inventory. Since
+    services may run concurrently, access is thread-safe: a second consumer
+    asking for a resource type that is currently being retrieved blocks until
+    the first retrieval completes, instead of retrieving it again.
+
+    Resources are retrieved without an ``owner-id`` filter, and are returned
+    as lists of the dicts from the corresponding ``Describe*`` API responses;
+    consumers that only want resources owned by the current account must
+    filter on ``OwnerId`` themselves.
+
+    Instances should be obtained from :py:meth:`.ClientRegistry.ec2_inventory`
+    rather than constructed directly.
+    """
+
+    def __init__(self, conn):
+        """
+        :param conn: boto3 EC2 low-level client to retrieve resources with
+        """
+        self.conn = conn
+        self._lock = threading.Lock()
+        #: dict of resource type name to threading.Lock
+        self._type_locks = {}
+        #: dict of resource type name to list of resource dicts
+        self._resources = {}
+
+    def _get(self, name, func, data_key, paginate=True):
+        """
+        Return the list of resources of type ``name``, retrieving them with
+        ``func`` (paginated with NextToken, if ``paginate`` is True) if they
+        have not already been retrieved.
+
+        :param name: resource type name, used for logging and caching
+        :type name: str
+        :param func: boto3 client method to call
+        :param data_key: key in the response containing the list of resources
+        :type data_key: str
+        :param paginate: whether ``func`` must be paginated
+        :type paginate: bool
+        :rtype: list
+        """
+        with self._lock:
+            type_lock = self._type_locks.setdefault(name, threading.Lock())
+        with type_lock:
+            if name not in self._resources:
+                logger.debug('Retrieving %s for EC2 inventory', name)
+                if paginate:
+                    self._resources[name] = list(paginate_items(
+                        func, alc_marker_path=['NextToken'],
+                        alc_data_path=[data_key], alc_marker_param='NextToken'
+                    ))
+                else:
+                    self._resources[name] = func()[data_key]
+                logger.debug(
+                    'Found %d %s', len(self._resources[name]), name
+                )
+            return self._resources[name]
+
+    @property
+    def network_interfaces(self):
+        """
+        Return all Network Interfaces (ENIs) in the region.
+
+        :returns: list of ``NetworkInterfaces`` dicts from
+          ``DescribeNetworkInterfaces``
+        :rtype: list
+        """
+        return self._get(
+            'network interfaces', self.conn.describe_network_interfaces,
+            'NetworkInterfaces'
+        )
+
+    @property
+    def security_groups(self):
+        """
+        Return all Security Groups in the region.
+
+        :returns: list of ``SecurityGroups`` dicts from
+          ``DescribeSecurityGroups``
+        :rtype: list
+        """
+        return self._get(
+            'security groups', self.conn.describe_security_groups,
+            'SecurityGroups'
+        )
+
+    @property
+    def subnets(self):
+        """
+        Return all Subnets in the region.
+
+        :returns: list of ``Subnets`` dicts from ``DescribeSubnets``
+        :rtype: list
+        """
+        return self._get('subnets', self.conn.describe_subnets, 'Subnets')
+
+    @property
+    def vpcs(self):
+        """
+        Return all VPCs in the region.
+
+        :returns: list of ``Vpcs`` dicts from ``DescribeVpcs``
+        :rtype: list
+        """
+        return self._get('VPCs', self.conn.describe_vpcs, 'Vpcs')
+
+    @property
+    def addresses(self):
+        """
+        Return all Elastic IP addresses (both VPC and EC2-Classic) in the
+        region. ``DescribeAddresses`` is not paginated.
+
+        :returns: list of ``Addresses`` dicts from ``DescribeAddresses``
+        :rtype: list
+        """
+        return self._get(
+            'addresses', self.conn.describe_addresses, 'Addresses',
+            paginate=False
+        )
@@ -37,6 +37,14 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import heapq
+import logging
+import sys
+
+from .utils import current_call_abandoned
+
+logger = logging.getLogger(__name__)
+
 #: indicates a limit value that came from hard-coded defaults in awslimitchecker
 SOURCE_DEFAULT = 0
 
@@ -52,6 +60,11 @@ SOURCE_API = 3
 #: indicates a limit value that came from the Service Quotas service
 SOURCE_QUOTAS = 4
 
+#: number of buckets in the utilization histogram of a
+#: :py:class:`~.UsageSummary`; each bucket covers 10 percentage points of
+#: utilization, and the last one covers 100% and above
+USAGE_HISTOGRAM_BUCKETS = 11
+
 
 class AwsLimit(object):
 
@@ -146,6 +159,29 @@ class AwsLimit(object):
         self._quotas_unit = quotas_unit
         self.quotas_limit = None
         self.quotas_unit_converter = quotas_unit_converter
+        self._incomplete_reason = None
+        self._usage_retention = None
+        # heap of (utilization, value, sequence, usage) for the retained
+        # usages that did not cross a threshold
+        self._retained = []
+        # heap of (utilization, value, sequence, usage) for the highest-
+        # utilization usages that were not retained, re-evaluated by
+        # check_thresholds() in case the limit or thresholds changed
+        self._dropped = []
+        # (maximum value and utilization of the usages with a resource
+        # maximum, maximum value of those without) of the usages that were
+        # discarded entirely, or None if there are none
+        self._lost = None
+        # why usage that was discarded entirely may cross a threshold, as of
+        # the last threshold check
+        self._lost_reason = None
+        self._usage_seq = 0
+        self._usage_summary = None
+        # incremented whenever the current usage changes
+        self._usage_version = 0
+        # the _threshold_key() as of the last threshold check, and its result
+        self._checked_key = None
+        self._thresholds_ok = True
 
     def set_limit_override(self, limit_value, override_ta=True):
         """
@@ -192,6 +228,9 @@ class AwsLimit(object):
         :param limit_value: the API limit value
         :type limit_value: int
         """
+        if current_call_abandoned():
+            # the usage check that found this limit ran past its time budget
+            return
         self.api_limit = limit_value
 
     def _set_quotas_limit(self, limit_value):
@@ -203,6 +242,9 @@ class AwsLimit(object):
         :param limit_value: the Service Quotas limit value
         :type limit_value: float
         """
+        if current_call_abandoned():
+            # the usage check that found this limit ran past its time budget
+            return
         self.quotas_limit = limit_value
 
     def get_limit_source(self):
@@ -280,12 +322,65 @@ class AwsLimit(object):
         """
         return self._current_usage
 
+    def set_usage_retention(self, top_k):
+        """
+        Set how many of this limit's per-resource usage values to keep.
+
+        By default (``top_k`` of None), every usage value added is kept. When
+        ``top_k`` is set, only the ``top_k`` values with the highest
+        utilization are kept, plus every value that crossed a warning or
+        critical threshold when it was added; all other values are only
+        counted in the summary returned by :py:meth:`~.get_usage_summary`.
+        This bounds the memory used by limits with one usage value per
+        resource (i.e. "Rules per VPC security group") in large accounts.
+
+        Thresholds are evaluated as values are added, so
+        :py:meth:`~.check_thresholds` catches every crossing as long as the
+        limit and thresholds do not change after usage is found. In case they
+        do (i.e. when a lower limit is found by Trusted Advisor after usage
+        was found), the next ``top_k`` values by utilization are also kept,
+        out of :py:meth:`~.get_current_usage`, and evaluated along with the
+        retained ones, and only the maximum value and utilization of the
+        remaining values are kept. If those show that a discarded value may
+        cross a threshold, the limit is marked as incomplete (see
+        :py:meth:`~.is_incomplete`) and :py:meth:`~.check_thresholds` returns
+        False, so that no crossing goes unreported. Any current usage is
+        re-added under the new setting.
+
+        :param top_k: number of usage values below thresholds to keep, or
+          None to keep all usage values
+        :type top_k: int
+        :raises: ValueError if ``top_k`` is less than 1
+        """
+        if top_k is not None and top_k < 1:
+            raise ValueError('top_k must be at least 1')
+        usage = self._current_usage
+        self._usage_retention = top_k
+        self._clear_usage()
+        for u in usage:
+            self._store_usage(u)
+
+    def get_usage_summary(self):
+        """
+        Return a summary of all usage values added for this limit, including
+        any that were not kept because of :py:meth:`~.set_usage_retention`.
+
+        :rtype: :py:class:`~.UsageSummary`
+        """
+        if self._usage_summary is not None:
+            return self._usage_summary
+        summary = UsageSummary()
+        for u in self._current_usage:
+            summary.add(u.value, u.maximum or self.get_limit())
+        return summary
+
     def get_current_usage_str(self):
         """
         Get the a string describing the current usage for this limit.
 
         If no usage has been added for this limit, the result will be
-        "<unknown>".
+        "<unknown>", or "<incomplete>" if the usage check for this limit's
+        service was abandoned (see :py:meth:`~.is_incomplete`).
 
         If the limit has only one current usage instance, this will be
         that instance's ``AwsLimitUsage.__str__`` value.
@@ -300,16 +395,22 @@ class AwsLimit(object):
         :returns: representation of current usage
         :rtype: str
         """
-        if len(self._current_usage) == 0:
-            return '<unknown>'
-        if len(self._current_usage) == 1:
-            return str(self._current_usage[0])
-        lim_str = ', '.join([str(x) for x in sorted(self._current_usage)])
-        s = 'max: {m} ({l})'.format(
-            m=str(max(self._current_usage)),
-            l=lim_str
+        return format_usage_str(
+            sorted(self._current_usage),
+            incomplete=self.is_incomplete(),
+            not_retained=self._usage_not_retained()
         )
-        return s
+
+    def _usage_not_retained(self):
+        """
+        Return the number of usage values that were added but not kept
+        because of :py:meth:`~.set_usage_retention`.
+
+        :rtype: int
+        """
+        if self._usage_summary is None:
+            return 0
+        return self._usage_summary.count - len(self._current_usage)
 
     def _add_current_usage(self, value, maximum=None, resource_id=None,
                            aws_type=None):
@@ -335,7 +436,15 @@ class AwsLimit(object):
           `CloudFormation <http://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/aws-template-resource-type-ref.html>`_  # noqa
         :type aws_type: str
         """
-        self._current_usage.append(
+        if current_call_abandoned():
+            # the usage check that produced this value ran past its time
+            # budget; its results have already been discarded
+            return
+        if aws_type is not None:
+            # share one copy of each type name among all usages, including
+            # those loaded from usage snapshots
+            aws_type = sys.intern(aws_type)
+        self._store_usage(
             AwsLimitUsage(
                 self,
                 value,
@@ -345,9 +454,202 @@ class AwsLimit(object):
             )
         )
 
-    def _reset_usage(self):
-        """Discard all current usage data."""
+    def _store_usage(self, usage):
+        """
+        Add ``usage`` to the current usage, subject to the retention set by
+        :py:meth:`~.set_usage_retention`.
+
+        :param usage: the usage to add
+        :type usage: :py:class:`~.AwsLimitUsage`
+        """
+        self._usage_version += 1
+        if self._usage_retention is None:
+            self._current_usage.append(usage)
+            return
+        limit = usage.maximum or self.get_limit()
+        self._usage_summary.add(usage.value, limit)
+        if self._crosses_threshold(usage.value, limit):
+            self._current_usage.append(usage)
+            return
+        util = 0.0
+        if limit:
+            util = usage.value / (limit * 1.0)
+        entry = (util, usage.value, self._usage_seq, usage)
+        self._usage_seq += 1
+        if len(self._retained) < self._usage_retention:
+            heapq.heappush(self._retained, entry)
+            self._current_usage.append(usage)
+            return
+        if entry[:2] <= self._retained[0][:2]:
+            self._set_dropped(entry)
+            return
+        evicted_entry = heapq.heapreplace(self._retained, entry)
+        self._set_dropped(evicted_entry)
+        evicted = evicted_entry[3]
+        # AwsLimitUsage compares by value, so find the evicted one by identity
+        for idx, u in enumerate(self._current_usage):
+            if u is evicted:
+                del self._current_usage[idx]
+                break
+        self._current_usage.append(usage)
+
+    def _set_dropped(self, entry):
+        """
+        Record that the usage in heap entry ``entry`` was not retained. The
+        ``top_k`` highest-utilization usages that were not retained are kept
+        in ``self._dropped``; only the maximum value and utilization of the
+        others are kept, in ``self._lost``.
+
+        :param entry: the (utilization, value, sequence, usage) heap entry
+        :type entry: tuple
+        """
+        if len(self._dropped) < self._usage_retention:
+            heapq.heappush(self._dropped, entry)
+            return
+        if entry[:2] > self._dropped[0][:2]:
+            entry = heapq.heapreplace(self._dropped, entry)
+        usage = entry[3]
+        lost = list(self._lost or (None, None, None))
+        if usage.maximum:
+            lost[0] = max(usage.value, lost[0] or usage.value)
+            util = usage.value / (usage.maximum * 1.0)
+            lost[1] = max(util, lost[1] or util)
+        else:
+            lost[2] = max(usage.value, lost[2] or usage.value)
+        self._lost = tuple(lost)
+
+    def _usage_to_check(self):
+        """
+        Return the usages to evaluate in :py:meth:`~.check_thresholds`: the
+        current usage, plus the highest-utilization usages that were not
+        retained (see :py:meth:`~.set_usage_retention`), in the order they
+        were added. The latter did not cross a threshold when they were
+        added, but may cross one if the limit or thresholds changed since.
+
+        :rtype: :py:obj:`list` of :py:class:`~.AwsLimitUsage`
+        """
+        if len(self._dropped) == 0:
+            return self._current_usage
+        return self._current_usage + [
+            e[3] for e in sorted(self._dropped, key=lambda e: e[2])
+        ]
+
+    def _lost_may_cross(self, lim_value, thresholds):
+        """
+        Return whether any usage that was discarded entirely because of
+        :py:meth:`~.set_usage_retention` may cross a threshold.
+
+        :param lim_value: the effective limit value
+        :type lim_value: :py:obj:`int` or :py:obj:`float`
+        :param thresholds: thresholds, as returned by
+          :py:meth:`~._get_thresholds`
+        :type thresholds: tuple
+        :rtype: bool
+        """
+        if self._lost is None:
+            return False
+        (max_value, max_util, max_plain) = self._lost
+        (warn_int, warn_pct, crit_int, crit_pct) = thresholds
+        # as in check_thresholds(), usage without a resource maximum is only
+        # evaluated if the limit is known
+        values = [max_value]
+        if lim_value:
+            values.append(max_plain)
+        values = [v for v in values if v is not None]
+        for count in (warn_int, crit_int):
+            if count is not None and any(v >= count for v in values):
+                return True
+        min_pct = min(warn_pct, crit_pct)
+        if max_util is not None and max_util * 100 >= min_pct:
+            return True
+        if max_plain is None or not lim_value:
+            return False
+        return (max_plain / (lim_value * 1.0)) * 100 >= min_pct
+
+    def _crosses_threshold(self, value, limit):
+        """
+        Return whether a usage value crosses any of this limit's current
+        warning or critical thresholds, as evaluated by
+        :py:meth:`~.check_thresholds`.
+
+        :param value: the usage value
+        :type value: :py:obj:`int` or :py:obj:`float`
+        :param limit: the limit (or resource maximum) the value applies to
+        :type limit: :py:obj:`int` or :py:obj:`float`
+        :rtype: bool
+        """
+        if limit is None or limit == 0:
+            return False
+        (warn_int, warn_pct, crit_int, crit_pct) = self._get_thresholds()
+        if crit_int is not None and value >= crit_int:
+            return True
+        if warn_int is not None and value >= warn_int:
+            return True
+        pct = (value / (limit * 1.0)) * 100
+        return pct >= min(warn_pct, crit_pct)
+
+    def _clear_usage(self):
+        """
+        Discard all current usage data and any usage summary.
+        """
+        self._usage_version += 1
         self._current_usage = []
+        self._retained = []
+        self._dropped = []
+        self._lost = None
+        self._lost_reason = None
+        self._usage_summary = None
+        if self._usage_retention is not None:
+            self._usage_summary = UsageSummary()
+
+    def _reset_usage(self):
+        """
+        Discard all current usage data, and clear any mark set by
+        :py:meth:`~._set_incomplete`.
+        """
+        if current_call_abandoned():
+            return
+        self._clear_usage()
+        self._incomplete_reason = None
+
+    def _set_incomplete(self, reason):
+        """
+        Mark this limit's usage as incomplete, i.e. because the usage check
+        for its service did not finish within its time budget, and discard
+        any usage that was found and the results of any previous
+        :py:meth:`~.check_thresholds`.
+
+        This method should only be called by :py:class:`~.AwsLimitChecker`.
+
+        :param reason: description of why the usage is incomplete
+        :type reason: str
+        """
+        self._clear_usage()
+        self._set_threshold_results([], [])
+        self._incomplete_reason = reason
+
+    def is_incomplete(self):
+        """
+        Return whether the current usage for this limit is incomplete,
+        because the usage check for its service was abandoned, or because
+        usage that was not retained (see :py:meth:`~.set_usage_retention`)
+        may cross a threshold as of the last :py:meth:`~.check_thresholds`.
+        See :py:meth:`~.get_incomplete_reason`.
+
+        :rtype: bool
+        """
+        return self.get_incomplete_reason() is not None
+
+    def get_incomplete_reason(self):
+        """
+        Return a description of why the current usage for this limit is
+        incomplete, or None if it is not.
+
+        :rtype: :py:obj:`str` or :py:obj:`None`
+        """
+        if self._incomplete_reason is not None:
+            return self._incomplete_reason
+        return self._lost_reason
 
     def _get_thresholds(self):
         """
@@ -407,11 +709,17 @@ class AwsLimit(object):
         Check this limit's current usage against the specified default
         thresholds, and any custom theresholds that have been set on the
         class instance. Return True if usage is within thresholds, or false if
-        warning or critical thresholds have been surpassed.
+        warning or critical thresholds have been surpassed (or, with
+        :py:meth:`~.set_usage_retention`, usage that was not retained may
+        have surpassed them; see :py:meth:`~.is_incomplete`).
 
         This method sets internal variables in this instance which can be
         queried via :py:meth:`~.get_warnings` and :py:meth:`~.get_criticals`
-        to obtain further details about the thresholds that were crossed.
+        to obtain further details about the thresholds that were crossed;
+        these replace the results of any previous call. If the current usage,
+        the effective limit (:py:meth:`~.get_limit`) and the thresholds are
+        all unchanged since the previous call, its results are kept and
+        returned without evaluating the usage again.
 
         **Note** This function returns False if *any* thresholds were crossed.
         Please be aware of this when setting threshold overrides to suppress
@@ -424,27 +732,87 @@ class AwsLimit(object):
         :returns: False if any thresholds were crossed, True otherwise
         :rtype: bool
         """
-        (warn_int, warn_pct, crit_int, crit_pct) = self._get_thresholds()
-        all_ok = True
-        for u in self._current_usage:
+        key = self._threshold_key()
+        if self._thresholds_current(key):
+            return self._thresholds_ok
+        (_, lim_value, (warn_int, warn_pct, crit_int, crit_pct)) = key
+        warnings = []
+        criticals = []
+        for u in self._usage_to_check():
             usage = u.get_value()
-            limit = u.get_maximum() or self.get_limit()
+            limit = u.get_maximum() or lim_value
             if limit is None or limit == 0:
                 continue
             pct = (usage / (limit * 1.0)) * 100
             if crit_int is not None and usage >= crit_int:
-                self._criticals.append(u)
-                all_ok = False
+                criticals.append(u)
             elif pct >= crit_pct:
-                self._criticals.append(u)
-                all_ok = False
+                criticals.append(u)
             elif warn_int is not None and usage >= warn_int:
-                self._warnings.append(u)
-                all_ok = False
+                warnings.append(u)
             elif pct >= warn_pct:
-                self._warnings.append(u)
-                all_ok = False
-        return all_ok
+                warnings.append(u)
+        self._set_threshold_results(warnings, criticals, key)
+        return self._thresholds_ok
+
+    def _threshold_key(self):
+        """
+        Return everything the result of :py:meth:`~.check_thresholds` depends
+        on: a tuple of the current usage version (which changes whenever
+        usage is added or reset), the effective limit value and the
+        thresholds (as returned by :py:meth:`~._get_thresholds`).
+
+        :rtype: tuple
+        """
+        return (self._usage_version, self.get_limit(), self._get_thresholds())
+
+    def _thresholds_current(self, key):
+        """
+        Return whether the results of the last threshold check are still
+        valid for ``key``, as returned by :py:meth:`~._threshold_key`.
+
+        :param key: the current threshold key
+        :type key: tuple
+        :rtype: bool
+        """
+        return key == self._checked_key
+
+    def _set_threshold_results(self, warnings, criticals, key=None):
+        """
+        Store the results of a threshold check done elsewhere (i.e. by
+        :py:func:`~.evaluate_thresholds`) as if :py:meth:`~.check_thresholds`
+        had been called.
+
+        :param warnings: usages that crossed the warning threshold
+        :type warnings: :py:obj:`list` of :py:class:`~.AwsLimitUsage`
+        :param criticals: usages that crossed the critical threshold
+        :type criticals: :py:obj:`list` of :py:class:`~.AwsLimitUsage`
+        :param key: the :py:meth:`~._threshold_key` the results were
+          evaluated for; if None, the next :py:meth:`~.check_thresholds`
+          will evaluate the usage again
+        :type key: tuple
+        """
+        self._warnings = warnings
+        self._criticals = criticals
+        self._checked_key = key
+        self._lost_reason = None
+        if self._lost is not None:
+            (_, lim_value, thresholds) = key or self._threshold_key()
+            if self._lost_may_cross(lim_value, thresholds):
+                self._lost_reason = (
+                    'usage values that were not retained may cross a '
+                    'threshold since the limit or thresholds changed; '
+                    'disable usage retention to see them'
+                )
+                logger.warning(
+                    'Usage values of %s limit "%s" that were not retained '
+                    'may cross a threshold since the limit or thresholds '
+                    'changed', self.service.service_name, self.name
+                )
+        self._thresholds_ok = (
+            len(warnings) == 0 and len(criticals) == 0 and
+            self._lost_reason is None
+        )
 
     def get_warnings(self):
         """
@@ -529,8 +897,100 @@ class AwsLimit(object):
         return self._quotas_unit
 
 
+def format_usage_str(sorted_usage, incomplete=False, not_retained=0):
+    """
+    Return the string describing the usage of a limit, as returned by
+    :py:meth:`.AwsLimit.get_current_usage_str`.
+
+    :param sorted_usage: the limit's usage, sorted in ascending order
+    :type sorted_usage: :py:obj:`list` of :py:class:`~.AwsLimitUsage`
+    :param incomplete: whether the limit's usage is incomplete
+    :type incomplete: bool
+    :param not_retained: number of usage values not retained
+    :type not_retained: int
+    :rtype: str
+    """
+    if len(sorted_usage) == 0:
+        if incomplete:
+            return '<incomplete>'
+        return '<unknown>'
+    if len(sorted_usage) == 1 and not_retained == 0:
+        return str(sorted_usage[0])
+    lim_str = ', '.join([str(x) for x in sorted_usage])
+    if not_retained > 0:
+        lim_str += '; {n} more not retained'.format(n=not_retained)
+    # sorting is stable, so this is the same usage as max() of the unsorted
+    # list would return
+    return 'max: {m} ({l})'.format(m=str(max(sorted_usage)), l=lim_str)
+
+
+class UsageSummary(object):
+    """
+    Exact count and maximum of all usage values added for one
+    :py:class:`~.AwsLimit`, along with a histogram of their utilization
+    (see :py:data:`~.USAGE_HISTOGRAM_BUCKETS`). Returned by
+    :py:meth:`.AwsLimit.get_usage_summary`.
+    """
+
+    __slots__ = ('count', 'maximum', 'histogram')
+
+    def __init__(self):
+        #: number of usage values
+        self.count = 0
+        #: maximum usage value, or None if there are none
+        self.maximum = None
+        #: number of usage values in each utilization bucket; values whose
+        #: limit is unknown are not included
+        self.histogram = [0] * USAGE_HISTOGRAM_BUCKETS
+
+    def add(self, value, limit):
+        """
+        Add one usage value to the summary.
+
+        :param value: the usage value
+        :type value: :py:obj:`int` or :py:obj:`float`
+        :param limit: the limit (or resource maximum) the value applies to,
+          or None if unknown
+        :type limit: :py:obj:`int` or :py:obj:`float`
+        """
+        self.count += 1
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        if limit is None or limit == 0:
+            return
+        bucket = int((value * 10.0) / limit)
+        bucket = max(0, min(bucket, USAGE_HISTOGRAM_BUCKETS - 1))
+        self.histogram[bucket] += 1
+
+    def utilization_percentile(self, percentile):
+        """
+        Return the lower bound, in percent, of the histogram bucket that holds
+        the given percentile of utilization; i.e. a return value of 70 means
+        that the percentile is between 70% and 80% utilization. Return None if
+        no usage values with a known limit were added.
+
+        :param percentile: the percentile to find, from 0 to 100
+        :type percentile: :py:obj:`int` or :py:obj:`float`
+        :rtype: int
+        """
+        total = sum(self.histogram)
+        if total == 0:
+            return None
+        wanted = total * (min(percentile, 100) / 100.0)
+        seen = 0
+        for idx, count in enumerate(self.histogram):
+            seen += count
+            if seen >= wanted and count > 0:
+                return idx * 10
+
+
 class AwsLimitUsage(object):
 
+    # limits such as "Rules per VPC security group" have one usage per
+    # resource, so there can be a great many of these; store them without
+    # a per-instance ``__dict__``.
+    __slots__ = ('limit', 'value', 'maximum', 'resource_id', 'aws_type')
+
     def __init__(self, limit, value, maximum=None, resource_id=None,
                  aws_type=None):
         """
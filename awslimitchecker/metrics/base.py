@@ -61,6 +61,7 @@ class MetricsProvider(object):
         self._region_name = region_name
         self._duration = 0.0
         self._limits = []
+        self._results = {}
 
     def set_run_duration(self, duration):
         """
@@ -81,6 +82,36 @@ class MetricsProvider(object):
         """
         self._limits.append(limit)
 
+    def add_result(self, result):
+        """
+        Cache all of the limits in a :py:class:`~.CheckResult` for later
+        sending to the metrics store.
+
+        :param result: the result of a check
+        :type result: :py:class:`~.CheckResult`
+        """
+        for r in result:
+            self._limits.append(r.limit)
+            self._results[id(r.limit)] = r
+
+    def _max_usage(self, limit):
+        """
+        Return the value of the highest current usage of a cached limit, or
+        0 if it has no usage. This uses the limit's :py:class:`~.LimitResult`
+        if it was added with :py:meth:`~.add_result`.
+
+        :param limit: a cached limit
+        :type limit: AwsLimit
+        :rtype: :py:obj:`int` or :py:obj:`float`
+        """
+        r = self._results.get(id(limit))
+        if r is not None:
+            return r.max_usage_value
+        u = limit.get_current_usage()
+        if len(u) == 0:
+            return 0
+        return max(u).get_value()
+
     @abstractmethod
     def flush(self):
         """
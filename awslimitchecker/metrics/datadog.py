@@ -126,11 +126,7 @@ class Datadog(MetricsProvider):
             'tags': self._tags
         }]
         for lim in self._limits:
-            u = lim.get_current_usage()
-            if len(u) == 0:
-                max_usage = 0
-            else:
-                max_usage = max(u).get_value()
+            max_usage = self._max_usage(lim)
             mname = self._name_for_metric(lim.service.service_name, lim.name)
             series.append({
                 'metric': '%s.max_usage' % mname,
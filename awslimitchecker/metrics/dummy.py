@@ -54,11 +54,7 @@ class Dummy(MetricsProvider):
         print('Duration: %s' % self._duration)
         lines = []
         for lim in self._limits:
-            u = lim.get_current_usage()
-            if len(u) == 0:
-                max_usage = 0
-            else:
-                max_usage = max(u).get_value()
+            max_usage = self._max_usage(lim)
             limit = lim.get_limit()
             if limit is None:
                 limit = 'unknown'
@@ -0,0 +1,527 @@
+"""
+awslimitchecker/multiaccount.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import sys
+import os
+import logging
+import argparse
+import json
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import termcolor
+
+from .checker import AwsLimitChecker
+from .connectable import StsCredentialCache
+
+#: This defines the default role name to assume in other accounts that don't
+#: have a specific name (or ``null`` for no assumed role) specified in their
+#: config.json files.
+DEFAULT_ROLE_NAME = 'awslimitchecker'
+
+logger = logging.getLogger(__name__)
+
+#: The result of checking one account in one region. ``warnings`` and
+#: ``criticals`` are lists of strings describing each limit over threshold;
+#: ``error`` is None, or a string describing the exception that prevented
+#: the account/region from being checked.
+AccountRegionResult = namedtuple(
+    'AccountRegionResult',
+    ['account_id', 'account_name', 'region', 'warnings', 'criticals', 'error']
+)
+
+
+class MultiAccountConfig(object):
+
+    acct_id_re = re.compile(r'^[0-9]+$')
+
+    def __init__(self, config_dir, default_role_name=DEFAULT_ROLE_NAME):
+        """
+        Per-account and per-region configuration for
+        :py:class:`~.MultiAccountChecker`, read from a directory laid out as::
+
+            config_dir/
+              ACCOUNT-NUMBER/
+                config.json (account name, IAM role, etc.)
+                REGION_NAME/
+                  limit_overrides.json
+                  threshold_overrides.json
+
+        Each ``config.json`` may specify a ``name`` for the account and the
+        ``role_name`` to assume in it (``null`` to not assume a role). The
+        override files are optional and are in the formats accepted by
+        :py:meth:`.AwsLimitChecker.set_limit_overrides` and
+        :py:meth:`.AwsLimitChecker.set_threshold_overrides`.
+
+        :param config_dir: path to the configuration directory
+        :type config_dir: str
+        :param default_role_name: name of the role to assume in accounts whose
+          config.json does not specify ``role_name``
+        :type default_role_name: str
+        """
+        self._conf_dir = config_dir
+        self._default_role_name = default_role_name
+        self._config = {}
+        self._acct_name_to_id = {}
+        self._load_config()
+
+    def _load_config(self):
+        """load configuration from the config directory"""
+        logger.debug(
+            'Listing per-account config subdirectories in %s', self._conf_dir
+        )
+        for acct_id in sorted(os.listdir(self._conf_dir)):
+            path = os.path.join(self._conf_dir, acct_id)
+            # skip if not a directory
+            if not os.path.isdir(path):
+                continue
+            # skip if doesn't match ^[0-9]+$
+            if not self.acct_id_re.match(acct_id):
+                continue
+            self._load_account(acct_id, path)
+        # Once all configuration is loaded, build a dict of Account Name to
+        # Account ID (``self._acct_name_to_id``) for faster access to configs
+        # by name.
+        for acct_id, data in self._config.items():
+            if data['name'] is None:
+                continue
+            self._acct_name_to_id[data['name']] = acct_id
+
+    def _load_account(self, acct_id, acct_dir_path):
+        """load configuration from one per-account subdirectory"""
+        self._config[acct_id] = {
+            'name': None,
+            'role_name': self._default_role_name,
+            'regions': {}
+        }
+        self._config[acct_id].update(
+            self._load_json(os.path.join(acct_dir_path, 'config.json'))
+        )
+        self._config[acct_id]['account_id'] = acct_id
+        for region_name in sorted(os.listdir(acct_dir_path)):
+            path = os.path.join(acct_dir_path, region_name)
+            if not os.path.isdir(path):
+                continue
+            self._load_region(acct_id, region_name, path)
+
+    def _load_region(self, acct_id, region_name, path):
+        """load config from a single per-region subdirectory of an account"""
+        res = {'limit_overrides': {}, 'threshold_overrides': {}}
+        for k in res.keys():
+            fpath = os.path.join(path, '%s.json' % k)
+            if os.path.exists(fpath):
+                res[k] = self._load_json(fpath)
+        self._config[acct_id]['regions'][region_name] = res
+
+    def _load_json(self, path):
+        """read and return the JSON in the file at ``path``"""
+        logger.debug('Reading JSON from: %s', path)
+        with open(path, 'r') as fh:
+            return json.loads(fh.read())
+
+    def get_account_config(self, id_or_name):
+        """
+        Return a dictionary of account configuration for the account with the
+        specified ID or name.
+
+        :param id_or_name: ID or name of account
+        :type id_or_name: str
+        :return: configuration for specified account
+        :rtype: dict
+        :raises: :py:exc:`KeyError` if the account is not configured
+        """
+        if id_or_name in self._config:
+            return self._config[id_or_name]
+        if id_or_name in self._acct_name_to_id:
+            return self._config[self._acct_name_to_id[id_or_name]]
+        raise KeyError('Unknown account ID or name: %s' % id_or_name)
+
+    @property
+    def list_account_ids(self):
+        """
+        Return a list of the configured account IDs
+
+        :return: list of configured account IDs (strings)
+        :rtype: list
+        """
+        return sorted(self._config.keys())
+
+
+def check_account_region(account_id, region_name, role_name=None,
+                         limit_overrides={}, threshold_overrides={},
+                         checker_kwargs={}, use_ta=True):
+    """
+    Run the actual usage and limit check, with overrides, against a specific
+    account in a specific region, optionally assuming a role in the account
+    and optionally setting limit and/or threshold overrides.
+
+    This is a module-level function so that it can be run in a worker
+    process by :py:class:`~.MultiAccountChecker`; it only returns strings,
+    as the :py:class:`~.AwsLimit` objects themselves can't be sent back
+    across processes.
+
+    :param account_id: AWS account ID to check
+    :type account_id: str
+    :param region_name: AWS region name to check
+    :type region_name: str
+    :param role_name: name of the role to assume in the account, or None to
+      check using the current credentials
+    :type role_name: str
+    :param limit_overrides: limit overrides, as accepted by
+      :py:meth:`.AwsLimitChecker.set_limit_overrides`
+    :type limit_overrides: dict
+    :param threshold_overrides: threshold overrides, as accepted by
+      :py:meth:`.AwsLimitChecker.set_threshold_overrides`
+    :type threshold_overrides: dict
+    :param checker_kwargs: additional keyword arguments for the
+      :py:class:`~.AwsLimitChecker` constructor
+    :type checker_kwargs: dict
+    :param use_ta: check Trusted Advisor for information on limits
+    :type use_ta: bool
+    :returns: 2-tuple of lists of strings, warnings and criticals
+    :rtype: tuple
+    """
+    kwargs = dict(checker_kwargs)
+    kwargs['region'] = region_name
+    if role_name is not None:
+        kwargs['account_id'] = account_id
+        kwargs['account_role'] = role_name
+    checker = AwsLimitChecker(**kwargs)
+    if len(threshold_overrides) > 0:
+        checker.set_threshold_overrides(threshold_overrides)
+    if len(limit_overrides) > 0:
+        checker.set_limit_overrides(limit_overrides)
+    warnings = []
+    criticals = []
+    problems = checker.check_thresholds(use_ta=use_ta)
+    for service, svc_limits in sorted(problems.items()):
+        for limit_name, limit in sorted(svc_limits.items()):
+            for warn in limit.get_warnings():
+                warnings.append(
+                    "{s} '{n}' usage ({u}) exceeds warning threshold "
+                    "(limit={l})".format(
+                        s=service, n=limit_name, u=str(warn),
+                        l=limit.get_limit()
+                    )
+                )
+            for crit in limit.get_criticals():
+                criticals.append(
+                    "{s} '{n}' usage ({u}) exceeds critical threshold "
+                    "(limit={l})".format(
+                        s=service, n=limit_name, u=str(crit),
+                        l=limit.get_limit()
+                    )
+                )
+    return warnings, criticals
+
+
+class MultiAccountChecker(object):
+
+    def __init__(self, config, max_workers=1, checker_kwargs={}, use_ta=True):
+        """
+        Check many (account, region) pairs, as configured by a
+        :py:class:`~.MultiAccountConfig`, spreading them over a pool of
+        worker processes.
+
+        :param config: the multi-account configuration
+        :type config: :py:class:`~.MultiAccountConfig`
+        :param max_workers: maximum number of (account, region) pairs to
+          check concurrently, each in its own process. If 1 or less, pairs are
+          checked sequentially in the current process.
+        :type max_workers: int
+        :param checker_kwargs: additional keyword arguments for the
+          :py:class:`~.AwsLimitChecker` constructor, used for every pair
+        :type checker_kwargs: dict
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        """
+        self._conf = config
+        self.max_workers = max_workers
+        self.checker_kwargs = checker_kwargs
+        self.use_ta = use_ta
+
+    def work_units(self, accounts=[], region=None):
+        """
+        Return the list of (account, region) pairs to check.
+
+        :param accounts: IDs or names of accounts to check; if empty, check
+          all configured accounts
+        :type accounts: list
+        :param region: if not None, only check this region in each account
+        :type region: str
+        :returns: list of dicts, each having keys ``account_id``,
+          ``account_name``, ``region``, ``role_name``, ``limit_overrides``
+          and ``threshold_overrides``
+        :rtype: list
+        """
+        if len(accounts) == 0:
+            accounts = self._conf.list_account_ids
+        units = []
+        for acct in accounts:
+            acct_conf = self._conf.get_account_config(acct)
+            acct_id = acct_conf['account_id']
+            if region is None:
+                regions = sorted(acct_conf['regions'].keys())
+            elif region in acct_conf['regions']:
+                regions = [region]
+            else:
+                logger.warning(
+                    'Account %s is not configured for region %s',
+                    acct_id, region
+                )
+                regions = []
+            for rname in regions:
+                rconf = acct_conf['regions'][rname]
+                units.append({
+                    'account_id': acct_id,
+                    'account_name': acct_conf['name'],
+                    'region': rname,
+                    'role_name': acct_conf['role_name'],
+                    'limit_overrides': rconf['limit_overrides'],
+                    'threshold_overrides': rconf['threshold_overrides']
+                })
+        return units
+
+    def _check_kwargs(self, unit):
+        """
+        Return the keyword arguments to :py:func:`~.check_account_region` for
+        one of the units returned by :py:meth:`~.work_units`.
+        """
+        return {
+            'account_id': unit['account_id'],
+            'region_name': unit['region'],
+            'role_name': unit['role_name'],
+            'limit_overrides': unit['limit_overrides'],
+            'threshold_overrides': unit['threshold_overrides'],
+            'checker_kwargs': self.checker_kwargs,
+            'use_ta': self.use_ta
+        }
+
+    def _result(self, unit, func):
+        """
+        Call ``func`` to get the (warnings, criticals) for ``unit``, and
+        return an :py:class:`~.AccountRegionResult` for it; if ``func`` raises
+        an exception, log it and record it as the result's ``error``.
+        """
+        warnings = []
+        criticals = []
+        error = None
+        try:
+            warnings, criticals = func()
+        except Exception as ex:
+            logger.error(
+                'Error checking account %s region %s: %s',
+                unit['account_id'], unit['region'], ex, exc_info=True
+            )
+            error = '%s: %s' % (ex.__class__.__name__, ex)
+        return AccountRegionResult(
+            unit['account_id'], unit['account_name'], unit['region'],
+            warnings, criticals, error
+        )
+
+    def check(self, accounts=[], region=None):
+        """
+        Check every (account, region) pair returned by :py:meth:`~.work_units`
+        and yield an :py:class:`~.AccountRegionResult` for each as soon as it
+        finishes (so, when running concurrently, not necessarily in order).
+        An exception checking one pair is logged and recorded in its result's
+        ``error``; it does not stop the remaining pairs from being checked.
+
+        :param accounts: IDs or names of accounts to check; if empty, check
+          all configured accounts
+        :type accounts: list
+        :param region: if not None, only check this region in each account
+        :type region: str
+        :returns: generator of :py:class:`~.AccountRegionResult`
+        """
+        units = self.work_units(accounts=accounts, region=region)
+        if self.max_workers <= 1 or len(units) < 2:
+            for unit in units:
+                kwargs = self._check_kwargs(unit)
+                yield self._result(
+                    unit, lambda: check_account_region(**kwargs)
+                )
+            return
+        logger.debug(
+            'Checking %d account/region pairs with %d worker processes',
+            len(units), self.max_workers
+        )
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = dict(
+                (
+                    pool.submit(check_account_region,
+                                **self._check_kwargs(unit)),
+                    unit
+                ) for unit in units
+            )
+            for fut in as_completed(futures):
+                yield self._result(futures[fut], fut.result)
+
+    def run(self, error_on_warning=False, region=None, accounts=[],
+            colorize=True):
+        """
+        Check all configured (or the specified) accounts and regions,
+        printing the results for each pair as it finishes and then a
+        summary.
+
+        :param error_on_warning: whether warnings, as well as criticals and
+          errors, should result in a non-zero return value
+        :type error_on_warning: bool
+        :param region: if not None, only check this region in each account
+        :type region: str
+        :param accounts: IDs or names of accounts to check; if empty, check
+          all configured accounts
+        :type accounts: list
+        :param colorize: whether to colorize output
+        :type colorize: bool
+        :returns: exit code; 1 if problems were found, 0 otherwise
+        :rtype: int
+        """
+        def color(s, c):
+            if not colorize:
+                return s
+            return termcolor.colored(s, c)
+
+        num_warn = 0
+        num_crit = 0
+        num_err = 0
+        for res in self.check(accounts=accounts, region=region):
+            print('\n%s (%s) %s' % (
+                res.account_id, res.account_name, res.region
+            ))
+            for w in res.warnings:
+                print("\tWARNING: %s" % color(w, 'yellow'))
+            for c in res.criticals:
+                print("\tCRITICAL: %s" % color(c, 'red'))
+            if res.error is not None:
+                print("\tERROR: %s" % color(res.error, 'red'))
+            elif len(res.warnings) == 0 and len(res.criticals) == 0:
+                print("\tNo problems found.")
+            sys.stdout.flush()
+            num_warn += len(res.warnings)
+            num_crit += len(res.criticals)
+            num_err += 0 if res.error is None else 1
+        if num_warn > 0 or num_crit > 0 or num_err > 0:
+            print(
+                "\n{c} limit(s) above CRITICAL threshold; {w} limit(s) above "
+                "WARNING threshold; {e} account/region(s) could not be "
+                "checked".format(c=num_crit, w=num_warn, e=num_err)
+            )
+        else:
+            print("All limits are within thresholds.")
+        if num_crit > 0 or num_err > 0 or (num_warn > 0 and error_on_warning):
+            print('PROBLEMS FOUND. See above output for details.')
+            return 1
+        return 0
+
+
+def parse_args(argv):
+    """
+    parse arguments/options for the multi-account entry point
+    """
+    p = argparse.ArgumentParser(
+        description='Check AWS usage against service limits in multiple '
+                    'accounts and regions, as configured in a directory of '
+                    'per-account configuration. For further help, see '
+                    '<http://awslimitchecker.readthedocs.org/>'
+    )
+    p.add_argument('-c', '--config-dir', action='store', type=str,
+                   default='config',
+                   help='path to the configuration directory '
+                        '(default: ./config)')
+    p.add_argument('-j', '--jobs', action='store', type=int, default=1,
+                   help='maximum number of account/region pairs to check '
+                        'concurrently, each in its own process (default: 1)')
+    p.add_argument('--default-role-name', action='store', type=str,
+                   default=DEFAULT_ROLE_NAME,
+                   help='name of the role to assume in accounts that do not '
+                        'specify one (default: %s)' % DEFAULT_ROLE_NAME)
+    p.add_argument('-w', '--error-on-warning', action='store_true',
+                   default=False, dest='error_on_warning',
+                   help='exit 1 on warning as well as critical')
+    p.add_argument('-r', '--region', action='store', type=str,
+                   dest='region_name', default=None,
+                   help='run only for this region name')
+    p.add_argument('--skip-ta', action='store_true', default=False,
+                   help='do not attempt to pull *any* information on limits'
+                   ' from Trusted Advisor')
+    p.add_argument('--sts-cache-dir', action='store', type=str, default=None,
+                   metavar='PATH',
+                   help='directory to cache STS assumed role credentials in '
+                        'until shortly before they expire (created if it '
+                        'does not exist)')
+    p.add_argument('--no-color', action='store_true', default=False,
+                   help='do not colorize output')
+    p.add_argument('-v', '--verbose', dest='verbose', action='count',
+                   default=0,
+                   help='verbose output. specify twice for debug-level output.')
+    p.add_argument('ACCOUNT', nargs='*',
+                   help='run only for these account IDs/names')
+    return p.parse_args(argv)
+
+
+def console_entry_point():
+    args = parse_args(sys.argv[1:])
+    logging.basicConfig(level=logging.WARNING)
+    if args.verbose == 1:
+        logging.getLogger('awslimitchecker').setLevel(logging.INFO)
+    elif args.verbose > 1:
+        logging.getLogger('awslimitchecker').setLevel(logging.DEBUG)
+    conf = MultiAccountConfig(
+        os.path.abspath(args.config_dir),
+        default_role_name=args.default_role_name
+    )
+    checker_kwargs = {'check_version': False}
+    if args.sts_cache_dir is not None:
+        checker_kwargs['sts_cache'] = StsCredentialCache(args.sts_cache_dir)
+    checker = MultiAccountChecker(
+        conf, max_workers=args.jobs, checker_kwargs=checker_kwargs,
+        use_ta=(not args.skip_ta)
+    )
+    raise SystemExit(checker.run(
+        error_on_warning=args.error_on_warning,
+        region=args.region_name,
+        accounts=args.ACCOUNT,
+        colorize=(not args.no_color)
+    ))
+
+
+if __name__ == "__main__":
+    console_entry_point()
@@ -0,0 +1,421 @@
+"""
+awslimitchecker/multiregion.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from collections import OrderedDict
+import logging
+
+from .checker import AwsLimitChecker
+from .utils import run_concurrently
+
+logger = logging.getLogger(__name__)
+
+
+class MultiRegionChecker(object):
+
+    def __init__(self, regions, region_parallelism=None, **kwargs):
+        """
+        Check limits and usage in multiple regions of the same account, from a
+        single process. One :py:class:`~.AwsLimitChecker` is built per region
+        (available in the ``checkers`` attribute, keyed by region name), all
+        sharing the same credentials; regions are then queried concurrently.
+
+        Services whose limits are account-wide (see
+        :py:attr:`._AwsService.is_global`, i.e. IAM, Route53 and S3) are only
+        queried in, and reported for, the *first* region in ``regions``.
+
+        All methods that return data return it as a dict of region name to the
+        return value of the same method of :py:class:`~.AwsLimitChecker`.
+
+        The ``parallelism`` keyword argument is the total number of threads
+        used to query AWS, split between regions: up to
+        ``region_parallelism`` regions are queried at once, each with
+        ``parallelism // region_parallelism`` (but at least one) concurrent
+        services.
+
+        :param regions: the AWS region names to check; must not be empty
+        :type regions: list
+        :param region_parallelism: the maximum number of regions to query
+          concurrently; defaults to ``parallelism``, or the number of
+          regions if that is lower
+        :type region_parallelism: int
+        :param kwargs: keyword arguments to pass to the
+          :py:class:`~.AwsLimitChecker` constructor; anything other than
+          ``region`` is allowed.
+        :type kwargs: dict
+        """
+        if len(regions) < 1:
+            raise ValueError('at least one region must be specified')
+        self.regions = []
+        for region in regions:
+            if region not in self.regions:
+                self.regions.append(region)
+        self.checkers = OrderedDict()
+        primary = AwsLimitChecker(region=self.regions[0], **kwargs)
+        self.checkers[self.regions[0]] = primary
+        for region in self.regions[1:]:
+            self.checkers[region] = primary.for_region(
+                region, skip_global=True
+            )
+        parallelism = kwargs.get('parallelism', 1)
+        if region_parallelism is None:
+            region_parallelism = min(len(self.regions), parallelism)
+        self.region_parallelism = max(1, region_parallelism)
+        # keep the total number of threads within ``parallelism``
+        svc_parallelism = max(1, parallelism // self.region_parallelism)
+        for checker in self.checkers.values():
+            checker.parallelism = svc_parallelism
+
+    @property
+    def region_name(self):
+        """
+        Return the names of the AWS regions that we're checking, as a
+        comma-separated string.
+
+        :return: AWS region names
+        :rtype: str
+        """
+        return ','.join(self.regions)
+
+    @property
+    def client_registry(self):
+        """
+        Return the :py:class:`~.ClientRegistry` shared by the checkers for all
+        regions.
+
+        :rtype: :py:class:`~.ClientRegistry`
+        """
+        return self.checkers[self.regions[0]].client_registry
+
+    def get_version(self):
+        """
+        Return the version of awslimitchecker currently running.
+
+        :returns: current awslimitchecker version
+        :rtype: str
+        """
+        return self.checkers[self.regions[0]].get_version()
+
+    def get_project_url(self):
+        """
+        Return the URL for the awslimitchecker project.
+
+        :returns: URL of where to find awslimitchecker
+        :rtype: str
+        """
+        return self.checkers[self.regions[0]].get_project_url()
+
+    def get_service_names(self):
+        """
+        Return a list of all known service names
+
+        :returns: list of service names
+        :rtype: list
+        """
+        return self.checkers[self.regions[0]].get_service_names()
+
+    def get_required_iam_policy(self):
+        """
+        Return an IAM policy granting all of the permissions needed for
+        awslimitchecker to fully function. See
+        :py:meth:`.AwsLimitChecker.get_required_iam_policy`.
+
+        :returns: dict representation of IAM Policy
+        :rtype: dict
+        """
+        return self.checkers[self.regions[0]].get_required_iam_policy()
+
+    def remove_services(self, services_to_remove=[]):
+        """
+        Remove all service names specified in ``services_to_remove`` from
+        every region. See :py:meth:`.AwsLimitChecker.remove_services`.
+
+        :param services_to_remove: the name(s) of one or more services to
+          permanently exclude from future calls to this instance
+        :type service_to_skip: list
+        """
+        for checker in self.checkers.values():
+            checker.remove_services(services_to_remove)
+
+    def _services_for(self, checker, service):
+        """
+        Return the subset of service names in ``service`` that ``checker``
+        has, or None if ``service`` is None.
+
+        :param checker: the checker for one region
+        :type checker: :py:class:`~.AwsLimitChecker`
+        :param service: list of service names, or None for all services
+        :type service: :py:obj:`None` or :py:obj:`list`
+        :rtype: :py:obj:`None` or :py:obj:`list`
+        """
+        if service is None:
+            return None
+        return [s for s in service if s in checker.services]
+
+    def _run_regions(self, method, service, use_ta, errors=None, **kwargs):
+        """
+        Concurrently call ``method`` (the name of a method of
+        :py:class:`~.AwsLimitChecker` taking ``service`` and ``use_ta``
+        keyword arguments) on the checker for every region that has at least
+        one of the services in ``service``, with any additional ``kwargs``.
+        See :py:func:`~.run_concurrently` for how exceptions are handled.
+
+        :param method: name of the :py:class:`~.AwsLimitChecker` method
+        :type method: str
+        :param service: list of service names, or None for all services
+        :type service: :py:obj:`None` or :py:obj:`list`
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        :param errors: if set, dict to store the exception raised for each
+          region that failed in, instead of re-raising it
+        :type errors: dict
+        :param kwargs: additional keyword arguments for ``method``
+        :type kwargs: dict
+        :returns: dict of region name to return value of ``method``
+        :rtype: dict
+        """
+        to_run = OrderedDict()
+        for region, checker in self.checkers.items():
+            svcs = self._services_for(checker, service)
+            if svcs is not None and len(svcs) == 0:
+                continue
+            to_run[region] = (checker, svcs)
+
+        def _run(item):
+            checker, svcs = item
+            return getattr(checker, method)(
+                service=svcs, use_ta=use_ta, **kwargs
+            )
+
+        return run_concurrently(
+            _run, to_run, self.region_parallelism, item_type='region',
+            errors=errors
+        )
+
+    def get_limits(self, service=None, use_ta=True):
+        """
+        Return all :py:class:`~.AwsLimit` objects for the given
+        service name(s), or for all services if ``service`` is None, in every
+        region. See :py:meth:`.AwsLimitChecker.get_limits`.
+
+        :param service: the name(s) of one or more services to return limits for
+        :type service: list
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        :returns: dict of region name (string) to dict of service name
+          (string) to nested dict of limit name (string) to limit
+          (:py:class:`~.AwsLimit`)
+        :rtype: dict
+        """
+        return self._run_regions('get_limits', service, use_ta)
+
+    def find_usage(self, service=None, use_ta=True, max_age=None):
+        """
+        Find the current usage of the specified service(s), or all services if
+        ``service`` is ``None``, in every region. See
+        :py:meth:`.AwsLimitChecker.find_usage`.
+
+        :param service: list of :py:class:`~._AwsService` name(s), or ``None``
+          to check all services.
+        :type service: :py:obj:`None`, or :py:obj:`list` service names to get
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        :param max_age: maximum age in seconds of stored usage snapshots to
+          reuse
+        :type max_age: float
+        """
+        self._run_regions('find_usage', service, use_ta, max_age=max_age)
+
+    def check_thresholds(self, service=None, use_ta=True, max_age=None):
+        """
+        Check all limits and current usage against their specified thresholds
+        in every region. See :py:meth:`.AwsLimitChecker.check_thresholds`.
+
+        Regions with no limits that have crossed a threshold (or are
+        incomplete) are not included in the return value. If the check of a
+        region raises an exception, the exception is logged, the other
+        regions are still checked, and all of the failed region's limits for
+        the requested services are marked as incomplete (see
+        :py:meth:`.AwsLimit.is_incomplete`) and returned.
+
+        :param service: the name(s) of one or more service(s) to return
+          results for
+        :type service: list
+        :param use_ta: check Trusted Advisor for information on limits
+        :type use_ta: bool
+        :param max_age: maximum age in seconds of stored usage snapshots to
+          reuse
+        :type max_age: float
+        :returns: dict of region name (string) to dict of service name
+          (string) to nested dict of limit name (string) to limit
+          (:py:class:`~.AwsLimit`)
+        :rtype: dict
+        """
+        res = OrderedDict()
+        errors = {}
+        checked = self._run_regions(
+            'check_thresholds', service, use_ta, errors=errors,
+            max_age=max_age
+        )
+        for region, checker in self.checkers.items():
+            if region in errors:
+                problems = self._failed_region(
+                    checker, service, errors[region]
+                )
+            else:
+                problems = checked.get(region, {})
+            if len(problems) > 0:
+                res[region] = problems
+        return res
+
+    def _failed_region(self, checker, service, ex):
+        """
+        Mark all limits of the services in ``service`` (or all services, if
+        None) of ``checker`` as incomplete because checking its region raised
+        ``ex``, and return them in the format of
+        :py:meth:`.AwsLimitChecker.check_thresholds`.
+
+        :param checker: the checker for the failed region
+        :type checker: :py:class:`~.AwsLimitChecker`
+        :param service: list of service names, or None for all services
+        :type service: :py:obj:`None` or :py:obj:`list`
+        :param ex: the exception raised for the region
+        :type ex: Exception
+        :rtype: dict
+        """
+        svcs = self._services_for(checker, service)
+        if svcs is None:
+            svcs = sorted(checker.services.keys())
+        res = {}
+        for sname in svcs:
+            cls = checker.services[sname]
+            checker._set_incomplete(cls, 'region check failed: %s' % ex)
+            res[sname] = dict(cls.get_limits())
+        return res
+
+    def set_limit_overrides(self, override_dict, override_ta=True):
+        """
+        Set manual overrides on AWS service limits in every region. See
+        :py:meth:`.AwsLimitChecker.set_limit_overrides`.
+
+        :param override_dict: dict of overrides to default limits
+        :type override_dict: dict
+        :param override_ta: whether or not to use this value even if Trusted
+          Advisor supplies limit information
+        :type override_ta: bool
+        :raises: :py:exc:`ValueError` if limit_name is not known to the
+          service instance
+        """
+        for checker in self.checkers.values():
+            checker.set_limit_overrides(
+                dict(
+                    (k, v) for k, v in override_dict.items()
+                    if k in checker.services
+                ),
+                override_ta=override_ta
+            )
+
+    def set_limit_override(self, service_name, limit_name,
+                           value, override_ta=True):
+        """
+        Set a manual override on an AWS service limit in every region. See
+        :py:meth:`.AwsLimitChecker.set_limit_override`.
+
+        :param service_name: the name of the service to override limit for
+        :type service_name: str
+        :param limit_name: the name of the limit to override:
+        :type limit_name: str
+        :param value: the new (overridden) limit value)
+        :type value: int
+        :param override_ta: whether or not to use this value even if Trusted
+          Advisor supplies limit information
+        :type override_ta: bool
+        :raises: :py:exc:`ValueError` if limit_name is not known to the
+          service instance
+        """
+        for checker in self.checkers.values():
+            if service_name not in checker.services:
+                continue
+            checker.set_limit_override(
+                service_name, limit_name, value, override_ta=override_ta
+            )
+
+    def set_threshold_overrides(self, override_dict):
+        """
+        Set manual overrides on the thresholds of limits in every region. See
+        :py:meth:`.AwsLimitChecker.set_threshold_overrides`.
+
+        :param override_dict: nested dict of threshold overrides
+        :type override_dict: dict
+        """
+        for checker in self.checkers.values():
+            checker.set_threshold_overrides(
+                dict(
+                    (k, v) for k, v in override_dict.items()
+                    if k in checker.services
+                )
+            )
+
+    def set_threshold_override(self, service_name, limit_name,
+                               warn_percent=None, warn_count=None,
+                               crit_percent=None, crit_count=None):
+        """
+        Set a manual override on the threshold of a specific limit in every
+        region. See :py:meth:`.AwsLimitChecker.set_threshold_override`.
+
+        :param service_name: the name of the service to override limit for
+        :type service_name: str
+        :param limit_name: the name of the limit to override:
+        :type limit_name: str
+        :param warn_percent: new warning threshold, percentage used
+        :type warn_percent: int
+        :param warn_count: new warning threshold, actual count/number
+        :type warn_count: int
+        :param crit_percent: new critical threshold, percentage used
+        :type crit_percent: int
+        :param crit_count: new critical threshold, actual count/number
+        :type crit_count: int
+        """
+        for checker in self.checkers.values():
+            if service_name not in checker.services:
+                continue
+            checker.set_threshold_override(
+                service_name, limit_name, warn_percent=warn_percent,
+                warn_count=warn_count, crit_percent=crit_percent,
+                crit_count=crit_count
+            )
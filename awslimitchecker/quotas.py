@@ -39,8 +39,10 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 from botocore.exceptions import ClientError
 import logging
+import threading
 
-from awslimitchecker.connectable import Connectable
+from awslimitchecker.connectable import Connectable, ClientRegistry
+from awslimitchecker.utils import run_concurrently
 
 logger = logging.getLogger(__name__)
 
@@ -48,7 +50,8 @@ logger = logging.getLogger(__name__)
 class ServiceQuotasClient(Connectable):
     api_name = 'service-quotas'
 
-    def __init__(self, boto_connection_kwargs):
+    def __init__(self, boto_connection_kwargs, client_registry=None,
+                 cache=None, account_id=None):
         """
         Client for the AWS Service Quotas service, that manages retrieving
         quotas information and updating :py:class:`~.AwsLimit` instances for
@@ -57,16 +60,143 @@ class ServiceQuotasClient(Connectable):
         :param boto_connection_kwargs: keyword arguments to pass to boto3
           connection methods.
         :type boto_connection_kwargs: dict
+        :param client_registry: registry to obtain boto3 clients from; if
+          None, a new one is created for this instance.
+        :type client_registry: :py:class:`~.ClientRegistry`
+        :param cache: persistent cache to read quotas from (if they are not
+          older than its TTL) and write them to, in addition to the
+          per-instance in-memory cache
+        :type cache: :py:class:`~.SqliteQuotasCache`
+        :param account_id: ID of the account that quotas are retrieved for,
+          used as part of the ``cache`` key; if None and ``cache`` is set,
+          it will be looked up via STS
+        :type account_id: str
         """
+        if client_registry is None:
+            client_registry = ClientRegistry()
+        self._client_registry = client_registry
         self._boto3_connection_kwargs = boto_connection_kwargs
         self._cache = {}
+        self._persistent_cache = cache
+        self._account_id = account_id
         self.conn = None
+        # a single instance is shared by all services, which may be queried
+        # concurrently; ``_lock`` guards ``_code_locks``, which hold one lock
+        # per service code so that different codes can be fetched at once
+        self._lock = threading.RLock()
+        self._code_locks = {}
 
     def quotas_for_service(self, service_code):
         """
         Return this account's current quotas for the specified service code.
         Also cache them on this class instance.
 
+        :param service_code: the service code to get quotas for
+        :type service_code: str
+        :return: QuotaName to dictionary of quota information returned by the
+          service
+        :rtype: dict
+        """
+        with self._lock:
+            lock = self._code_locks.setdefault(service_code, threading.Lock())
+        with lock:
+            return self._quotas_for_service(service_code)
+
+    def prefetch(self, service_codes, max_workers=8):
+        """
+        Retrieve (and cache) the quotas for all of ``service_codes``
+        concurrently, on up to ``max_workers`` threads, so that later calls
+        to :py:meth:`~.quotas_for_service` are served from the cache. Errors
+        are logged and otherwise ignored; they will be raised again when the
+        quotas for that service code are next requested.
+
+        :param service_codes: the service codes to get quotas for
+        :type service_codes: list
+        :param max_workers: maximum number of service codes to query at once
+        :type max_workers: int
+        """
+        def _fetch(service_code):
+            try:
+                self.quotas_for_service(service_code)
+            except Exception:
+                logger.warning(
+                    'Unable to prefetch Service Quotas for service code %s',
+                    service_code, exc_info=True
+                )
+
+        with self._lock:
+            self.connect()
+            to_fetch = dict(
+                (code, code) for code in service_codes
+                if code not in self._cache
+            )
+        if len(to_fetch) == 0:
+            return
+        logger.debug(
+            'Prefetching Service Quotas for service codes: %s',
+            sorted(to_fetch.keys())
+        )
+        run_concurrently(
+            _fetch, to_fetch, max_workers, item_type='service code'
+        )
+
+    def _cache_key(self):
+        """
+        Return the (account ID, region name) 2-tuple that quotas are stored
+        under in the persistent cache. Must only be called after
+        :py:meth:`~.connect`.
+
+        :rtype: tuple
+        """
+        with self._lock:
+            if self._account_id is None:
+                sts = self._client_registry.client(
+                    'sts', **self._boto3_connection_kwargs
+                )
+                self._account_id = sts.get_caller_identity()['Account']
+        return self._account_id, self.conn._client_config.region_name
+
+    def _get_persistent(self, service_code):
+        """
+        Return the quotas for ``service_code`` from the persistent cache, or
+        None if there is no persistent cache or the quotas are not in it (or
+        cannot be read from it).
+
+        :rtype: :py:obj:`dict` or :py:obj:`None`
+        """
+        if self._persistent_cache is None:
+            return None
+        try:
+            acct, region = self._cache_key()
+            return self._persistent_cache.get(acct, region, service_code)
+        except Exception:
+            logger.warning(
+                'Unable to read cached Service Quotas for service code %s',
+                service_code, exc_info=True
+            )
+            return None
+
+    def _put_persistent(self, service_code, quotas):
+        """
+        Store the quotas for ``service_code`` in the persistent cache, if
+        there is one.
+        """
+        if self._persistent_cache is None:
+            return
+        try:
+            acct, region = self._cache_key()
+            self._persistent_cache.put(acct, region, service_code, quotas)
+        except Exception:
+            logger.warning(
+                'Unable to cache Service Quotas for service code %s',
+                service_code, exc_info=True
+            )
+
+    def _quotas_for_service(self, service_code):
+        """
+        Implementation of :py:meth:`~.quotas_for_service`; must only be called
+        while holding the lock for ``service_code`` in ``self._code_locks``.
+
         :param service_code: the service code to get quotas for
         :type service_code: str
         :return: QuotaName to dictionary of quota information returned by the
@@ -75,7 +205,16 @@ class ServiceQuotasClient(Connectable):
         """
         if service_code in self._cache:
             return self._cache[service_code]
-        self.connect()
+        with self._lock:
+            self.connect()
+        cached = self._get_persistent(service_code)
+        if cached is not None:
+            logger.debug(
+                'Using cached Service Quotas for service code %s',
+                service_code
+            )
+            self._cache[service_code] = cached
+            return cached
         logger.debug(
             'Getting service quotas for service code: %s', service_code
         )
@@ -103,6 +242,7 @@ class ServiceQuotasClient(Connectable):
                     '%s but received NoSuchResourceException',
                     service_code
                 )
+                self._put_persistent(service_code, {})
                 return {}
             raise
         logger.debug(
@@ -110,6 +250,7 @@ class ServiceQuotasClient(Connectable):
             len(self._cache[service_code]), service_code,
             sorted([x['QuotaName'] for x in self._cache[service_code].values()])
         )
+        self._put_persistent(service_code, self._cache[service_code])
         return self._cache[service_code]
 
     def get_quota_value(
@@ -153,3 +294,26 @@ class ServiceQuotasClient(Connectable):
             )
             return None
         return val
+
+    def get_usage_metric(self, service_code, quota_name):
+        """
+        Return the CloudWatch metric that Service Quotas reports the usage of
+        a given quota in (the ``UsageMetric`` of the quota), or None if the
+        quota cannot be found or has no usage metric.
+
+        :param service_code: the service code to get a quota from
+        :type service_code: str
+        :param quota_name: the quota name to get
+        :type quota_name: str
+        :return: dict with ``MetricNamespace``, ``MetricName``,
+          ``MetricDimensions`` and (optionally)
+          ``MetricStatisticRecommendation`` keys
+        :rtype: dict or None
+        """
+        svc = self.quotas_for_service(service_code)
+        if quota_name.lower() not in svc:
+            return None
+        metric = svc[quota_name.lower()].get('UsageMetric', None)
+        if not metric or 'MetricName' not in metric:
+            return None
+        return metric
@@ -0,0 +1,299 @@
+"""
+awslimitchecker/ratelimit.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import threading
+import time
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+#: AWS API error codes that indicate a request was throttled.
+THROTTLING_ERROR_CODES = (
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottledException',
+    'RequestThrottled',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'BandwidthLimitExceeded',
+    'SlowDown',
+    'PriorRequestNotComplete',
+    'EC2ThrottledException',
+)
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket that adapts its refill rate to throttling, using
+    additive-increase / multiplicative-decrease (AIMD): every successful
+    request increases the rate by ``increase`` requests per second, up to
+    ``max_rate``, and every throttled request multiplies it by
+    ``decrease_factor``, down to ``min_rate``.
+    """
+
+    def __init__(self, rate=20.0, burst=20.0, min_rate=0.5, max_rate=100.0,
+                 increase=0.5, decrease_factor=0.5):
+        """
+        :param rate: initial rate, in requests per second
+        :type rate: float
+        :param burst: maximum number of tokens the bucket can hold, i.e. the
+          number of requests that can be made at once after a quiet period
+        :type burst: float
+        :param min_rate: minimum rate, in requests per second
+        :type min_rate: float
+        :param max_rate: maximum rate, in requests per second
+        :type max_rate: float
+        :param increase: requests per second to add to the rate after each
+          successful request
+        :type increase: float
+        :param decrease_factor: factor to multiply the rate by after each
+          throttled request
+        :type decrease_factor: float
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.increase = float(increase)
+        self.decrease_factor = float(decrease_factor)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        #: number of requests that acquired a token
+        self.requests = 0
+        #: number of requests that had to wait for a token
+        self.waits = 0
+        #: total time, in seconds, spent waiting for tokens
+        self.wait_time = 0.0
+        #: number of throttled responses
+        self.throttles = 0
+
+    def _refill(self):
+        """
+        Add tokens for the time elapsed since the last refill. Must be called
+        with ``self._lock`` held.
+        """
+        now = time.monotonic()
+        self._tokens = min(
+            self.burst, self._tokens + ((now - self._last) * self.rate)
+        )
+        self._last = now
+
+    def acquire(self):
+        """
+        Take a token from the bucket, blocking until one is available.
+
+        :returns: number of seconds spent waiting
+        :rtype: float
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.requests += 1
+                    if waited > 0:
+                        self.waits += 1
+                        self.wait_time += waited
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        """
+        Record a successful (non-throttled) response; additively increase the
+        rate.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        """
+        Record a throttled response; multiplicatively decrease the rate and
+        empty the bucket, so that the next request waits for the new rate.
+        """
+        with self._lock:
+            self.throttles += 1
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._tokens = min(self._tokens, 0.0)
+
+    def stats(self):
+        """
+        Return the bucket's current rate and counters.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'requests': self.requests,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+                'throttles': self.throttles,
+            }
+
+
+class RateLimiter(object):
+    """
+    Process-wide collection of :py:class:`~.TokenBucket` instances, one per
+    ``(api, region)`` pair, shared by every thread (and every
+    :py:class:`~.ClientRegistry`) in the process. Clients are attached with
+    :py:meth:`~.register`, which hooks botocore's ``before-send`` event to
+    take a token before every HTTP request (including retries), and its
+    ``response-received`` event to adapt the bucket's rate to throttling
+    responses.
+
+    The shared instance is :py:data:`~.rate_limiter`.
+    """
+
+    def __init__(self, **bucket_kwargs):
+        """
+        :param bucket_kwargs: keyword arguments for new
+          :py:class:`~.TokenBucket` instances
+        :type bucket_kwargs: dict
+        """
+        self._bucket_kwargs = bucket_kwargs
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, api_name, region_name):
+        """
+        Return the :py:class:`~.TokenBucket` for ``api_name`` in
+        ``region_name``, creating it if needed.
+
+        :param api_name: AWS API (service) name
+        :type api_name: str
+        :param region_name: region name
+        :type region_name: str
+        :rtype: :py:class:`~.TokenBucket`
+        """
+        key = (api_name, region_name)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(**self._bucket_kwargs)
+            return self._buckets[key]
+
+    def register(self, client):
+        """
+        Rate-limit all requests made with ``client``.
+
+        :param client: boto3 low-level client
+        """
+        bucket = self.bucket(
+            client.meta.service_model.service_name, client.meta.region_name
+        )
+        client.meta.events.register(
+            'before-send', partial(self._before_send, bucket)
+        )
+        client.meta.events.register(
+            'response-received', partial(self._response_received, bucket)
+        )
+
+    @staticmethod
+    def _before_send(bucket, **kwargs):
+        """
+        botocore ``before-send`` event handler; wait for a token. Returns None
+        so that the request is sent.
+        """
+        waited = bucket.acquire()
+        if waited > 0:
+            logger.debug('Rate limiter delayed request by %.3fs', waited)
+        return None
+
+    @staticmethod
+    def _response_received(bucket, response_dict=None, parsed_response=None,
+                           exception=None, **kwargs):
+        """
+        botocore ``response-received`` event handler; adapt the bucket's rate
+        depending on whether the response was throttled. Responses that were
+        not received (connection errors) are ignored.
+        """
+        if response_dict is None:
+            return
+        code = (parsed_response or {}).get('Error', {}).get('Code')
+        if (
+            code in THROTTLING_ERROR_CODES or
+            response_dict.get('status_code') == 429
+        ):
+            bucket.on_throttle()
+            logger.debug(
+                'Request throttled (%s); rate limit decreased to %.2f/s',
+                code, bucket.rate
+            )
+        else:
+            bucket.on_success()
+
+    def stats(self):
+        """
+        Return the current rate and counters of every bucket.
+
+        :returns: dict of ``(api, region)`` tuples to the dict returned by
+          :py:meth:`.TokenBucket.stats`
+        :rtype: dict
+        """
+        with self._lock:
+            buckets = dict(self._buckets)
+        return dict((k, v.stats()) for k, v in buckets.items())
+
+    def log_stats(self):
+        """
+        Log the counters of every bucket; at INFO level for buckets that were
+        throttled or had to wait, otherwise at DEBUG level.
+        """
+        stats = self.stats()
+        for api, region in sorted(stats.keys(), key=str):
+            s = stats[(api, region)]
+            level = logging.DEBUG
+            if s['throttles'] > 0 or s['waits'] > 0:
+                level = logging.INFO
+            logger.log(
+                level, 'Rate limiter for %s in %s: %d requests, %d throttled, '
+                '%d delayed (%.2fs total); current rate %.2f/s', api, region,
+                s['requests'], s['throttles'], s['waits'], s['wait_time'],
+                s['rate']
+            )
+
+
+#: The :py:class:`~.RateLimiter` shared by every :py:class:`~.ClientRegistry`
+#: in the process.
+rate_limiter = RateLimiter()
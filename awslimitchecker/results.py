@@ -0,0 +1,338 @@
+"""
+awslimitchecker/results.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from .limit import format_usage_str
+
+
+class LimitResult(object):
+    """
+    The result of a check for one :py:class:`~.AwsLimit`, as held by a
+    :py:class:`~.CheckResult`.
+
+    Each of the properties below is computed from the limit the first time
+    it is accessed and cached after that; a result should therefore be used
+    for one run, and a new :py:class:`~.CheckResult` built for the next.
+    """
+
+    __slots__ = (
+        'service_name', 'name', 'limit', '_warnings', '_criticals',
+        '_sorted_usage', '_max_usage', '_usage_str', '_utilization'
+    )
+
+    _UNSET = object()
+
+    def __init__(self, service_name, limit_name, limit):
+        """
+        :param service_name: the name of the service the limit is for (which
+          is prefixed with the region name when checking multiple regions)
+        :type service_name: str
+        :param limit_name: the name of the limit
+        :type limit_name: str
+        :param limit: the limit
+        :type limit: :py:class:`~.AwsLimit`
+        """
+        #: the name of the service the limit is for
+        self.service_name = service_name
+        #: the name of the limit
+        self.name = limit_name
+        #: the :py:class:`~.AwsLimit` itself
+        self.limit = limit
+        self._warnings = None
+        self._criticals = None
+        self._sorted_usage = None
+        self._max_usage = self._UNSET
+        self._usage_str = None
+        self._utilization = self._UNSET
+
+    def __repr__(self):
+        return '<LimitResult %s/%s>' % (self.service_name, self.name)
+
+    @property
+    def warnings(self):
+        """
+        The usages that crossed the warning threshold.
+
+        :rtype: tuple of :py:class:`~.AwsLimitUsage`
+        """
+        if self._warnings is None:
+            self._warnings = tuple(self.limit.get_warnings())
+        return self._warnings
+
+    @property
+    def criticals(self):
+        """
+        The usages that crossed the critical threshold.
+
+        :rtype: tuple of :py:class:`~.AwsLimitUsage`
+        """
+        if self._criticals is None:
+            self._criticals = tuple(self.limit.get_criticals())
+        return self._criticals
+
+    @property
+    def has_problems(self):
+        """
+        Whether any usage crossed the warning or critical threshold.
+
+        :rtype: bool
+        """
+        return len(self.criticals) > 0 or len(self.warnings) > 0
+
+    @property
+    def sorted_usage(self):
+        """
+        The limit's current usage, lowest first.
+
+        :rtype: tuple of :py:class:`~.AwsLimitUsage`
+        """
+        if self._sorted_usage is None:
+            self._sorted_usage = tuple(sorted(self.limit.get_current_usage()))
+        return self._sorted_usage
+
+    @property
+    def max_usage(self):
+        """
+        The highest current usage of the limit, or None if it has no usage.
+
+        :rtype: :py:class:`~.AwsLimitUsage`
+        """
+        if self._max_usage is self._UNSET:
+            if len(self.sorted_usage) == 0:
+                self._max_usage = None
+            else:
+                # the same usage max() of the unsorted list would return
+                self._max_usage = max(self.sorted_usage)
+        return self._max_usage
+
+    @property
+    def max_usage_value(self):
+        """
+        The value of :py:attr:`~.max_usage`, or 0 if the limit has no usage.
+
+        :rtype: :py:obj:`int` or :py:obj:`float`
+        """
+        if self.max_usage is None:
+            return 0
+        return self.max_usage.get_value()
+
+    @property
+    def usage_str(self):
+        """
+        The limit's usage, as returned by
+        :py:meth:`.AwsLimit.get_current_usage_str`.
+
+        :rtype: str
+        """
+        if self._usage_str is None:
+            self._usage_str = format_usage_str(
+                self.sorted_usage,
+                incomplete=self.limit.is_incomplete(),
+                not_retained=self.limit._usage_not_retained()
+            )
+        return self._usage_str
+
+    @property
+    def utilization(self):
+        """
+        The highest utilization of the limit by any of its usages, as a
+        percentage, or None if it has no usage or the limit is unknown.
+
+        :rtype: float
+        """
+        if self._utilization is self._UNSET:
+            self._utilization = None
+            lim_value = self.limit.get_limit()
+            for u in self.sorted_usage:
+                limit = u.get_maximum() or lim_value
+                if not limit:
+                    continue
+                pct = (u.get_value() / (limit * 1.0)) * 100
+                if self._utilization is None or pct > self._utilization:
+                    self._utilization = pct
+        return self._utilization
+
+
+class CheckResult(object):
+    """
+    Read-only, indexed view of the limits returned by
+    :py:meth:`.AwsLimitChecker.get_limits` or
+    :py:meth:`.AwsLimitChecker.check_thresholds`.
+
+    Lookups by service and limit name are dict lookups. The indexes by
+    resource ID and AWS type and the utilization ranking are built the first
+    time one of them is used, and then cached.
+    """
+
+    def __init__(self, limits):
+        """
+        :param limits: dict of service name to dict of limit name to
+          :py:class:`~.AwsLimit`, as returned by
+          :py:meth:`.AwsLimitChecker.check_thresholds`
+        :type limits: dict
+        """
+        self._by_service = {}
+        results = []
+        for svc in sorted(limits.keys()):
+            svc_results = {}
+            for lim_name in sorted(limits[svc].keys()):
+                r = LimitResult(svc, lim_name, limits[svc][lim_name])
+                svc_results[lim_name] = r
+                results.append(r)
+            self._by_service[svc] = svc_results
+        self._results = tuple(results)
+        self._by_resource_id = None
+        self._by_aws_type = None
+        self._ranked = None
+        self._problems = None
+
+    def __iter__(self):
+        """
+        Iterate over all :py:class:`~.LimitResult` instances, sorted by
+        service name and then limit name.
+        """
+        return iter(self._results)
+
+    def __len__(self):
+        return len(self._results)
+
+    def services(self):
+        """
+        Return the names of the services in this result, sorted.
+
+        :rtype: list
+        """
+        return sorted(self._by_service.keys())
+
+    def get(self, service_name, limit_name):
+        """
+        Return the result for one limit, or None if it isn't present.
+
+        :param service_name: the name of the service
+        :type service_name: str
+        :param limit_name: the name of the limit
+        :type limit_name: str
+        :rtype: :py:class:`~.LimitResult`
+        """
+        return self._by_service.get(service_name, {}).get(limit_name)
+
+    def service_limits(self, service_name):
+        """
+        Return the results for all limits of one service, sorted by limit
+        name.
+
+        :param service_name: the name of the service
+        :type service_name: str
+        :rtype: list of :py:class:`~.LimitResult`
+        """
+        svc_results = self._by_service.get(service_name, {})
+        return [svc_results[k] for k in sorted(svc_results.keys())]
+
+    def _build_usage_indexes(self):
+        """
+        Build the indexes of usages by resource ID and by AWS type.
+        """
+        by_id = {}
+        by_type = {}
+        for r in self._results:
+            for u in r.sorted_usage:
+                if u.resource_id is not None:
+                    by_id.setdefault(u.resource_id, []).append((r, u))
+                if u.aws_type is not None:
+                    by_type.setdefault(u.aws_type, []).append((r, u))
+        self._by_resource_id = by_id
+        self._by_aws_type = by_type
+
+    def by_resource_id(self, resource_id):
+        """
+        Return every usage of the given resource, across all limits.
+
+        :param resource_id: the resource ID
+        :type resource_id: str
+        :returns: list of (:py:class:`~.LimitResult`,
+          :py:class:`~.AwsLimitUsage`) tuples
+        :rtype: list
+        """
+        if self._by_resource_id is None:
+            self._build_usage_indexes()
+        return list(self._by_resource_id.get(resource_id, []))
+
+    def by_aws_type(self, aws_type):
+        """
+        Return every usage by resources of the given AWS type, across all
+        limits.
+
+        :param aws_type: the AWS type, i.e. ``AWS::EC2::Instance``
+        :type aws_type: str
+        :returns: list of (:py:class:`~.LimitResult`,
+          :py:class:`~.AwsLimitUsage`) tuples
+        :rtype: list
+        """
+        if self._by_aws_type is None:
+            self._build_usage_indexes()
+        return list(self._by_aws_type.get(aws_type, []))
+
+    def ranked(self, count=None):
+        """
+        Return the limits ordered by :py:attr:`.LimitResult.utilization`,
+        highest first. Limits whose utilization is unknown are last, and ties
+        keep service and limit name order.
+
+        :param count: if set, return only this many limits
+        :type count: int
+        :rtype: list of :py:class:`~.LimitResult`
+        """
+        if self._ranked is None:
+            self._ranked = tuple(sorted(
+                self._results,
+                key=lambda r: (r.utilization is None, -(r.utilization or 0))
+            ))
+        if count is None:
+            return list(self._ranked)
+        return list(self._ranked[:count])
+
+    def problems(self):
+        """
+        Return the limits with usage over their warning or critical
+        threshold, sorted by service and limit name.
+
+        :rtype: list of :py:class:`~.LimitResult`
+        """
+        if self._problems is None:
+            self._problems = tuple(r for r in self._results if r.has_problems)
+        return list(self._problems)
@@ -37,18 +37,28 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ##############################################################################
 """
 
+import os
 import sys
 import argparse
 import logging
 import json
-import boto3
 import time
 
+from .catalog import LimitsCatalog
 from .checker import AwsLimitChecker
+from .connectable import StsCredentialCache
+from .daemon import LimitCheckerDaemon
+from .multiregion import MultiRegionChecker
+from .snapshots import (
+    SqliteUsageSnapshotStore, SqliteQuotasCache, SqliteTrustedAdvisorCache
+)
 from .utils import StoreKeyValuePair, dict2cols, issue_string_tuple
 from .limit import SOURCE_TA, SOURCE_API, SOURCE_QUOTAS
 from .metrics import MetricsProvider
+from .results import CheckResult
 from .alerts import AlertProvider
+from .ratelimit import rate_limiter
+from .schedule import ScanSchedule
 
 try:
     from urllib.parse import urlparse
@@ -77,6 +87,8 @@ class Runner(object):
         self.skip_ta = False
         self.service_name = None
         self.skip_check = []
+        self.regions = None
+        self.max_usage_age = None
 
     def parse_args(self, argv):
         """
@@ -182,9 +194,19 @@ class Runner(object):
         p.add_argument('-T', '--mfa-token', action='store', type=str,
                        default=None, help='MFA Token to use when assuming '
                        'a role via STS')
+        p.add_argument('--sts-cache-dir', action='store', type=str,
+                       default=None, metavar='PATH',
+                       help='directory to cache STS assumed role credentials '
+                            'in until shortly before they expire (created if '
+                            'it does not exist)')
         p.add_argument('-r', '--region', action='store',
                        type=str, default=None,
                        help='AWS region name to connect to; required for STS')
+        p.add_argument('--regions', action='store', type=str, nargs='+',
+                       default=None,
+                       help='check multiple AWS regions in one run; output '
+                            'is prefixed with the region name (mutually '
+                            'exclusive with -r/--region)')
         p.add_argument('--role-partition', action='store', type=str,
                        default='aws',
                        help='AWS partition name to use for account_role when '
@@ -200,6 +222,108 @@ class Runner(object):
         p.add_argument('--skip-quotas', action='store_true', default=False,
                        help='Do not attempt to connect to Service Quotas '
                             'service or use its data for current limits')
+        p.add_argument('--parallelism', action='store', type=int, default=1,
+                       help='maximum number of services to query concurrently'
+                            ' (default: 1, query services sequentially)')
+        p.add_argument('--region-parallelism', action='store', type=int,
+                       default=None,
+                       help='with --regions, the maximum number of regions to'
+                            ' query concurrently; --parallelism is split '
+                            'between them (default: the lower of '
+                            '--parallelism and the number of regions)')
+        p.add_argument('--service-timeout', action='store', type=float,
+                       default=None, metavar='SECONDS',
+                       help='maximum number of seconds to spend checking any '
+                            'one service; services that take longer are '
+                            'abandoned and their limits reported as '
+                            'incomplete (default: no limit)')
+        p.add_argument('--service-timeout-override', action=StoreKeyValuePair,
+                       help='override --service-timeout for a single service,'
+                            ' specified in "service_name=seconds" format; can '
+                            'be specified multiple times.')
+        p.add_argument('--run-timeout', action='store', type=float,
+                       default=None, metavar='SECONDS',
+                       help='maximum number of seconds to spend checking all '
+                            'services; services still running or not yet '
+                            'started when it expires are reported as '
+                            'incomplete (default: no limit)')
+        p.add_argument('--usage-snapshot-db', action='store', type=str,
+                       default=None, metavar='PATH',
+                       help='path to a SQLite database to store a snapshot of'
+                            ' each service\'s usage in after checking it '
+                            '(created if it does not exist)')
+        p.add_argument('--max-usage-age', action='store', type=float,
+                       default=None, metavar='SECONDS',
+                       help='reuse usage from --usage-snapshot-db for '
+                            'services whose snapshot is no more than this '
+                            'many seconds old, instead of querying AWS')
+        p.add_argument('--scan-schedule', action='store_true',
+                       default=False,
+                       help='only scan services that are due according to '
+                            'their utilization history in '
+                            '--usage-snapshot-db (the closer to their limits '
+                            'and the faster they are growing, the more often'
+                            '); use the stored usage for the rest')
+        p.add_argument('--min-scan-interval', action='store', type=float,
+                       default=300, metavar='SECONDS',
+                       help='with --scan-schedule, the shortest interval '
+                            'between scans of a service (default: 300)')
+        p.add_argument('--max-scan-interval', action='store', type=float,
+                       default=86400, metavar='SECONDS',
+                       help='with --scan-schedule, the longest interval '
+                            'between scans of a service (default: 86400)')
+        p.add_argument('--usage-source', action='store', type=str,
+                       choices=['api', 'cloudwatch'], default='api',
+                       help='where to get current usage from; "cloudwatch" '
+                            'reads it from the CloudWatch AWS/Usage metrics '
+                            'published for Service Quotas (in batched '
+                            'requests), falling back to the service APIs for '
+                            'limits without a metric (default: api)')
+        p.add_argument('--resource-detail', action='store_true',
+                       default=False,
+                       help='list individual resources to find usage even '
+                            'when a service\'s API returns the total (i.e. '
+                            'RDS and Auto Scaling), so that the usage of '
+                            'each resource is known')
+        p.add_argument('--usage-retention', action='store', type=int,
+                       default=None, metavar='COUNT',
+                       help='for each limit, only keep the COUNT resources '
+                            'with the highest utilization that are below '
+                            'thresholds, plus all resources that cross them, '
+                            'to bound memory use in large accounts (default: '
+                            'keep all)')
+        p.add_argument('--daemon', action='store_true', default=False,
+                       help='run continuously, re-checking services every '
+                            '--daemon-interval seconds and serving the latest '
+                            'limits, usage and threshold status over HTTP at '
+                            '/metrics (Prometheus) and /json')
+        p.add_argument('--daemon-interval', action='store', type=float,
+                       default=300, metavar='SECONDS',
+                       help='with --daemon, number of seconds between checks '
+                            'of each service (default: 300)')
+        p.add_argument('--daemon-service-interval', action=StoreKeyValuePair,
+                       help='with --daemon, override --daemon-interval for a '
+                            'single service, specified in '
+                            '"service_name=seconds" format; can be specified '
+                            'multiple times.')
+        p.add_argument('--listen-address', action='store', type=str,
+                       default='127.0.0.1',
+                       help='with --daemon, address to serve results on '
+                            '(default: 127.0.0.1)')
+        p.add_argument('--listen-port', action='store', type=int,
+                       default=9555,
+                       help='with --daemon, port to serve results on '
+                            '(default: 9555)')
+        p.add_argument('--quotas-cache-db', action='store', type=str,
+                       default=None, metavar='PATH',
+                       help='path to a SQLite database to cache Service '
+                            'Quotas responses in (created if it does not '
+                            'exist; may be the same as --usage-snapshot-db)')
+        p.add_argument('--quotas-cache-ttl', action='store', type=float,
+                       default=86400, metavar='SECONDS',
+                       help='number of seconds to use Service Quotas '
+                            'responses from --quotas-cache-db for '
+                            '(default: 86400)')
         g = p.add_mutually_exclusive_group()
         g.add_argument('--ta-refresh-wait', dest='ta_refresh_wait',
                        action='store_true', default=False,
@@ -224,11 +348,31 @@ class Runner(object):
                        help='If waiting for TA checks to refresh, wait up to '
                             'this number of seconds before continuing on '
                             'anyway.')
+        p.add_argument('--ta-poll-min-interval', type=float, action='store',
+                       default=5, metavar='SECONDS',
+                       help='If waiting for TA checks to refresh, initial '
+                            'number of seconds between refresh status polls; '
+                            'doubles after each poll (default: 5)')
+        p.add_argument('--ta-poll-max-interval', type=float, action='store',
+                       default=60, metavar='SECONDS',
+                       help='If waiting for TA checks to refresh, maximum '
+                            'number of seconds between refresh status polls '
+                            '(default: 60)')
+        p.add_argument('--ta-cache-db', action='store', type=str,
+                       default=None, metavar='PATH',
+                       help='path to a SQLite database to cache Trusted '
+                            'Advisor check results (for all regions) in '
+                            '(created if it does not exist; may be the same '
+                            'as --usage-snapshot-db)')
+        p.add_argument('--ta-cache-ttl', action='store', type=float,
+                       default=3600, metavar='SECONDS',
+                       help='number of seconds to use Trusted Advisor check '
+                            'results from --ta-cache-db for (default: 3600)')
         p.add_argument('--no-color', action='store_true', default=False,
                        help='do not colorize output')
         p.add_argument('--no-check-version', action='store_false', default=True,
                        dest='check_version',
-                       help='do not check latest version at startup')
+                       help='do not check latest version before finding usage')
         p.add_argument('-v', '--verbose', dest='verbose', action='count',
                        default=0,
                        help='verbose output. specify twice for debug-level '
@@ -276,10 +420,25 @@ class Runner(object):
         for x in sorted(self.checker.get_service_names()):
             print(x)
 
+    def _flatten_regions(self, res):
+        """
+        When checking multiple regions, flatten a dict of region name to dict
+        of service name to some value, as returned by
+        :py:class:`~.MultiRegionChecker`, into a dict of "region/service"
+        to value. When checking a single region, return ``res`` unchanged.
+        """
+        if self.regions is None:
+            return res
+        flat = {}
+        for region, svcs in res.items():
+            for svc, val in svcs.items():
+                flat['{r}/{s}'.format(r=region, s=svc)] = val
+        return flat
+
     def list_limits(self):
-        limits = self.checker.get_limits(
+        limits = self._flatten_regions(self.checker.get_limits(
             use_ta=(not self.skip_ta),
-            service=self.service_name)
+            service=self.service_name))
         data = {}
         for svc in sorted(limits.keys()):
             for lim in sorted(limits[svc].keys()):
@@ -301,13 +460,58 @@ class Runner(object):
                         t=src_str)
         print(dict2cols(data))
 
+    def _region_defaults(self, catalog, checker, region_name):
+        """
+        Return a dict of service name to dict of limit name to default limit
+        for the services of ``checker`` (limited to ``self.service_name``, if
+        set) in ``region_name``. Defaults are read from ``catalog`` (if not
+        None) where possible; services or regions not in the catalog fall
+        back to the limits defined by the services of ``checker``, without
+        any Trusted Advisor or Service Quotas calls.
+        """
+        names = checker.get_service_names()
+        if self.service_name is not None:
+            names = [n for n in names if n in self.service_name]
+        res = {}
+        missing = []
+        for sname in names:
+            if (
+                catalog is not None and
+                catalog.has_region(region_name) and
+                sname in catalog.service_names()
+            ):
+                res[sname] = catalog.default_limits(sname, region_name)
+            else:
+                missing.append(sname)
+        if missing and catalog is not None:
+            logger.debug('Services not in limits catalog for region %s: %s',
+                         region_name, missing)
+        for sname in missing:
+            res[sname] = {
+                lname: lim.default_limit
+                for lname, lim in checker.services[sname].get_limits().items()
+            }
+        return res
+
     def list_defaults(self):
-        limits = self.checker.get_limits(service=self.service_name)
+        catalog = None
+        if 'USE_VCPU_LIMITS' not in os.environ:
+            # the catalog is built without vCPU-based EC2 limits
+            catalog = LimitsCatalog.load()
+        if self.regions is None:
+            defaults = self._region_defaults(
+                catalog, self.checker, self.checker.region_name
+            )
+        else:
+            defaults = self._flatten_regions({
+                region: self._region_defaults(catalog, checker, region)
+                for region, checker in self.checker.checkers.items()
+            })
         data = {}
-        for svc in sorted(limits.keys()):
-            for lim in sorted(limits[svc].keys()):
+        for svc in sorted(defaults.keys()):
+            for lim in sorted(defaults[svc].keys()):
                 data["{s}/{l}".format(s=svc, l=lim)] = '{v}'.format(
-                    v=limits[svc][lim].default_limit)
+                    v=defaults[svc][lim])
         print(dict2cols(data))
 
     def iam_policy(self):
@@ -316,49 +520,58 @@ class Runner(object):
 
     def show_usage(self):
         self.checker.find_usage(
-            service=self.service_name, use_ta=(not self.skip_ta))
-        limits = self.checker.get_limits(
-            service=self.service_name, use_ta=(not self.skip_ta))
+            service=self.service_name, use_ta=(not self.skip_ta),
+            max_age=self.max_usage_age)
+        limits = self._flatten_regions(self.checker.get_limits(
+            service=self.service_name, use_ta=(not self.skip_ta)))
         data = {}
-        for svc in sorted(limits.keys()):
-            for lim in sorted(limits[svc].keys()):
-                data["{s}/{l}".format(s=svc, l=lim)] = '{v}'.format(
-                    v=limits[svc][lim].get_current_usage_str())
+        for r in CheckResult(limits):
+            data["{s}/{l}".format(s=r.service_name, l=r.name)] = r.usage_str
         print(dict2cols(data))
 
     def check_thresholds(self, metrics=None):
         have_warn = False
         have_crit = False
-        problems = self.checker.check_thresholds(
+        have_incomplete = False
+        problems = self._flatten_regions(self.checker.check_thresholds(
             use_ta=(not self.skip_ta),
-            service=self.service_name
-        )
+            service=self.service_name,
+            max_age=self.max_usage_age
+        ))
         if metrics:
-            for svc, svc_limits in sorted(self.checker.get_limits().items()):
-                if self.service_name and svc not in self.service_name:
-                    continue
-                for _, limit in sorted(svc_limits.items()):
-                    metrics.add_limit(limit)
+            # when checking multiple regions, ``metrics`` is a dict of region
+            # name to MetricsProvider
+            all_limits = self.checker.get_limits()
+            if self.regions is None:
+                all_limits = {None: all_limits}
+                metrics = {None: metrics}
+            for region in sorted(all_limits.keys(), key=str):
+                metrics[region].add_result(CheckResult(dict(
+                    (svc, svc_limits)
+                    for svc, svc_limits in all_limits[region].items()
+                    if not self.service_name or svc in self.service_name
+                )))
         columns = {}
-        for svc in sorted(problems.keys()):
-            for lim_name in sorted(problems[svc].keys()):
-                check_name = "{svc}/{limit}".format(
-                    svc=svc,
-                    limit=lim_name,
-                )
-                if check_name in self.skip_check:
-                    continue
-                limit = problems[svc][lim_name]
-                warns = limit.get_warnings()
-                crits = limit.get_criticals()
-                if len(crits) > 0:
-                    have_crit = True
-                if len(warns) > 0:
-                    have_warn = True
-                k, v = issue_string_tuple(
-                    svc, limit, crits, warns, colorize=self.colorize
-                )
-                columns[k] = v
+        for r in CheckResult(problems):
+            # skip checks are always "service/limit", without region
+            check_name = "{svc}/{limit}".format(
+                svc=r.service_name.split('/')[-1],
+                limit=r.name,
+            )
+            if check_name in self.skip_check:
+                continue
+            warns = list(r.warnings)
+            crits = list(r.criticals)
+            if len(crits) > 0:
+                have_crit = True
+            if len(warns) > 0:
+                have_warn = True
+            if r.limit.is_incomplete():
+                have_incomplete = True
+            k, v = issue_string_tuple(
+                r.service_name, r.limit, crits, warns, colorize=self.colorize
+            )
+            columns[k] = v
         d2c = dict2cols(columns)
         print(d2c)
         # might as well use the Nagios exit codes,
@@ -367,8 +580,32 @@ class Runner(object):
             return 2, problems, d2c
         if have_warn:
             return 1, problems, d2c
+        if have_incomplete:
+            # Nagios "UNKNOWN"; some services ran out of time
+            return 3, problems, d2c
         return 0, problems, d2c
 
+    def run_daemon(self, args):
+        """
+        Run a :py:class:`~.LimitCheckerDaemon` for ``self.checker`` until
+        interrupted.
+
+        :param args: parsed command-line arguments
+        :type args: :py:class:`argparse.Namespace`
+        """
+        daemon = LimitCheckerDaemon(
+            self.checker,
+            interval=args.daemon_interval,
+            service_intervals=dict(
+                (k, float(v))
+                for k, v in args.daemon_service_interval.items()
+            ),
+            service=self.service_name,
+            use_ta=(not self.skip_ta),
+            max_age=self.max_usage_age
+        )
+        daemon.serve(args.listen_address, args.listen_port)
+
     def set_limit_overrides(self, overrides):
         for key in sorted(overrides.keys()):
             if key.count('/') != 1:
@@ -386,7 +623,7 @@ class Runner(object):
                 'Reading JSON from S3 bucket "%s" key "%s"',
                 parsed.netloc, s3key
             )
-            client = boto3.client('s3')
+            client = self.checker.client_registry.client('s3')
             resp = client.get_object(Bucket=parsed.netloc, Key=s3key)
             data = resp['Body'].read()
         else:
@@ -428,14 +665,59 @@ class Runner(object):
         if args.skip_ta:
             self.skip_ta = True
 
+        checker_kwargs = {'region': args.region}
+        if args.regions is not None:
+            if args.region is not None:
+                logger.error('-r/--region and --regions may not be used '
+                             'together')
+                raise SystemExit(1)
+            self.regions = sorted(set(args.regions), key=args.regions.index)
+            checker_kwargs = {
+                'regions': self.regions,
+                'region_parallelism': args.region_parallelism
+            }
+        elif args.region_parallelism is not None:
+            logger.error('--region-parallelism requires --regions')
+            raise SystemExit(1)
+
+        usage_store = None
+        if args.usage_snapshot_db is not None:
+            usage_store = SqliteUsageSnapshotStore(args.usage_snapshot_db)
+        elif args.max_usage_age is not None:
+            logger.error('--max-usage-age requires --usage-snapshot-db')
+            raise SystemExit(1)
+        elif args.scan_schedule:
+            logger.error('--scan-schedule requires --usage-snapshot-db')
+            raise SystemExit(1)
+        self.max_usage_age = args.max_usage_age
+        scan_schedule = None
+        if args.scan_schedule:
+            scan_schedule = ScanSchedule(
+                min_interval=args.min_scan_interval,
+                max_interval=args.max_scan_interval,
+                threshold=args.critical_threshold
+            )
+        quotas_cache = None
+        if args.quotas_cache_db is not None:
+            quotas_cache = SqliteQuotasCache(
+                args.quotas_cache_db, ttl=args.quotas_cache_ttl
+            )
+        sts_cache = None
+        if args.sts_cache_dir is not None:
+            sts_cache = StsCredentialCache(args.sts_cache_dir)
+        ta_cache = None
+        if args.ta_cache_db is not None:
+            ta_cache = SqliteTrustedAdvisorCache(args.ta_cache_db)
+
         # the rest of these actually use the checker
-        self.checker = AwsLimitChecker(
+        self.checker = (
+            AwsLimitChecker if self.regions is None else MultiRegionChecker
+        )(
             warning_threshold=args.warning_threshold,
             critical_threshold=args.critical_threshold,
             profile_name=args.profile_name,
             account_id=args.sts_account_id,
             account_role=args.sts_account_role,
-            region=args.region,
             external_id=args.external_id,
             mfa_serial_number=args.mfa_serial_number,
             mfa_token=args.mfa_token,
@@ -444,7 +726,26 @@ class Runner(object):
             check_version=args.check_version,
             role_partition=args.role_partition,
             ta_api_region=args.ta_api_region,
-            skip_quotas=args.skip_quotas
+            skip_quotas=args.skip_quotas,
+            parallelism=args.parallelism,
+            service_timeout=args.service_timeout,
+            service_timeouts=dict(
+                (k, float(v))
+                for k, v in args.service_timeout_override.items()
+            ),
+            run_timeout=args.run_timeout,
+            usage_store=usage_store,
+            quotas_cache=quotas_cache,
+            ta_poll_min_interval=args.ta_poll_min_interval,
+            ta_poll_max_interval=args.ta_poll_max_interval,
+            ta_cache=ta_cache,
+            ta_cache_ttl=args.ta_cache_ttl,
+            sts_cache=sts_cache,
+            scan_schedule=scan_schedule,
+            usage_source=args.usage_source,
+            resource_detail=args.resource_detail,
+            usage_retention=args.usage_retention,
+            **checker_kwargs
         )
 
         if args.version:
@@ -504,6 +805,10 @@ class Runner(object):
                 print(p)
             raise SystemExit(0)
 
+        if args.daemon:
+            self.run_daemon(args)
+            raise SystemExit(0)
+
         # else check
         alerter = None
         if args.alert_provider:
@@ -514,15 +819,29 @@ class Runner(object):
         try:
             metrics = None
             if args.metrics_provider:
-                metrics = MetricsProvider.get_provider_by_name(
+                klass = MetricsProvider.get_provider_by_name(
                     args.metrics_provider
-                )(self.checker.region_name, **args.metrics_config)
+                )
+                if self.regions is None:
+                    metrics = klass(
+                        self.checker.region_name, **args.metrics_config
+                    )
+                else:
+                    metrics = dict(
+                        (r, klass(r, **args.metrics_config))
+                        for r in self.regions
+                    )
             res, problems, problem_str = self.check_thresholds(metrics)
             duration = time.time() - start_time
             logger.info('Finished checking limits in %s seconds', duration)
+            rate_limiter.log_stats()
             if metrics:
-                metrics.set_run_duration(duration)
-                metrics.flush()
+                providers = [metrics]
+                if self.regions is not None:
+                    providers = [metrics[r] for r in self.regions]
+                for m in providers:
+                    m.set_run_duration(duration)
+                    m.flush()
         except Exception as ex:
             if alerter:
                 alerter.on_critical(
@@ -534,7 +853,7 @@ class Runner(object):
                 alerter.on_critical(
                     problems, problem_str, duration=time.time() - start_time
                 )
-            elif res == 1:
+            elif res in (1, 3):
                 alerter.on_warning(
                     problems, problem_str, duration=time.time() - start_time
                 )
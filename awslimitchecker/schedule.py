@@ -0,0 +1,110 @@
+"""
+awslimitchecker/schedule.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ScanSchedule(object):
+    """
+    Policy that decides how often each service needs to be scanned, from the
+    history of its utilization (the highest usage of any of its limits, as a
+    fraction of that limit) kept by a :py:class:`~.UsageSnapshotStore`.
+
+    A service is rescanned at an interval that shrinks linearly, from
+    ``max_interval`` at zero utilization to ``min_interval`` at ``threshold``
+    percent utilization. If utilization has grown within the last ``window``
+    seconds, the interval is also limited to ``safety_factor`` times the time
+    that it would take to reach ``threshold`` at the same rate. Until a
+    service has a history, it is scanned on every run.
+
+    When a :py:class:`~.ScanSchedule` is passed to
+    :py:class:`~.AwsLimitChecker`, :py:meth:`~.AwsLimitChecker.find_usage` and
+    :py:meth:`~.AwsLimitChecker.check_thresholds` reuse the stored usage
+    snapshot of each service that is not yet due to be scanned.
+    """
+
+    def __init__(self, min_interval=300, max_interval=86400, threshold=99,
+                 safety_factor=0.5, window=604800):
+        """
+        :param min_interval: shortest interval between scans of a service, in
+          seconds
+        :type min_interval: float
+        :param max_interval: longest interval between scans of a service, in
+          seconds
+        :type max_interval: float
+        :param threshold: utilization, in percent, at (and above) which a
+          service is scanned every ``min_interval`` seconds
+        :type threshold: float
+        :param safety_factor: fraction of the projected time until
+          ``threshold`` is reached to wait before the next scan
+        :type safety_factor: float
+        :param window: number of seconds of history to compute the growth
+          rate of utilization from
+        :type window: float
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.threshold = threshold
+        self.safety_factor = safety_factor
+        self.window = window
+
+    def interval(self, history):
+        """
+        Return the number of seconds that may pass between the last scan in
+        ``history`` and the next scan of the service.
+
+        :param history: the service's utilization history, as a list of
+          (timestamp, utilization) 2-tuples in ascending timestamp order, as
+          returned by :py:meth:`.UsageSnapshotStore.get_history`
+        :type history: list
+        :rtype: float
+        """
+        if len(history) == 0:
+            return 0
+        last_ts, last_util = history[-1]
+        limit = self.threshold / 100.0
+        headroom = max(limit - last_util, 0.0)
+        interval = self.max_interval * headroom / limit
+        first_ts, first_util = history[0]
+        if last_ts > first_ts and last_util > first_util:
+            rate = (last_util - first_util) / (last_ts - first_ts)
+            interval = min(interval, self.safety_factor * headroom / rate)
+        return min(max(interval, self.min_interval), self.max_interval)
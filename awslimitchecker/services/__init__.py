@@ -37,33 +37,36 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
-from awslimitchecker.services.base import _AwsService
-from awslimitchecker.services.apigateway import _ApigatewayService
-from awslimitchecker.services.autoscaling import _AutoscalingService
-from awslimitchecker.services.cloudformation import _CloudformationService
-from awslimitchecker.services.cloudtrail import _CloudTrailService
-from awslimitchecker.services.directoryservice import _DirectoryserviceService
-from awslimitchecker.services.dynamodb import _DynamodbService
-from awslimitchecker.services.ebs import _EbsService
-from awslimitchecker.services.ec2 import _Ec2Service
-from awslimitchecker.services.ecs import _EcsService
-from awslimitchecker.services.efs import _EfsService
-from awslimitchecker.services.elasticache import _ElastiCacheService
-from awslimitchecker.services.elasticbeanstalk import _ElasticBeanstalkService
-from awslimitchecker.services.elb import _ElbService
-from awslimitchecker.services.eks import _EksService
-from awslimitchecker.services.firehose import _FirehoseService
-from awslimitchecker.services.iam import _IamService
-from awslimitchecker.services.kinesis import _KinesisService
-from awslimitchecker.services.lambdafunc import _LambdaService
-from awslimitchecker.services.rds import _RDSService
-from awslimitchecker.services.redshift import _RedshiftService
-from awslimitchecker.services.route53 import _Route53Service
-from awslimitchecker.services.s3 import _S3Service
-from awslimitchecker.services.ses import _SesService
-from awslimitchecker.services.vpc import _VpcService
+from awslimitchecker.services.registry import ServiceRegistry
 
-# dynamically generate the service name to class dict
-_services = {}
-for cls in _AwsService.__subclasses__():
-    _services[cls.service_name] = cls
+# service name to the module and class implementing it; service modules are
+# only imported when their class is first looked up. New services must be
+# added here.
+_services = ServiceRegistry([
+    ('ApiGateway', 'apigateway', '_ApigatewayService', False),
+    ('AutoScaling', 'autoscaling', '_AutoscalingService', False),
+    ('CloudFormation', 'cloudformation', '_CloudformationService', False),
+    ('CloudTrail', 'cloudtrail', '_CloudTrailService', False),
+    ('Directory Service', 'directoryservice', '_DirectoryserviceService',
+     False),
+    ('DynamoDB', 'dynamodb', '_DynamodbService', False),
+    ('EBS', 'ebs', '_EbsService', False),
+    ('EC2', 'ec2', '_Ec2Service', False),
+    ('ECS', 'ecs', '_EcsService', False),
+    ('EFS', 'efs', '_EfsService', False),
+    ('ElastiCache', 'elasticache', '_ElastiCacheService', False),
+    ('ElasticBeanstalk', 'elasticbeanstalk', '_ElasticBeanstalkService',
+     False),
+    ('ELB', 'elb', '_ElbService', False),
+    ('EKS', 'eks', '_EksService', False),
+    ('Firehose', 'firehose', '_FirehoseService', False),
+    ('IAM', 'iam', '_IamService', True),
+    ('Kinesis', 'kinesis', '_KinesisService', False),
+    ('Lambda', 'lambdafunc', '_LambdaService', False),
+    ('RDS', 'rds', '_RDSService', False),
+    ('Redshift', 'redshift', '_RedshiftService', False),
+    ('Route53', 'route53', '_Route53Service', True),
+    ('S3', 's3', '_S3Service', True),
+    ('SES', 'ses', '_SesService', False),
+    ('VPC', 'vpc', '_VpcService', False),
+])
@@ -42,7 +42,7 @@ import logging
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import count_paginated
 
 logger = logging.getLogger(__name__)
 
@@ -63,32 +63,56 @@ class _AutoscalingService(_AwsService):
         self.connect()
         for lim in self.limits.values():
             lim._reset_usage()
+        self._set_usage_from_counters()
+        if self._needs_enumeration(['Auto Scaling groups']):
+            self._find_usage_groups()
+        if self._needs_enumeration(['Launch configurations']):
+            self._find_usage_launch_configs()
+        self._have_usage = True
+        logger.debug("Done checking usage.")
 
+    def _find_usage_groups(self):
+        """count Auto Scaling groups by listing them"""
         self.limits['Auto Scaling groups']._add_current_usage(
-            len(
-                paginate_dict(
-                    self.conn.describe_auto_scaling_groups,
-                    alc_marker_path=['NextToken'],
-                    alc_data_path=['AutoScalingGroups'],
-                    alc_marker_param='NextToken'
-                )['AutoScalingGroups']
+            count_paginated(
+                self.conn.describe_auto_scaling_groups,
+                alc_marker_path=['NextToken'],
+                alc_data_path=['AutoScalingGroups'],
+                alc_marker_param='NextToken'
             ),
             aws_type='AWS::AutoScaling::AutoScalingGroup',
         )
 
+    def _find_usage_launch_configs(self):
+        """count launch configurations by listing them"""
         self.limits['Launch configurations']._add_current_usage(
-            len(
-                paginate_dict(
-                    self.conn.describe_launch_configurations,
-                    alc_marker_path=['NextToken'],
-                    alc_data_path=['LaunchConfigurations'],
-                    alc_marker_param='NextToken'
-                )['LaunchConfigurations']
+            count_paginated(
+                self.conn.describe_launch_configurations,
+                alc_marker_path=['NextToken'],
+                alc_data_path=['LaunchConfigurations'],
+                alc_marker_param='NextToken'
             ),
             aws_type='AWS::AutoScaling::LaunchConfiguration',
         )
-        self._have_usage = True
-        logger.debug("Done checking usage.")
+
+    def _find_usage_counters(self):
+        """
+        Return the number of Auto Scaling groups and launch configurations,
+        as returned by the DescribeAccountLimits API action along with their
+        limits.
+
+        :rtype: dict
+        """
+        self.connect()
+        lims = self.conn.describe_account_limits()
+        res = {}
+        for lname, key in [
+            ('Auto Scaling groups', 'NumberOfAutoScalingGroups'),
+            ('Launch configurations', 'NumberOfLaunchConfigurations'),
+        ]:
+            if key in lims:
+                res[lname] = lims[key]
+        return res
 
     def get_limits(self):
         """
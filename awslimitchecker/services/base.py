@@ -39,9 +39,8 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import abc
 import logging
-import boto3
-from datetime import datetime, timedelta
-from awslimitchecker.connectable import Connectable
+from awslimitchecker.connectable import Connectable, ClientRegistry
+from awslimitchecker.utils import current_call_abandoned
 
 logger = logging.getLogger(__name__)
 
@@ -58,8 +57,23 @@ class _AwsService(Connectable):
     #: the service code for Service Quotas, or None
     quotas_service_code = None
 
+    #: whether this service's limits and usage are account-wide (global)
+    #: rather than per-region
+    is_global = False
+
+    #: whether to take the usage of limits that have an ``AWS/Usage``
+    #: CloudWatch metric from that metric; set per instance by
+    #: :py:class:`~.AwsLimitChecker`. See :py:meth:`~._find_current_usage`.
+    usage_from_cloudwatch = False
+
+    #: whether to list individual resources to find the usage of limits whose
+    #: usage is also returned by an account-level API (so that the usage of
+    #: each resource is known, not just the total); set per instance by
+    #: :py:class:`~.AwsLimitChecker`. See :py:meth:`~._find_usage_counters`.
+    resource_detail = False
+
     def __init__(self, warning_threshold, critical_threshold,
-                 boto_connection_kwargs, quotas_client):
+                 boto_connection_kwargs, quotas_client, client_registry=None):
         """
         Describes an AWS service and its limits, and provides methods to
         query current utilization.
@@ -82,11 +96,17 @@ class _AwsService(Connectable):
         :type boto_connection_kwargs: dict
         :param quotas_client: Instance of ServiceQuotasClient
         :type quotas_client: ``ServiceQuotasClient`` or ``None``
+        :param client_registry: registry to obtain boto3 clients and
+          resources from; if None, a new one is created for this instance.
+        :type client_registry: :py:class:`~.ClientRegistry`
         """
         self.warning_threshold = warning_threshold
         self.critical_threshold = critical_threshold
         self._boto3_connection_kwargs = boto_connection_kwargs
         self._quotas_client = quotas_client
+        if client_registry is None:
+            client_registry = ClientRegistry()
+        self._client_registry = client_registry
         self.conn = None
         self.resource_conn = None
         self.limits = {}
@@ -94,6 +114,26 @@ class _AwsService(Connectable):
         self._have_usage = False
         self._current_account_id = None
         self._cloudwatch_client = None
+        #: dict of limit name to its usage from CloudWatch, for the usage
+        #: check in progress
+        self._cloudwatch_usage = {}
+        #: dict of limit name to its usage from API counters, for the usage
+        #: check in progress
+        self._counter_usage = {}
+
+    @property
+    def _region_name(self):
+        """
+        Return the name of the region this service connects to, as resolved
+        by :py:meth:`.ClientRegistry.region_name` from its connection
+        arguments, without connecting; for limits whose default values depend
+        on the region.
+
+        :rtype: str
+        """
+        return self._client_registry.region_name(
+            self._boto3_connection_kwargs.get('region_name')
+        )
 
     @property
     def current_account_id(self):
@@ -106,8 +146,9 @@ class _AwsService(Connectable):
         """
         if self._current_account_id is not None:
             return self._current_account_id
-        kwargs = dict(self._boto3_connection_kwargs)
-        sts = boto3.client('sts', **kwargs)
+        sts = self._client_registry.client(
+            'sts', **self._boto3_connection_kwargs
+        )
         logger.info(
             "Connected to STS in region %s", sts._client_config.region_name
         )
@@ -127,8 +168,9 @@ class _AwsService(Connectable):
         If the boto3 method being called returns a dict response that can
         include 'NextToken' or another pagination marker, it should be called
         through
-        :py:func:`~awslimitchecker.utils.paginate_dict` with the appropriate
-        parameters.
+        :py:func:`~awslimitchecker.utils.paginate_items` or
+        :py:func:`~awslimitchecker.utils.count_paginated` with the
+        appropriate parameters.
         """
         """
         logger.debug("Checking usage for service {n}".format(
@@ -136,7 +178,7 @@ class _AwsService(Connectable):
         self.connect()
         usage = self.conn.method_to_get_usage()
         # or, if it needs to be paginated, something like:
-        usage = paginate_dict(
+        usage = count_paginated(
             self.conn.method_to_get_usage,
             alc_marker_path=['NextToken'],
             alc_data_path=['ResourceListName'],
@@ -268,6 +310,222 @@ class _AwsService(Connectable):
                 s=self.service_name,
                 l=limit_name))
 
+    def set_usage_retention(self, top_k, limit_name=None):
+        """
+        Set how many per-resource usage values to keep for one or all of this
+        service's limits; see :py:meth:`.AwsLimit.set_usage_retention`.
+
+        :param top_k: number of usage values below thresholds to keep, or
+          None to keep all usage values
+        :type top_k: int
+        :param limit_name: the name of the limit to set retention for, or
+          None for all limits
+        :type limit_name: str
+        """
+        if limit_name is None:
+            for lim in self.limits.values():
+                lim.set_usage_retention(top_k)
+            return
+        try:
+            self.limits[limit_name].set_usage_retention(top_k)
+        except KeyError:
+            raise ValueError("{s} service has no '{l}' limit".format(
+                s=self.service_name,
+                l=limit_name))
+
+    @property
+    def _have_usage(self):
+        """
+        Whether the usage of this service's limits has been found. Set by
+        :py:meth:`~.find_usage`; setting it from a usage check that was
+        abandoned (see :py:func:`~.current_call_abandoned`) has no effect.
+
+        :rtype: bool
+        """
+        return self._usage_found
+
+    @_have_usage.setter
+    def _have_usage(self, value):
+        if current_call_abandoned():
+            return
+        self._usage_found = value
+
+    def _find_usage_if_needed(self):
+        """
+        Call :py:meth:`~._find_current_usage` if usage has not been found yet.
+        """
+        if not self._have_usage:
+            self._find_current_usage()
+
+    def _find_current_usage(self):
+        """
+        Find the current usage of this service's limits.
+
+        Unless ``usage_from_cloudwatch`` is True, this just calls
+        :py:meth:`~.find_usage`. Otherwise, the latest value of the
+        CloudWatch metric of each limit in :py:meth:`~._usage_metrics` (which
+        are retrieved in one batch with those of all other services) is used
+        as its usage instead; :py:meth:`~.find_usage` is only called if some
+        limits do not have a value from CloudWatch, and subclasses may skip
+        finding the usage of limits that do (see
+        :py:meth:`~._have_cloudwatch_usage`).
+        """
+        if not self.usage_from_cloudwatch:
+            self.find_usage()
+            return
+        batch = self._usage_metrics_batch()
+        keys = dict(
+            (lname, batch.add(*query))
+            for lname, query in self._usage_metrics().items()
+        )
+        cloudwatch_usage = {}
+        for lname, key in keys.items():
+            val = batch.get(key)
+            if val is not None:
+                cloudwatch_usage[lname] = val
+        if current_call_abandoned():
+            return
+        self._cloudwatch_usage = cloudwatch_usage
+        logger.debug(
+            'Usage of %d of %d %s limits found in CloudWatch',
+            len(self._cloudwatch_usage), len(self.limits), self.service_name
+        )
+        if len(self._cloudwatch_usage) < len(self.limits):
+            self.find_usage()
+        for lname, val in self._cloudwatch_usage.items():
+            self.limits[lname]._reset_usage()
+            self.limits[lname]._add_current_usage(val)
+        if current_call_abandoned():
+            return
+        self._cloudwatch_usage = {}
+        self._have_usage = True
+
+    def _have_cloudwatch_usage(self, limit_names):
+        """
+        Return whether the usage of all of the given limits is being taken
+        from CloudWatch by the usage check in progress, in which case
+        :py:meth:`~.find_usage` need not find it.
+
+        :param limit_names: names of the limits to check
+        :type limit_names: list
+        :rtype: bool
+        """
+        return all(n in self._cloudwatch_usage for n in limit_names)
+
+    def _find_usage_counters(self):
+        """
+        Return the usage of limits that an account-level API of this service
+        returns as a single number (i.e. along with the limits themselves),
+        as a dict of limit name to usage. Subclasses whose APIs provide such
+        counters should override this; by default, there are none.
+
+        :rtype: dict
+        """
+        return {}
+
+    def _set_usage_from_counters(self):
+        """
+        Unless ``resource_detail`` is True, add the usage of each limit
+        returned by :py:meth:`~._find_usage_counters` to that limit, so that
+        :py:meth:`~.find_usage` can skip listing resources only to count them
+        (see :py:meth:`~._needs_enumeration`). Should be called by
+        :py:meth:`~.find_usage` after resetting usage.
+        """
+        if current_call_abandoned():
+            return
+        self._counter_usage = {}
+        if self.resource_detail:
+            return
+        counter_usage = self._find_usage_counters()
+        if current_call_abandoned():
+            return
+        for lname, val in counter_usage.items():
+            lim = self.limits[lname]
+            lim._add_current_usage(val, aws_type=lim.limit_type)
+            self._counter_usage[lname] = val
+        logger.debug(
+            'Usage of %d %s limits found from API counters',
+            len(self._counter_usage), self.service_name
+        )
+
+    def _needs_enumeration(self, limit_names):
+        """
+        Return whether :py:meth:`~.find_usage` needs to list resources to find
+        the usage of the given limits; False if the usage of all of them was
+        already found from API counters (see
+        :py:meth:`~._set_usage_from_counters`) or is being taken from
+        CloudWatch (see :py:meth:`~._have_cloudwatch_usage`).
+
+        :param limit_names: names of the limits to check
+        :type limit_names: list
+        :rtype: bool
+        """
+        return not all(
+            n in self._counter_usage or n in self._cloudwatch_usage
+            for n in limit_names
+        )
+
+    def _usage_metrics(self):
+        """
+        Return the CloudWatch metrics that this service takes the usage of
+        some of its limits from, as a dict of limit name to a tuple of
+        positional arguments for :py:meth:`.UsageMetricsBatch.add` (metric
+        name, dimensions, period and statistic).
+
+        When ``usage_from_cloudwatch`` is True, this includes every limit
+        whose quota has an ``AWS/Usage`` metric in Service Quotas (see
+        :py:meth:`.ServiceQuotasClient.get_usage_metric`). Subclasses that
+        always query CloudWatch for some limits should add those.
+
+        :rtype: dict
+        """
+        res = {}
+        if not self.usage_from_cloudwatch or self._quotas_client is None:
+            return res
+        for lname, lim in sorted(self.limits.items()):
+            if lim.quotas_service_code is None or lim.quotas_unit != 'None':
+                continue
+            metric = self._quotas_client.get_usage_metric(
+                lim.quotas_service_code, lim.quota_name
+            )
+            if metric is None or metric.get('MetricNamespace') != 'AWS/Usage':
+                continue
+            res[lname] = (
+                metric['MetricName'],
+                [
+                    {'Name': k, 'Value': v} for k, v in sorted(
+                        metric.get('MetricDimensions', {}).items()
+                    )
+                ],
+                60,
+                metric.get('MetricStatisticRecommendation', 'Average')
+            )
+        return res
+
+    def _register_usage_metrics(self):
+        """
+        Add the metrics from :py:meth:`~._usage_metrics` to the
+        :py:class:`~.UsageMetricsBatch` shared by all services, so that they
+        are retrieved together with those of all other services.
+        """
+        metrics = self._usage_metrics()
+        if len(metrics) == 0:
+            return
+        batch = self._usage_metrics_batch()
+        for query in metrics.values():
+            batch.add(*query)
+
+    def _usage_metrics_batch(self):
+        """
+        Return the :py:class:`~.UsageMetricsBatch` for this service's
+        CloudWatch client.
+
+        :rtype: :py:class:`~.UsageMetricsBatch`
+        """
+        return self._client_registry.usage_metrics(
+            self._cloudwatch_connection()
+        )
+
     def check_thresholds(self):
         """
         Checks current usage against configured thresholds for all limits
@@ -277,8 +535,7 @@ class _AwsService(Connectable):
           for all limits that crossed one or more of their thresholds.
         :rtype: :py:obj:`dict` of :py:class:`~.AwsLimit`
         """
-        if not self._have_usage:
-            self.find_usage()
+        self._find_usage_if_needed()
         ret = {}
         for name, limit in self.limits.items():
             if limit.check_thresholds() is False:
@@ -306,14 +563,16 @@ class _AwsService(Connectable):
     def _cloudwatch_connection(self):
         """
         Return a connected CloudWatch client instance. ONLY to be used by
-        :py:meth:`_get_cloudwatch_usage_latest`.
+        :py:meth:`_usage_metrics_batch`.
         """
         if self._cloudwatch_client is not None:
             return self._cloudwatch_client
         kwargs = dict(self._boto3_connection_kwargs)
         if self._max_retries_config is not None:
             kwargs['config'] = self._max_retries_config
-        self._cloudwatch_client = boto3.client('cloudwatch', **kwargs)
+        self._cloudwatch_client = self._client_registry.client(
+            'cloudwatch', **kwargs
+        )
         logger.info(
             "Connected to cloudwatch in region %s",
             self._cloudwatch_client._client_config.region_name
@@ -327,55 +586,28 @@ class _AwsService(Connectable):
         Given some metric dimensions, return the value of the latest data point
         for the ``AWS/Usage`` metric specified.
 
+        The metric is retrieved through the :py:class:`~.UsageMetricsBatch`
+        shared by all services, together with any other metrics that have
+        been registered with it; services should include the metric in
+        :py:meth:`~._usage_metrics` so that it is registered before any
+        service's usage is found.
+
         :param dimensions: list of dicts; dimensions for the metric
         :type dimensions: list
         :param metric_name: AWS/Usage metric name to get
         :type metric_name: str
         :param period: metric period
         :type period: int
-        :return: return the metric value (float or int), or None if it cannot
+        :return: return the metric value (float or int), or zero if it cannot
           be retrieved
-        :rtype: ``float, int or None``
-        """
-        conn = self._cloudwatch_connection()
-        kwargs = dict(
-            MetricDataQueries=[
-                {
-                    'Id': 'id',
-                    'MetricStat': {
-                        'Metric': {
-                            'Namespace': 'AWS/Usage',
-                            'MetricName': metric_name,
-                            'Dimensions': dimensions
-                        },
-                        'Period': period,
-                        'Stat': 'Average'
-                    }
-                }
-            ],
-            StartTime=datetime.utcnow() - timedelta(hours=1),
-            EndTime=datetime.utcnow(),
-            ScanBy='TimestampDescending',
-            MaxDatapoints=1
-        )
-        try:
-            logger.debug('Querying CloudWatch GetMetricData: %s', kwargs)
-            resp = conn.get_metric_data(**kwargs)
-        except Exception as ex:
-            logger.error(
-                'Error querying CloudWatch GetMetricData for AWS/Usage %s: %s',
-                metric_name, ex
-            )
-            return 0
-        results = resp.get('MetricDataResults', [])
-        if len(results) < 1 or len(results[0]['Values']) < 1:
+        :rtype: ``float or int``
+        """
+        batch = self._usage_metrics_batch()
+        val = batch.get(batch.add(metric_name, dimensions, period))
+        if val is None:
             logger.warning(
                 'No data points found for AWS/Usage metric %s with dimensions '
                 '%s; using value of zero!', metric_name, dimensions
             )
             return 0
-        logger.debug(
-            'CloudWatch metric query returned value of %s with timestamp %s',
-            results[0]['Values'][0], results[0]['Timestamps'][0]
-        )
-        return results[0]['Values'][0]
+        return val
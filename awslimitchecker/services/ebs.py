@@ -42,7 +42,7 @@ import logging
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import paginate_items, count_paginated
 
 logger = logging.getLogger(__name__)
 
@@ -91,13 +91,12 @@ class _EbsService(_AwsService):
         st_gb = 0
         sc_gb = 0
         logger.debug("Getting usage for EBS volumes")
-        results = paginate_dict(
+        for vol in paginate_items(
             self.conn.describe_volumes,
             alc_marker_path=['NextToken'],
             alc_data_path=['Volumes'],
             alc_marker_param='NextToken'
-        )
-        for vol in results['Volumes']:
+        ):
             vols += 1
             if vol['VolumeType'] == 'io1':
                 piops_io1_gb += vol['Size']
@@ -179,7 +178,7 @@ class _EbsService(_AwsService):
     def _find_usage_snapshots(self):
         """find snapshot usage"""
         logger.debug("Getting usage for EBS snapshots")
-        snaps = paginate_dict(
+        snaps = count_paginated(
             self.conn.describe_snapshots,
             OwnerIds=['self'],
             alc_marker_path=['NextToken'],
@@ -187,7 +186,7 @@ class _EbsService(_AwsService):
             alc_marker_param='NextToken'
         )
         self.limits['Active snapshots']._add_current_usage(
-            len(snaps['Snapshots']),
+            snaps,
             aws_type='AWS::EC2::VolumeSnapshot'
         )
 
@@ -116,7 +116,11 @@ class _Ec2Service(_AwsService):
         for lim in self.limits.values():
             lim._reset_usage()
         if self._use_vcpu_limits:
-            self._find_usage_instances_vcpu()
+            if not self._have_cloudwatch_usage(
+                list(self.instance_family_to_limit_name.values()) +
+                [self.default_limit_name]
+            ):
+                self._find_usage_instances_vcpu()
         else:
             self._find_usage_instances_nonvcpu()
         self._find_usage_networking_sgs()
@@ -399,11 +403,10 @@ class _Ec2Service(_AwsService):
                 'environment and set to something other than "true".'
             )
             return False
-        oldconn = self.conn
-        self.connect()
-        region_name = self.conn._client_config.region_name
-        self.conn = oldconn
-        if region_name.startswith('cn-') or region_name.startswith('us-gov-'):
+        region_name = self._region_name
+        if region_name is not None and (
+            region_name.startswith('cn-') or region_name.startswith('us-gov-')
+        ):
             logger.debug(
                 'Using non-vCPU EC2 limits due to region name: %s', region_name
             )
@@ -642,8 +645,9 @@ class _Ec2Service(_AwsService):
         logger.debug("Getting usage for EC2 VPC resources")
         sg_count = 0
         rules_per_sg = defaultdict(int)
-        for sg in self.resource_conn.security_groups.all():
-            if sg.vpc_id is None:
+        inventory = self._client_registry.ec2_inventory(self.conn)
+        for sg in inventory.security_groups:
+            if sg.get('VpcId') is None:
                 continue
             sg_count += 1
             """
@@ -665,7 +669,10 @@ class _Ec2Service(_AwsService):
             UserIdGroupPairs count towards both IPv4 and IPv6.
             """
             counts = []
-            for perm in [sg.ip_permissions, sg.ip_permissions_egress]:
+            for perm in [
+                sg.get('IpPermissions', []),
+                sg.get('IpPermissionsEgress', [])
+            ]:
                 counts.append(
                     max(
                         sum([len(x.get('IpRanges', [])) for x in perm]),
@@ -674,7 +681,7 @@ class _Ec2Service(_AwsService):
                     sum([len(x.get('PrefixListIds', [])) for x in perm]) +
                     sum([len(x.get('UserIdGroupPairs', [])) for x in perm])
                 )
-            rules_per_sg[sg.id] = max(counts)
+            rules_per_sg[sg['GroupId']] = max(counts)
         # set usage
         self.limits['VPC security groups per Region']._add_current_usage(
             sg_count,
@@ -689,31 +696,30 @@ class _Ec2Service(_AwsService):
 
     def _find_usage_networking_eips(self):
         logger.debug("Getting usage for EC2 EIPs")
-        vpc_addrs = self.resource_conn.vpc_addresses.all()
+        addrs = self._client_registry.ec2_inventory(self.conn).addresses
         self.limits['VPC Elastic IP addresses (EIPs)']._add_current_usage(
-            sum(1 for a in vpc_addrs if a.domain == 'vpc'),
+            sum(1 for a in addrs if a.get('Domain') == 'vpc'),
             aws_type='AWS::EC2::EIP',
         )
         # the EC2 limits screen calls this 'EC2-Classic Elastic IPs'
         # but Trusted Advisor just calls it 'Elastic IP addresses (EIPs)'
-        classic_addrs = self.resource_conn.classic_addresses.all()
         self.limits['Elastic IP addresses (EIPs)']._add_current_usage(
-            sum(1 for a in classic_addrs if a.domain == 'standard'),
+            sum(1 for a in addrs if a.get('Domain') == 'standard'),
             aws_type='AWS::EC2::EIP',
         )
 
     def _find_usage_networking_eni_sg(self):
         logger.debug("Getting usage for EC2 Network Interfaces")
-        ints = self.resource_conn.network_interfaces.all()
-        for iface in ints:
-            if iface.vpc is None:
+        inventory = self._client_registry.ec2_inventory(self.conn)
+        for iface in inventory.network_interfaces:
+            if iface.get('VpcId') is None:
                 continue
             self.limits[
                 'VPC security groups per elastic network interface'
             ]._add_current_usage(
-                len(iface.groups),
+                len(iface.get('Groups', [])),
                 aws_type='AWS::EC2::NetworkInterface',
-                resource_id=iface.id,
+                resource_id=iface['NetworkInterfaceId'],
             )
 
     def _get_limits_networking(self):
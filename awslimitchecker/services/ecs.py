@@ -52,6 +52,22 @@ class _EcsService(_AwsService):
     service_name = 'ECS'
     api_name = 'ecs'  # AWS API name to connect to (boto3.client)
 
+    #: AWS/Usage ResourceCount metric dimensions for the Fargate limits
+    fargate_usage_dimensions = {
+        'Fargate On-Demand resource count': [
+            {'Name': 'Type', 'Value': 'Resource'},
+            {'Name': 'Resource', 'Value': 'OnDemand'},
+            {'Name': 'Service', 'Value': 'Fargate'},
+            {'Name': 'Class', 'Value': 'None'},
+        ],
+        'Fargate Spot resource count': [
+            {'Name': 'Type', 'Value': 'Resource'},
+            {'Name': 'Resource', 'Value': 'Spot'},
+            {'Name': 'Service', 'Value': 'Fargate'},
+            {'Name': 'Class', 'Value': 'None'},
+        ],
+    }
+
     def find_usage(self):
         """
         Determine the current usage for each limit of this service,
@@ -79,28 +95,24 @@ class _EcsService(_AwsService):
         """
         Find the usage for Fargate, via CloudWatch.
         """
-        self.limits['Fargate On-Demand resource count']._add_current_usage(
-            self._get_cloudwatch_usage_latest(
-                [
-                    {'Name': 'Type', 'Value': 'Resource'},
-                    {'Name': 'Resource', 'Value': 'OnDemand'},
-                    {'Name': 'Service', 'Value': 'Fargate'},
-                    {'Name': 'Class', 'Value': 'None'},
-                ],
-            ),
-            aws_type='AWS::ECS::TaskDefinition'
-        )
-        self.limits['Fargate Spot resource count']._add_current_usage(
-            self._get_cloudwatch_usage_latest(
-                [
-                    {'Name': 'Type', 'Value': 'Resource'},
-                    {'Name': 'Resource', 'Value': 'Spot'},
-                    {'Name': 'Service', 'Value': 'Fargate'},
-                    {'Name': 'Class', 'Value': 'None'},
-                ],
-            ),
-            aws_type='AWS::ECS::TaskDefinition'
-        )
+        for lname, dims in sorted(self.fargate_usage_dimensions.items()):
+            self.limits[lname]._add_current_usage(
+                self._get_cloudwatch_usage_latest(dims),
+                aws_type='AWS::ECS::TaskDefinition'
+            )
+
+    def _usage_metrics(self):
+        """
+        Return the CloudWatch metrics that this service takes the usage of
+        some of its limits from; see :py:meth:`._AwsService._usage_metrics`.
+        The Fargate limits' usage is always taken from CloudWatch.
+
+        :rtype: dict
+        """
+        res = super(_EcsService, self)._usage_metrics()
+        for lname, dims in self.fargate_usage_dimensions.items():
+            res[lname] = ('ResourceCount', dims, 60, 'Average')
+        return res
 
     def _find_usage_clusters(self):
         """
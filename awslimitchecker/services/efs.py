@@ -43,7 +43,7 @@ from botocore.exceptions import ConnectionError, ClientError
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import count_paginated
 
 logger = logging.getLogger(__name__)
 
@@ -76,14 +76,14 @@ class _EfsService(_AwsService):
         logger.debug("Done checking usage.")
 
     def _find_usage_filesystems(self):
-        filesystems = paginate_dict(
+        filesystems = count_paginated(
             self.conn.describe_file_systems,
             alc_marker_path=['NextMarker'],
             alc_data_path=['FileSystems'],
             alc_marker_param='Marker'
         )
         self.limits['File systems']._add_current_usage(
-            len(filesystems['FileSystems']),
+            filesystems,
             aws_type='AWS::EFS::FileSystem',
         )
 
@@ -42,7 +42,7 @@ import logging
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import paginate_dict, paginate_items, count_paginated
 
 logger = logging.getLogger(__name__)
 
@@ -68,16 +68,14 @@ class _EksService(_AwsService):
         logger.debug("Done checking usage.")
 
     def _find_clusters_usage(self):
-        clusters_info = paginate_dict(
+        cluster_count = 0
+        for cluster in paginate_items(
             self.conn.list_clusters,
             alc_marker_path=['nextToken'],
             alc_data_path=['clusters'],
             alc_marker_param='nextToken'
-        )
-
-        cluster_list = clusters_info['clusters']
-
-        for cluster in cluster_list:
+        ):
+            cluster_count += 1
             describe_cluster_response = self.conn.describe_cluster(
                 name=cluster
             )
@@ -99,16 +97,15 @@ class _EksService(_AwsService):
                 aws_type='AWS::EKS::Cluster'
             )
 
-            list_nodegroup_response = paginate_dict(
+            nodegroups = count_paginated(
                 self.conn.list_nodegroups,
                 clusterName=cluster,
                 alc_marker_path=['nextToken'],
                 alc_data_path=['nodegroups'],
                 alc_marker_param='nextToken'
             )
-            nodegroup_list = list_nodegroup_response['nodegroups']
             self.limits['Managed node groups per cluster']._add_current_usage(
-                len(nodegroup_list),
+                nodegroups,
                 resource_id=cluster,
                 aws_type='AWS::EKS::Cluster')
 
@@ -156,7 +153,7 @@ class _EksService(_AwsService):
                         aws_type='AWS::EKS::FargateProfile')
 
         self.limits['Clusters']._add_current_usage(
-            len(cluster_list),
+            cluster_count,
             resource_id=self._boto3_connection_kwargs['region_name'],
             aws_type='AWS::EKS::Cluster')
 
@@ -39,12 +39,11 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import abc  # noqa
 import logging
-from boto3 import client
 from botocore.config import Config
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import paginate_items, count_paginated
 
 logger = logging.getLogger(__name__)
 
@@ -116,13 +115,14 @@ class _ElbService(_AwsService):
         """
         logger.debug("Checking usage for ELBv1")
         self.connect()
-        lbs = paginate_dict(
+        lb_count = 0
+        for lb in paginate_items(
             self.conn.describe_load_balancers,
             alc_marker_path=['NextMarker'],
             alc_data_path=['LoadBalancerDescriptions'],
             alc_marker_param='Marker'
-        )
-        for lb in lbs['LoadBalancerDescriptions']:
+        ):
+            lb_count += 1
             self.limits['Listeners per load balancer']._add_current_usage(
                 len(lb['ListenerDescriptions']),
                 aws_type='AWS::ElasticLoadBalancing::LoadBalancer',
@@ -136,7 +136,7 @@ class _ElbService(_AwsService):
                 resource_id=lb['LoadBalancerName']
             )
         logger.debug('Done with ELBv1 usage')
-        return len(lbs['LoadBalancerDescriptions'])
+        return lb_count
 
     def _find_usage_elbv2(self):
         """
@@ -146,38 +146,36 @@ class _ElbService(_AwsService):
         :rtype: int
         """
         logger.debug('Checking usage for ELBv2')
-        conn2 = client(
+        conn2 = self._client_registry.client(
             'elbv2',
-            config=Config(retries={'max_attempts': ELBV2_MAX_RETRY_ATTEMPTS}),
+            config=Config(
+                retries={'max_attempts': ELBV2_MAX_RETRY_ATTEMPTS}
+            ),
             **self._boto3_connection_kwargs
         )
         logger.debug("Connected to %s in region %s (with max retry attempts "
                      "overridden to %d)", 'elbv2',
                      conn2._client_config.region_name, ELBV2_MAX_RETRY_ATTEMPTS)
         # Target groups
-        tgroups = paginate_dict(
+        tgroups = count_paginated(
             conn2.describe_target_groups,
             alc_marker_path=['NextMarker'],
             alc_data_path=['TargetGroups'],
             alc_marker_param='Marker'
         )
         self.limits['Target groups']._add_current_usage(
-            len(tgroups['TargetGroups']),
+            tgroups,
             aws_type='AWS::ElasticLoadBalancingV2::TargetGroup'
         )
         # ALBs
-        lbs = paginate_dict(
+        alb_count = 0
+        nlb_count = 0
+        for lb in paginate_items(
             conn2.describe_load_balancers,
             alc_marker_path=['NextMarker'],
             alc_data_path=['LoadBalancers'],
             alc_marker_param='Marker'
-        )
-        logger.debug(
-            'Checking usage for each of %d ALBs', len(lbs['LoadBalancers'])
-        )
-        alb_count = 0
-        nlb_count = 0
-        for lb in lbs['LoadBalancers']:
+        ):
             if lb.get('Type') == 'network':
                 nlb_count += 1
             else:
@@ -191,7 +189,9 @@ class _ElbService(_AwsService):
             nlb_count,
             aws_type='AWS::ElasticLoadBalancing::NetworkLoadBalancer'
         )
-        logger.debug('Done with ELBv2 usage')
+        logger.debug(
+            'Done with ELBv2 usage (%d ALBs, %d NLBs)', alb_count, nlb_count
+        )
         return alb_count
 
     def _update_usage_for_alb(self, conn, alb_arn, alb_name):
@@ -206,32 +206,32 @@ class _ElbService(_AwsService):
         :type alb_name: str
         """
         logger.debug('Updating usage for ALB %s', alb_arn)
-        listeners = paginate_dict(
+        num_listeners = 0
+        num_rules = 0
+        num_certs = 0
+        for l in paginate_items(
             conn.describe_listeners,
             LoadBalancerArn=alb_arn,
             alc_marker_path=['NextMarker'],
             alc_data_path=['Listeners'],
             alc_marker_param='Marker'
-        )['Listeners']
-        num_rules = 0
-        num_certs = 0
-        for l in listeners:
+        ):
+            num_listeners += 1
             certs = [
                 x for x in l.get('Certificates', [])
                 if x.get('IsDefault', False) is False
             ]
             num_certs += len(certs)
-            rules = paginate_dict(
+            num_rules += count_paginated(
                 conn.describe_rules,
                 ListenerArn=l['ListenerArn'],
                 alc_marker_path=['NextMarker'],
                 alc_data_path=['Rules'],
                 alc_marker_param='Marker'
-            )['Rules']
-            num_rules += len(rules)
+            )
         self.limits[
             'Listeners per application load balancer']._add_current_usage(
-            len(listeners),
+            num_listeners,
             aws_type='AWS::ElasticLoadBalancingV2::LoadBalancer',
             resource_id=alb_name,
         )
@@ -260,16 +260,16 @@ class _ElbService(_AwsService):
         :type nlb_name: str
         """
         logger.debug('Updating usage for NLB %s', nlb_arn)
-        listeners = paginate_dict(
+        listeners = count_paginated(
             conn.describe_listeners,
             LoadBalancerArn=nlb_arn,
             alc_marker_path=['NextMarker'],
             alc_data_path=['Listeners'],
             alc_marker_param='Marker'
-        )['Listeners']
+        )
         self.limits[
             'Listeners per network load balancer']._add_current_usage(
-            len(listeners),
+            listeners,
             aws_type='AWS::ElasticLoadBalancingV2::NetworkLoadBalancer',
             resource_id=nlb_name
         )
@@ -405,7 +405,9 @@ class _ElbService(_AwsService):
                 continue
             self.limits[name_to_limits[name]]._set_api_limit(int(attrib['Max']))
         # connect to ELBv2 API as well
-        self.conn2 = client('elbv2', **self._boto3_connection_kwargs)
+        self.conn2 = self._client_registry.client(
+            'elbv2', **self._boto3_connection_kwargs
+        )
         logger.debug("Connected to %s in region %s",
                      'elbv2', self.conn2._client_config.region_name)
         logger.debug("Querying ELBv2 (ALB) DescribeAccountLimits for limits")
@@ -85,8 +85,7 @@ class _KinesisService(_AwsService):
         if self.limits != {}:
             return self.limits
 
-        self.connect()
-        region_name = self.conn._client_config.region_name
+        region_name = self._region_name
         regions_500_shards = ['us-east-1', 'us-west-2', 'eu-west-1']
 
         limits = {}
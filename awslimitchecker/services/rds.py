@@ -85,9 +85,15 @@ class _RDSService(_AwsService):
         self.connect()
         for lim in self.limits.values():
             lim._reset_usage()
-        self._find_usage_instances()
-        self._find_usage_subnet_groups()
-        self._find_usage_security_groups()
+        self._set_usage_from_counters()
+        if self._needs_enumeration(['Read replicas per master']):
+            self._find_usage_instances()
+        if self._needs_enumeration(['Subnets per Subnet Group']):
+            self._find_usage_subnet_groups()
+        if self._needs_enumeration(
+            ['Max auths per security group', 'VPC Security Groups']
+        ):
+            self._find_usage_security_groups()
         # RDS API also provides usage information
         self._update_limits_from_api()
         self._have_usage = True
@@ -327,12 +333,30 @@ class _RDSService(_AwsService):
         self.limits = limits
         return limits
 
+    def _find_usage_counters(self):
+        """
+        Return the usage of each limit returned by RDS's
+        DescribeAccountAttributes API action (along with its quota), as a
+        dict of limit name to usage.
+
+        :rtype: dict
+        """
+        self.connect()
+        res = {}
+        lims = self.conn.describe_account_attributes()['AccountQuotas']
+        for lim in lims:
+            if lim['AccountQuotaName'] in self.API_NAME_TO_LIMIT:
+                res[self.API_NAME_TO_LIMIT[lim['AccountQuotaName']]] = lim[
+                    'Used']
+        return res
+
     def _update_limits_from_api(self):
         """
         Query RDS's DescribeAccountAttributes API action, and update limits
         with the quotas returned. Updates ``self.limits``.
 
-        We ignore the usage information from the API,
+        The usage returned by the API is only used for limits that have no
+        usage yet; see :py:meth:`~._find_usage_counters`.
         """
         self.connect()
         logger.info("Querying RDS DescribeAccountAttributes for limits")
@@ -0,0 +1,184 @@
+"""
+awslimitchecker/services/registry.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import importlib
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class ServiceRegistry(MutableMapping):
+    """
+    Mapping of service name to :py:class:`~._AwsService` subclass that only
+    imports the module defining each class the first time that class is
+    looked up. Listing the service names, or checking whether a service is
+    global (:py:meth:`~.is_global`), imports nothing.
+    """
+
+    def __init__(self, entries=()):
+        """
+        :param entries: tuples of (service name, name of the module in
+          :py:mod:`awslimitchecker.services` that defines its class, class
+          name, and the class's :py:attr:`~._AwsService.is_global`), in the
+          order the services should be listed
+        :type entries: list
+        """
+        #: service name to (module name, class name, is_global)
+        self._entries = OrderedDict()
+        #: service name to class, for classes that have been imported
+        self._classes = {}
+        for sname, module, clsname, is_global in entries:
+            self._entries[sname] = (module, clsname, is_global)
+
+    def __getitem__(self, name):
+        if name not in self._classes:
+            module, clsname, _ = self._entries[name]
+            mod = importlib.import_module(
+                '%s.%s' % (__name__.rsplit('.', 1)[0], module)
+            )
+            self._classes[name] = getattr(mod, clsname)
+        return self._classes[name]
+
+    def __setitem__(self, name, cls):
+        self._entries[name] = (None, None, cls.is_global)
+        self._classes[name] = cls
+
+    def __delitem__(self, name):
+        del self._entries[name]
+        self._classes.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries.keys()))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_global(self, name):
+        """
+        Return whether the named service's limits are account-wide (see
+        :py:attr:`._AwsService.is_global`), without importing its class.
+
+        :param name: service name
+        :type name: str
+        :rtype: bool
+        """
+        return self._entries[name][2]
+
+
+class ServiceInstances(MutableMapping):
+    """
+    Mapping of service name to :py:class:`~._AwsService` instance that only
+    creates each instance (importing its class, and building its limits) the
+    first time it is looked up. Listing or checking for service names creates
+    nothing. Used for :py:attr:`.AwsLimitChecker.services`, so that commands
+    that only work with some services (or none) do not pay for all of them.
+    """
+
+    def __init__(self, names, factory):
+        """
+        :param names: names of the services in this mapping
+        :type names: list
+        :param factory: callable taking a service name and returning a new
+          instance of that service
+        :type factory: ``callable``
+        """
+        self._names = list(names)
+        self._factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._names:
+                    raise KeyError(name)
+                self._instances[name] = self._factory(name)
+            return self._instances[name]
+
+    def __setitem__(self, name, svc):
+        with self._lock:
+            if name not in self._names:
+                self._names.append(name)
+            self._instances[name] = svc
+
+    def __delitem__(self, name):
+        with self._lock:
+            self._names.remove(name)
+            self._instances.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(list(self._names))
+
+    def __len__(self):
+        return len(self._names)
+
+    def loaded(self):
+        """
+        Return the services that have been created so far.
+
+        :returns: dict of service name to :py:class:`~._AwsService` instance
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(
+                (n, self._instances[n])
+                for n in self._names if n in self._instances
+            )
+
+
+def loaded_services(services):
+    """
+    Return the services in ``services`` that have already been created: for
+    a :py:class:`~.ServiceInstances`, the result of its
+    :py:meth:`~.ServiceInstances.loaded`, and for any other dict, all of
+    them.
+
+    :param services: dict of service name to :py:class:`~._AwsService`
+    :type services: dict
+    :rtype: dict
+    """
+    if isinstance(services, ServiceInstances):
+        return services.loaded()
+    return services
@@ -43,7 +43,7 @@ from collections import defaultdict
 
 from .base import _AwsService
 from ..limit import AwsLimit
-from ..utils import paginate_dict
+from ..utils import paginate_items
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
@@ -76,14 +76,37 @@ class _VpcService(_AwsService):
         self._have_usage = True
         logger.debug("Done checking usage.")
 
+    @property
+    def _inventory(self):
+        """
+        Return the :py:class:`~.Ec2Inventory` shared with other services using
+        the same EC2 client.
+
+        :rtype: :py:class:`~.Ec2Inventory`
+        """
+        return self._client_registry.ec2_inventory(self.conn)
+
+    def _owned(self, resources):
+        """
+        Return only the resources (dicts from an :py:class:`~.Ec2Inventory`)
+        owned by the current account, excluding i.e. VPCs and Subnets shared
+        with it via Resource Access Manager.
+
+        :param resources: list of resource dicts with an ``OwnerId`` key
+        :type resources: list
+        :rtype: list
+        """
+        return [
+            r for r in resources
+            if r.get('OwnerId') == self.current_account_id
+        ]
+
     def _find_usage_vpcs(self):
         """find usage for VPCs"""
         # overall number of VPCs
-        vpcs = self.conn.describe_vpcs(
-            Filters=[{'Name': 'owner-id', 'Values': [self.current_account_id]}]
-        )
+        vpcs = self._owned(self._inventory.vpcs)
         self.limits['VPCs']._add_current_usage(
-            len(vpcs['Vpcs']),
+            len(vpcs),
             aws_type='AWS::EC2::VPC'
         )
 
@@ -92,9 +115,7 @@ class _VpcService(_AwsService):
         # subnets per VPC
         subnet_to_az = {}
         subnets = defaultdict(int)
-        for subnet in self.conn.describe_subnets(
-            Filters=[{'Name': 'owner-id', 'Values': [self.current_account_id]}]
-        )['Subnets']:
+        for subnet in self._owned(self._inventory.subnets):
             subnets[subnet['VpcId']] += 1
             subnet_to_az[subnet['SubnetId']] = subnet['AvailabilityZone']
         for vpc_id in subnets:
@@ -174,11 +195,11 @@ class _VpcService(_AwsService):
         # "This request has been administratively disabled."
         try:
             gws_per_az = defaultdict(int)
-            for gw in paginate_dict(
+            for gw in paginate_items(
                 self.conn.describe_nat_gateways,
                 alc_marker_path=['NextToken'], alc_data_path=['NatGateways'],
                 alc_marker_param='NextToken'
-            )['NatGateways']:
+            ):
                 if gw['State'] not in ['pending', 'available']:
                     logger.debug(
                         'Skipping NAT Gateway %s in state: %s',
@@ -224,16 +245,10 @@ class _VpcService(_AwsService):
 
     def _find_usage_network_interfaces(self):
         """find usage of network interfaces"""
-        enis = paginate_dict(
-            self.conn.describe_network_interfaces,
-            alc_marker_path=['NextToken'],
-            alc_data_path=['NetworkInterfaces'],
-            alc_marker_param='NextToken',
-            Filters=[{'Name': 'owner-id', 'Values': [self.current_account_id]}]
-        )
+        enis = self._owned(self._inventory.network_interfaces)
 
         self.limits['Network interfaces per Region']._add_current_usage(
-            len(enis['NetworkInterfaces']),
+            len(enis),
             aws_type='AWS::EC2::NetworkInterface'
         )
 
@@ -0,0 +1,441 @@
+"""
+awslimitchecker/snapshots.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+
+class UsageSnapshotStore(object):
+    """
+    Base class for stores of per-service usage snapshots, which allow
+    :py:meth:`.AwsLimitChecker.find_usage` and
+    :py:meth:`.AwsLimitChecker.check_thresholds` to reuse recent usage data
+    instead of querying AWS for it again (see their ``max_age`` parameters).
+
+    Each snapshot holds the limits of one service in one account and region,
+    as a dict of limit name to a dict with ``limit`` (the effective limit
+    value) and ``usage`` (a list of ``[value, maximum, resource_id,
+    aws_type]`` lists, one per :py:class:`~.AwsLimitUsage`) keys, along with
+    the time it was taken.
+
+    Subclasses must implement :py:meth:`~.get` and :py:meth:`~.put`. They
+    may also keep a history of each service's utilization for
+    :py:class:`~.ScanSchedule` by implementing :py:meth:`~.get_history` and
+    :py:meth:`~.add_history`.
+    """
+
+    def get(self, account_id, region, service_name):
+        """
+        Return the most recent snapshot for the given service, account and
+        region.
+
+        :param account_id: AWS account ID
+        :type account_id: str
+        :param region: AWS region name
+        :type region: str
+        :param service_name: :py:attr:`~._AwsService.service_name`
+        :type service_name: str
+        :returns: 2-tuple of the snapshot time (as returned by
+          :py:func:`time.time`) and the snapshot data dict, or None if there
+          is no snapshot
+        :rtype: :py:obj:`tuple` or :py:obj:`None`
+        """
+        raise NotImplementedError()
+
+    def put(self, account_id, region, service_name, data, timestamp):
+        """
+        Store a snapshot for the given service, account and region, replacing
+        any previous one.
+
+        :param account_id: AWS account ID
+        :type account_id: str
+        :param region: AWS region name
+        :type region: str
+        :param service_name: :py:attr:`~._AwsService.service_name`
+        :type service_name: str
+        :param data: snapshot data, as described above
+        :type data: dict
+        :param timestamp: time the snapshot was taken, as returned by
+          :py:func:`time.time`
+        :type timestamp: float
+        """
+        raise NotImplementedError()
+
+    def get_history(self, account_id, region, service_name, since):
+        """
+        Return the utilization history of the given service, account and
+        region since ``since``. This implementation keeps no history, and
+        returns an empty list.
+
+        :param account_id: AWS account ID
+        :type account_id: str
+        :param region: AWS region name
+        :type region: str
+        :param service_name: :py:attr:`~._AwsService.service_name`
+        :type service_name: str
+        :param since: earliest time to return history for, as returned by
+          :py:func:`time.time`
+        :type since: float
+        :returns: list of (timestamp, utilization) 2-tuples in ascending
+          timestamp order, where utilization is the highest usage of any of
+          the service's limits as a fraction of that limit
+        :rtype: list
+        """
+        return []
+
+    def add_history(self, account_id, region, service_name, timestamp,
+                    utilization):
+        """
+        Record the utilization of the given service, account and region at
+        ``timestamp``; see :py:meth:`~.get_history`. This implementation
+        does nothing.
+        """
+        pass
+
+    def save_service(self, account_id, region, service):
+        """
+        Store a snapshot of the current usage and limits of ``service``, and
+        add its current utilization to its history.
+
+        :param account_id: AWS account ID
+        :type account_id: str
+        :param region: AWS region name
+        :type region: str
+        :param service: the service to take a snapshot of
+        :type service: :py:class:`~._AwsService`
+        """
+        data = {}
+        utilization = 0.0
+        for name, lim in service.get_limits().items():
+            limit = lim.get_limit()
+            data[name] = {
+                'limit': limit,
+                'usage': [
+                    [u.value, u.maximum, u.resource_id, u.aws_type]
+                    for u in lim.get_current_usage()
+                ]
+            }
+            if limit is None or limit <= 0:
+                continue
+            for u in lim.get_current_usage():
+                utilization = max(utilization, float(u.value) / limit)
+        now = time.time()
+        self.put(account_id, region, service.service_name, data, now)
+        self.add_history(
+            account_id, region, service.service_name, now, utilization
+        )
+
+    def load_service(self, account_id, region, service, max_age):
+        """
+        If there is a snapshot of ``service`` no older than ``max_age``
+        seconds, that covers all of its limits, replace the current usage of
+        its limits with the usage from the snapshot and return True.
+        Otherwise, return False and leave the service as-is.
+
+        :param account_id: AWS account ID
+        :type account_id: str
+        :param region: AWS region name
+        :type region: str
+        :param service: the service to load usage for
+        :type service: :py:class:`~._AwsService`
+        :param max_age: maximum age of the snapshot, in seconds
+        :type max_age: float
+        :returns: whether usage was loaded from a snapshot
+        :rtype: bool
+        """
+        snap = self.get(account_id, region, service.service_name)
+        if snap is None:
+            return False
+        timestamp, data = snap
+        age = time.time() - timestamp
+        if age > max_age:
+            logger.debug(
+                'Usage snapshot for %s is %.0fs old; not using it',
+                service.service_name, age
+            )
+            return False
+        limits = service.get_limits()
+        if not set(limits).issubset(data):
+            logger.debug(
+                'Usage snapshot for %s does not include all limits; not using '
+                'it', service.service_name
+            )
+            return False
+        for name, lim in limits.items():
+            lim._reset_usage()
+            for value, maximum, resource_id, aws_type in data[name]['usage']:
+                lim._add_current_usage(
+                    value, maximum=maximum, resource_id=resource_id,
+                    aws_type=aws_type
+                )
+        service._have_usage = True
+        logger.info(
+            'Using %.0fs old usage snapshot for %s', age, service.service_name
+        )
+        return True
+
+
+class _SqliteStore(object):
+    """
+    Base class for stores in a SQLite database file, each using a single
+    table (:py:attr:`~.table`) with one row per (``account_id``, ``region``,
+    ``service``) primary key, holding a ``timestamp`` (seconds since the
+    epoch) and ``data`` (compact JSON). The database's ``user_version`` is
+    :py:attr:`~.SCHEMA_VERSION`. Different stores can share one database file.
+
+    A new connection is made for each operation, so one instance can be
+    shared by multiple threads (and multiple processes can use the same file).
+    """
+
+    #: version of the database schema, stored as the ``user_version``
+    SCHEMA_VERSION = 1
+
+    #: name of the table this store uses
+    table = None
+
+    def __init__(self, path, timeout=30):
+        """
+        :param path: path to the SQLite database file; it will be created if
+          it does not exist
+        :type path: str
+        :param timeout: number of seconds to wait for another connection's
+          lock on the database to be released
+        :type timeout: float
+        """
+        self.path = path
+        self.timeout = timeout
+
+    def _connect(self):
+        """
+        Connect to the database, creating the table if needed.
+
+        :rtype: :py:class:`sqlite3.Connection`
+        """
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS %s ('
+                'account_id TEXT NOT NULL, region TEXT NOT NULL, '
+                'service TEXT NOT NULL, timestamp REAL NOT NULL, '
+                'data TEXT NOT NULL, '
+                'PRIMARY KEY (account_id, region, service))' % self.table
+            )
+            conn.execute('PRAGMA user_version = %d' % self.SCHEMA_VERSION)
+        return conn
+
+    def _get_row(self, account_id, region, service):
+        """
+        Return the ``timestamp`` and decoded ``data`` of the row for the
+        given key, or None if there is no such row.
+
+        :rtype: :py:obj:`tuple` or :py:obj:`None`
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT timestamp, data FROM %s WHERE '
+                'account_id = ? AND region = ? AND service = ?' % self.table,
+                (account_id, region, service)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _put_row(self, account_id, region, service, data, timestamp):
+        """
+        Insert or replace the row for the given key.
+        """
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO %s (account_id, region, service, '
+                    'timestamp, data) VALUES (?, ?, ?, ?, ?)' % self.table,
+                    (account_id, region, service, timestamp,
+                     json.dumps(data, separators=(',', ':'), sort_keys=True))
+                )
+
+
+class SqliteUsageSnapshotStore(UsageSnapshotStore, _SqliteStore):
+    """
+    :py:class:`~.UsageSnapshotStore` in a SQLite database file, using the
+    ``usage_snapshots`` table (see :py:class:`~._SqliteStore`), with the
+    snapshot data as the ``data`` column. Utilization history is kept in the
+    ``usage_history`` table, for ``history_retention`` seconds.
+    """
+
+    table = 'usage_snapshots'
+
+    def __init__(self, path, timeout=30, history_retention=2592000):
+        """
+        :param path: path to the SQLite database file; it will be created if
+          it does not exist
+        :type path: str
+        :param timeout: number of seconds to wait for another connection's
+          lock on the database to be released
+        :type timeout: float
+        :param history_retention: number of seconds to keep utilization
+          history for
+        :type history_retention: float
+        """
+        super(SqliteUsageSnapshotStore, self).__init__(path, timeout=timeout)
+        self.history_retention = history_retention
+
+    def _connect(self):
+        conn = super(SqliteUsageSnapshotStore, self)._connect()
+        with conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS usage_history ('
+                'account_id TEXT NOT NULL, region TEXT NOT NULL, '
+                'service TEXT NOT NULL, timestamp REAL NOT NULL, '
+                'utilization REAL NOT NULL, '
+                'PRIMARY KEY (account_id, region, service, timestamp))'
+            )
+        return conn
+
+    def get(self, account_id, region, service_name):
+        return self._get_row(account_id, region, service_name)
+
+    def put(self, account_id, region, service_name, data, timestamp):
+        self._put_row(account_id, region, service_name, data, timestamp)
+
+    def get_history(self, account_id, region, service_name, since):
+        with closing(self._connect()) as conn:
+            return [
+                tuple(row) for row in conn.execute(
+                    'SELECT timestamp, utilization FROM usage_history WHERE '
+                    'account_id = ? AND region = ? AND service = ? AND '
+                    'timestamp >= ? ORDER BY timestamp',
+                    (account_id, region, service_name, since)
+                )
+            ]
+
+    def add_history(self, account_id, region, service_name, timestamp,
+                    utilization):
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO usage_history (account_id, '
+                    'region, service, timestamp, utilization) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (account_id, region, service_name, timestamp,
+                     utilization)
+                )
+                conn.execute(
+                    'DELETE FROM usage_history WHERE account_id = ? AND '
+                    'region = ? AND service = ? AND timestamp < ?',
+                    (account_id, region, service_name,
+                     timestamp - self.history_retention)
+                )
+
+
+class SqliteQuotasCache(_SqliteStore):
+    """
+    Persistent cache of Service Quotas responses for
+    :py:class:`~.ServiceQuotasClient`, in a SQLite database file. Uses the
+    ``service_quotas`` table (see :py:class:`~._SqliteStore`), with the
+    Service Quotas service code as the ``service`` column and the quotas for
+    it (a dict of lower-cased quota name to ``ListServiceQuotas`` item) as
+    the ``data`` column.
+    """
+
+    table = 'service_quotas'
+
+    def __init__(self, path, ttl=86400, timeout=30):
+        """
+        :param path: path to the SQLite database file; it will be created if
+          it does not exist
+        :type path: str
+        :param ttl: number of seconds that cached quotas remain valid for
+        :type ttl: float
+        :param timeout: number of seconds to wait for another connection's
+          lock on the database to be released
+        :type timeout: float
+        """
+        super(SqliteQuotasCache, self).__init__(path, timeout=timeout)
+        self.ttl = ttl
+
+    def get(self, account_id, region, service_code):
+        """
+        Return the cached quotas for the given account, region and service
+        code, or None if they are not cached or older than ``ttl``.
+
+        :rtype: :py:obj:`dict` or :py:obj:`None`
+        """
+        row = self._get_row(account_id, region, service_code)
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return row[1]
+
+    def put(self, account_id, region, service_code, quotas):
+        """
+        Cache the quotas for the given account, region and service code.
+        """
+        self._put_row(account_id, region, service_code, quotas, time.time())
+
+
+class SqliteTrustedAdvisorCache(_SqliteStore):
+    """
+    Persistent store for :py:class:`~.TrustedAdvisorResultCache`, in a SQLite
+    database file. Uses the ``trusted_advisor`` table (see
+    :py:class:`~._SqliteStore`), with one row per account (the ``region`` and
+    ``service`` columns are always the empty string and ``Service Limits``,
+    respectively), holding the time the results were fetched as the
+    ``timestamp`` and the results for all regions as the ``data`` column.
+    """
+
+    table = 'trusted_advisor'
+
+    def get(self, account_id):
+        """
+        Return the time the results for the given account were fetched and
+        the results, or None if there are none.
+
+        :rtype: :py:obj:`tuple` or :py:obj:`None`
+        """
+        return self._get_row(account_id, '', 'Service Limits')
+
+    def put(self, account_id, data, timestamp):
+        """
+        Store the results for the given account.
+        """
+        self._put_row(account_id, '', 'Service Limits', data, timestamp)
@@ -41,6 +41,15 @@ from awslimitchecker.metrics.base import MetricsProvider
 from awslimitchecker.metrics import Dummy, Datadog
 
 import pytest
+import sys
+
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import Mock
+else:
+    from unittest.mock import Mock
 
 
 class MPTester(MetricsProvider):
@@ -70,6 +79,34 @@ class TestMetricsProvider(object):
         cls.add_limit(2)
         assert cls._limits == [1, 2]
 
+    def test_add_result(self):
+        cls = MPTester('foo')
+        limA = Mock()
+        limB = Mock()
+        resA = Mock(limit=limA, max_usage_value=6)
+        resB = Mock(limit=limB, max_usage_value=0)
+        cls.add_limit(1)
+        cls.add_result([resA, resB])
+        assert cls._limits == [1, limA, limB]
+        assert cls._results == {id(limA): resA, id(limB): resB}
+
+    def test_max_usage(self):
+        cls = MPTester('foo')
+        limA = Mock()
+        cls.add_result([Mock(limit=limA, max_usage_value=6)])
+        assert cls._max_usage(limA) == 6
+        assert limA.mock_calls == []
+        u1 = Mock()
+        u1.get_value.return_value = 2
+        limB = Mock()
+        limB.get_current_usage.return_value = [u1]
+        cls.add_limit(limB)
+        assert cls._max_usage(limB) == 2
+        limC = Mock()
+        limC.get_current_usage.return_value = []
+        cls.add_limit(limC)
+        assert cls._max_usage(limC) == 0
+
     def test_providers_by_name(self):
         assert MetricsProvider.providers_by_name() == {
             'Dummy': Dummy,
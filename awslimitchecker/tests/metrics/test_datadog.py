@@ -172,6 +172,7 @@ class TestFlush(DatadogTester):
         self.cls._prefix = 'prefix.'
         self.cls._tags = ['tag1', 'tag:2']
         self.cls._limits = []
+        self.cls._results = {}
         self.cls._api_key = 'myKey'
         self.cls.set_run_duration(123.45)
         limA = Mock(
@@ -239,6 +240,7 @@ class TestFlush(DatadogTester):
         self.cls._prefix = 'prefix.'
         self.cls._tags = ['tag1', 'tag:2']
         self.cls._limits = []
+        self.cls._results = {}
         self.cls._api_key = 'myKey'
         self.cls.set_run_duration(123.45)
         limA = Mock(
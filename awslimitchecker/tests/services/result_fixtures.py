@@ -94,10 +94,6 @@ def get_boto3_resource_model(service_name, resource_name):
 
 # get some resource models for specs...
 Instance = get_boto3_resource_model('ec2', 'Instance')
-SecurityGroup = get_boto3_resource_model('ec2', 'SecurityGroup')
-ClassicAddress = get_boto3_resource_model('ec2', 'ClassicAddress')
-VpcAddress = get_boto3_resource_model('ec2', 'VpcAddress')
-NetworkInterface = get_boto3_resource_model('ec2', 'NetworkInterface')
 
 
 class EBS(object):
@@ -254,6 +250,7 @@ class VPC(object):
         'Vpcs': [
             {
                 'VpcId': 'vpc-1',
+                'OwnerId': '0123456789',
                 'State': 'available',
                 'CidrBlock': 'string',
                 'DhcpOptionsId': 'string',
@@ -266,7 +263,9 @@ class VPC(object):
                 'InstanceTenancy': 'default',
                 'IsDefault': False
             },
-            {'VpcId': 'vpc-2'},
+            {'VpcId': 'vpc-2', 'OwnerId': '0123456789'},
+            # shared with this account by another account
+            {'VpcId': 'vpc-3', 'OwnerId': '9876543210'},
         ]
     }
 
@@ -274,6 +273,7 @@ class VPC(object):
         'Subnets': [
             {
                 'SubnetId': 'string',
+                'OwnerId': '0123456789',
                 'State': 'available',
                 'VpcId': 'vpc-1',
                 'CidrBlock': 'string',
@@ -291,13 +291,21 @@ class VPC(object):
             {
                 'VpcId': 'vpc-1',
                 'SubnetId': 'subnet2',
+                'OwnerId': '0123456789',
                 'AvailabilityZone': 'az3',
             },
             {
                 'VpcId': 'vpc-2',
                 'SubnetId': 'subnet3',
+                'OwnerId': '0123456789',
                 'AvailabilityZone': 'az2',
             },
+            {
+                'VpcId': 'vpc-3',
+                'SubnetId': 'subnet4',
+                'OwnerId': '9876543210',
+                'AvailabilityZone': 'az1',
+            },
         ]
     }
 
@@ -612,7 +620,7 @@ class VPC(object):
                 'Ipv6Addresses': [],
                 'MacAddress': 'address',
                 'NetworkInterfaceId': 'eni-123',
-                'OwnerId': 'string',
+                'OwnerId': '0123456789',
                 'PrivateDnsName': 'string',
                 'PrivateIpAddress': 'string',
                 'PrivateIpAddresses': [
@@ -641,6 +649,11 @@ class VPC(object):
                     },
                 ],
                 'VpcId': 'string'
+            },
+            {
+                'NetworkInterfaceId': 'eni-456',
+                'OwnerId': '9876543210',
+                'VpcId': 'vpc-3'
             }
         ],
         'ResponseMetadata': {
@@ -2175,15 +2188,15 @@ class EC2(object):
 
     @property
     def test_find_usage_networking_sgs(self):
-        mock_sg1 = Mock(spec_set=SecurityGroup)
-        type(mock_sg1).id = 'sg-1'
-        type(mock_sg1).vpc_id = 'vpc-aaa'
-        type(mock_sg1).ip_permissions = []
-        type(mock_sg1).ip_permissions_egress = []
-        mock_sg2 = Mock(spec_set=SecurityGroup)
-        type(mock_sg2).id = 'sg-2'
-        type(mock_sg2).vpc_id = 'vpc-aaa'
-        type(mock_sg2).ip_permissions = [
+        mock_sg1 = {}
+        mock_sg1['GroupId'] = 'sg-1'
+        mock_sg1['VpcId'] = 'vpc-aaa'
+        mock_sg1['IpPermissions'] = []
+        mock_sg1['IpPermissionsEgress'] = []
+        mock_sg2 = {}
+        mock_sg2['GroupId'] = 'sg-2'
+        mock_sg2['VpcId'] = 'vpc-aaa'
+        mock_sg2['IpPermissions'] = [
             {
                 'FromPort': 1,
                 'ToPort': 123,
@@ -2265,7 +2278,7 @@ class EC2(object):
                 'UserIdGroupPairs': []
             }
         ]
-        type(mock_sg2).ip_permissions_egress = [
+        mock_sg2['IpPermissionsEgress'] = [
             {
                 'FromPort': 123,
                 'IpProtocol': 'string',
@@ -2306,10 +2319,10 @@ class EC2(object):
                 'UserIdGroupPairs': []
             }
         ]
-        mock_sg3 = Mock(spec_set=SecurityGroup)
-        type(mock_sg3).id = 'sg-3'
-        type(mock_sg3).vpc_id = 'vpc-bbb'
-        type(mock_sg3).ip_permissions = [
+        mock_sg3 = {}
+        mock_sg3['GroupId'] = 'sg-3'
+        mock_sg3['VpcId'] = 'vpc-bbb'
+        mock_sg3['IpPermissions'] = [
             {
                 'FromPort': 123,
                 'IpProtocol': 'string',
@@ -2339,7 +2352,7 @@ class EC2(object):
                 'UserIdGroupPairs': []
             }
         ]
-        type(mock_sg3).ip_permissions_egress = [
+        mock_sg3['IpPermissionsEgress'] = [
             {
                 'FromPort': 123,
                 'IpProtocol': 'string',
@@ -2389,10 +2402,10 @@ class EC2(object):
                 ]
             }
         ]
-        mock_sg4 = Mock(spec_set=SecurityGroup)
-        type(mock_sg4).id = 'sg-4'
-        type(mock_sg4).vpc_id = None
-        type(mock_sg4).ip_permissions = [
+        mock_sg4 = {}
+        mock_sg4['GroupId'] = 'sg-4'
+        mock_sg4['VpcId'] = None
+        mock_sg4['IpPermissions'] = [
             {
                 'FromPort': 123,
                 'IpProtocol': 'string',
@@ -2496,7 +2509,7 @@ class EC2(object):
                 ]
             },
         ]
-        type(mock_sg4).ip_permissions_egress = [
+        mock_sg4['IpPermissionsEgress'] = [
             {
                 'FromPort': 123,
                 'IpProtocol': 'string',
@@ -2635,13 +2648,9 @@ class EC2(object):
             }
         ]
 
-        return_value = [
-            mock_sg1,
-            mock_sg2,
-            mock_sg3,
-            mock_sg4,
-        ]
-        return return_value
+        return {
+            'SecurityGroups': [mock_sg1, mock_sg2, mock_sg3, mock_sg4]
+        }
 
     test_get_reserved_instance_count = {
         'ReservedInstances': [
@@ -2709,41 +2718,37 @@ class EC2(object):
         ]
     }
 
-    @property
-    def test_find_usage_networking_eips(self):
-        mock_addr1 = Mock(spec_set=VpcAddress)
-        type(mock_addr1).domain = 'vpc'
-        mock_addr2 = Mock(spec_set=VpcAddress)
-        type(mock_addr2).domain = 'vpc'
-        mock_addr3 = Mock(spec_set=ClassicAddress)
-        type(mock_addr3).domain = 'standard'
-        return {
-            'Classic': [mock_addr3],
-            'Vpc': [mock_addr1, mock_addr2]
-        }
+    test_find_usage_networking_eips = {
+        'Addresses': [
+            {'PublicIp': '1.1.1.1', 'Domain': 'vpc'},
+            {'PublicIp': '1.1.1.2', 'Domain': 'vpc'},
+            {'PublicIp': '1.1.1.3', 'Domain': 'standard'},
+        ]
+    }
 
-    @property
-    def test_find_usage_networking_eni_sg(self):
-        mock_if1 = Mock(spec_set=NetworkInterface)
-        type(mock_if1).id = 'if-1'
-        type(mock_if1).groups = []
-        type(mock_if1).vpc = Mock()
-
-        mock_if2 = Mock(spec_set=NetworkInterface)
-        type(mock_if2).id = 'if-2'
-        type(mock_if2).groups = [1, 2, 3]
-        type(mock_if2).vpc = Mock()
-
-        mock_if3 = Mock(spec_set=NetworkInterface)
-        type(mock_if3).id = 'if-3'
-        type(mock_if3).groups = [1, 2, 3, 4, 5, 6, 7, 8]
-        type(mock_if3).vpc = Mock()
-
-        mock_if4 = Mock(spec_set=NetworkInterface)
-        type(mock_if4).id = 'if-4'
-        type(mock_if4).groups = [1, 2, 3, 4, 5, 6, 7, 8]
-        type(mock_if4).vpc = None
-        return [mock_if1, mock_if2, mock_if3, mock_if4]
+    test_find_usage_networking_eni_sg = {
+        'NetworkInterfaces': [
+            {
+                'NetworkInterfaceId': 'if-1',
+                'Groups': [],
+                'VpcId': 'vpc-1',
+            },
+            {
+                'NetworkInterfaceId': 'if-2',
+                'Groups': [{'GroupId': 'sg-%d' % x} for x in range(3)],
+                'VpcId': 'vpc-1',
+            },
+            {
+                'NetworkInterfaceId': 'if-3',
+                'Groups': [{'GroupId': 'sg-%d' % x} for x in range(8)],
+                'VpcId': 'vpc-2',
+            },
+            {
+                'NetworkInterfaceId': 'if-4',
+                'Groups': [{'GroupId': 'sg-%d' % x} for x in range(8)],
+            },
+        ]
+    }
 
     test_update_limits_from_api = {
         'ResponseMetadata': {
@@ -91,26 +91,16 @@ class Test_AutoscalingService(object):
 
         def se_wrapper(func, *args, **kwargs):
             if func == mock_conn.describe_auto_scaling_groups:
-                return {
-                    'AutoScalingGroups': [
-                        {'AutoScalingGroupName': 'foo'},
-                        {'AutoScalingGroupName': 'bar'},
-                        {'AutoScalingGroupName': 'baz'},
-                    ],
-                }
+                return 3
             elif func == mock_conn.describe_launch_configurations:
-                return {
-                    'LaunchConfigurations': [
-                        {'LaunchConfigurationName': 'foo'},
-                        {'LaunchConfigurationName': 'bar'},
-                    ],
-                }
+                return 2
             return None
 
         with patch('%s.connect' % self.pb) as mock_connect:
-            with patch('%s.paginate_dict' % self.pbm) as mock_paginate:
+            with patch('%s.count_paginated' % self.pbm) as mock_paginate:
                 cls = _AutoscalingService(21, 43, {}, None)
                 cls.conn = mock_conn
+                cls.resource_detail = True
                 mock_paginate.side_effect = se_wrapper
                 assert cls._have_usage is False
                 cls.find_usage()
@@ -138,6 +128,36 @@ class Test_AutoscalingService(object):
         assert len(lcs) == 1
         assert lcs[0].get_value() == 2
 
+    def test_find_usage_from_counters(self):
+        mock_conn = Mock()
+        mock_conn.describe_account_limits.return_value = {
+            'MaxNumberOfAutoScalingGroups': 200,
+            'MaxNumberOfLaunchConfigurations': 200,
+            'NumberOfAutoScalingGroups': 3,
+        }
+
+        with patch('%s.connect' % self.pb) as mock_connect:
+            with patch('%s.count_paginated' % self.pbm) as mock_paginate:
+                mock_paginate.return_value = 2
+                cls = _AutoscalingService(21, 43, {}, None)
+                cls.conn = mock_conn
+                cls.find_usage()
+        assert mock_connect.mock_calls == [call(), call()]
+        assert mock_conn.mock_calls == [call.describe_account_limits()]
+        assert mock_paginate.mock_calls == [
+            call(
+                mock_conn.describe_launch_configurations,
+                alc_marker_path=['NextToken'],
+                alc_data_path=['LaunchConfigurations'],
+                alc_marker_param='NextToken'
+            )
+        ]
+        assert cls._have_usage is True
+        asgs = cls.limits['Auto Scaling groups'].get_current_usage()
+        assert [u.get_value() for u in asgs] == [3]
+        lcs = cls.limits['Launch configurations'].get_current_usage()
+        assert [u.get_value() for u in lcs] == [2]
+
     def test_required_iam_permissions(self):
         cls = _AutoscalingService(21, 43, {}, None)
         assert cls.required_iam_permissions() == [
@@ -40,12 +40,9 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 from awslimitchecker.services.base import _AwsService
 from awslimitchecker.limit import AwsLimit
 from awslimitchecker.quotas import ServiceQuotasClient
+from awslimitchecker.connectable import ClientRegistry
 import pytest
 import sys
-from datetime import datetime
-from dateutil.tz import tzutc
-from freezegun import freeze_time
-from botocore.exceptions import ClientError
 
 # https://code.google.com/p/mock/issues/detail?id=249
 # py>=3.4 should use unittest.mock not the mock package on pypi
@@ -57,6 +54,8 @@ if (
 else:
     from unittest.mock import patch, call, Mock, PropertyMock
 
+pbm = 'awslimitchecker.services.base'
+
 
 class AwsServiceTester(_AwsService):
     """class to test non-abstract methods on base class"""
@@ -108,6 +107,12 @@ class Test_AwsService(object):
         assert cls._quotas_client == m_quota
         assert cls._current_account_id is None
         assert cls._cloudwatch_client is None
+        assert isinstance(cls._client_registry, ClientRegistry)
+
+    def test_init_subclass_client_registry(self):
+        m_reg = Mock(spec_set=ClientRegistry)
+        cls = AwsServiceTester(1, 2, {}, None, client_registry=m_reg)
+        assert cls._client_registry == m_reg
 
     def test_init_subclass_boto_xargs(self):
         boto_args = {'region_name': 'myregion',
@@ -126,6 +131,14 @@ class Test_AwsService(object):
         assert cls._current_account_id is None
         assert cls._cloudwatch_client is None
 
+    def test_region_name(self):
+        reg = ClientRegistry(session=Mock(region_name='dflt'))
+        cls = AwsServiceTester(1, 2, {'region_name': 'r1'}, None,
+                               client_registry=reg)
+        assert cls._region_name == 'r1'
+        cls = AwsServiceTester(1, 2, {}, None, client_registry=reg)
+        assert cls._region_name == 'dflt'
+
     def test_current_account_id_stored(self):
         mock_conf = Mock(region_name='foo')
         mock_sts = Mock(_client_config=mock_conf)
@@ -136,7 +149,7 @@ class Test_AwsService(object):
         }
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
         cls._current_account_id = '987654321'
-        with patch('awslimitchecker.services.base.boto3.client') as m_boto:
+        with patch.object(cls._client_registry, 'client') as m_boto:
             m_boto.return_value = mock_sts
             res = cls.current_account_id
         assert res == '987654321'
@@ -151,7 +164,7 @@ class Test_AwsService(object):
             'Arn': 'something'
         }
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch('awslimitchecker.services.base.boto3.client') as m_boto:
+        with patch.object(cls._client_registry, 'client') as m_boto:
             m_boto.return_value = mock_sts
             res = cls.current_account_id
         assert res == '123456789'
@@ -253,6 +266,31 @@ class Test_AwsService(object):
             "'bar' limit"
         assert mock_limit.mock_calls == []
 
+    def test_set_usage_retention(self):
+        mock_limit1 = Mock(spec_set=AwsLimit)
+        mock_limit2 = Mock(spec_set=AwsLimit)
+        cls = AwsServiceTester(1, 2, {}, None)
+        cls.limits = {'foo': mock_limit1, 'bar': mock_limit2}
+        cls.set_usage_retention(10)
+        assert mock_limit1.mock_calls == [call.set_usage_retention(10)]
+        assert mock_limit2.mock_calls == [call.set_usage_retention(10)]
+        cls.set_usage_retention(None, limit_name='foo')
+        assert mock_limit1.mock_calls == [
+            call.set_usage_retention(10),
+            call.set_usage_retention(None)
+        ]
+        assert mock_limit2.mock_calls == [call.set_usage_retention(10)]
+
+    def test_set_usage_retention_keyerror(self):
+        mock_limit = Mock(spec_set=AwsLimit)
+        cls = AwsServiceTester(1, 2, {}, None)
+        cls.limits['foo'] = mock_limit
+        with pytest.raises(ValueError) as excinfo:
+            cls.set_usage_retention(5, limit_name='bar')
+        assert excinfo.value.args[0] == "AwsServiceTester service has no " \
+            "'bar' limit"
+        assert mock_limit.mock_calls == []
+
     def test_check_thresholds(self):
         cls = AwsServiceTester(1, 2, {}, None)
         cls.find_usage()
@@ -422,7 +460,7 @@ class Test_AwsService(object):
         mock_cw = Mock(_client_config=mock_conf)
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
         assert cls._cloudwatch_client is None
-        with patch('awslimitchecker.services.base.boto3.client') as m_boto:
+        with patch.object(cls._client_registry, 'client') as m_boto:
             m_boto.return_value = mock_cw
             res = cls._cloudwatch_connection()
         assert res == mock_cw
@@ -436,7 +474,7 @@ class Test_AwsService(object):
         mock_cw = Mock(_client_config=mock_conf)
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
         assert cls._cloudwatch_client is None
-        with patch('awslimitchecker.services.base.boto3.client') as m_boto:
+        with patch.object(cls._client_registry, 'client') as m_boto:
             with patch(
                 'awslimitchecker.connectable.Connectable._max_retries_config',
                 new_callable=PropertyMock
@@ -455,7 +493,7 @@ class Test_AwsService(object):
         mock_cw = Mock(_client_config=mock_conf)
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
         cls._cloudwatch_client = mock_cw
-        with patch('awslimitchecker.services.base.boto3.client') as m_boto:
+        with patch.object(cls._client_registry, 'client') as m_boto:
             m_boto.return_value = mock_cw
             res = cls._cloudwatch_connection()
         assert res == mock_cw
@@ -463,328 +501,253 @@ class Test_AwsService(object):
         assert m_boto.mock_calls == []
 
 
-class TestGetCloudwatchUsageLatest:
+class TestGetCloudwatchUsageLatest(object):
 
-    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
     def test_defaults(self):
-        mock_conn = Mock()
-        mock_conn.get_metric_data.return_value = {
-            'MetricDataResults': [
-                {
-                    'Id': 'id',
-                    'Label': 'ResourceCount',
-                    'Timestamps': [
-                        datetime(2020, 9, 22, 12, 25, tzinfo=tzutc())
-                    ],
-                    'Values': [3.0],
-                    'StatusCode': 'PartialData'
-                }
-            ],
-            'NextToken': 'foo',
-            'Messages': [],
-            'ResponseMetadata': {
-                'RequestId': '77a86d3c-16e1-47c5-b2d1-0f7d81d48a05',
-                'HTTPStatusCode': 200,
-                'HTTPHeaders': {
-                    'x-amzn-requestid': '70f7d81d48a05',
-                    'content-type': 'text/xml',
-                    'content-length': '796',
-                    'date': 'Tue, 22 Sep 2020 12:26:36 GMT'
-                },
-                'RetryAttempts': 0
-            }
-        }
+        mock_batch = Mock()
+        mock_batch.add.return_value = 'key'
+        mock_batch.get.return_value = 3.0
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch(
-            'awslimitchecker.services.base._AwsService._cloudwatch_connection',
-            autospec=True
-        ) as m_cw_conn:
-            m_cw_conn.return_value = mock_conn
+        with patch.object(cls, '_usage_metrics_batch') as m_batch:
+            m_batch.return_value = mock_batch
             res = cls._get_cloudwatch_usage_latest([
                 {'Name': 'foo', 'Value': 'bar'},
                 {'Name': 'baz', 'Value': 'blam'}
             ])
         assert res == 3.0
-        assert m_cw_conn.mock_calls == [
-            call(cls)
-        ]
-        assert mock_conn.mock_calls == [
-            call.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        'Id': 'id',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/Usage',
-                                'MetricName': 'ResourceCount',
-                                'Dimensions': [
-                                    {'Name': 'foo', 'Value': 'bar'},
-                                    {'Name': 'baz', 'Value': 'blam'}
-                                ]
-                            },
-                            'Period': 60,
-                            'Stat': 'Average'
-                        }
-                    }
-                ],
-                StartTime=datetime(2020, 9, 22, 11, 26, 00),
-                EndTime=datetime(2020, 9, 22, 12, 26, 00),
-                ScanBy='TimestampDescending',
-                MaxDatapoints=1
-            )
+        assert mock_batch.mock_calls == [
+            call.add('ResourceCount', [
+                {'Name': 'foo', 'Value': 'bar'},
+                {'Name': 'baz', 'Value': 'blam'}
+            ], 60),
+            call.get('key')
         ]
 
-    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
     def test_non_default(self):
-        mock_conn = Mock()
-        mock_conn.get_metric_data.return_value = {
-            'MetricDataResults': [
-                {
-                    'Id': 'id',
-                    'Label': 'ResourceCount',
-                    'Timestamps': [
-                        datetime(2020, 9, 22, 12, 25, tzinfo=tzutc())
-                    ],
-                    'Values': [3.0],
-                    'StatusCode': 'PartialData'
-                }
-            ],
-            'NextToken': 'foo',
-            'Messages': [],
-            'ResponseMetadata': {
-                'RequestId': '77a86d3c-16e1-47c5-b2d1-0f7d81d48a05',
-                'HTTPStatusCode': 200,
-                'HTTPHeaders': {
-                    'x-amzn-requestid': '70f7d81d48a05',
-                    'content-type': 'text/xml',
-                    'content-length': '796',
-                    'date': 'Tue, 22 Sep 2020 12:26:36 GMT'
-                },
-                'RetryAttempts': 0
-            }
-        }
+        mock_batch = Mock()
+        mock_batch.add.return_value = 'key'
+        mock_batch.get.return_value = 3.0
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch(
-            'awslimitchecker.services.base._AwsService._cloudwatch_connection',
-            autospec=True
-        ) as m_cw_conn:
-            m_cw_conn.return_value = mock_conn
+        with patch.object(cls, '_usage_metrics_batch') as m_batch:
+            m_batch.return_value = mock_batch
             res = cls._get_cloudwatch_usage_latest([
-                {'Name': 'foo', 'Value': 'bar'},
-                {'Name': 'baz', 'Value': 'blam'}
+                {'Name': 'foo', 'Value': 'bar'}
             ], metric_name='MyMetric', period=3600)
         assert res == 3.0
-        assert m_cw_conn.mock_calls == [
-            call(cls)
-        ]
-        assert mock_conn.mock_calls == [
-            call.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        'Id': 'id',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/Usage',
-                                'MetricName': 'MyMetric',
-                                'Dimensions': [
-                                    {'Name': 'foo', 'Value': 'bar'},
-                                    {'Name': 'baz', 'Value': 'blam'}
-                                ]
-                            },
-                            'Period': 3600,
-                            'Stat': 'Average'
-                        }
-                    }
-                ],
-                StartTime=datetime(2020, 9, 22, 11, 26, 00),
-                EndTime=datetime(2020, 9, 22, 12, 26, 00),
-                ScanBy='TimestampDescending',
-                MaxDatapoints=1
-            )
+        assert mock_batch.mock_calls == [
+            call.add('MyMetric', [{'Name': 'foo', 'Value': 'bar'}], 3600),
+            call.get('key')
         ]
 
-    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
-    def test_exception(self):
-        mock_conn = Mock()
-        mock_conn.get_metric_data.side_effect = ClientError(
-            {
-                'ResponseMetadata': {
-                    'HTTPStatusCode': 503,
-                    'RequestId': '7d74c6f0-c789-11e5-82fe-a96cdaa6d564'
-                },
-                'Error': {
-                    'Message': 'Service Unavailable',
-                    'Code': '503'
-                }
-            },
-            'GetMetricData'
-        )
+    def test_no_data(self):
+        mock_batch = Mock()
+        mock_batch.add.return_value = 'key'
+        mock_batch.get.return_value = None
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch(
-            'awslimitchecker.services.base._AwsService._cloudwatch_connection',
-            autospec=True
-        ) as m_cw_conn:
-            m_cw_conn.return_value = mock_conn
-            res = cls._get_cloudwatch_usage_latest([
-                {'Name': 'foo', 'Value': 'bar'},
-                {'Name': 'baz', 'Value': 'blam'}
-            ], metric_name='MyMetric', period=3600)
+        with patch.object(cls, '_usage_metrics_batch') as m_batch:
+            m_batch.return_value = mock_batch
+            with patch('%s.logger' % pbm) as mock_logger:
+                res = cls._get_cloudwatch_usage_latest([
+                    {'Name': 'foo', 'Value': 'bar'}
+                ])
         assert res == 0
-        assert m_cw_conn.mock_calls == [
-            call(cls)
-        ]
-        assert mock_conn.mock_calls == [
-            call.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        'Id': 'id',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/Usage',
-                                'MetricName': 'MyMetric',
-                                'Dimensions': [
-                                    {'Name': 'foo', 'Value': 'bar'},
-                                    {'Name': 'baz', 'Value': 'blam'}
-                                ]
-                            },
-                            'Period': 3600,
-                            'Stat': 'Average'
-                        }
-                    }
-                ],
-                StartTime=datetime(2020, 9, 22, 11, 26, 00),
-                EndTime=datetime(2020, 9, 22, 12, 26, 00),
-                ScanBy='TimestampDescending',
-                MaxDatapoints=1
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'No data points found for AWS/Usage metric %s with '
+                'dimensions %s; using value of zero!', 'ResourceCount',
+                [{'Name': 'foo', 'Value': 'bar'}]
             )
         ]
 
-    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
-    def test_no_data(self):
-        mock_conn = Mock()
-        mock_conn.get_metric_data.return_value = {
-            'MetricDataResults': [],
-            'NextToken': 'foo',
-            'Messages': [],
-            'ResponseMetadata': {
-                'RequestId': '77a86d3c-16e1-47c5-b2d1-0f7d81d48a05',
-                'HTTPStatusCode': 200,
-                'HTTPHeaders': {
-                    'x-amzn-requestid': '70f7d81d48a05',
-                    'content-type': 'text/xml',
-                    'content-length': '796',
-                    'date': 'Tue, 22 Sep 2020 12:26:36 GMT'
-                },
-                'RetryAttempts': 0
-            }
-        }
+    def test_usage_metrics_batch(self):
         cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch(
-            'awslimitchecker.services.base._AwsService._cloudwatch_connection',
-            autospec=True
-        ) as m_cw_conn:
-            m_cw_conn.return_value = mock_conn
-            res = cls._get_cloudwatch_usage_latest([
-                {'Name': 'foo', 'Value': 'bar'},
-                {'Name': 'baz', 'Value': 'blam'}
-            ], metric_name='MyMetric', period=3600)
-        assert res == 0
-        assert m_cw_conn.mock_calls == [
-            call(cls)
-        ]
-        assert mock_conn.mock_calls == [
-            call.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        'Id': 'id',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/Usage',
-                                'MetricName': 'MyMetric',
-                                'Dimensions': [
-                                    {'Name': 'foo', 'Value': 'bar'},
-                                    {'Name': 'baz', 'Value': 'blam'}
-                                ]
-                            },
-                            'Period': 3600,
-                            'Stat': 'Average'
-                        }
-                    }
-                ],
-                StartTime=datetime(2020, 9, 22, 11, 26, 00),
-                EndTime=datetime(2020, 9, 22, 12, 26, 00),
-                ScanBy='TimestampDescending',
-                MaxDatapoints=1
-            )
+        with patch.object(cls, '_cloudwatch_connection') as m_cw_conn:
+            with patch.object(
+                cls._client_registry, 'usage_metrics'
+            ) as m_um:
+                res = cls._usage_metrics_batch()
+        assert m_um.mock_calls == [call(m_cw_conn.return_value)]
+        assert res == m_um.return_value
+
+
+class TestUsageFromCloudwatch(object):
+
+    def setup(self):
+        self.m_quota = Mock(spec_set=ServiceQuotasClient)
+        self.cls = AwsServiceTester(1, 2, {}, self.m_quota)
+        self.cls.quotas_service_code = 'qsc'
+        self.lim1 = AwsLimit('limit1', self.cls, 10, 1, 2)
+        self.lim2 = AwsLimit('limit2', self.cls, 10, 1, 2,
+                             quotas_unit='Gigabytes')
+        self.lim3 = AwsLimit('limit3', self.cls, 10, 1, 2)
+        self.cls.limits = {
+            'limit1': self.lim1, 'limit2': self.lim2, 'limit3': self.lim3
+        }
+        self.dims = [
+            {'Name': 'Class', 'Value': 'None'},
+            {'Name': 'Resource', 'Value': 'res'},
         ]
 
-    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
-    def test_no_values(self):
-        mock_conn = Mock()
-        mock_conn.get_metric_data.return_value = {
-            'MetricDataResults': [
-                {
-                    'Id': 'id',
-                    'Label': 'ResourceCount',
-                    'Timestamps': [],
-                    'Values': [],
-                    'StatusCode': 'PartialData'
+        def se_metric(code, name):
+            if name == 'limit1':
+                return {
+                    'MetricNamespace': 'AWS/Usage',
+                    'MetricName': 'ResourceCount',
+                    'MetricDimensions': {'Resource': 'res', 'Class': 'None'},
+                    'MetricStatisticRecommendation': 'Maximum'
                 }
-            ],
-            'NextToken': 'foo',
-            'Messages': [],
-            'ResponseMetadata': {
-                'RequestId': '77a86d3c-16e1-47c5-b2d1-0f7d81d48a05',
-                'HTTPStatusCode': 200,
-                'HTTPHeaders': {
-                    'x-amzn-requestid': '70f7d81d48a05',
-                    'content-type': 'text/xml',
-                    'content-length': '796',
-                    'date': 'Tue, 22 Sep 2020 12:26:36 GMT'
-                },
-                'RetryAttempts': 0
-            }
+            if name == 'limit3':
+                return {
+                    'MetricNamespace': 'AWS/Other',
+                    'MetricName': 'Foo',
+                    'MetricDimensions': {}
+                }
+            return None
+
+        self.m_quota.get_usage_metric.side_effect = se_metric
+
+    def test_usage_metrics_disabled(self):
+        assert self.cls._usage_metrics() == {}
+        assert self.m_quota.mock_calls == []
+
+    def test_usage_metrics_no_quotas(self):
+        self.cls.usage_from_cloudwatch = True
+        self.cls._quotas_client = None
+        assert self.cls._usage_metrics() == {}
+
+    def test_usage_metrics(self):
+        self.cls.usage_from_cloudwatch = True
+        assert self.cls._usage_metrics() == {
+            'limit1': ('ResourceCount', self.dims, 60, 'Maximum')
         }
-        cls = AwsServiceTester(1, 2, {'foo': 'bar'}, None)
-        with patch(
-            'awslimitchecker.services.base._AwsService._cloudwatch_connection',
-            autospec=True
-        ) as m_cw_conn:
-            m_cw_conn.return_value = mock_conn
-            res = cls._get_cloudwatch_usage_latest([
-                {'Name': 'foo', 'Value': 'bar'},
-                {'Name': 'baz', 'Value': 'blam'}
-            ], metric_name='MyMetric', period=3600)
-        assert res == 0
-        assert m_cw_conn.mock_calls == [
-            call(cls)
+        assert self.m_quota.mock_calls == [
+            call.get_usage_metric('qsc', 'limit1'),
+            call.get_usage_metric('qsc', 'limit3')
         ]
-        assert mock_conn.mock_calls == [
-            call.get_metric_data(
-                MetricDataQueries=[
-                    {
-                        'Id': 'id',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/Usage',
-                                'MetricName': 'MyMetric',
-                                'Dimensions': [
-                                    {'Name': 'foo', 'Value': 'bar'},
-                                    {'Name': 'baz', 'Value': 'blam'}
-                                ]
-                            },
-                            'Period': 3600,
-                            'Stat': 'Average'
-                        }
-                    }
-                ],
-                StartTime=datetime(2020, 9, 22, 11, 26, 00),
-                EndTime=datetime(2020, 9, 22, 12, 26, 00),
-                ScanBy='TimestampDescending',
-                MaxDatapoints=1
-            )
+
+    def test_register_usage_metrics(self):
+        self.cls.usage_from_cloudwatch = True
+        with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+            self.cls._register_usage_metrics()
+        assert m_batch.mock_calls == [
+            call(),
+            call().add('ResourceCount', self.dims, 60, 'Maximum')
         ]
 
+    def test_register_usage_metrics_none(self):
+        with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+            self.cls._register_usage_metrics()
+        assert m_batch.mock_calls == []
+
+    def test_find_current_usage_disabled(self):
+        with patch.object(self.cls, 'find_usage') as m_find:
+            with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+                self.cls._find_current_usage()
+        assert m_find.mock_calls == [call()]
+        assert m_batch.mock_calls == []
+
+    def test_find_current_usage(self):
+        self.cls.usage_from_cloudwatch = True
+
+        def se_find():
+            assert self.cls._have_cloudwatch_usage(['limit1']) is True
+            assert self.cls._have_cloudwatch_usage(
+                ['limit1', 'limit3']
+            ) is False
+            self.lim1._add_current_usage(2)
+            self.lim3._add_current_usage(3)
+
+        with patch.object(self.cls, 'find_usage') as m_find:
+            m_find.side_effect = se_find
+            with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+                m_batch.return_value.add.return_value = 'key1'
+                m_batch.return_value.get.return_value = 7.0
+                self.cls._find_current_usage()
+        assert m_find.mock_calls == [call()]
+        assert m_batch.mock_calls == [
+            call(),
+            call().add('ResourceCount', self.dims, 60, 'Maximum'),
+            call().get('key1')
+        ]
+        assert [u.get_value() for u in self.lim1.get_current_usage()] == [7.0]
+        assert [u.get_value() for u in self.lim3.get_current_usage()] == [3]
+        assert self.cls._have_usage is True
+        assert self.cls._cloudwatch_usage == {}
+
+    def test_find_current_usage_all_limits(self):
+        self.cls.usage_from_cloudwatch = True
+        self.cls.limits = {'limit1': self.lim1}
+        with patch.object(self.cls, 'find_usage') as m_find:
+            with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+                m_batch.return_value.get.return_value = 7.0
+                self.cls._find_current_usage()
+        assert m_find.mock_calls == []
+        assert [u.get_value() for u in self.lim1.get_current_usage()] == [7.0]
+        assert self.cls._have_usage is True
+
+    def test_find_current_usage_no_data(self):
+        self.cls.usage_from_cloudwatch = True
+        self.cls.limits = {'limit1': self.lim1}
+
+        def se_find():
+            self.lim1._add_current_usage(2)
+
+        with patch.object(self.cls, 'find_usage') as m_find:
+            m_find.side_effect = se_find
+            with patch.object(self.cls, '_usage_metrics_batch') as m_batch:
+                m_batch.return_value.get.return_value = None
+                self.cls._find_current_usage()
+        assert m_find.mock_calls == [call()]
+        assert [u.get_value() for u in self.lim1.get_current_usage()] == [2]
+
+    def test_find_usage_if_needed(self):
+        with patch.object(self.cls, '_find_current_usage') as m_find:
+            self.cls._find_usage_if_needed()
+            self.cls._have_usage = True
+            self.cls._find_usage_if_needed()
+        assert m_find.mock_calls == [call()]
+
+
+class TestUsageCounters(object):
+
+    def setup(self):
+        self.cls = AwsServiceTester(1, 2, {}, None)
+        self.lim1 = AwsLimit('limit1', self.cls, 10, 1, 2, limit_type='foo')
+        self.lim2 = AwsLimit('limit2', self.cls, 10, 1, 2)
+        self.cls.limits = {'limit1': self.lim1, 'limit2': self.lim2}
+
+    def test_find_usage_counters(self):
+        assert self.cls._find_usage_counters() == {}
+
+    def test_set_usage_from_counters(self):
+        self.cls._counter_usage = {'limit2': 1}
+        with patch.object(self.cls, '_find_usage_counters') as m_counters:
+            m_counters.return_value = {'limit1': 4}
+            self.cls._set_usage_from_counters()
+        assert m_counters.mock_calls == [call()]
+        assert self.cls._counter_usage == {'limit1': 4}
+        usage = self.lim1.get_current_usage()
+        assert [u.get_value() for u in usage] == [4]
+        assert usage[0].aws_type == 'foo'
+        assert self.lim2.get_current_usage() == []
+        assert self.cls._needs_enumeration(['limit1']) is False
+        assert self.cls._needs_enumeration(['limit1', 'limit2']) is True
+
+    def test_set_usage_from_counters_resource_detail(self):
+        self.cls.resource_detail = True
+        with patch.object(self.cls, '_find_usage_counters') as m_counters:
+            self.cls._set_usage_from_counters()
+        assert m_counters.mock_calls == []
+        assert self.cls._counter_usage == {}
+        assert self.lim1.get_current_usage() == []
+        assert self.cls._needs_enumeration(['limit1']) is True
+
+    def test_needs_enumeration_cloudwatch(self):
+        self.cls._counter_usage = {'limit1': 4}
+        self.cls._cloudwatch_usage = {'limit2': 3}
+        assert self.cls._needs_enumeration(['limit1', 'limit2']) is False
+        assert self.cls._needs_enumeration(['limit1', 'limit3']) is True
+
 
 class Test_AwsServiceSubclasses(object):
 
@@ -819,3 +782,13 @@ class Test_AwsServiceSubclasses(object):
         sts_inst = cls(3, 7, boto_args, mock_quotas)
         assert sts_inst._boto3_connection_kwargs == boto_args
         assert sts_inst._quotas_client == mock_quotas
+
+        # constructors must not connect to AWS
+        reg = ClientRegistry(session=Mock(region_name='us-east-1'))
+        with patch.object(reg, 'client') as m_client:
+            with patch.object(reg, 'resource') as m_resource:
+                offline = cls(3, 7, {}, mock_quotas, client_registry=reg)
+        assert m_client.mock_calls == []
+        assert m_resource.mock_calls == []
+        assert offline.conn is None
+        assert len(offline.limits) > 0
@@ -163,8 +163,8 @@ class Test_EbsService(object):
         cls = _EbsService(21, 43, {}, None)
         cls.conn = mock_conn
         with patch('awslimitchecker.services.ebs.logger') as mock_logger:
-            with patch('%s.paginate_dict' % self.pbm) as mock_paginate:
-                mock_paginate.return_value = response
+            with patch('%s.paginate_items' % self.pbm) as mock_paginate:
+                mock_paginate.return_value = iter(response['Volumes'])
                 cls._find_usage_ebs()
         assert mock_logger.mock_calls == [
             call.debug("Getting usage for EBS volumes"),
@@ -230,8 +230,8 @@ class Test_EbsService(object):
         cls = _EbsService(21, 43, {}, None)
         cls.conn = mock_conn
         with patch('awslimitchecker.services.ebs.logger') as mock_logger:
-            with patch('%s.paginate_dict' % self.pbm) as mock_paginate:
-                mock_paginate.return_value = response
+            with patch('%s.count_paginated' % self.pbm) as mock_paginate:
+                mock_paginate.return_value = len(response['Snapshots'])
                 cls._find_usage_snapshots()
         assert mock_logger.mock_calls == [
             call.debug("Getting usage for EBS snapshots"),
@@ -378,6 +378,37 @@ class TestFindUsage(object):
             call(cls)
         ]
 
+    def test_vcpu_from_cloudwatch(self):
+        with patch.multiple(
+                pb,
+                connect=DEFAULT,
+                _find_usage_instances_nonvcpu=DEFAULT,
+                _find_usage_instances_vcpu=DEFAULT,
+                _find_usage_networking_sgs=DEFAULT,
+                _find_usage_networking_eips=DEFAULT,
+                _find_usage_networking_eni_sg=DEFAULT,
+                _find_usage_spot_instances=DEFAULT,
+                _find_usage_spot_fleets=DEFAULT,
+                autospec=True,
+        ) as mocks:
+            with patch(
+                    '%s._use_vcpu_limits' % pb, new_callable=PropertyMock
+            ) as m_use_vcpu:
+                m_use_vcpu.return_value = True
+                cls = _Ec2Service(21, 43, {}, None)
+                cls._cloudwatch_usage = dict(
+                    (lname, 1.0) for lname in list(
+                        cls.instance_family_to_limit_name.values()
+                    ) + [cls.default_limit_name]
+                )
+                cls.find_usage()
+        assert cls._have_usage is True
+        assert mocks['_find_usage_instances_nonvcpu'].mock_calls == []
+        assert mocks['_find_usage_instances_vcpu'].mock_calls == []
+        assert mocks['_find_usage_networking_sgs'].mock_calls == [
+            call(cls)
+        ]
+
 
 class TestInstanceUsage(object):
 
@@ -767,10 +798,10 @@ class TestFindUsageNetworkingSgs(object):
         mocks = fixtures.test_find_usage_networking_sgs
 
         mock_conn = Mock()
-        mock_conn.security_groups.all.return_value = mocks
+        mock_conn.describe_security_groups.return_value = mocks
 
         cls = _Ec2Service(21, 43, {}, None)
-        cls.resource_conn = mock_conn
+        cls.conn = mock_conn
 
         with patch('awslimitchecker.services.ec2.logger') as mock_logger:
             cls._find_usage_networking_sgs()
@@ -802,7 +833,7 @@ class TestFindUsageNetworkingSgs(object):
         # egress: IPv4 = 22; IPv6 = 29
         assert sorted_usage[2].get_value() == 29
         assert mock_conn.mock_calls == [
-            call.security_groups.all()
+            call.describe_security_groups()
         ]
 
 
@@ -812,10 +843,9 @@ class TestFindUsageNetworkingEips(object):
         mocks = fixtures.test_find_usage_networking_eips
 
         mock_conn = Mock()
-        mock_conn.classic_addresses.all.return_value = mocks['Classic']
-        mock_conn.vpc_addresses.all.return_value = mocks['Vpc']
+        mock_conn.describe_addresses.return_value = mocks
         cls = _Ec2Service(21, 43, {}, None)
-        cls.resource_conn = mock_conn
+        cls.conn = mock_conn
 
         with patch('awslimitchecker.services.ec2.logger') as mock_logger:
             cls._find_usage_networking_eips()
@@ -839,8 +869,7 @@ class TestFindUsageNetworkingEips(object):
         assert usage[0].aws_type == 'AWS::EC2::EIP'
 
         assert mock_conn.mock_calls == [
-            call.vpc_addresses.all(),
-            call.classic_addresses.all()
+            call.describe_addresses()
         ]
 
 
@@ -850,9 +879,9 @@ class TestFindUsageNetworkingEniSg(object):
         mocks = fixtures.test_find_usage_networking_eni_sg
 
         mock_conn = Mock()
-        mock_conn.network_interfaces.all.return_value = mocks
+        mock_conn.describe_network_interfaces.return_value = mocks
         cls = _Ec2Service(21, 43, {}, None)
-        cls.resource_conn = mock_conn
+        cls.conn = mock_conn
         with patch('awslimitchecker.services.ec2.logger') as mock_logger:
             cls._find_usage_networking_eni_sg()
         assert mock_logger.mock_calls == [
@@ -871,7 +900,7 @@ class TestFindUsageNetworkingEniSg(object):
         assert sorted_usage[2].resource_id == 'if-3'
         assert sorted_usage[2].get_value() == 8
         assert mock_conn.mock_calls == [
-            call.network_interfaces.all()
+            call.describe_network_interfaces()
         ]
 
 
@@ -1221,20 +1250,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-east-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-east-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is True
         assert cls.conn == mock_orig_conn
 
@@ -1249,20 +1269,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-north-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-north-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1277,20 +1288,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-northwest-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-northwest-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1305,20 +1307,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-gov-west-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-gov-west-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1332,20 +1325,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-east-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-east-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is True
         assert cls.conn == mock_orig_conn
 
@@ -1359,20 +1343,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-north-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-north-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is True
         assert cls.conn == mock_orig_conn
 
@@ -1386,20 +1361,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-northwest-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-northwest-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is True
         assert cls.conn == mock_orig_conn
 
@@ -1413,20 +1379,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-gov-west-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-gov-west-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is True
         assert cls.conn == mock_orig_conn
 
@@ -1440,20 +1397,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-east-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-east-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1467,20 +1415,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-north-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-north-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1494,20 +1433,11 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='cn-northwest-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'cn-northwest-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
 
@@ -1521,19 +1451,10 @@ class TestUseVcpuLimits(object):
         mock_orig_conn = Mock()
         cls.conn = mock_orig_conn
 
-        def se_conn(klass):
-            mock_conn = Mock()
-            mock_conf = Mock()
-            type(mock_conf).region_name = PropertyMock(
-                return_value='us-gov-west-1'
-            )
-            type(mock_conn)._client_config = PropertyMock(
-                return_value=mock_conf
-            )
-            klass.conn = mock_conn
+        cls._boto3_connection_kwargs = {'region_name': 'us-gov-west-1'}
 
         with patch('%s.connect' % pb, autospec=True) as m_connect:
-            m_connect.side_effect = se_conn
             res = cls._use_vcpu_limits
+        assert m_connect.mock_calls == []
         assert res is False
         assert cls.conn == mock_orig_conn
@@ -136,6 +136,31 @@ class Test_EcsService(object):
         assert spot[0].get_value() == 2.0
         assert spot[0].resource_id is None
 
+    def test_usage_metrics(self):
+        cls = _EcsService(21, 43, {}, None)
+        assert cls._usage_metrics() == {
+            'Fargate On-Demand resource count': (
+                'ResourceCount',
+                [
+                    {'Name': 'Type', 'Value': 'Resource'},
+                    {'Name': 'Resource', 'Value': 'OnDemand'},
+                    {'Name': 'Service', 'Value': 'Fargate'},
+                    {'Name': 'Class', 'Value': 'None'},
+                ],
+                60, 'Average'
+            ),
+            'Fargate Spot resource count': (
+                'ResourceCount',
+                [
+                    {'Name': 'Type', 'Value': 'Resource'},
+                    {'Name': 'Resource', 'Value': 'Spot'},
+                    {'Name': 'Service', 'Value': 'Fargate'},
+                    {'Name': 'Class', 'Value': 'None'},
+                ],
+                60, 'Average'
+            ),
+        }
+
     def test_find_usage_clusters(self):
         def se_clusters(*_, **kwargs):
             if kwargs['clusters'] == ['c1arn']:
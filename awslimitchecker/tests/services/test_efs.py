@@ -91,14 +91,8 @@ class Test_EfsService(object):
     def test_find_usage(self):
         mock_conn = Mock()
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.paginate_dict' % pbm) as mock_paginate:
-                mock_paginate.return_value = {
-                    'FileSystems': [
-                        {'FileSystemId': 'foo'},
-                        {'FileSystemId': 'bar'},
-                        {'FileSystemId': 'baz'}
-                    ]
-                }
+            with patch('%s.count_paginated' % pbm) as mock_paginate:
+                mock_paginate.return_value = 3
                 cls = _EfsService(21, 43, {}, None)
                 cls.conn = mock_conn
                 assert cls._have_usage is False
@@ -125,7 +119,7 @@ class Test_EfsService(object):
         )
         mock_conn = Mock()
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.paginate_dict' % pbm) as mock_paginate:
+            with patch('%s.count_paginated' % pbm) as mock_paginate:
                 mock_paginate.side_effect = exc
                 cls = _EfsService(21, 43, {}, None)
                 cls.conn = mock_conn
@@ -158,7 +152,7 @@ class Test_EfsService(object):
         )
         mock_conn = Mock()
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.paginate_dict' % pbm) as mock_paginate:
+            with patch('%s.count_paginated' % pbm) as mock_paginate:
                 mock_paginate.side_effect = exc
                 cls = _EfsService(21, 43, {}, None)
                 cls.conn = mock_conn
@@ -47,9 +47,9 @@ if (
         sys.version_info[0] < 3 or
         sys.version_info[0] == 3 and sys.version_info[1] < 4
 ):
-    from mock import patch, call, Mock, PropertyMock
+    from mock import patch, call, Mock, PropertyMock, DEFAULT
 else:
-    from unittest.mock import patch, call, Mock, PropertyMock
+    from unittest.mock import patch, call, Mock, PropertyMock, DEFAULT
 
 
 pbm = 'awslimitchecker.services.elb'  # patch base path - module
@@ -122,7 +122,9 @@ class Test_ElbService(object):
         mock_conn.describe_account_limits.return_value = r1
 
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.client' % pbm) as mock_client:
+            with patch(
+                'awslimitchecker.connectable.ClientRegistry.client'
+            ) as mock_client:
                 m_cli = mock_client.return_value
                 m_cli._client_config.region_name = PropertyMock(
                     return_value='rname'
@@ -178,8 +180,10 @@ class Test_ElbService(object):
         return_value = result_fixtures.ELB.test_find_usage
 
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.paginate_dict' % pbm) as mock_paginate:
-                mock_paginate.return_value = return_value
+            with patch('%s.paginate_items' % pbm) as mock_paginate:
+                mock_paginate.return_value = iter(
+                    return_value['LoadBalancerDescriptions']
+                )
                 cls = _ElbService(21, 43, {}, None)
                 cls.conn = mock_conn
                 res = cls._find_usage_elbv1()
@@ -222,20 +226,26 @@ class Test_ElbService(object):
         tgs_res = result_fixtures.ELB.test_find_usage_elbv2_target_groups
 
         with patch('%s.connect' % pb) as mock_connect:
-            with patch('%s.client' % pbm) as mock_client:
+            with patch(
+                'awslimitchecker.connectable.ClientRegistry.client'
+            ) as mock_client:
                 mock_client.return_value._client_config.region_name = \
                     PropertyMock(return_value='rname')
-                with patch('%s.paginate_dict' % pbm) as mock_paginate:
+                with patch.multiple(
+                    pbm, paginate_items=DEFAULT, count_paginated=DEFAULT
+                ) as mock_pag:
                     with patch(
                         '%s._update_usage_for_alb' % pb, autospec=True
                     ) as mock_u:
                         with patch(
                             '%s.Config' % pbm, autospec=True
                         ) as mock_conf:
-                            mock_paginate.side_effect = [
-                                tgs_res,
-                                lbs_res
-                            ]
+                            mock_pag['count_paginated'].return_value = len(
+                                tgs_res['TargetGroups']
+                            )
+                            mock_pag['paginate_items'].return_value = iter(
+                                lbs_res['LoadBalancers']
+                            )
                             cls = _ElbService(21, 43, {}, None)
                             cls._boto3_connection_kwargs = {
                                 'foo': 'bar',
@@ -250,13 +260,15 @@ class Test_ElbService(object):
         assert mock_client.mock_calls == [
             call('elbv2', foo='bar', baz='blam', config=mock_conf.return_value),
         ]
-        assert mock_paginate.mock_calls == [
+        assert mock_pag['count_paginated'].mock_calls == [
             call(
                 mock_client.return_value.describe_target_groups,
                 alc_marker_path=['NextMarker'],
                 alc_data_path=['TargetGroups'],
                 alc_marker_param='Marker'
-            ),
+            )
+        ]
+        assert mock_pag['paginate_items'].mock_calls == [
             call(
                 mock_client.return_value.describe_load_balancers,
                 alc_marker_path=['NextMarker'],
@@ -280,23 +292,28 @@ class Test_ElbService(object):
 
     def test_update_usage_for_alb(self):
         conn = Mock()
-        with patch('%s.paginate_dict' % pbm) as mock_paginate:
-            mock_paginate.side_effect = [
-                result_fixtures.ELB.test_usage_alb_listeners,
-                result_fixtures.ELB.test_usage_alb_rules[0],
-                result_fixtures.ELB.test_usage_alb_rules[1],
-                result_fixtures.ELB.test_usage_alb_rules[2]
+        with patch.multiple(
+            pbm, paginate_items=DEFAULT, count_paginated=DEFAULT
+        ) as mock_pag:
+            mock_pag['paginate_items'].return_value = iter(
+                result_fixtures.ELB.test_usage_alb_listeners['Listeners']
+            )
+            rules = result_fixtures.ELB.test_usage_alb_rules
+            mock_pag['count_paginated'].side_effect = [
+                len(r['Rules']) for r in rules
             ]
             cls = _ElbService(21, 43, {}, None)
             cls._update_usage_for_alb(conn, 'myarn', 'albname')
-        assert mock_paginate.mock_calls == [
+        assert mock_pag['paginate_items'].mock_calls == [
             call(
                 conn.describe_listeners,
                 LoadBalancerArn='myarn',
                 alc_marker_path=['NextMarker'],
                 alc_data_path=['Listeners'],
                 alc_marker_param='Marker'
-            ),
+            )
+        ]
+        assert mock_pag['count_paginated'].mock_calls == [
             call(
                 conn.describe_rules,
                 ListenerArn='listener1',
@@ -341,10 +358,10 @@ class Test_ElbService(object):
 
     def test_update_usage_for_nlb(self):
         conn = Mock()
-        with patch('%s.paginate_dict' % pbm) as mock_paginate:
-            mock_paginate.side_effect = [
-                result_fixtures.ELB.test_usage_nlb_listeners
-            ]
+        with patch('%s.count_paginated' % pbm) as mock_paginate:
+            mock_paginate.return_value = len(
+                result_fixtures.ELB.test_usage_nlb_listeners['Listeners']
+            )
             cls = _ElbService(21, 43, {}, None)
             cls._update_usage_for_nlb(conn, 'mynarn', 'nlbname')
         assert mock_paginate.mock_calls == [
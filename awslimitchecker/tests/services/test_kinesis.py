@@ -70,17 +70,11 @@ class Test_KinesisService(object):
         assert cls.critical_threshold == 43
 
     def test_get_limits(self):
-        mock_conn = Mock()
-        m_client = Mock()
-        type(m_client).region_name = 'ap-southeast-2'
-        type(mock_conn)._client_config = m_client
-
-        def se_conn(cls):
-            cls.conn = mock_conn
-
         with patch('%s.connect' % pb, autospec=True) as mock_connect:
-            mock_connect.side_effect = se_conn
-            cls = _KinesisService(21, 43, {}, None)
+            cls = _KinesisService(
+                21, 43, {'region_name': 'ap-southeast-2'}, None
+            )
+        assert mock_connect.mock_calls == []
 
         cls.limits = {}
         res = cls.get_limits()
@@ -97,17 +91,9 @@ class Test_KinesisService(object):
         assert limits['Shards per Region'].default_limit == 200
 
     def test_get_limits_us_east_1(self):
-        mock_conn = Mock()
-        m_client = Mock()
-        type(m_client).region_name = 'us-east-1'
-        type(mock_conn)._client_config = m_client
-
-        def se_conn(cls):
-            cls.conn = mock_conn
-
         with patch('%s.connect' % pb, autospec=True) as mock_connect:
-            mock_connect.side_effect = se_conn
-            cls = _KinesisService(21, 43, {}, None)
+            cls = _KinesisService(21, 43, {'region_name': 'us-east-1'}, None)
+        assert mock_connect.mock_calls == []
 
         limits = cls.limits
         for x in limits:
@@ -142,7 +128,7 @@ class Test_KinesisService(object):
                 cls.conn = mock_conn
                 assert cls._have_usage is False
                 cls.find_usage()
-        assert mock_connect.mock_calls == [call(cls), call(cls)]
+        assert mock_connect.mock_calls == [call(cls)]
         assert cls._have_usage is True
         assert mock_conn.mock_calls == []
         for x in [
@@ -183,7 +169,7 @@ class Test_KinesisService(object):
             cls.conn = mock_conn
             cls._update_limits_from_api()
 
-        assert mock_connect.mock_calls == [call(cls), call(cls)]
+        assert mock_connect.mock_calls == [call(cls)]
         assert mock_conn.mock_calls == [call.describe_limits()]
         assert len(cls.limits) == 1
         lim = cls.limits['Shards per Region'].get_limit()
@@ -115,7 +115,9 @@ class Test_RDSService(object):
                     _find_usage_subnet_groups=DEFAULT,
                     _find_usage_security_groups=DEFAULT,
                     _update_limits_from_api=DEFAULT,
+                    _find_usage_counters=DEFAULT,
             ) as mocks:
+                mocks['_find_usage_counters'].return_value = {}
                 cls = _RDSService(21, 43, {}, None)
                 cls.conn = mock_conn
                 assert cls._have_usage is False
@@ -123,6 +125,7 @@ class Test_RDSService(object):
         assert mock_connect.mock_calls == [call()]
         assert cls._have_usage is True
         for x in [
+                '_find_usage_counters',
                 '_find_usage_instances',
                 '_find_usage_subnet_groups',
                 '_find_usage_security_groups',
@@ -130,6 +133,54 @@ class Test_RDSService(object):
         ]:
             assert mocks[x].mock_calls == [call()]
 
+    def test_find_usage_from_counters(self):
+        mock_conn = Mock()
+
+        with patch('%s.connect' % self.pb):
+            with patch.multiple(
+                    self.pb,
+                    _find_usage_instances=DEFAULT,
+                    _find_usage_subnet_groups=DEFAULT,
+                    _find_usage_security_groups=DEFAULT,
+                    _update_limits_from_api=DEFAULT,
+                    _find_usage_counters=DEFAULT,
+            ) as mocks:
+                mocks['_find_usage_counters'].return_value = {
+                    'DB instances': 3,
+                    'Read replicas per master': 2,
+                    'Subnets per Subnet Group': 4,
+                    'Max auths per security group': 1,
+                }
+                cls = _RDSService(21, 43, {}, None)
+                cls.conn = mock_conn
+                cls.find_usage()
+        assert cls._have_usage is True
+        assert mocks['_find_usage_instances'].mock_calls == []
+        assert mocks['_find_usage_subnet_groups'].mock_calls == []
+        # VPC Security Groups has no counter
+        assert mocks['_find_usage_security_groups'].mock_calls == [call()]
+        usage = cls.limits['DB instances'].get_current_usage()
+        assert [u.get_value() for u in usage] == [3]
+        usage = cls.limits['Read replicas per master'].get_current_usage()
+        assert [u.get_value() for u in usage] == [2]
+
+    def test_find_usage_counters(self):
+        mock_conn = Mock()
+        mock_conn.describe_account_attributes.return_value = {
+            'AccountQuotas': [
+                {'AccountQuotaName': 'DBInstances', 'Used': 3, 'Max': 40},
+                {'AccountQuotaName': 'Foo', 'Used': 1, 'Max': 2},
+                {'AccountQuotaName': 'DBSubnetGroups', 'Used': 5, 'Max': 50},
+            ]
+        }
+        cls = _RDSService(21, 43, {}, None)
+        cls.conn = mock_conn
+        with patch('%s.connect' % self.pb) as mock_connect:
+            res = cls._find_usage_counters()
+        assert mock_connect.mock_calls == [call()]
+        assert mock_conn.mock_calls == [call.describe_account_attributes()]
+        assert res == {'DB instances': 3, 'Subnet Groups': 5}
+
     def test_required_iam_permissions(self):
         cls = _RDSService(21, 43, {}, None)
         assert cls.required_iam_permissions() == [
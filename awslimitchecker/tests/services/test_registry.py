@@ -0,0 +1,167 @@
+"""
+awslimitchecker/tests/services/test_registry.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import os
+import sys
+import pytest
+
+from awslimitchecker.services import _services
+from awslimitchecker.services.base import _AwsService
+from awslimitchecker.services.registry import (
+    ServiceRegistry, ServiceInstances, loaded_services
+)
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.services.registry'
+
+
+class TestServiceRegistry(object):
+
+    def setup(self):
+        self.cls = ServiceRegistry([
+            ('Foo', 'foo', '_FooService', False),
+            ('Bar', 'bar', '_BarService', True),
+        ])
+
+    def test_names(self):
+        with patch('%s.importlib.import_module' % pbm) as m_import:
+            assert list(self.cls) == ['Foo', 'Bar']
+            assert len(self.cls) == 2
+            assert 'Foo' in self.cls
+            assert 'Baz' not in self.cls
+            assert self.cls.is_global('Foo') is False
+            assert self.cls.is_global('Bar') is True
+        assert m_import.mock_calls == []
+
+    def test_getitem(self):
+        with patch('%s.importlib.import_module' % pbm) as m_import:
+            res = self.cls['Bar']
+            assert self.cls['Bar'] is res
+        assert m_import.mock_calls == [
+            call('awslimitchecker.services.bar')
+        ]
+        assert res == m_import.return_value._BarService
+
+    def test_getitem_unknown(self):
+        with pytest.raises(KeyError):
+            self.cls['Baz']
+
+    def test_set_del(self):
+        m_cls = Mock(spec_set=_AwsService)
+        m_cls.is_global = True
+        self.cls['Baz'] = m_cls
+        del self.cls['Foo']
+        assert list(self.cls) == ['Bar', 'Baz']
+        assert self.cls['Baz'] == m_cls
+        assert self.cls.is_global('Baz') is True
+
+
+class TestServices(object):
+
+    def test_all_modules_registered(self):
+        sdir = os.path.dirname(sys.modules[_AwsService.__module__].__file__)
+        modules = sorted(
+            f[:-3] for f in os.listdir(sdir)
+            if f.endswith('.py') and f not in [
+                '__init__.py', 'base.py', 'registry.py'
+            ]
+        )
+        assert sorted(
+            _services[sname].__module__.rsplit('.', 1)[1]
+            for sname in _services
+        ) == modules
+
+    def test_entries_match_classes(self):
+        for sname in _services:
+            cls = _services[sname]
+            assert issubclass(cls, _AwsService)
+            assert cls.service_name == sname
+            assert cls.is_global == _services.is_global(sname)
+
+
+class TestServiceInstances(object):
+
+    def setup(self):
+        self.svc1 = Mock(spec_set=_AwsService)
+        self.svc2 = Mock(spec_set=_AwsService)
+        self.factory = Mock(side_effect=lambda n: {
+            'Foo': self.svc1, 'Bar': self.svc2
+        }[n])
+        self.cls = ServiceInstances(['Foo', 'Bar'], self.factory)
+
+    def test_lazy(self):
+        assert list(self.cls) == ['Foo', 'Bar']
+        assert len(self.cls) == 2
+        assert 'Bar' in self.cls
+        assert 'Baz' not in self.cls
+        assert self.cls.loaded() == {}
+        assert self.factory.mock_calls == []
+        assert self.cls['Bar'] is self.svc2
+        assert self.cls['Bar'] is self.svc2
+        assert self.factory.mock_calls == [call('Bar')]
+        assert self.cls.loaded() == {'Bar': self.svc2}
+        assert self.cls == {'Foo': self.svc1, 'Bar': self.svc2}
+
+    def test_getitem_unknown(self):
+        with pytest.raises(KeyError):
+            self.cls['Baz']
+        assert self.factory.mock_calls == []
+
+    def test_set_del(self):
+        svc3 = Mock(spec_set=_AwsService)
+        self.cls['Baz'] = svc3
+        del self.cls['Foo']
+        assert list(self.cls) == ['Bar', 'Baz']
+        assert self.cls.loaded() == {'Baz': svc3}
+        assert self.factory.mock_calls == []
+
+    def test_loaded_services(self):
+        self.cls['Foo']
+        assert loaded_services(self.cls) == {'Foo': self.svc1}
+        d = {'Foo': self.svc1, 'Bar': self.svc2}
+        assert loaded_services(d) is d
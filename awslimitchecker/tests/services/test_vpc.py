@@ -149,11 +149,7 @@ class Test_VpcService(object):
 
         assert len(cls.limits['VPCs'].get_current_usage()) == 1
         assert cls.limits['VPCs'].get_current_usage()[0].get_value() == 2
-        assert mock_conn.mock_calls == [
-            call.describe_vpcs(Filters=[{
-                'Name': 'owner-id', 'Values': ['0123456789']
-            }])
-        ]
+        assert mock_conn.mock_calls == [call.describe_vpcs()]
 
     def test_find_usage_subnets(self):
         response = result_fixtures.VPC.test_find_usage_subnets
@@ -177,11 +173,7 @@ class Test_VpcService(object):
         assert usage[0].resource_id == 'vpc-2'
         assert usage[1].get_value() == 2
         assert usage[1].resource_id == 'vpc-1'
-        assert mock_conn.mock_calls == [
-            call.describe_subnets(Filters=[{
-                'Name': 'owner-id', 'Values': ['0123456789']
-            }])
-        ]
+        assert mock_conn.mock_calls == [call.describe_subnets()]
 
     def test_find_usage_acls(self):
         response = result_fixtures.VPC.test_find_usage_acls
@@ -377,9 +369,7 @@ class Test_VpcService(object):
         assert cls.limits['Network interfaces per Region'].get_current_usage()[
             0].get_value() == 1
         assert mock_conn.mock_calls == [
-            call.describe_network_interfaces(Filters=[{
-                'Name': 'owner-id', 'Values': ['0123456789']
-            }]),
+            call.describe_network_interfaces(),
         ]
 
     def test_required_iam_permissions(self):
@@ -0,0 +1,183 @@
+"""
+awslimitchecker/tests/test_catalog.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+from awslimitchecker.catalog import (
+    CATALOG_PATH, LimitsCatalog, build_catalog, catalog_regions,
+    write_catalog
+)
+from awslimitchecker.services import _services
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch
+else:
+    from unittest.mock import patch
+
+pbm = 'awslimitchecker.catalog'
+
+
+class TestCatalogRegions(object):
+
+    def test_partitions(self):
+        res = catalog_regions()
+        assert 'us-east-1' in res
+        assert 'cn-north-1' in res
+        assert 'us-gov-west-1' in res
+        assert res == sorted(res)
+
+    def test_one_partition(self):
+        res = catalog_regions(partitions=('aws-cn', ))
+        assert 'cn-north-1' in res
+        assert 'us-east-1' not in res
+
+
+class TestBuildCatalog(object):
+
+    def test_build(self):
+        with patch.dict('os.environ', {}, clear=True):
+            res = build_catalog(
+                regions=['us-west-1', 'us-east-1', 'cn-north-1', 'eu-west-3']
+            )
+        assert res['regions'] == [
+            'cn-north-1', 'eu-west-3', 'us-east-1', 'us-west-1'
+        ]
+        assert sorted(res['services'].keys()) == sorted(_services.keys())
+        dynamo = _services['DynamoDB'](
+            80, 99, {'region_name': 'us-east-1'}, None
+        )
+        assert res['services']['DynamoDB']['variants'] == [{
+            'regions': ['us-east-1'],
+            'limits': {
+                k: v.default_limit for k, v in dynamo.get_limits().items()
+            }
+        }]
+        assert res['services']['EC2']['variants'][0]['regions'] == [
+            'cn-north-1'
+        ]
+        assert res['services']['IAM']['variants'] == []
+
+    def test_vcpu_limits(self):
+        with patch.dict('os.environ', {'USE_VCPU_LIMITS': 'true'}):
+            with pytest.raises(RuntimeError):
+                build_catalog(regions=['us-east-1'])
+
+    def test_packaged_catalog_current(self):
+        """
+        The packaged catalog must match the service classes; if this fails,
+        regenerate it with ``python -m awslimitchecker.catalog``.
+        """
+        with open(CATALOG_PATH, 'r') as fh:
+            packaged = json.load(fh)
+        with patch.dict('os.environ', {}, clear=True):
+            res = build_catalog(regions=packaged['regions'])
+        assert res == packaged
+
+    def test_write(self, tmpdir):
+        path = str(tmpdir.join('catalog.json'))
+        with patch.dict('os.environ', {}, clear=True):
+            write_catalog(path=path, regions=['us-east-1'])
+            expected = build_catalog(regions=['us-east-1'])
+        with open(path, 'r') as fh:
+            assert json.load(fh) == expected
+        assert LimitsCatalog.load(path=path).regions == ['us-east-1']
+
+
+class TestLimitsCatalog(object):
+
+    def setup(self):
+        self.cls = LimitsCatalog({
+            'regions': ['r1', 'r2', 'r3'],
+            'services': {
+                'SvcFoo': {
+                    'default': {'lim1': 1, 'lim2': None},
+                    'variants': [
+                        {'regions': ['r2'], 'limits': {'lim1': 2}}
+                    ]
+                },
+                'SvcBar': {
+                    'default': {'lim3': 3.5},
+                    'variants': []
+                }
+            }
+        })
+
+    def test_regions(self):
+        assert self.cls.regions == ['r1', 'r2', 'r3']
+
+    def test_service_names(self):
+        assert self.cls.service_names() == ['SvcBar', 'SvcFoo']
+
+    def test_has_region(self):
+        assert self.cls.has_region('r2') is True
+        assert self.cls.has_region('r4') is False
+        assert self.cls.has_region(None) is False
+
+    def test_default_limits(self):
+        assert self.cls.default_limits('SvcFoo', 'r1') == {
+            'lim1': 1, 'lim2': None
+        }
+        assert self.cls.default_limits('SvcFoo', 'r2') == {'lim1': 2}
+        assert self.cls.default_limits('SvcFoo') == {
+            'lim1': 1, 'lim2': None
+        }
+        assert self.cls.default_limits('SvcBar', 'r2') == {'lim3': 3.5}
+
+    def test_default_limits_copy(self):
+        self.cls.default_limits('SvcFoo', 'r1')['lim1'] = 5
+        assert self.cls.default_limits('SvcFoo', 'r1')['lim1'] == 1
+
+    def test_default_limits_unknown_service(self):
+        with pytest.raises(KeyError):
+            self.cls.default_limits('SvcBaz', 'r1')
+
+    def test_load_packaged(self):
+        cls = LimitsCatalog.load()
+        assert os.path.exists(CATALOG_PATH)
+        assert 'us-east-1' in cls.regions
+        assert cls.service_names() == sorted(_services.keys())
@@ -38,13 +38,26 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import sys
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
 
 from awslimitchecker.services.base import _AwsService
 from awslimitchecker.checker import AwsLimitChecker
 from awslimitchecker.version import _get_version_info
 from awslimitchecker.limit import AwsLimit
-from awslimitchecker.trustedadvisor import TrustedAdvisor
+from awslimitchecker.trustedadvisor import (
+    TrustedAdvisor, TrustedAdvisorResultCache
+)
+from awslimitchecker.connectable import (
+    ClientRegistry, StsCredentialCache
+)
+from awslimitchecker.snapshots import UsageSnapshotStore
+from awslimitchecker.schedule import ScanSchedule
+from awslimitchecker.thresholds import ThresholdResults
 from .support import sample_limits
+from datetime import datetime
+from pytz import utc
 
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -61,6 +74,12 @@ pbm = 'awslimitchecker.checker'  # patch base path - module
 pb = '%s.AwsLimitChecker' % pbm  # patch base path
 
 
+def se_evaluate(limits):
+    # the test limits are strings; those starting with "ok" are within
+    # their thresholds
+    return ThresholdResults(limits, [x.startswith('ok') for x in limits])
+
+
 class ApiServiceSpec(_AwsService):
     """
     Used for Mock's ``spec_set`` parameter to represent classes that have
@@ -71,6 +90,43 @@ class ApiServiceSpec(_AwsService):
         pass
 
 
+class SlowService(_AwsService):
+    """
+    Service whose first usage check blocks until ``release`` is set, and
+    then records usage and an API limit.
+    """
+
+    service_name = 'SlowService'
+    api_name = 'slowservice'
+
+    def __init__(self, *args, **kwargs):
+        self.release = threading.Event()
+        self.done = threading.Event()
+        self.calls = 0
+        super(SlowService, self).__init__(*args, **kwargs)
+
+    def connect(self):
+        pass
+
+    def find_usage(self):
+        self.calls += 1
+        self.limits['lim']._reset_usage()
+        if self.calls == 1:
+            self.release.wait(5)
+        self.limits['lim']._set_api_limit(5)
+        self.limits['lim']._add_current_usage(3)
+        self._have_usage = True
+        self.done.set()
+
+    def get_limits(self):
+        if self.limits != {}:
+            return self.limits
+        return {'lim': AwsLimit('lim', self, 10, 80, 99)}
+
+    def required_iam_permissions(self):
+        return []
+
+
 class TestAwsLimitChecker(object):
 
     def setup(self):
@@ -108,6 +164,9 @@ class TestAwsLimitChecker(object):
                 mocks['_get_latest_version'].return_value = None
                 self.mock_version.return_value = self.mock_ver_info
                 self.cls = AwsLimitChecker(check_version=False)
+                # services are created on first use; create them while
+                # _services is patched
+                list(self.cls.services.values())
 
     def test_init(self):
         # dict should be of _AwsService instances
@@ -117,16 +176,31 @@ class TestAwsLimitChecker(object):
         }
         assert self.cls.services == services
         # _AwsService instances should exist, but have no other calls
+        reg = self.cls.client_registry
+        assert isinstance(reg, ClientRegistry)
+        assert reg._session is None
         assert self.mock_foo.mock_calls == [
-            call(80, 99, {'region_name': None}, self.mock_quotas.return_value)
+            call(80, 99, {'region_name': None}, self.mock_quotas.return_value,
+                 client_registry=reg)
         ]
         assert self.mock_bar.mock_calls == [
-            call(80, 99, {'region_name': None}, self.mock_quotas.return_value)
+            call(80, 99, {'region_name': None}, self.mock_quotas.return_value,
+                 client_registry=reg)
         ]
         assert self.mock_ta_constr.mock_calls == [
             call(services, {'region_name': None}, ta_api_region='us-east-1',
-                 ta_refresh_mode=None, ta_refresh_timeout=None)
+                 ta_refresh_mode=None, ta_refresh_timeout=None,
+                 client_registry=reg, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 result_cache=self.cls._ta_result_cache, account_id=None)
         ]
+        assert self.cls.usage_source == 'api'
+        assert self.mock_svc1.usage_from_cloudwatch is False
+        assert self.mock_svc2.usage_from_cloudwatch is False
+        assert self.cls.resource_detail is False
+        assert self.mock_svc1.resource_detail is False
+        assert self.mock_svc2.resource_detail is False
+        assert self.cls.usage_retention is None
         assert self.mock_svc1.mock_calls == []
         assert self.mock_svc2.mock_calls == []
         assert self.cls.ta == self.mock_ta
@@ -137,9 +211,66 @@ class TestAwsLimitChecker(object):
             call.debug('Connecting to region %s', None)
         ]
         assert self.cls.role_partition == 'aws'
+        assert self.cls.parallelism == 1
+        assert isinstance(self.cls._ta_result_cache, TrustedAdvisorResultCache)
+        assert self.cls._ta_result_cache.store is None
+        assert self.cls._ta_result_cache.ttl == 3600
+        assert self.mock_quotas.mock_calls == [
+            call({'region_name': None}, client_registry=reg, cache=None,
+                 account_id=None)
+        ]
+
+    def test_for_region(self, capsys):
+        self.mock_foo.is_global = False
+        self.mock_bar.is_global = True
+        self.mock_foo.reset_mock()
+        self.mock_bar.reset_mock()
+        self.mock_ta_constr.reset_mock()
+        self.mock_quotas.reset_mock()
+        self.cls.parallelism = 3
+        self.cls._check_version = True
+        with patch.dict('%s._services' % pbm, values=self.svcs, clear=True):
+            with patch.multiple(
+                'awslimitchecker.checker',
+                TrustedAdvisor=self.mock_ta_constr,
+                ServiceQuotasClient=self.mock_quotas
+            ):
+                res = self.cls.for_region('us-west-2', skip_global=True)
+                list(res.services.values())
+        out, err = capsys.readouterr()
+        assert err == ''
+        assert res is not self.cls
+        assert res.region == 'us-west-2'
+        assert res.parallelism == 3
+        assert res._check_version is False
+        assert self.cls._check_version is True
+        assert res.services == {'SvcFoo': self.mock_svc1}
+        assert self.cls.services == {
+            'SvcFoo': self.mock_svc1,
+            'SvcBar': self.mock_svc2
+        }
+        assert self.cls.region is None
+        assert res.client_registry is self.cls.client_registry
+        assert res._ta_result_cache is self.cls._ta_result_cache
+        reg = self.cls.client_registry
+        assert self.mock_foo.mock_calls == [
+            call(80, 99, {'region_name': 'us-west-2'},
+                 self.mock_quotas.return_value, client_registry=reg)
+        ]
+        assert self.mock_bar.mock_calls == []
+        assert self.mock_ta_constr.mock_calls == [
+            call({'SvcFoo': self.mock_svc1}, {'region_name': 'us-west-2'},
+                 ta_api_region='us-east-1', ta_refresh_mode=None,
+                 ta_refresh_timeout=None, client_registry=reg,
+                 ta_poll_min_interval=5, ta_poll_max_interval=60,
+                 result_cache=self.cls._ta_result_cache, account_id=None)
+        ]
         assert self.mock_quotas.mock_calls == [
-            call({'region_name': None})
+            call({'region_name': 'us-west-2'}, client_registry=reg, cache=None,
+                 account_id=None)
         ]
+        assert self.cls._conn_kwargs == {'region_name': None}
+        assert self.mock_version.mock_calls == [call()]
 
     def test_init_AGPL_message(self, capsys):
         # get rid of the class
@@ -156,6 +287,19 @@ class TestAwsLimitChecker(object):
             "all users have a right to the full source code of "
             "this version. See <http://myurl>\n")
 
+    def test_init_no_http(self):
+        with patch.multiple(
+            'awslimitchecker.checker',
+            logger=DEFAULT,
+            _get_version_info=DEFAULT,
+            autospec=True,
+        ) as mocks:
+            mocks['_get_version_info'].return_value = self.mock_ver_info
+            with patch('awslimitchecker.utils.urllib3') as mock_urllib3:
+                cls = AwsLimitChecker()
+        assert mock_urllib3.mock_calls == []
+        assert cls._check_version is True
+
     def test_check_version_old(self):
         with patch.multiple(
             'awslimitchecker.checker',
@@ -167,14 +311,17 @@ class TestAwsLimitChecker(object):
         ) as mocks:
             mocks['_get_version_info'].return_value = self.mock_ver_info
             mocks['_get_latest_version'].return_value = '3.4.5'
-            AwsLimitChecker()
+            cls = AwsLimitChecker()
+            assert mocks['_get_latest_version'].mock_calls == []
+            cls._check_latest_version()
+            cls._check_latest_version()
         assert mocks['_get_latest_version'].mock_calls == [call()]
         assert mocks['logger'].mock_calls == [
+            call.debug('Connecting to region %s', None),
             call.warning(
                 'You are running awslimitchecker %s, but the latest version'
                 ' is %s; please consider upgrading.', '1.2.3', '3.4.5'
-            ),
-            call.debug('Connecting to region %s', None)
+            )
         ]
 
     def test_check_version_not_old(self):
@@ -188,12 +335,59 @@ class TestAwsLimitChecker(object):
         ) as mocks:
             mocks['_get_version_info'].return_value = self.mock_ver_info
             mocks['_get_latest_version'].return_value = None
-            AwsLimitChecker()
+            cls = AwsLimitChecker()
+            cls._check_latest_version()
         assert mocks['_get_latest_version'].mock_calls == [call()]
         assert mocks['logger'].mock_calls == [
             call.debug('Connecting to region %s', None)
         ]
 
+    def test_check_version_disabled(self):
+        with patch('%s._get_latest_version' % pbm) as mock_glv:
+            self.cls._check_latest_version()
+        assert mock_glv.mock_calls == []
+
+    def test_check_version_on_first_check(self):
+        with patch('%s._check_latest_version' % pb) as mock_clv:
+            with patch('%s.run_concurrently' % pbm) as mock_rc:
+                mock_rc.return_value = {}
+                self.cls.find_usage()
+                self.cls.check_thresholds()
+        assert mock_clv.mock_calls == [call(), call()]
+
+    def test_init_usage_source(self):
+        mock_svc1 = Mock(spec_set=_AwsService)
+        mock_foo = Mock(spec_set=_AwsService)
+        mock_foo.return_value = mock_svc1
+        svcs = {'SvcFoo': mock_foo}
+        with patch.dict('%s._services' % pbm, values=svcs, clear=True):
+            with patch.multiple(
+                    'awslimitchecker.checker',
+                    logger=DEFAULT,
+                    _get_version_info=DEFAULT,
+                    TrustedAdvisor=DEFAULT,
+                    _get_latest_version=DEFAULT,
+                    ServiceQuotasClient=DEFAULT,
+                    autospec=True,
+            ) as mocks:
+                mocks['_get_version_info'].return_value = self.mock_ver_info
+                mocks['_get_latest_version'].return_value = None
+                cls = AwsLimitChecker(
+                    usage_source='cloudwatch', resource_detail=True,
+                    usage_retention=20
+                )
+                list(cls.services.values())
+                with pytest.raises(ValueError) as excinfo:
+                    AwsLimitChecker(usage_source='foo')
+        assert cls.usage_source == 'cloudwatch'
+        assert mock_svc1.usage_from_cloudwatch is True
+        assert cls.resource_detail is True
+        assert mock_svc1.resource_detail is True
+        assert cls.usage_retention == 20
+        assert mock_svc1.mock_calls == [call.set_usage_retention(20)]
+        assert str(excinfo.value) == 'usage_source must be "api" or ' \
+                                     '"cloudwatch", not "foo"'
+
     def test_init_thresholds(self):
         mock_svc1 = Mock(spec_set=_AwsService)
         mock_svc2 = Mock(spec_set=_AwsService)
@@ -222,6 +416,7 @@ class TestAwsLimitChecker(object):
                     warning_threshold=5,
                     critical_threshold=22,
                 )
+                list(cls.services.values())
         # dict should be of _AwsService instances
         services = {
             'SvcFoo': mock_svc1,
@@ -232,18 +427,23 @@ class TestAwsLimitChecker(object):
         assert mock_foo.mock_calls == [
             call(
                 5, 22, {'region_name': None},
-                mocks['ServiceQuotasClient'].return_value
+                mocks['ServiceQuotasClient'].return_value,
+                client_registry=cls.client_registry
             )
         ]
         assert mock_bar.mock_calls == [
             call(
                 5, 22, {'region_name': None},
-                mocks['ServiceQuotasClient'].return_value
+                mocks['ServiceQuotasClient'].return_value,
+                client_registry=cls.client_registry
             )
         ]
         assert mock_ta_constr.mock_calls == [
             call(services, {'region_name': None}, ta_api_region='us-east-1',
-                 ta_refresh_mode=None, ta_refresh_timeout=None)
+                 ta_refresh_mode=None, ta_refresh_timeout=None,
+                 client_registry=cls.client_registry,
+                 ta_poll_min_interval=5, ta_poll_max_interval=60,
+                 result_cache=cls._ta_result_cache, account_id=None)
         ]
         assert mock_svc1.mock_calls == []
         assert mock_svc2.mock_calls == []
@@ -283,6 +483,7 @@ class TestAwsLimitChecker(object):
                             role_partition='rpName',
                             ta_api_region='taRegion'
                         )
+                        list(cls.services.values())
         # dict should be of _AwsService instances
         services = {
             'SvcFoo': mock_svc1,
@@ -302,9 +503,16 @@ class TestAwsLimitChecker(object):
                 {'region_name': 'rName'},
                 ta_api_region='taRegion',
                 ta_refresh_mode=None,
-                ta_refresh_timeout=None
+                ta_refresh_timeout=None,
+                client_registry=cls.client_registry,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                result_cache=cls._ta_result_cache,
+                account_id=None
             )
         ]
+        assert mock_boto3.mock_calls == [call.Session(profile_name='foo')]
+        assert cls.client_registry.session == mock_boto3.Session.return_value
 
     def test_init_sts(self):
         mock_svc1 = Mock(spec_set=_AwsService)
@@ -315,8 +523,9 @@ class TestAwsLimitChecker(object):
         mock_foo.return_value = mock_svc1
         mock_bar.return_value = mock_svc2
         svcs = {'SvcFoo': mock_foo, 'SvcBar': mock_bar}
-        with patch('%s.boto3' % pbm) as mock_boto:
-            mock_boto.client.return_value.assume_role.return_value = {
+        with patch('%s.ClientRegistry' % pbm) as mock_boto:
+            mock_sts = mock_boto.return_value.client.return_value
+            mock_sts.assume_role.return_value = {
                 'Credentials': {
                     'AccessKeyId': 'akid',
                     'SecretAccessKey': 'sk',
@@ -346,6 +555,7 @@ class TestAwsLimitChecker(object):
                         account_role='myrole',
                         region='myregion'
                     )
+                    list(cls.services.values())
         # dict should be of _AwsService instances
         services = {
             'SvcFoo': mock_svc1,
@@ -357,8 +567,9 @@ class TestAwsLimitChecker(object):
         assert self.mock_version.mock_calls == [call()]
         assert self.cls.vinfo == self.mock_ver_info
         assert mock_boto.mock_calls == [
-            call.client('sts', region_name='myregion'),
-            call.client().assume_role(
+            call(session=None),
+            call().client('sts', region_name='myregion'),
+            call().client().assume_role(
                 RoleArn='arn:aws:iam::123456789012:role/myrole',
                 RoleSessionName='awslimitchecker'
             )
@@ -373,8 +584,9 @@ class TestAwsLimitChecker(object):
         mock_foo.return_value = mock_svc1
         mock_bar.return_value = mock_svc2
         svcs = {'SvcFoo': mock_foo, 'SvcBar': mock_bar}
-        with patch('%s.boto3' % pbm) as mock_boto:
-            mock_boto.client.return_value.assume_role.return_value = {
+        with patch('%s.ClientRegistry' % pbm) as mock_boto:
+            mock_sts = mock_boto.return_value.client.return_value
+            mock_sts.assume_role.return_value = {
                 'Credentials': {
                     'AccessKeyId': 'akid',
                     'SecretAccessKey': 'sk',
@@ -410,6 +622,7 @@ class TestAwsLimitChecker(object):
                         ta_refresh_timeout=456,
                         role_partition='mypart'
                     )
+                    list(cls.services.values())
         # dict should be of _AwsService instances
         services = {
             'SvcFoo': mock_svc1,
@@ -421,8 +634,9 @@ class TestAwsLimitChecker(object):
         assert self.mock_version.mock_calls == [call()]
         assert self.cls.vinfo == self.mock_ver_info
         assert mock_boto.mock_calls == [
-            call.client('sts', region_name='myregion'),
-            call.client().assume_role(
+            call(session=None),
+            call().client('sts', region_name='myregion'),
+            call().client().assume_role(
                 ExternalId='myextid',
                 RoleArn='arn:mypart:iam::123456789012:role/myrole',
                 RoleSessionName='awslimitchecker',
@@ -471,7 +685,8 @@ class TestAwsLimitChecker(object):
         assert mock_logger.mock_calls == [
             call.debug('Using credentials profile: %s', 'myprof')
         ]
-        assert mock_sess.mock_calls == [call(profile_name='myprof')]
+        assert mock_sess.mock_calls == []
+        assert cls.client_registry.session == mock_session
         assert res == {
             'region_name': None,
             'aws_access_key_id': 'ak',
@@ -527,6 +742,137 @@ class TestAwsLimitChecker(object):
             'aws_session_token': 'sts_token'
         }
 
+    def test_get_sts_token_cached(self):
+        mock_cache = Mock(spec_set=StsCredentialCache)
+        mock_creds = Mock()
+        mock_cache.get.return_value = mock_creds
+        mock_reg = Mock(spec_set=ClientRegistry)
+        self.cls.account_id = '123'
+        self.cls.account_role = 'myrole'
+        self.cls.sts_cache = mock_cache
+        self.cls.client_registry = mock_reg
+        res = self.cls._get_sts_token()
+        assert res == mock_creds
+        assert mock_creds.account_id == '123'
+        assert self.cls._sts_credentials == mock_creds
+        assert mock_reg.mock_calls == []
+        assert mock_cache.mock_calls == [
+            call.get(
+                'arn:aws:iam::123:role/myrole', external_id=None,
+                session_name='awslimitchecker', margin=300
+            )
+        ]
+
+    def test_get_sts_token_cache_miss(self):
+        mock_cache = Mock(spec_set=StsCredentialCache)
+        mock_cache.get.return_value = None
+        mock_reg = Mock(spec_set=ClientRegistry)
+        mock_reg.client.return_value.assume_role.return_value = {
+            'Credentials': {
+                'AccessKeyId': 'akid',
+                'SecretAccessKey': 'sk',
+                'SessionToken': 'stoken',
+                'Expiration': datetime(2020, 1, 1, tzinfo=utc)
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': 'arid',
+                'Arn': 'arn'
+            }
+        }
+        self.cls.account_id = '123'
+        self.cls.account_role = 'myrole'
+        self.cls.external_id = 'extid'
+        self.cls.sts_cache = mock_cache
+        self.cls.client_registry = mock_reg
+        res = self.cls._get_sts_token()
+        assert res.access_key == 'akid'
+        assert res.account_id == '123'
+        assert self.cls._sts_credentials == res
+        assert mock_reg.mock_calls == [
+            call.client('sts', region_name=None),
+            call.client().assume_role(
+                RoleArn='arn:aws:iam::123:role/myrole',
+                RoleSessionName='awslimitchecker',
+                ExternalId='extid'
+            )
+        ]
+        assert mock_cache.mock_calls == [
+            call.get(
+                'arn:aws:iam::123:role/myrole', external_id='extid',
+                session_name='awslimitchecker', margin=300
+            ),
+            call.put(
+                'arn:aws:iam::123:role/myrole', res, external_id='extid',
+                session_name='awslimitchecker'
+            )
+        ]
+
+    def test_refresh_sts_credentials_no_sts(self):
+        with patch('%s._get_sts_token' % pb) as mock_get_sts:
+            self.cls._refresh_sts_credentials()
+        assert mock_get_sts.mock_calls == []
+
+    def test_refresh_sts_credentials_not_expiring(self):
+        mock_creds = Mock()
+        mock_creds.expires_within.return_value = False
+        self.cls._sts_credentials = mock_creds
+        with patch('%s._get_sts_token' % pb) as mock_get_sts:
+            self.cls._refresh_sts_credentials()
+        assert mock_get_sts.mock_calls == []
+        assert mock_creds.mock_calls == [call.expires_within(300)]
+
+    def test_refresh_sts_credentials(self):
+        mock_creds = Mock(access_key='ak1')
+        mock_creds.expires_within.return_value = True
+        new_creds = Mock(
+            access_key='ak2', secret_key='sk2', session_token='st2'
+        )
+        old = {'region_name': 'r', 'aws_access_key_id': 'ak1'}
+        svc = Mock(_boto3_connection_kwargs=dict(old), conn=Mock(),
+                   resource_conn=Mock())
+        ta = Mock(spec_set=['_boto3_connection_kwargs', 'conn'],
+                  _boto3_connection_kwargs=dict(old), conn=Mock())
+        self.cls.services = {'SvcFoo': svc}
+        self.cls.ta = ta
+        self.cls._quotas_client = None
+        self.cls._conn_kwargs = dict(old)
+        self.cls._sts_credentials = mock_creds
+        new = {
+            'region_name': 'r',
+            'aws_access_key_id': 'ak2',
+            'aws_secret_access_key': 'sk2',
+            'aws_session_token': 'st2'
+        }
+        self.cls.client_registry = Mock(spec_set=ClientRegistry)
+        with patch('%s._get_sts_token' % pb) as mock_get_sts:
+            mock_get_sts.return_value = new_creds
+            self.cls._refresh_sts_credentials()
+        assert mock_get_sts.mock_calls == [call()]
+        assert self.cls.client_registry.mock_calls == [
+            call.evict_clients('ak1')
+        ]
+        assert self.cls._conn_kwargs == new
+        assert svc._boto3_connection_kwargs == new
+        assert svc.conn is None
+        assert svc.resource_conn is None
+        assert ta._boto3_connection_kwargs == new
+        assert ta.conn is None
+
+    def test_refresh_sts_credentials_error(self):
+        mock_creds = Mock()
+        mock_creds.expires_within.return_value = True
+        self.cls._sts_credentials = mock_creds
+        self.cls._conn_kwargs = {'region_name': 'r'}
+        with patch('%s._get_sts_token' % pb) as mock_get_sts:
+            with patch('%s.logger' % pbm) as mock_logger:
+                mock_get_sts.side_effect = RuntimeError('foo')
+                self.cls._refresh_sts_credentials()
+        assert self.cls._conn_kwargs == {'region_name': 'r'}
+        assert mock_logger.mock_calls[-1] == call.error(
+            'Unable to refresh STS credentials for account %s', None,
+            exc_info=True
+        )
+
     def test_get_version(self):
         with patch('%s._get_version_info' % pbm,
                    spec_set=_get_version_info) as mock_version:
@@ -571,6 +917,7 @@ class TestAwsLimitChecker(object):
         res = self.cls.get_limits()
         assert res == limits
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
         assert self.mock_svc1.mock_calls == [
@@ -607,6 +954,7 @@ class TestAwsLimitChecker(object):
         res = self.cls.get_limits(service=['SvcFoo'])
         assert res == {'SvcFoo': limits['SvcFoo']}
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
         assert self.mock_svc1.mock_calls == [
@@ -622,6 +970,7 @@ class TestAwsLimitChecker(object):
         res = self.cls.get_limits(service=['SvcBar'])
         assert res == {'SvcBar': limits['SvcBar']}
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
         assert self.mock_svc1.mock_calls == []
@@ -631,42 +980,89 @@ class TestAwsLimitChecker(object):
             call.get_limits()
         ]
 
+    def test_prefetch_quotas(self):
+        self.mock_svc1.quotas_service_code = 'foo'
+        self.mock_svc2.quotas_service_code = None
+        svc3 = Mock(spec_set=_AwsService)
+        svc3.quotas_service_code = 'foo'
+        mock_qc = self.cls._quotas_client
+        mock_qc.reset_mock()
+        self.cls._prefetch_quotas(
+            {'SvcFoo': self.mock_svc1, 'SvcBar': self.mock_svc2, 'Svc3': svc3}
+        )
+        assert mock_qc.mock_calls == [call.prefetch(['foo'])]
+
+    def test_prefetch_quotas_skip(self):
+        self.cls._quotas_client = None
+        self.cls._prefetch_quotas({'SvcFoo': self.mock_svc1})
+
+    def test_register_usage_metrics(self):
+        self.mock_svc1._register_usage_metrics.side_effect = RuntimeError()
+        with patch('%s.logger' % pbm) as mock_logger:
+            self.cls._register_usage_metrics(
+                {'SvcFoo': self.mock_svc1, 'SvcBar': self.mock_svc2}
+            )
+        assert self.mock_svc1.mock_calls == [call._register_usage_metrics()]
+        assert self.mock_svc2.mock_calls == [call._register_usage_metrics()]
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Unable to register CloudWatch usage metrics for %s',
+                'SvcFoo', exc_info=True
+            )
+        ]
+
+    def test_find_usage_prefetches_quotas(self):
+        with patch('%s._prefetch_quotas' % pb, autospec=True) as mock_pq:
+            self.cls.find_usage(service=['SvcFoo'])
+        assert mock_pq.mock_calls == [
+            call(self.cls, {'SvcFoo': self.mock_svc1})
+        ]
+
     def test_find_usage(self):
-        self.cls.find_usage()
+        with patch.object(self.cls.client_registry, 'clear_cache') as m_clr:
+            self.cls.find_usage()
+        assert m_clr.mock_calls == [call(None)]
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
 
     def test_find_usage_no_ta(self):
         self.cls.find_usage(use_ta=False)
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_ta.mock_calls == []
 
     def test_find_usage_service(self):
         self.cls.find_usage(service=['SvcFoo'])
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_svc2.mock_calls == []
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
 
@@ -674,13 +1070,315 @@ class TestAwsLimitChecker(object):
         self.cls.find_usage(service=['SvcBar'])
         assert self.mock_svc1.mock_calls == []
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_limits_from_api(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
+            call.update_limits()
+        ]
+
+    def test_find_usage_service_timeout(self):
+        self.mock_svc1.service_name = 'SvcFoo'
+        self.mock_svc2.service_name = 'SvcBar'
+        mock_lim = Mock(spec_set=AwsLimit)
+        self.mock_svc2.get_limits.return_value = {'lim': mock_lim}
+        self.cls.service_timeout = 5
+        self.cls.service_timeouts = {'SvcBar': 2}
+
+        def se_call(func, args, timeout, name=None):
+            if name == 'alc-SvcBar':
+                return False, None
+            return True, func(*args)
+
+        with patch('%s.call_with_timeout' % pbm) as mock_cwt:
+            mock_cwt.side_effect = se_call
+            with patch('%s.logger' % pbm) as mock_logger:
+                self.cls.find_usage()
+        assert mock_cwt.mock_calls == [
+            call(mock_cwt.mock_calls[0][1][0], (self.mock_svc1,), 5,
+                 name='alc-SvcFoo'),
+            call(mock_cwt.mock_calls[0][1][0], (self.mock_svc2,), 2,
+                 name='alc-SvcBar')
+        ]
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call.get_limits()
+        ]
+        assert mock_lim.mock_calls == [
+            call._set_incomplete(
+                'usage check did not finish within 2 seconds'
+            )
+        ]
+        assert self.mock_svc2._have_usage is False
+        assert mock_logger.mock_calls == [
+            call.debug('Finding usage for service: %s', 'SvcFoo'),
+            call.warning(
+                'Abandoning service %s: %s; its limits have incomplete usage',
+                'SvcBar', 'usage check did not finish within 2 seconds'
+            )
+        ]
+
+    def test_abandoned_service_rescanned(self):
+        svc = SlowService(80, 99, {}, None)
+        lim = svc.limits['lim']
+        self.cls.service_timeout = 0.1
+
+        def _find(cls):
+            cls._find_usage_if_needed()
+            return True
+
+        with patch('%s.logger' % pbm):
+            assert self.cls._run_with_budget(svc, _find, None, False) is False
+        svc.release.set()
+        assert svc.done.wait(5)
+        # the abandoned call's usage, limit and _have_usage were discarded
+        assert svc._have_usage is False
+        assert lim.is_incomplete() is True
+        assert lim.get_current_usage() == []
+        assert lim.api_limit is None
+        svc.done.clear()
+        assert self.cls._run_with_budget(svc, _find, None, False) is True
+        assert svc.calls == 2
+        assert svc._have_usage is True
+        assert lim.is_incomplete() is False
+        assert [u.get_value() for u in lim.get_current_usage()] == [3]
+        assert lim.api_limit == 5
+
+    def test_find_usage_run_timeout(self):
+        mock_lim = Mock(spec_set=AwsLimit)
+        self.mock_svc1.get_limits.return_value = {'lim': mock_lim}
+        self.mock_svc2.get_limits.return_value = {}
+        self.cls.run_timeout = 10
+        with patch('%s.time' % pbm) as mock_time:
+            mock_time.time.side_effect = [100, 104, 111]
+            with patch('%s.call_with_timeout' % pbm) as mock_cwt:
+                mock_cwt.return_value = True, None
+                self.cls.find_usage()
+        assert len(mock_cwt.mock_calls) == 1
+        assert mock_cwt.mock_calls[0][1][1] == (self.mock_svc1,)
+        assert mock_cwt.mock_calls[0][1][2] == 6
+        assert self.mock_svc1.mock_calls == [call._register_usage_metrics()]
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call.get_limits()
+        ]
+        assert mock_lim.mock_calls == []
+
+    def test_find_usage_snapshots(self):
+        self.mock_svc1.service_name = 'SvcFoo'
+        self.mock_svc2.service_name = 'SvcBar'
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+
+        def se_load(acct, region, svc, max_age):
+            return svc is self.mock_svc1
+
+        mock_store.load_service.side_effect = se_load
+        self.cls.usage_store = mock_store
+        self.cls.account_id = '123'
+        with patch(
+            '%s.region_name' % pb, new_callable=PropertyMock
+        ) as mock_rn:
+            mock_rn.return_value = 'rname'
+            self.cls.find_usage(max_age=300)
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas()
+        ]
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_limits_from_api(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert mock_store.mock_calls == [
+            call.load_service('123', 'rname', self.mock_svc1, 300),
+            call.load_service('123', 'rname', self.mock_svc2, 300),
+            call.save_service('123', 'rname', self.mock_svc2)
+        ]
+
+    def test_find_usage_snapshots_no_max_age(self):
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        self.cls.usage_store = mock_store
+        type(self.mock_svc1).current_account_id = PropertyMock(
+            return_value='456'
+        )
+        with patch(
+            '%s.region_name' % pb, new_callable=PropertyMock
+        ) as mock_rn:
+            mock_rn.return_value = 'rname'
+            self.cls.find_usage(service=['SvcFoo'])
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert mock_store.mock_calls == [
+            call.save_service('456', 'rname', self.mock_svc1)
+        ]
+
+    def test_load_usage_snapshot_scheduled(self):
+        self.mock_svc1.service_name = 'SvcFoo'
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        mock_store.get_history.return_value = [(1.0, 0.5)]
+        mock_store.load_service.return_value = True
+        mock_sched = Mock(spec_set=ScanSchedule())
+        mock_sched.window = 100
+        mock_sched.interval.return_value = 600
+        self.cls.usage_store = mock_store
+        self.cls.scan_schedule = mock_sched
+        with patch('%s.time' % pbm) as mock_time:
+            mock_time.time.return_value = 1000.0
+            res = self.cls._load_usage_snapshot(
+                self.mock_svc1, ('1', 'r'), None
+            )
+        assert res is True
+        assert mock_store.mock_calls == [
+            call.get_history('1', 'r', 'SvcFoo', 900.0),
+            call.load_service('1', 'r', self.mock_svc1, 600)
+        ]
+        assert mock_sched.mock_calls == [call.interval([(1.0, 0.5)])]
+
+    def test_load_usage_snapshot_max_age_overrides_schedule(self):
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        mock_store.load_service.return_value = False
+        mock_sched = Mock(spec_set=ScanSchedule)
+        self.cls.usage_store = mock_store
+        self.cls.scan_schedule = mock_sched
+        res = self.cls._load_usage_snapshot(self.mock_svc1, ('1', 'r'), 30)
+        assert res is False
+        assert mock_store.mock_calls == [
+            call.load_service('1', 'r', self.mock_svc1, 30)
+        ]
+        assert mock_sched.mock_calls == []
+
+    def test_snapshot_key_no_store(self):
+        assert self.cls._snapshot_key(self.cls.services) is None
+
+    def test_snapshot_key_exception(self):
+        self.cls.usage_store = Mock(spec_set=UsageSnapshotStore)
+        type(self.mock_svc1).current_account_id = PropertyMock(
+            side_effect=RuntimeError('foo')
+        )
+        with patch('%s.logger' % pbm) as mock_logger:
+            res = self.cls._snapshot_key({'SvcFoo': self.mock_svc1})
+        assert res is None
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Unable to determine account ID; not using usage snapshots',
+                exc_info=True
+            )
+        ]
+
+    def test_usage_snapshot_exceptions(self):
+        self.mock_svc1.service_name = 'SvcFoo'
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        mock_store.load_service.side_effect = RuntimeError('foo')
+        mock_store.save_service.side_effect = RuntimeError('bar')
+        self.cls.usage_store = mock_store
+        with patch('%s.logger' % pbm) as mock_logger:
+            res = self.cls._load_usage_snapshot(
+                self.mock_svc1, ('1', 'r'), 10
+            )
+            self.cls._save_usage_snapshot(self.mock_svc1, ('1', 'r'))
+        assert res is False
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Unable to load usage snapshot for %s', 'SvcFoo',
+                exc_info=True
+            ),
+            call.warning(
+                'Unable to save usage snapshot for %s', 'SvcFoo',
+                exc_info=True
+            )
+        ]
+
+    def test_save_usage_snapshot_abandoned(self):
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        self.cls.usage_store = mock_store
+        with patch('%s.current_call_abandoned' % pbm) as mock_abandoned:
+            mock_abandoned.return_value = True
+            self.cls._save_usage_snapshot(self.mock_svc1, ('1', 'r'))
+        assert mock_store.mock_calls == []
+
+    def test_find_usage_parallel(self):
+        self.cls.parallelism = 4
+        with patch('awslimitchecker.utils.ThreadPoolExecutor',
+                   wraps=ThreadPoolExecutor) as mock_pool:
+            self.cls.find_usage()
+        assert mock_pool.mock_calls[0] == call(max_workers=4)
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_limits_from_api(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
+            call.update_limits()
+        ]
+
+    def test_find_usage_parallel_one_service(self):
+        self.cls.parallelism = 4
+        with patch('awslimitchecker.utils.ThreadPoolExecutor',
+                   wraps=ThreadPoolExecutor) as mock_pool:
+            self.cls.find_usage(service=['SvcFoo'])
+        assert mock_pool.mock_calls == []
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_current_usage()
+        ]
+        assert self.mock_svc2.mock_calls == []
+
+    def test_find_usage_parallel_exception(self):
+        self.cls.parallelism = 2
+        self.mock_svc1._find_current_usage.side_effect = RuntimeError('foo')
+        mock_lim = Mock(spec_set=AwsLimit)
+        self.mock_svc1.get_limits.return_value = {'lim': mock_lim}
+        with patch('awslimitchecker.utils.logger',
+                   autospec=True) as mock_logger:
+            with pytest.raises(RuntimeError) as excinfo:
+                self.cls.find_usage()
+        assert str(excinfo.value) == 'foo'
+        # the failure of SvcFoo must not prevent SvcBar from running, and
+        # Trusted Advisor limits are still applied
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_current_usage(),
+            call.get_limits()
+        ]
+        assert mock_lim.mock_calls == [
+            call._set_incomplete('usage check failed: foo')
+        ]
+        assert self.mock_svc1._have_usage is False
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.find_usage()
+            call._find_current_usage()
         ]
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
+        assert call.error(
+            'Error in %s %s: %s', 'service', 'SvcFoo',
+            self.mock_svc1._find_current_usage.side_effect, exc_info=True
+        ) in mock_logger.mock_calls
 
     def test_set_threshold_overrides(self):
         limits = sample_limits()
@@ -878,76 +1576,204 @@ class TestAwsLimitChecker(object):
         assert self.mock_svc2.mock_calls == [call.required_iam_permissions()]
 
     def test_check_thresholds(self):
-        self.mock_svc1.check_thresholds.return_value = {
+        self.mock_svc1.get_limits.return_value = {
             'foo': 'bar',
             'baz': 'blam',
+            'quux': 'ok1',
         }
-        self.mock_svc2.check_thresholds.return_value = {}
-        res = self.cls.check_thresholds()
+        self.mock_svc2.get_limits.return_value = {'blarg': 'ok2'}
+        with patch.object(self.cls.client_registry, 'clear_cache') as m_clr:
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                res = self.cls.check_thresholds()
+        assert m_clr.mock_calls == [call(None)]
         assert res == {
             'SvcFoo': {
                 'foo': 'bar',
                 'baz': 'blam',
             }
         }
+        assert mock_eval.mock_calls == [
+            call(['bar', 'blam', 'ok1', 'ok2'])
+        ]
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits(),
         ]
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
         ]
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
+        ]
+
+    def test_check_thresholds_service_timeout(self):
+        self.mock_svc1.service_name = 'SvcFoo'
+        self.mock_svc2.service_name = 'SvcBar'
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        mock_lim = Mock(spec_set=AwsLimit)
+        self.mock_svc2.get_limits.return_value = {'baz': mock_lim}
+        self.cls.service_timeouts = {'SvcBar': 2}
+
+        def se_call(func, args, timeout, name=None):
+            return False, None
+
+        with patch('%s.call_with_timeout' % pbm) as mock_cwt:
+            mock_cwt.side_effect = se_call
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                res = self.cls.check_thresholds()
+        # the abandoned service's limits are returned as incomplete
+        assert res == {
+            'SvcFoo': {'foo': 'bar'},
+            'SvcBar': {'baz': mock_lim}
+        }
+        assert mock_lim.mock_calls == [
+            call._set_incomplete('usage check did not finish within 2 seconds')
+        ]
+        assert mock_eval.mock_calls == [call(['bar'])]
+        assert len(mock_cwt.mock_calls) == 1
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call.get_limits(),
+            call.get_limits()
+        ]
+
+    def test_check_thresholds_exception(self):
+        self.cls.parallelism = 2
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        mock_lim = Mock(spec_set=AwsLimit)
+        self.mock_svc2.get_limits.return_value = {'baz': mock_lim}
+        self.mock_svc2._find_usage_if_needed.side_effect = RuntimeError('foo')
+        with patch('awslimitchecker.utils.logger'):
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                res = self.cls.check_thresholds()
+        # the failed service does not hide the other's results, and its
+        # limits are returned as incomplete
+        assert res == {
+            'SvcFoo': {'foo': 'bar'},
+            'SvcBar': {'baz': mock_lim}
+        }
+        assert mock_eval.mock_calls == [call(['bar'])]
+        assert mock_lim.mock_calls == [
+            call._set_incomplete('usage check failed: foo')
+        ]
+        assert self.mock_svc2._have_usage is False
+
+    def test_check_thresholds_snapshots(self):
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        self.mock_svc2.get_limits.return_value = {'blarg': 'ok2'}
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+
+        def se_load(acct, region, svc, max_age):
+            return svc is self.mock_svc1
+
+        mock_store.load_service.side_effect = se_load
+        self.mock_svc2._have_usage = False
+        self.cls.usage_store = mock_store
+        self.cls.account_id = '123'
+        with patch(
+            '%s.region_name' % pb, new_callable=PropertyMock
+        ) as mock_rn:
+            mock_rn.return_value = 'rname'
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                res = self.cls.check_thresholds(max_age=60)
+        assert res == {'SvcFoo': {'foo': 'bar'}}
+        assert mock_store.mock_calls == [
+            call.load_service('123', 'rname', self.mock_svc1, 60),
+            call.load_service('123', 'rname', self.mock_svc2, 60),
+            call.save_service('123', 'rname', self.mock_svc2)
+        ]
+
+    def test_check_thresholds_snapshots_have_usage(self):
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        self.mock_svc2.get_limits.return_value = {'blarg': 'ok2'}
+        mock_store = Mock(spec_set=UsageSnapshotStore)
+        mock_store.load_service.return_value = False
+        # usage found by an earlier find_usage() is not saved again
+        self.mock_svc1._have_usage = True
+        self.mock_svc2._have_usage = True
+        self.cls.usage_store = mock_store
+        self.cls.account_id = '123'
+        with patch(
+            '%s.region_name' % pb, new_callable=PropertyMock
+        ) as mock_rn:
+            mock_rn.return_value = 'rname'
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                self.cls.check_thresholds(max_age=60)
+        assert mock_store.mock_calls == [
+            call.load_service('123', 'rname', self.mock_svc1, 60),
+            call.load_service('123', 'rname', self.mock_svc2, 60)
         ]
 
     def test_check_thresholds_service(self):
-        self.mock_svc1.check_thresholds.return_value = {'foo': 'bar'}
-        self.mock_svc2.check_thresholds.return_value = {'baz': 'blam'}
-        res = self.cls.check_thresholds(service=['SvcFoo'])
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        self.mock_svc2.get_limits.return_value = {'baz': 'blam'}
+        with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+            mock_eval.side_effect = se_evaluate
+            res = self.cls.check_thresholds(service=['SvcFoo'])
         assert res == {
             'SvcFoo': {
                 'foo': 'bar',
             }
         }
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
         ]
         assert self.mock_svc2.mock_calls == []
 
     def test_check_thresholds_service_api(self):
-        self.mock_svc1.check_thresholds.return_value = {'foo': 'bar'}
-        self.mock_svc2.check_thresholds.return_value = {'baz': 'blam'}
-        res = self.cls.check_thresholds(service=['SvcBar'])
+        self.mock_svc1.get_limits.return_value = {'foo': 'bar'}
+        self.mock_svc2.get_limits.return_value = {'baz': 'blam'}
+        with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+            mock_eval.side_effect = se_evaluate
+            res = self.cls.check_thresholds(service=['SvcBar'])
         assert res == {
             'SvcBar': {
                 'baz': 'blam',
             }
         }
         assert self.mock_ta.mock_calls == [
+            call.start_update_limits(),
             call.update_limits()
         ]
         assert self.mock_svc1.mock_calls == []
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
         ]
 
     def test_check_thresholds_no_ta(self):
-        self.mock_svc1.check_thresholds.return_value = {
+        self.mock_svc1.get_limits.return_value = {
             'foo': 'bar',
             'baz': 'blam',
+            'quux': 'ok1',
         }
-        self.mock_svc2.check_thresholds.return_value = {}
+        self.mock_svc2.get_limits.return_value = {'blarg': 'ok2'}
         self.cls.use_ta = False
-        res = self.cls.check_thresholds(use_ta=False)
+        with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+            mock_eval.side_effect = se_evaluate
+            res = self.cls.check_thresholds(use_ta=False)
         assert res == {
             'SvcFoo': {
                 'foo': 'bar',
@@ -956,24 +1782,78 @@ class TestAwsLimitChecker(object):
         }
         assert self.mock_ta.mock_calls == []
         assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
         ]
         assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
             call._update_limits_from_api(),
             call._update_service_quotas(),
-            call.check_thresholds()
+            call._find_usage_if_needed(),
+            call.get_limits()
         ]
 
+    def test_check_thresholds_parallel(self):
+        self.cls.parallelism = 2
+        self.mock_svc1.get_limits.return_value = {
+            'foo': 'bar',
+            'baz': 'blam',
+            'quux': 'ok1',
+        }
+        self.mock_svc2.get_limits.return_value = {'blarg': 'ok2'}
+        with patch.object(self.cls.client_registry, 'clear_cache') as m_clr:
+            with patch('%s.evaluate_thresholds' % pbm) as mock_eval:
+                mock_eval.side_effect = se_evaluate
+                res = self.cls.check_thresholds()
+        assert m_clr.mock_calls == [call(None)]
+        assert res == {
+            'SvcFoo': {
+                'foo': 'bar',
+                'baz': 'blam',
+            }
+        }
+        assert self.mock_svc1.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_service_quotas(),
+            call._find_usage_if_needed(),
+            call.get_limits()
+        ]
+        assert self.mock_svc2.mock_calls == [
+            call._register_usage_metrics(),
+            call._update_limits_from_api(),
+            call._update_service_quotas(),
+            call._find_usage_if_needed(),
+            call.get_limits()
+        ]
+
+    def test_get_limits_parallel(self):
+        self.cls.parallelism = 2
+        limits = sample_limits()
+        self.mock_svc1.get_limits.return_value = limits['SvcFoo']
+        self.mock_svc2.get_limits.return_value = limits['SvcBar']
+        res = self.cls.get_limits(use_ta=False)
+        assert res == limits
+        assert list(res.keys()) == ['SvcFoo', 'SvcBar']
+
     def test_region_name(self):
-        mock_client = Mock(
-            _client_config=Mock(region_name='rname')
-        )
+        self.cls._conn_kwargs = {'region_name': 'rname'}
         with patch(
             '%s._boto_conn_kwargs' % pb, new_callable=PropertyMock
         ) as mock_bck:
-            mock_bck.return_value = {'foo': 'bar'}
-            with patch('%s.boto3.client' % pbm) as m_client:
-                m_client.return_value = mock_client
+            with patch.object(self.cls.client_registry, 'client') as m_client:
                 res = self.cls.region_name
         assert res == 'rname'
+        assert mock_bck.mock_calls == []
+        assert m_client.mock_calls == []
+
+    def test_region_name_default(self):
+        self.cls._conn_kwargs = {'region_name': None}
+        with patch.object(
+            self.cls.client_registry, 'region_name'
+        ) as m_region:
+            m_region.return_value = 'dflt'
+            res = self.cls.region_name
+        assert res == 'dflt'
+        assert m_region.mock_calls == [call(None)]
@@ -0,0 +1,234 @@
+"""
+awslimitchecker/tests/test_cloudwatch.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import sys
+from datetime import datetime
+
+from dateutil.tz import tzutc
+from freezegun import freeze_time
+from botocore.exceptions import ClientError
+
+from awslimitchecker.cloudwatch import UsageMetricsBatch
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.cloudwatch'
+
+DIMS1 = [
+    {'Name': 'foo', 'Value': 'bar'},
+    {'Name': 'baz', 'Value': 'blam'}
+]
+
+DIMS2 = [{'Name': 'foo', 'Value': 'quux'}]
+
+
+def metric_query(metric_id, dims, metric_name='ResourceCount', period=60,
+                 stat='Average'):
+    return {
+        'Id': metric_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/Usage',
+                'MetricName': metric_name,
+                'Dimensions': dims
+            },
+            'Period': period,
+            'Stat': stat
+        }
+    }
+
+
+def metric_result(metric_id, values):
+    return {
+        'Id': metric_id,
+        'Label': 'ResourceCount',
+        'Timestamps': [
+            datetime(2020, 9, 22, 12, 25 - i, tzinfo=tzutc())
+            for i in range(len(values))
+        ],
+        'Values': values,
+        'StatusCode': 'Complete'
+    }
+
+
+class TestUsageMetricsBatch(object):
+
+    def setup(self):
+        self.mock_conn = Mock()
+        self.cls = UsageMetricsBatch(self.mock_conn)
+
+    def test_init(self):
+        assert self.cls.conn == self.mock_conn
+        assert self.cls.lookback == 3600
+        assert self.cls._pending == []
+        assert self.cls._queries == {}
+        assert self.cls._values == {}
+
+    def test_key(self):
+        assert UsageMetricsBatch.key('ResourceCount', DIMS1) == (
+            'AWS/Usage', 'ResourceCount',
+            (('baz', 'blam'), ('foo', 'bar')), 60, 'Average'
+        )
+        # dimension order does not matter
+        assert UsageMetricsBatch.key(
+            'ResourceCount', list(reversed(DIMS1))
+        ) == UsageMetricsBatch.key('ResourceCount', DIMS1)
+        assert UsageMetricsBatch.key(
+            'CallCount', DIMS2, period=300, stat='Maximum', namespace='NS'
+        ) == ('NS', 'CallCount', (('foo', 'quux'),), 300, 'Maximum')
+
+    def test_add(self):
+        k1 = self.cls.add('ResourceCount', DIMS1)
+        k2 = self.cls.add('ResourceCount', DIMS2, 300, 'Maximum')
+        assert self.cls.add('ResourceCount', DIMS1) == k1
+        assert self.cls._pending == [k1, k2]
+        assert self.cls._queries == {
+            k1: metric_query('x', DIMS1)['MetricStat'],
+            k2: metric_query(
+                'x', DIMS2, period=300, stat='Maximum'
+            )['MetricStat'],
+        }
+        assert self.mock_conn.mock_calls == []
+
+    @freeze_time("2020-09-22 12:26:00", tz_offset=0)
+    def test_get(self):
+        self.mock_conn.get_metric_data.side_effect = [
+            {
+                'MetricDataResults': [
+                    metric_result('m0', [3.0, 2.0]),
+                    metric_result('m1', [])
+                ],
+                'NextToken': 'tok',
+                'Messages': []
+            },
+            {
+                'MetricDataResults': [
+                    metric_result('m1', [5.0]),
+                    metric_result('m0', [1.0])
+                ],
+                'Messages': []
+            }
+        ]
+        k1 = self.cls.add('ResourceCount', DIMS1)
+        k2 = self.cls.add('ResourceCount', DIMS2)
+        k3 = self.cls.add('Other', DIMS2)
+        assert self.cls.get(k1) == 3.0
+        assert self.cls.get(k2) == 5.0
+        assert self.cls.get(k3) is None
+        assert self.cls.get('unknown') is None
+        queries = [
+            metric_query('m0', DIMS1),
+            metric_query('m1', DIMS2),
+            metric_query('m2', DIMS2, metric_name='Other')
+        ]
+        kwargs = dict(
+            MetricDataQueries=queries,
+            StartTime=datetime(2020, 9, 22, 11, 26, 00),
+            EndTime=datetime(2020, 9, 22, 12, 26, 00),
+            ScanBy='TimestampDescending'
+        )
+        assert self.mock_conn.mock_calls == [
+            call.get_metric_data(**kwargs),
+            call.get_metric_data(NextToken='tok', **kwargs)
+        ]
+        assert self.cls._pending == []
+
+    def test_get_adds_later(self):
+        self.mock_conn.get_metric_data.side_effect = [
+            {'MetricDataResults': [metric_result('m0', [3.0])]},
+            {'MetricDataResults': [metric_result('m0', [4.0])]}
+        ]
+        k1 = self.cls.add('ResourceCount', DIMS1)
+        assert self.cls.get(k1) == 3.0
+        k2 = self.cls.add('ResourceCount', DIMS2)
+        assert self.cls.get(k2) == 4.0
+        assert self.cls.get(k1) == 3.0
+        assert len(self.mock_conn.mock_calls) == 2
+        assert self.mock_conn.mock_calls[1][2]['MetricDataQueries'] == [
+            metric_query('m0', DIMS2)
+        ]
+
+    def test_get_chunks(self):
+        self.mock_conn.get_metric_data.return_value = {'MetricDataResults': []}
+        keys = [
+            self.cls.add('ResourceCount', [{'Name': 'n', 'Value': str(i)}])
+            for i in range(1001)
+        ]
+        assert self.cls.get(keys[0]) is None
+        assert [
+            len(c[2]['MetricDataQueries'])
+            for c in self.mock_conn.mock_calls
+        ] == [500, 500, 1]
+
+    def test_get_exception(self):
+        self.mock_conn.get_metric_data.side_effect = ClientError(
+            {
+                'ResponseMetadata': {
+                    'HTTPStatusCode': 503,
+                    'RequestId': '7d74c6f0-c789-11e5-82fe-a96cdaa6d564'
+                },
+                'Error': {
+                    'Message': 'Service Unavailable',
+                    'Code': '503'
+                }
+            },
+            'GetMetricData'
+        )
+        k1 = self.cls.add('ResourceCount', DIMS1)
+        with patch('%s.logger' % pbm) as mock_logger:
+            assert self.cls.get(k1) is None
+            assert self.cls.get(k1) is None
+        assert len(self.mock_conn.mock_calls) == 1
+        assert mock_logger.mock_calls == [
+            call.debug(
+                'Querying CloudWatch GetMetricData for %d metrics', 1
+            ),
+            call.error(
+                'Error querying CloudWatch GetMetricData for %d metrics: %s',
+                1, self.mock_conn.get_metric_data.side_effect
+            )
+        ]
@@ -37,8 +37,17 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
-from awslimitchecker.connectable import Connectable, ConnectableCredentials
-from datetime import datetime
+from awslimitchecker.connectable import (
+    Connectable, ConnectableCredentials, ClientRegistry, StsCredentialCache
+)
+from awslimitchecker.ratelimit import rate_limiter as shared_rate_limiter
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+import boto3
+import pytest
+from datetime import datetime, timedelta
+from pytz import utc
 import sys
 import os
 
@@ -74,6 +83,7 @@ class ConnectableTester(Connectable):
         self.mfa_serial_number = mfa_serial_number
         self.mfa_token = mfa_token
         self.profile_name = profile_name
+        self._client_registry = ClientRegistry()
 
 
 class TestMaxRetriesConfig(object):
@@ -140,7 +150,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.client' % pbm) as mock_client:
+                with patch.object(
+                        cls._client_registry, 'client'
+                ) as mock_client:
                     with patch(
                         '%s._max_retries_config' % pb, new_callable=PropertyMock
                     ) as m_mrc:
@@ -178,7 +190,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.client' % pbm) as mock_client:
+                with patch.object(
+                        cls._client_registry, 'client'
+                ) as mock_client:
                     with patch(
                         '%s._max_retries_config' % pb, new_callable=PropertyMock
                     ) as m_mrc:
@@ -217,7 +231,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.client' % pbm) as mock_client:
+                with patch.object(
+                        cls._client_registry, 'client'
+                ) as mock_client:
                     with patch(
                             '%s._max_retries_config' % pb,
                             new_callable=PropertyMock
@@ -249,7 +265,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.resource' % pbm) as mock_resource:
+                with patch.object(
+                        cls._client_registry, 'resource'
+                ) as mock_resource:
                     with patch(
                             '%s._max_retries_config' % pb,
                             new_callable=PropertyMock
@@ -292,7 +310,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.resource' % pbm) as mock_resource:
+                with patch.object(
+                        cls._client_registry, 'resource'
+                ) as mock_resource:
                     with patch(
                             '%s._max_retries_config' % pb,
                             new_callable=PropertyMock
@@ -337,7 +357,9 @@ class Test_Connectable(object):
                    new_callable=PropertyMock, create=True) as mock_kwargs:
             mock_kwargs.return_value = kwargs
             with patch('%s.logger' % pbm) as mock_logger:
-                with patch('%s.boto3.resource' % pbm) as mock_resource:
+                with patch.object(
+                        cls._client_registry, 'resource'
+                ) as mock_resource:
                     with patch(
                             '%s._max_retries_config' % pb,
                             new_callable=PropertyMock
@@ -375,3 +397,352 @@ class TestConnectableCredentials(object):
         assert c.expiration == datetime(2015, 1, 1)
         assert c.assumed_role_id == 'roleid'
         assert c.assumed_role_arn == 'arn'
+
+    def test_to_dict(self):
+        result = {
+            'Credentials': {
+                'AccessKeyId': 'akid',
+                'SecretAccessKey': 'secret',
+                'SessionToken': 'token',
+                'Expiration': datetime(2015, 1, 1, tzinfo=utc)
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': 'roleid',
+                'Arn': 'arn'
+            }
+        }
+        res = ConnectableCredentials(result).to_dict()
+        result['Credentials']['Expiration'] = '2015-01-01T00:00:00+00:00'
+        assert res == result
+
+    def test_expires_within(self):
+        c = Mock()
+        c.expiration = datetime.now(utc) + timedelta(seconds=600)
+        assert ConnectableCredentials.expires_within(c, 300) is False
+        assert ConnectableCredentials.expires_within(c, 900) is True
+
+
+class TestStsCredentialCache(object):
+
+    def _creds(self, expiration):
+        return ConnectableCredentials({
+            'Credentials': {
+                'AccessKeyId': 'akid',
+                'SecretAccessKey': 'secret',
+                'SessionToken': 'token',
+                'Expiration': expiration
+            },
+            'AssumedRoleUser': {
+                'AssumedRoleId': 'roleid',
+                'Arn': 'arn'
+            }
+        })
+
+    def test_put_get(self, tmpdir):
+        path = str(tmpdir.join('sts'))
+        exp = datetime.now(utc).replace(microsecond=0) + timedelta(hours=1)
+        cls = StsCredentialCache(path)
+        assert cls.get('arn:role') is None
+        cls.put('arn:role', self._creds(exp))
+        assert os.stat(path).st_mode & 0o777 == 0o700
+        files = os.listdir(path)
+        assert len(files) == 1
+        assert os.stat(os.path.join(path, files[0])).st_mode & 0o777 == 0o600
+        res = StsCredentialCache(path).get('arn:role', margin=300)
+        assert res.access_key == 'akid'
+        assert res.session_token == 'token'
+        assert res.expiration == exp
+        assert cls.get('arn:role', external_id='x') is None
+        assert cls.get('arn:role', session_name='other') is None
+        assert cls.get('arn:role', margin=7200) is None
+
+    def test_get_invalid(self, tmpdir):
+        cls = StsCredentialCache(str(tmpdir))
+        cls.put('arn:role', self._creds(datetime.now(utc)))
+        with open(cls._file_path('arn:role', None, 'awslimitchecker'),
+                  'w') as fh:
+            fh.write('{')
+        with patch('%s.logger' % pbm) as mock_logger:
+            assert cls.get('arn:role') is None
+        assert len(mock_logger.warning.mock_calls) == 1
+
+    def test_put_error(self, tmpdir):
+        path = str(tmpdir.join('file'))
+        with open(path, 'w') as fh:
+            fh.write('x')
+        cls = StsCredentialCache(path)
+        with patch('%s.logger' % pbm) as mock_logger:
+            cls.put('arn:role', self._creds(datetime.now(utc)))
+        assert len(mock_logger.warning.mock_calls) == 1
+
+
+class TestClientRegistry(object):
+
+    def test_session(self):
+        cls = ClientRegistry()
+        with patch('%s.boto3.session.Session' % pbm) as mock_sess:
+            res1 = cls.session
+            res2 = cls.session
+        assert mock_sess.mock_calls == [call()]
+        assert res1 is mock_sess.return_value
+        assert res2 is mock_sess.return_value
+
+    def test_rate_limiter(self):
+        assert ClientRegistry().rate_limiter is shared_rate_limiter
+        limiter = Mock()
+        cls = ClientRegistry(session=Mock(), rate_limiter=limiter)
+        conn = cls.client('ec2', region_name='r1')
+        assert limiter.mock_calls == [call.register(conn)]
+
+    def test_region_name(self):
+        mock_sess = Mock(region_name='dflt')
+        cls = ClientRegistry(session=mock_sess)
+        assert cls.region_name('r1') == 'r1'
+        assert cls.region_name() == 'dflt'
+        assert mock_sess.mock_calls == []
+
+    def test_session_provided(self):
+        mock_sess = Mock()
+        cls = ClientRegistry(session=mock_sess)
+        assert cls.session == mock_sess
+
+    def test_client(self):
+        mock_sess = Mock()
+        mock_sess.client.side_effect = [Mock(), Mock(), Mock(), Mock()]
+        cls = ClientRegistry(session=mock_sess)
+        c1 = cls.client('ec2', region_name='r1')
+        assert cls.client('ec2', region_name='r1') is c1
+        c2 = cls.client('ec2', region_name='r2')
+        assert c2 is not c1
+        c3 = cls.client(
+            'ec2', region_name='r1', config=Config(retries={'max_attempts': 5})
+        )
+        assert c3 is not c1
+        assert cls.client(
+            'ec2', config=Config(retries={'max_attempts': 5}), region_name='r1'
+        ) is c3
+        c4 = cls.client(
+            'ec2', region_name='r1', aws_access_key_id='ak',
+            aws_secret_access_key='sk', aws_session_token='tk'
+        )
+        assert c4 not in [c1, c2, c3]
+        assert len(mock_sess.client.mock_calls) == 4
+        assert mock_sess.client.mock_calls[0] == call('ec2', region_name='r1')
+
+    def test_resource(self):
+        mock_sess = Mock()
+        cls = ClientRegistry(session=mock_sess)
+        res = cls.resource('ec2', region_name='r1')
+        cls.resource('ec2', region_name='r1')
+        assert res == mock_sess.resource.return_value
+        assert mock_sess.resource.call_args_list == [
+            call('ec2', region_name='r1'),
+            call('ec2', region_name='r1')
+        ]
+        assert len(res.meta.client.meta.events.register.mock_calls) == 10
+
+    def test_client_registers_cache(self):
+        mock_sess = Mock()
+        cls = ClientRegistry(session=mock_sess)
+        with patch.object(cls.response_cache, 'register') as mock_reg:
+            c1 = cls.client('ec2', region_name='r1')
+            cls.client('ec2', region_name='r1')
+        assert mock_reg.mock_calls == [
+            call(c1, ('ec2', ('region_name', 'r1')))
+        ]
+
+    def test_clear_cache(self):
+        mock_sess = Mock(region_name='rd')
+        cls = ClientRegistry(session=mock_sess)
+        with patch.object(cls.response_cache, 'clear') as mock_clear:
+            cls.clear_cache('r1')
+            cls.clear_cache()
+        assert mock_clear.mock_calls == [
+            call(region_name='r1'),
+            call(region_name='rd')
+        ]
+
+    def test_ec2_inventory(self):
+        cls = ClientRegistry(session=Mock())
+        conn1 = Mock()
+        conn1.meta.region_name = 'r1'
+        conn2 = Mock()
+        conn2.meta.region_name = 'r2'
+        inv1 = cls.ec2_inventory(conn1)
+        assert inv1.conn is conn1
+        assert cls.ec2_inventory(conn1) is inv1
+        inv2 = cls.ec2_inventory(conn2)
+        assert inv2 is not inv1
+        cls.clear_cache('r1')
+        assert cls.ec2_inventory(conn1) is not inv1
+        assert cls.ec2_inventory(conn2) is inv2
+
+    def test_usage_metrics(self):
+        cls = ClientRegistry(session=Mock())
+        conn1 = Mock()
+        conn1.meta.region_name = 'r1'
+        conn2 = Mock()
+        conn2.meta.region_name = 'r2'
+        batch1 = cls.usage_metrics(conn1)
+        assert batch1.conn is conn1
+        assert cls.usage_metrics(conn1) is batch1
+        batch2 = cls.usage_metrics(conn2)
+        assert batch2 is not batch1
+        cls.clear_cache('r1')
+        assert cls.usage_metrics(conn1) is not batch1
+        assert cls.usage_metrics(conn2) is batch2
+
+    def test_evict_clients(self):
+        mock_sess = Mock()
+        mock_sess.client.side_effect = [Mock(), Mock(), Mock(), Mock()]
+        cls = ClientRegistry(session=mock_sess)
+        creds1 = {
+            'aws_access_key_id': 'ak1', 'aws_secret_access_key': 'sk1',
+            'aws_session_token': 'tk1'
+        }
+        creds2 = {
+            'aws_access_key_id': 'ak2', 'aws_secret_access_key': 'sk2',
+            'aws_session_token': 'tk2'
+        }
+        c1 = cls.client('ec2', region_name='r1', **creds1)
+        c2 = cls.client('cloudwatch', region_name='r1', **creds1)
+        c3 = cls.client('ec2', region_name='r1', **creds2)
+        inv1 = cls.ec2_inventory(c1)
+        batch2 = cls.usage_metrics(c2)
+        inv3 = cls.ec2_inventory(c3)
+        cls.evict_clients('ak1')
+        assert len(cls._clients) == 1
+        assert cls.client('ec2', region_name='r1', **creds2) is c3
+        assert cls.ec2_inventory(c3) is inv3
+        assert c1 not in cls._inventories
+        assert c2 not in cls._usage_metrics
+        c4 = cls.client('ec2', region_name='r1', **creds1)
+        assert c4 is not c1
+        assert cls.ec2_inventory(c4) is not inv1
+        assert inv1.conn is c1
+        assert batch2.conn is c2
+
+
+class TestResponseCache(object):
+
+    def setup(self):
+        self.reg = ClientRegistry(session=boto3.session.Session(
+            aws_access_key_id='ak', aws_secret_access_key='sk'
+        ))
+        self.cache = self.reg.response_cache
+
+    def test_cached_within_run(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        resp = {'Reservations': [{'ReservationId': 'r-1'}]}
+        with Stubber(conn) as stub:
+            stub.add_response('describe_instances', resp, {})
+            stub.add_response('describe_instances', resp, {})
+            res1 = conn.describe_instances()
+            res1['Reservations'].append('foo')
+            res2 = conn.describe_instances()
+            # the second stubbed response was not consumed
+            assert len(stub._queue) == 1
+        assert res2['Reservations'] == [{'ReservationId': 'r-1'}]
+        assert self.cache.hits == 1
+        assert self.cache.misses == 1
+
+    def test_different_params(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_response('describe_instances', {}, {})
+            stub.add_response(
+                'describe_instances', {}, {'InstanceIds': ['i-1']}
+            )
+            conn.describe_instances()
+            conn.describe_instances(InstanceIds=['i-1'])
+            stub.assert_no_pending_responses()
+        assert self.cache.hits == 0
+
+    def test_clear(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_response('describe_instances', {}, {})
+            stub.add_response('describe_instances', {}, {})
+            conn.describe_instances()
+            self.reg.clear_cache('us-east-1')
+            conn.describe_instances()
+            stub.assert_no_pending_responses()
+        assert self.cache.hits == 0
+        assert self.cache.misses == 1
+
+    def test_clear_other_region(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_response('describe_instances', {}, {})
+            stub.add_response('describe_instances', {}, {})
+            conn.describe_instances()
+            self.cache.clear(region_name='us-west-2')
+            conn.describe_instances()
+            assert len(stub._queue) == 1
+        assert self.cache.hits == 1
+
+    def test_not_read_only(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_response('run_instances', {}, {'MinCount': 1,
+                                                    'MaxCount': 1})
+            stub.add_response('run_instances', {}, {'MinCount': 1,
+                                                    'MaxCount': 1})
+            conn.run_instances(MinCount=1, MaxCount=1)
+            conn.run_instances(MinCount=1, MaxCount=1)
+            stub.assert_no_pending_responses()
+        assert self.cache.hits == 0
+        assert self.cache.misses == 0
+
+    def test_support_not_cached(self):
+        conn = self.reg.client('support', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_response('describe_trusted_advisor_checks', {
+                'checks': []}, {'language': 'en'})
+            stub.add_response('describe_trusted_advisor_checks', {
+                'checks': []}, {'language': 'en'})
+            conn.describe_trusted_advisor_checks(language='en')
+            conn.describe_trusted_advisor_checks(language='en')
+            stub.assert_no_pending_responses()
+
+    def test_errors_not_cached(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            stub.add_client_error('describe_instances', 'Throttling')
+            stub.add_response('describe_instances', {}, {})
+            with pytest.raises(ClientError):
+                conn.describe_instances()
+            conn.describe_instances()
+            stub.assert_no_pending_responses()
+
+    def test_paginated_not_cached(self):
+        conn = self.reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            for _ in range(2):
+                stub.add_response(
+                    'describe_instances',
+                    {'Reservations': [], 'NextToken': 't1'}, {}
+                )
+                stub.add_response(
+                    'describe_instances', {'Reservations': []},
+                    {'NextToken': 't1'}
+                )
+            for _ in range(2):
+                conn.describe_instances()
+                conn.describe_instances(NextToken='t1')
+            stub.assert_no_pending_responses()
+        assert self.cache.hits == 0
+        assert self.cache.misses == 2
+        assert self.cache._responses == {}
+
+    def test_single_page_listing_cached(self):
+        conn = self.reg.client('iam', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            for _ in range(2):
+                stub.add_response(
+                    'list_roles', {'Roles': [], 'IsTruncated': False}, {}
+                )
+            conn.list_roles()
+            conn.list_roles()
+            assert len(stub._queue) == 1
+        assert self.cache.hits == 1
@@ -0,0 +1,421 @@
+"""
+awslimitchecker/tests/test_daemon.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import json
+import sys
+import threading
+
+from awslimitchecker.checker import AwsLimitChecker
+from awslimitchecker.daemon import (
+    LimitCheckerDaemon, DaemonHTTPServer, _prometheus_escape
+)
+from awslimitchecker.multiregion import MultiRegionChecker
+from awslimitchecker.trustedadvisor import TrustedAdvisor
+from .support import sample_limits
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, HTTPError
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.daemon'
+
+
+def mock_checker(region='us-east-1'):
+    limits = sample_limits()
+    checker = Mock(spec=AwsLimitChecker)
+    checker.region_name = region
+    checker.ta = Mock(spec_set=TrustedAdvisor)
+    checker.get_service_names.return_value = ['SvcFoo', 'SvcBar']
+    checker.services = {}
+    for sname, svc_limits in limits.items():
+        checker.services[sname] = Mock()
+        checker.services[sname].get_limits.return_value = svc_limits
+    lim = limits['SvcBar']['bar limit2']
+    lim._add_current_usage(50, resource_id='r1')
+    lim._warnings = lim.get_current_usage()
+    lim = limits['SvcFoo']['foo limit3']
+    lim._add_current_usage(9)
+    lim._criticals = lim.get_current_usage()
+    return checker
+
+
+class TestPrometheusEscape(object):
+
+    def test_escape(self):
+        assert _prometheus_escape('a"b\\c\nd') == 'a\\"b\\\\c\\nd'
+
+
+class TestLimitCheckerDaemon(object):
+
+    def setup(self):
+        self.checker = mock_checker()
+        self.cls = LimitCheckerDaemon(
+            self.checker, interval=300, service_intervals={'SvcFoo': 60}
+        )
+
+    def test_init(self):
+        assert self.cls.checker == self.checker
+        assert self.cls.interval == 300
+        assert self.cls.service_intervals == {'SvcFoo': 60}
+        assert self.cls.use_ta is True
+        assert self.cls.max_age is None
+        assert self.cls.services == ['SvcBar', 'SvcFoo']
+        assert self.cls._checkers == {'us-east-1': self.checker}
+        assert json.loads(self.cls.json_text().decode('utf-8')) == {
+            'last_check': None,
+            'last_check_duration': None,
+            'check_errors': 0,
+            'regions': {},
+        }
+        assert b'awslimitchecker_check_errors_total 0\n' in \
+            self.cls.metrics_text()
+
+    def test_init_service(self):
+        cls = LimitCheckerDaemon(
+            self.checker, service=['SvcFoo', 'SvcBaz'], use_ta=False,
+            max_age=600
+        )
+        assert cls.service_intervals == {}
+        assert cls.use_ta is False
+        assert cls.max_age == 600
+        assert cls.services == ['SvcFoo']
+
+    def test_init_multiregion(self):
+        checker = Mock(spec=MultiRegionChecker)
+        checker.get_service_names.return_value = ['SvcFoo']
+        checker.checkers = {'r1': Mock(), 'r2': Mock()}
+        cls = LimitCheckerDaemon(checker)
+        assert cls._checkers == checker.checkers
+
+    def test_due_services(self):
+        assert self.cls.due_services(100) == ['SvcBar', 'SvcFoo']
+        assert self.cls.seconds_until_due(100) == 0
+        self.cls._next_check = {'SvcBar': 400, 'SvcFoo': 160}
+        assert self.cls.due_services(100) == []
+        assert self.cls.seconds_until_due(100) == 60
+        assert self.cls.due_services(160) == ['SvcFoo']
+        assert self.cls.seconds_until_due(200) == 0
+
+    def test_seconds_until_due_no_services(self):
+        self.cls.services = []
+        assert self.cls.seconds_until_due(100) == 300.0
+
+    def test_check_due(self):
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.side_effect = [1000.0, 1002.5]
+            res = self.cls.check_due()
+        assert res == ['SvcBar', 'SvcFoo']
+        # usage is found and TA polled again, by check_thresholds() alone
+        assert self.checker.mock_calls == [
+            call.get_service_names(),
+            call.ta.expire_limits(),
+            call.check_thresholds(
+                service=['SvcBar', 'SvcFoo'], use_ta=True, max_age=None
+            )
+        ]
+        assert self.cls._next_check == {'SvcBar': 1300.0, 'SvcFoo': 1060.0}
+        assert json.loads(self.cls.json_text().decode('utf-8')) == {
+            'last_check': 1002.5,
+            'last_check_duration': 2.5,
+            'check_errors': 0,
+            'regions': {
+                'us-east-1': {
+                    'SvcBar': {
+                        'checked_at': 1002.5,
+                        'limits': {
+                            'barlimit1': {
+                                'limit': 1,
+                                'source': 'default',
+                                'usage': [],
+                                'max_usage': None,
+                                'status': 'ok',
+                            },
+                            'bar limit2': {
+                                'limit': 99,
+                                'source': 'override',
+                                'usage': [{
+                                    'resource_id': 'r1',
+                                    'value': 50,
+                                    'maximum': None,
+                                }],
+                                'max_usage': 50,
+                                'status': 'warning',
+                            },
+                        },
+                    },
+                    'SvcFoo': {
+                        'checked_at': 1002.5,
+                        'limits': {
+                            'foo limit3': {
+                                'limit': 10,
+                                'source': 'ta',
+                                'usage': [{
+                                    'resource_id': None,
+                                    'value': 9,
+                                    'maximum': None,
+                                }],
+                                'max_usage': 9,
+                                'status': 'critical',
+                            },
+                        },
+                    },
+                },
+            },
+        }
+        labels_b1 = 'region="us-east-1",service="SvcBar",limit="barlimit1"'
+        labels_b2 = 'region="us-east-1",service="SvcBar",limit="bar limit2"'
+        labels_f3 = 'region="us-east-1",service="SvcFoo",limit="foo limit3"'
+        assert self.cls.metrics_text().decode('utf-8') == '\n'.join([
+            '# HELP awslimitchecker_limit Current value of the limit',
+            '# TYPE awslimitchecker_limit gauge',
+            'awslimitchecker_limit{%s} 99' % labels_b2,
+            'awslimitchecker_limit{%s} 1' % labels_b1,
+            'awslimitchecker_limit{%s} 10' % labels_f3,
+            '# HELP awslimitchecker_usage Highest current usage of the limit',
+            '# TYPE awslimitchecker_usage gauge',
+            'awslimitchecker_usage{%s} 50' % labels_b2,
+            'awslimitchecker_usage{%s} 9' % labels_f3,
+            '# HELP awslimitchecker_threshold_status Threshold status of the '
+            'limit (0=ok, 1=warning, 2=critical, 3=incomplete)',
+            '# TYPE awslimitchecker_threshold_status gauge',
+            'awslimitchecker_threshold_status{%s} 1' % labels_b2,
+            'awslimitchecker_threshold_status{%s} 0' % labels_b1,
+            'awslimitchecker_threshold_status{%s} 2' % labels_f3,
+            '# HELP awslimitchecker_service_last_check_timestamp_seconds '
+            'Time that the service was last checked',
+            '# TYPE awslimitchecker_service_last_check_timestamp_seconds '
+            'gauge',
+            'awslimitchecker_service_last_check_timestamp_seconds'
+            '{region="us-east-1",service="SvcBar"} 1002.5',
+            'awslimitchecker_service_last_check_timestamp_seconds'
+            '{region="us-east-1",service="SvcFoo"} 1002.5',
+            '# HELP awslimitchecker_check_errors_total Number of failed '
+            'checks',
+            '# TYPE awslimitchecker_check_errors_total counter',
+            'awslimitchecker_check_errors_total 0',
+            '# HELP awslimitchecker_last_check_timestamp_seconds Time that '
+            'the last successful check finished',
+            '# TYPE awslimitchecker_last_check_timestamp_seconds gauge',
+            'awslimitchecker_last_check_timestamp_seconds 1002.5',
+            '# HELP awslimitchecker_last_check_duration_seconds Duration of '
+            'the last successful check',
+            '# TYPE awslimitchecker_last_check_duration_seconds gauge',
+            'awslimitchecker_last_check_duration_seconds 2.5',
+        ]) + '\n'
+
+    def test_check_due_partial(self):
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.side_effect = [1000.0, 1001.0, 1070.0, 1071.0]
+            self.cls.check_due()
+            res = self.cls.check_due()
+        assert res == ['SvcFoo']
+        assert self.checker.find_usage.mock_calls == []
+        assert self.checker.check_thresholds.mock_calls == [
+            call(service=['SvcBar', 'SvcFoo'], use_ta=True, max_age=None),
+            call(service=['SvcFoo'], use_ta=True, max_age=None)
+        ]
+        assert self.cls._next_check == {'SvcBar': 1300.0, 'SvcFoo': 1130.0}
+        data = json.loads(self.cls.json_text().decode('utf-8'))
+        assert data['last_check'] == 1071.0
+        assert data['regions']['us-east-1']['SvcBar']['checked_at'] == 1001.0
+        assert data['regions']['us-east-1']['SvcFoo']['checked_at'] == 1071.0
+
+    def test_check_due_incomplete(self):
+        lim = self.checker.services['SvcFoo'].get_limits()['foo limit3']
+        lim._set_incomplete('timed out')
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.side_effect = [1000.0, 1002.5]
+            self.cls.check_due()
+        data = json.loads(self.cls.json_text().decode('utf-8'))
+        assert data['regions']['us-east-1']['SvcFoo']['limits'][
+            'foo limit3'] == {
+            'limit': 10,
+            'source': 'ta',
+            'usage': [],
+            'max_usage': None,
+            'status': 'incomplete',
+        }
+        assert ('awslimitchecker_threshold_status{region="us-east-1",'
+                'service="SvcFoo",limit="foo limit3"} 3\n') in \
+            self.cls.metrics_text().decode('utf-8')
+
+    def test_check_due_expires(self):
+        svc_foo = self.checker.services['SvcFoo']
+        svc_bar = self.checker.services['SvcBar']
+        svc_foo._have_usage = True
+        svc_bar._have_usage = True
+        self.cls._next_check = {'SvcBar': 2000.0, 'SvcFoo': 0}
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            self.cls.check_due()
+        assert svc_foo._have_usage is False
+        assert svc_bar._have_usage is True
+        assert self.checker.ta.mock_calls == [call.expire_limits()]
+
+    def test_check_due_no_ta(self):
+        self.cls.use_ta = False
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            self.cls.check_due()
+        assert self.checker.ta.mock_calls == []
+        assert self.checker.check_thresholds.mock_calls == [
+            call(service=['SvcBar', 'SvcFoo'], use_ta=False, max_age=None)
+        ]
+
+    def test_check_due_none(self):
+        self.cls._next_check = {'SvcBar': 2000.0, 'SvcFoo': 2000.0}
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            res = self.cls.check_due()
+        assert res == []
+        assert self.checker.find_usage.mock_calls == []
+        assert self.checker.check_thresholds.mock_calls == []
+
+    def test_check_due_exception(self):
+        self.checker.check_thresholds.side_effect = RuntimeError('foo')
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            with patch('%s.logger' % pbm) as mock_logger:
+                res = self.cls.check_due()
+        assert res == ['SvcBar', 'SvcFoo']
+        assert mock_logger.mock_calls == [
+            call.info('Checking services: %s', 'SvcBar, SvcFoo'),
+            call.error('Error checking services: %s', 'SvcBar, SvcFoo',
+                       exc_info=True)
+        ]
+        assert self.cls._next_check == {'SvcBar': 1300.0, 'SvcFoo': 1060.0}
+        data = json.loads(self.cls.json_text().decode('utf-8'))
+        assert data['check_errors'] == 1
+        assert data['regions'] == {}
+        assert b'awslimitchecker_check_errors_total 1\n' in \
+            self.cls.metrics_text()
+
+    def test_run_scheduler(self):
+        def se_check():
+            if len(mock_check.mock_calls) > 1:
+                self.cls.stop()
+
+        with patch.object(self.cls, 'check_due') as mock_check:
+            mock_check.side_effect = se_check
+            with patch.object(self.cls, '_stopping') as mock_stopping:
+                mock_stopping.is_set.side_effect = [False, False, True]
+                with patch.object(self.cls, 'seconds_until_due') as mock_sud:
+                    mock_sud.return_value = 12
+                    self.cls.run_scheduler()
+        assert mock_check.mock_calls == [call(), call()]
+        assert mock_stopping.mock_calls == [
+            call.is_set(),
+            call.wait(12),
+            call.is_set(),
+            call.set(),
+            call.wait(12),
+            call.is_set()
+        ]
+
+    def test_serve(self):
+        with patch('%s.DaemonHTTPServer' % pbm, autospec=True) as mock_srv:
+            with patch('%s.threading.Thread' % pbm, autospec=True) as m_thr:
+                mock_srv.return_value.serve_forever.side_effect = \
+                    KeyboardInterrupt
+                self.cls.serve('0.0.0.0', 9000)
+        assert mock_srv.mock_calls == [
+            call(('0.0.0.0', 9000), self.cls),
+            call().serve_forever(),
+            call().server_close()
+        ]
+        assert m_thr.mock_calls == [
+            call(target=self.cls.run_scheduler,
+                 name='awslimitchecker-scheduler'),
+            call().start()
+        ]
+        assert m_thr.return_value.daemon is True
+        assert self.cls._stopping.is_set() is True
+
+
+class TestDaemonHTTPServer(object):
+
+    def setup(self):
+        self.daemon = Mock(spec_set=LimitCheckerDaemon)
+        self.daemon.metrics_text.return_value = b'metrics\n'
+        self.daemon.json_text.return_value = b'{}'
+        self.server = DaemonHTTPServer(('127.0.0.1', 0), self.daemon)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def teardown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_metrics(self):
+        resp = urlopen(self.url + '/metrics')
+        assert resp.getcode() == 200
+        assert resp.headers['Content-Type'] == \
+            'text/plain; version=0.0.4; charset=utf-8'
+        assert resp.read() == b'metrics\n'
+        assert self.daemon.mock_calls == [call.metrics_text()]
+
+    def test_json(self):
+        for path in ['/', '/json?pretty=1']:
+            resp = urlopen(self.url + path)
+            assert resp.getcode() == 200
+            assert resp.headers['Content-Type'] == 'application/json'
+            assert resp.read() == b'{}'
+        assert self.daemon.mock_calls == [call.json_text(), call.json_text()]
+
+    def test_not_found(self):
+        try:
+            urlopen(self.url + '/foo')
+            raise AssertionError('expected HTTPError')
+        except HTTPError as ex:
+            assert ex.code == 404
+        assert self.daemon.mock_calls == []
@@ -0,0 +1,133 @@
+"""
+awslimitchecker/tests/test_inventory.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from awslimitchecker.inventory import Ec2Inventory
+from awslimitchecker.connectable import ClientRegistry
+from awslimitchecker.services.ec2 import _Ec2Service
+from awslimitchecker.services.vpc import _VpcService
+import sys
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import call, Mock
+else:
+    from unittest.mock import call, Mock
+
+
+class TestEc2Inventory(object):
+
+    def setup(self):
+        self.mock_conn = Mock()
+        self.cls = Ec2Inventory(self.mock_conn)
+
+    def test_network_interfaces(self):
+        self.mock_conn.describe_network_interfaces.side_effect = [
+            {'NetworkInterfaces': [{'a': 1}], 'NextToken': 't1'},
+            {'NetworkInterfaces': [{'b': 2}]}
+        ]
+        assert self.cls.network_interfaces == [{'a': 1}, {'b': 2}]
+        assert self.cls.network_interfaces == [{'a': 1}, {'b': 2}]
+        assert self.mock_conn.mock_calls == [
+            call.describe_network_interfaces(),
+            call.describe_network_interfaces(NextToken='t1')
+        ]
+
+    def test_security_groups(self):
+        self.mock_conn.describe_security_groups.return_value = {
+            'SecurityGroups': [{'GroupId': 'sg-1'}]
+        }
+        assert self.cls.security_groups == [{'GroupId': 'sg-1'}]
+        assert self.cls.security_groups == [{'GroupId': 'sg-1'}]
+        assert self.mock_conn.mock_calls == [call.describe_security_groups()]
+
+    def test_subnets(self):
+        self.mock_conn.describe_subnets.return_value = {
+            'Subnets': [{'SubnetId': 's-1'}]
+        }
+        assert self.cls.subnets == [{'SubnetId': 's-1'}]
+        assert self.cls.subnets == [{'SubnetId': 's-1'}]
+        assert self.mock_conn.mock_calls == [call.describe_subnets()]
+
+    def test_vpcs(self):
+        self.mock_conn.describe_vpcs.return_value = {
+            'Vpcs': [{'VpcId': 'vpc-1'}]
+        }
+        assert self.cls.vpcs == [{'VpcId': 'vpc-1'}]
+        assert self.cls.vpcs == [{'VpcId': 'vpc-1'}]
+        assert self.mock_conn.mock_calls == [call.describe_vpcs()]
+
+    def test_addresses(self):
+        self.mock_conn.describe_addresses.return_value = {
+            'Addresses': [{'Domain': 'vpc'}],
+            'NextToken': 'ignored'
+        }
+        assert self.cls.addresses == [{'Domain': 'vpc'}]
+        assert self.cls.addresses == [{'Domain': 'vpc'}]
+        assert self.mock_conn.mock_calls == [call.describe_addresses()]
+
+    def test_shared_by_services(self):
+        reg = ClientRegistry(session=Mock())
+        self.mock_conn.describe_network_interfaces.return_value = {
+            'NetworkInterfaces': [
+                {
+                    'NetworkInterfaceId': 'eni-1',
+                    'OwnerId': '0123456789',
+                    'VpcId': 'vpc-1',
+                    'Groups': [{'GroupId': 'sg-1'}]
+                }
+            ]
+        }
+        ec2 = _Ec2Service(21, 43, {}, None, client_registry=reg)
+        ec2.conn = self.mock_conn
+        vpc = _VpcService(21, 43, {}, None, client_registry=reg)
+        vpc.conn = self.mock_conn
+        vpc._current_account_id = '0123456789'
+        ec2._find_usage_networking_eni_sg()
+        vpc._find_usage_network_interfaces()
+        assert self.mock_conn.mock_calls == [
+            call.describe_network_interfaces()
+        ]
+        lim = ec2.limits['VPC security groups per elastic network interface']
+        assert lim.get_current_usage()[0].get_value() == 1
+        lim = vpc.limits['Network interfaces per Region']
+        assert lim.get_current_usage()[0].get_value() == 1
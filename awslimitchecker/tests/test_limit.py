@@ -40,7 +40,7 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 import pytest
 import sys
 from awslimitchecker.limit import (
-    AwsLimit, AwsLimitUsage, SOURCE_DEFAULT, SOURCE_OVERRIDE,
+    AwsLimit, AwsLimitUsage, UsageSummary, SOURCE_DEFAULT, SOURCE_OVERRIDE,
     SOURCE_TA, SOURCE_API, SOURCE_QUOTAS
 )
 from awslimitchecker.services.base import _AwsService
@@ -55,6 +55,8 @@ if (
 else:
     from unittest.mock import patch, call, Mock
 
+pbm = 'awslimitchecker.limit'
+
 
 class AwsLimitTester(object):
 
@@ -271,6 +273,340 @@ class TestAddCurrentUsage(AwsLimitTester):
         assert len(limit.get_current_usage()) == 2
         assert limit._current_usage[1].get_value() == 4
 
+    def test_abandoned(self):
+        limit = AwsLimit(
+            'limitname',
+            self.mock_svc,
+            3,
+            1,
+            2
+        )
+        with patch('%s.current_call_abandoned' % pbm) as mock_abandoned:
+            mock_abandoned.return_value = True
+            limit._add_current_usage(2)
+        assert limit._current_usage == []
+
+    def test_aws_type_interned(self):
+        limit = AwsLimit(
+            'limitname',
+            self.mock_svc,
+            3,
+            1,
+            2
+        )
+        # build equal strings at runtime, as if loaded from a snapshot
+        type1 = ''.join(['AWS::EC2::', 'SecurityGroup'])
+        type2 = ''.join(['AWS::EC2::', 'SecurityGroup'])
+        assert type1 is not type2
+        limit._add_current_usage(2, resource_id='sg-1', aws_type=type1)
+        limit._add_current_usage(3, resource_id='sg-2', aws_type=type2)
+        limit._add_current_usage(4)
+        usage = limit.get_current_usage()
+        assert usage[0].aws_type is usage[1].aws_type
+        assert usage[1].aws_type == 'AWS::EC2::SecurityGroup'
+        assert usage[2].aws_type is None
+
+
+class TestIncomplete(AwsLimitTester):
+
+    def test_set_incomplete(self):
+        limit = AwsLimit(
+            'limitname',
+            self.mock_svc,
+            3,
+            1,
+            2
+        )
+        assert limit.is_incomplete() is False
+        assert limit.get_incomplete_reason() is None
+        limit._add_current_usage(2)
+        assert limit.check_thresholds() is False
+        limit._set_incomplete('timed out')
+        assert limit.is_incomplete() is True
+        assert limit.get_incomplete_reason() == 'timed out'
+        assert limit.get_current_usage() == []
+        assert limit.get_current_usage_str() == '<incomplete>'
+        # the previous threshold results are discarded with the usage
+        assert limit.get_warnings() == []
+        assert limit.get_criticals() == []
+
+    def test_reset_usage_clears(self):
+        limit = AwsLimit(
+            'limitname',
+            self.mock_svc,
+            3,
+            1,
+            2
+        )
+        limit._set_incomplete('timed out')
+        limit._reset_usage()
+        assert limit.is_incomplete() is False
+        assert limit.get_current_usage_str() == '<unknown>'
+
+    def test_reset_usage_abandoned(self):
+        limit = AwsLimit(
+            'limitname',
+            self.mock_svc,
+            3,
+            1,
+            2
+        )
+        limit._set_incomplete('timed out')
+        with patch('%s.current_call_abandoned' % pbm) as mock_abandoned:
+            mock_abandoned.return_value = True
+            limit._reset_usage()
+        assert limit.is_incomplete() is True
+
+
+class TestUsageRetention(AwsLimitTester):
+
+    def values(self, usages):
+        return sorted(u.resource_id for u in usages)
+
+    def test_default(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        for i in range(20):
+            limit._add_current_usage(i, resource_id='r%02d' % i)
+        assert len(limit.get_current_usage()) == 20
+        summary = limit.get_usage_summary()
+        assert summary.count == 20
+        assert summary.maximum == 19
+        assert summary.histogram == [10, 10] + [0] * 9
+        assert limit._usage_summary is None
+
+    def test_top_k(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(3)
+        for i in [5, 50, 1, 70, 20, 60, 10]:
+            limit._add_current_usage(i, resource_id='r%02d' % i)
+        assert self.values(limit.get_current_usage()) == [
+            'r50', 'r60', 'r70'
+        ]
+        assert len(limit._retained) == 3
+        summary = limit.get_usage_summary()
+        assert summary.count == 7
+        assert summary.maximum == 70
+        assert summary.histogram == [2, 1, 1, 0, 0, 1, 1, 1, 0, 0, 0]
+        assert limit.get_current_usage_str() == \
+            'max: r70=70 (r50=50, r60=60, r70=70; 4 more not retained)'
+
+    def test_keeps_all_crossings(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        for i in [85, 10, 99, 90, 20, 30, 100]:
+            limit._add_current_usage(i, resource_id='r%03d' % i)
+        assert self.values(limit.get_current_usage()) == [
+            'r030', 'r085', 'r090', 'r099', 'r100'
+        ]
+        assert limit.check_thresholds() is False
+        assert self.values(limit.get_warnings()) == ['r085', 'r090']
+        assert self.values(limit.get_criticals()) == ['r099', 'r100']
+
+    def test_count_thresholds_and_maximum(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_threshold_override(warn_count=40)
+        limit.set_usage_retention(1)
+        # utilization is relative to each resource's maximum
+        limit._add_current_usage(5, maximum=10, resource_id='a')
+        limit._add_current_usage(30, maximum=1000, resource_id='b')
+        limit._add_current_usage(45, maximum=1000, resource_id='c')
+        limit._add_current_usage(1, maximum=2, resource_id='d')
+        assert self.values(limit.get_current_usage()) == ['a', 'c']
+        limit._add_current_usage(7, maximum=10, resource_id='e')
+        assert self.values(limit.get_current_usage()) == ['c', 'e']
+
+    def test_unknown_limit(self):
+        limit = AwsLimit('limitname', self.mock_svc, None, 80, 99)
+        limit.set_usage_retention(2)
+        for i in [3, 1, 4, 1, 5]:
+            limit._add_current_usage(i, resource_id='r%d' % i)
+        assert self.values(limit.get_current_usage()) == ['r4', 'r5']
+        summary = limit.get_usage_summary()
+        assert summary.count == 5
+        assert summary.maximum == 5
+        assert summary.histogram == [0] * 11
+
+    def test_ties(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(2)
+        # equal usages compare equal; the evicted one is found by identity
+        for rid in ['a', 'b', 'c']:
+            limit._add_current_usage(10, resource_id=rid)
+        limit._add_current_usage(20, resource_id='d')
+        assert [u.resource_id for u in limit.get_current_usage()] == [
+            'b', 'd'
+        ]
+
+    def test_set_after_usage(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        for i in [5, 50, 90, 70]:
+            limit._add_current_usage(i, resource_id='r%02d' % i)
+        limit.set_usage_retention(1)
+        assert self.values(limit.get_current_usage()) == ['r70', 'r90']
+        assert limit.get_usage_summary().count == 4
+        limit.set_usage_retention(None)
+        assert self.values(limit.get_current_usage()) == ['r70', 'r90']
+        assert limit._usage_summary is None
+        assert limit._retained == []
+
+    def test_reset(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        limit._add_current_usage(5)
+        limit._add_current_usage(6)
+        limit._reset_usage()
+        assert limit.get_current_usage() == []
+        assert limit._retained == []
+        assert limit.get_usage_summary().count == 0
+        limit._add_current_usage(7)
+        limit._set_incomplete('timed out')
+        assert limit.get_current_usage() == []
+        assert limit.get_usage_summary().count == 0
+
+    def test_single_retained(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        limit._add_current_usage(5)
+        assert limit.get_current_usage_str() == '5'
+        limit._add_current_usage(6)
+        assert limit.get_current_usage_str() == \
+            'max: 6 (6; 1 more not retained)'
+
+    def test_limit_lowered_after_usage(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        limit._add_current_usage(50, resource_id='a')
+        limit._add_current_usage(60, resource_id='b')
+        assert self.values(limit.get_current_usage()) == ['b']
+        assert limit.check_thresholds() is True
+        limit._set_ta_limit(55)
+        with patch('%s.logger' % pbm) as mock_logger:
+            assert limit.check_thresholds() is False
+        assert self.values(limit.get_warnings()) == ['a']
+        assert self.values(limit.get_criticals()) == ['b']
+        # 'a' was the only value not retained, so nothing else was missed
+        assert mock_logger.mock_calls == []
+
+    def test_limit_lowered_more_not_retained(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        for i in [40, 10, 60, 50, 20]:
+            limit._add_current_usage(i, resource_id='r%02d' % i)
+        assert self.values(limit.get_current_usage()) == ['r60']
+        # the next top_k values are kept for re-evaluation; only the
+        # maxima of the rest
+        assert self.values(limit._usage_to_check()) == ['r50', 'r60']
+        assert limit._lost == (None, None, 40)
+        limit._set_ta_limit(55)
+        with patch('%s.logger' % pbm) as mock_logger:
+            assert limit.check_thresholds() is False
+        assert self.values(limit.get_warnings()) == ['r50']
+        assert self.values(limit.get_criticals()) == ['r60']
+        assert limit.is_incomplete() is False
+        assert mock_logger.mock_calls == []
+        # now the discarded 40 may cross the warning threshold too
+        limit._set_ta_limit(45)
+        with patch('%s.logger' % pbm) as mock_logger:
+            assert limit.check_thresholds() is False
+        assert self.values(limit.get_warnings()) == []
+        assert self.values(limit.get_criticals()) == ['r50', 'r60']
+        assert limit.is_incomplete() is True
+        assert limit.get_incomplete_reason() == (
+            'usage values that were not retained may cross a threshold '
+            'since the limit or thresholds changed; disable usage retention '
+            'to see them'
+        )
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Usage values of %s limit "%s" that were not retained may '
+                'cross a threshold since the limit or thresholds changed',
+                'mysname', 'limitname'
+            )
+        ]
+        limit._reset_usage()
+        assert limit._dropped == []
+        assert limit._lost is None
+        assert limit.is_incomplete() is False
+        assert limit.check_thresholds() is True
+
+    def test_lost_incomplete_without_crossings(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        limit.set_usage_retention(1)
+        for i in [1, 2, 3, 4]:
+            limit._add_current_usage(i, resource_id='r%d' % i)
+        assert limit._lost == (None, None, 2)
+        limit.set_threshold_override(warn_count=2)
+        with patch('%s.logger' % pbm):
+            # r3 and r4 are reported; r2 may cross but was discarded
+            assert limit.check_thresholds() is False
+        assert self.values(limit.get_warnings()) == ['r3', 'r4']
+        assert limit.is_incomplete() is True
+        limit.set_threshold_override(warn_count=5)
+        assert limit.check_thresholds() is True
+        assert limit.is_incomplete() is False
+
+    def test_lost_maximum_and_unknown_limit(self):
+        limit = AwsLimit('limitname', self.mock_svc, None, 80, 99)
+        limit.set_usage_retention(1)
+        limit._add_current_usage(1, maximum=10, resource_id='a')
+        limit._add_current_usage(2, maximum=10, resource_id='b')
+        limit._add_current_usage(3, maximum=10, resource_id='c')
+        limit._add_current_usage(50, resource_id='d')
+        limit._add_current_usage(40, resource_id='e')
+        limit._add_current_usage(30, resource_id='f')
+        # 'b' is the top dropped usage; 'a' and 'd'-'f' are summarized
+        assert limit._lost == (1, 0.1, 50)
+        # usage without a maximum is not evaluated while the limit is unknown
+        limit.set_threshold_override(warn_count=25)
+        assert limit.check_thresholds() is True
+        assert limit.is_incomplete() is False
+        limit._set_ta_limit(1000)
+        with patch('%s.logger' % pbm):
+            assert limit.check_thresholds() is False
+        assert limit.is_incomplete() is True
+        # 'a' is at 10% of its maximum
+        limit.set_threshold_override(warn_count=None, warn_percent=8)
+        with patch('%s.logger' % pbm):
+            assert limit.check_thresholds() is False
+        assert limit.is_incomplete() is True
+        limit.set_threshold_override(warn_count=None, warn_percent=35)
+        assert limit.check_thresholds() is True
+        assert limit.is_incomplete() is False
+
+    def test_invalid(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 80, 99)
+        with pytest.raises(ValueError) as excinfo:
+            limit.set_usage_retention(0)
+        assert str(excinfo.value) == 'top_k must be at least 1'
+
+
+class TestUsageSummary(object):
+
+    def test_add(self):
+        s = UsageSummary()
+        assert s.count == 0
+        assert s.maximum is None
+        s.add(5, 10)
+        s.add(12, 10)
+        s.add(-1, 10)
+        s.add(3, None)
+        s.add(3, 0)
+        assert s.count == 5
+        assert s.maximum == 12
+        assert s.histogram == [1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1]
+
+    def test_utilization_percentile(self):
+        s = UsageSummary()
+        assert s.utilization_percentile(50) is None
+        for value in [1, 2, 3, 55, 95, 96]:
+            s.add(value, 100)
+        assert s.utilization_percentile(0) == 0
+        assert s.utilization_percentile(50) == 0
+        assert s.utilization_percentile(60) == 50
+        assert s.utilization_percentile(90) == 90
+        assert s.utilization_percentile(100) == 90
+        assert s.utilization_percentile(150) == 90
+
 
 class TestGetCurrentUsage(AwsLimitTester):
 
@@ -521,7 +857,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == []
         assert limit._criticals == []
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_ta_unlimited(self):
         limit = AwsLimit('limitname', self.mock_svc, 3, 1, 2)
@@ -541,7 +877,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == []
         assert limit._criticals == []
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_ta_zero(self):
         limit = AwsLimit('limitname', self.mock_svc, 3, 1, 2)
@@ -561,7 +897,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == []
         assert limit._criticals == []
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_pct_warn(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -580,7 +916,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == [u2]
         assert limit._criticals == []
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_int_warn(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -599,7 +935,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == [u1]
         assert limit._criticals == []
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_int_warn_crit(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -618,7 +954,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == [u1]
         assert limit._criticals == [u3]
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_pct_crit(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -637,7 +973,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == []
         assert limit._criticals == [u3]
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_int_crit(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -656,7 +992,7 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == []
         assert limit._criticals == [u1, u3]
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
 
     def test_pct_warn_crit(self):
         limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
@@ -675,7 +1011,71 @@ class TestCheckThresholds(AwsLimitTester):
         assert limit._warnings == [u1]
         assert limit._criticals == [u3]
         assert mock_get_thresh.mock_calls == [call()]
-        assert mock_get_limit.mock_calls == [call(), call(), call()]
+        assert mock_get_limit.mock_calls == [call()]
+
+    def test_repeated(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 1, 2)
+        u1 = AwsLimitUsage(limit, 50, resource_id='foo4bar')
+        u2 = AwsLimitUsage(limit, 95, resource_id='foo2bar')
+        limit._current_usage = [u1, u2]
+        with patch('awslimitchecker.limit.AwsLimit.'
+                   '_get_thresholds') as mock_get_thresh:
+            with patch('awslimitchecker.limit.AwsLimit.get_'
+                       'limit') as mock_get_limit:
+                mock_get_thresh.return_value = (None, 40, None, 80)
+                mock_get_limit.return_value = 100
+                assert limit.check_thresholds() is False
+                limit._reset_usage()
+                limit._store_usage(u1)
+                res = limit.check_thresholds()
+        assert res is False
+        assert limit._warnings == [u1]
+        assert limit._criticals == []
+
+    def test_unchanged(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 40, 80)
+        limit._add_current_usage(50)
+        limit._add_current_usage(95)
+        assert limit.check_thresholds() is False
+        warnings = limit.get_warnings()
+        criticals = limit.get_criticals()
+        with patch('awslimitchecker.limit.AwsLimitUsage.'
+                   'get_value') as mock_get_value:
+            assert limit.check_thresholds() is False
+        assert mock_get_value.mock_calls == []
+        assert limit.get_warnings() is warnings
+        assert limit.get_criticals() is criticals
+
+    def test_changed(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 40, 80)
+        limit._add_current_usage(50)
+        assert limit.check_thresholds() is False
+        assert len(limit.get_warnings()) == 1
+        # limit override
+        limit.set_limit_override(200)
+        assert limit.check_thresholds() is True
+        assert limit.get_warnings() == []
+        # threshold override
+        limit.set_threshold_override(warn_percent=20, crit_percent=90)
+        assert limit.check_thresholds() is False
+        assert len(limit.get_warnings()) == 1
+        # new usage
+        limit._add_current_usage(190)
+        assert limit.check_thresholds() is False
+        assert len(limit.get_criticals()) == 1
+        # reset usage
+        limit._reset_usage()
+        assert limit.check_thresholds() is True
+        assert limit.get_warnings() == []
+        assert limit.get_criticals() == []
+
+    def test_set_results_without_key(self):
+        limit = AwsLimit('limitname', self.mock_svc, 100, 40, 80)
+        limit._add_current_usage(50)
+        assert limit.check_thresholds() is False
+        limit._set_threshold_results([], [])
+        assert limit.check_thresholds() is False
+        assert len(limit.get_warnings()) == 1
 
 
 class TestGetWarnings(AwsLimitTester):
@@ -820,6 +1220,12 @@ class TestAwsLimitUsage(object):
         assert u2.resource_id == 'foobar'
         assert u2.aws_type == 'mytype'
 
+    def test_slots(self):
+        u = AwsLimitUsage(Mock(spec_set=AwsLimit), 3)
+        assert not hasattr(u, '__dict__')
+        with pytest.raises(AttributeError):
+            u.foo = 'bar'
+
     def test_get_value(self):
         mock_limit = Mock(spec_set=AwsLimit)
         u = AwsLimitUsage(
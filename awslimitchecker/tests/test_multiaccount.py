@@ -0,0 +1,411 @@
+"""
+awslimitchecker/tests/test_multiaccount.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import sys
+import os
+import json
+import pytest
+
+from awslimitchecker.limit import AwsLimit
+from awslimitchecker.multiaccount import (
+    MultiAccountConfig, MultiAccountChecker, AccountRegionResult,
+    check_account_region, parse_args, console_entry_point
+)
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.multiaccount'
+
+
+def write_config(base):
+    """
+    Write a configuration directory with two accounts under ``base``, and
+    return its path.
+    """
+    conf = {
+        '111111111111': {
+            'config.json': {'name': 'acctOne'},
+            'us-east-1': {
+                'limit_overrides.json': {'EC2': {'lim': 10}},
+                'threshold_overrides.json': {
+                    'EC2': {'lim': {'warning': {'percent': 50}}}
+                }
+            },
+            'us-west-2': {}
+        },
+        '222222222222': {
+            'config.json': {'name': 'acctTwo', 'role_name': None},
+            'eu-central-1': {
+                'limit_overrides.json': {'RDS': {'DB Clusters': 50}}
+            }
+        }
+    }
+    path = os.path.join(str(base), 'config')
+    os.mkdir(path)
+    # ignored: not a directory, and not an account ID
+    with open(os.path.join(path, 'README'), 'w') as fh:
+        fh.write('foo')
+    os.mkdir(os.path.join(path, 'notanaccount'))
+    for acct, data in conf.items():
+        apath = os.path.join(path, acct)
+        os.mkdir(apath)
+        for name, val in data.items():
+            if name.endswith('.json'):
+                with open(os.path.join(apath, name), 'w') as fh:
+                    fh.write(json.dumps(val))
+                continue
+            os.mkdir(os.path.join(apath, name))
+            for fname, fval in val.items():
+                with open(os.path.join(apath, name, fname), 'w') as fh:
+                    fh.write(json.dumps(fval))
+    return path
+
+
+class TestMultiAccountConfig(object):
+
+    def test_load(self, tmpdir):
+        cls = MultiAccountConfig(write_config(tmpdir), default_role_name='ro')
+        assert cls.list_account_ids == ['111111111111', '222222222222']
+        assert cls.get_account_config('111111111111') == {
+            'account_id': '111111111111',
+            'name': 'acctOne',
+            'role_name': 'ro',
+            'regions': {
+                'us-east-1': {
+                    'limit_overrides': {'EC2': {'lim': 10}},
+                    'threshold_overrides': {
+                        'EC2': {'lim': {'warning': {'percent': 50}}}
+                    }
+                },
+                'us-west-2': {
+                    'limit_overrides': {},
+                    'threshold_overrides': {}
+                }
+            }
+        }
+        assert cls.get_account_config('acctTwo') == {
+            'account_id': '222222222222',
+            'name': 'acctTwo',
+            'role_name': None,
+            'regions': {
+                'eu-central-1': {
+                    'limit_overrides': {'RDS': {'DB Clusters': 50}},
+                    'threshold_overrides': {}
+                }
+            }
+        }
+
+    def test_unknown_account(self, tmpdir):
+        cls = MultiAccountConfig(write_config(tmpdir))
+        with pytest.raises(KeyError):
+            cls.get_account_config('foo')
+
+
+class TestCheckAccountRegion(object):
+
+    def test_role(self):
+        lim1 = Mock(spec_set=AwsLimit)
+        lim1.get_warnings.return_value = [50]
+        lim1.get_criticals.return_value = []
+        lim1.get_limit.return_value = 60
+        lim2 = Mock(spec_set=AwsLimit)
+        lim2.get_warnings.return_value = []
+        lim2.get_criticals.return_value = [9, 10]
+        lim2.get_limit.return_value = 10
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            mock_alc.return_value.check_thresholds.return_value = {
+                'SvcB': {'limB': lim2},
+                'SvcA': {'limA': lim1}
+            }
+            res = check_account_region(
+                '123', 'r1', role_name='myrole',
+                limit_overrides={'SvcA': {'limA': 60}},
+                checker_kwargs={'check_version': False}, use_ta=False
+            )
+        assert res == (
+            ["SvcA 'limA' usage (50) exceeds warning threshold (limit=60)"],
+            [
+                "SvcB 'limB' usage (9) exceeds critical threshold (limit=10)",
+                "SvcB 'limB' usage (10) exceeds critical threshold (limit=10)"
+            ]
+        )
+        assert mock_alc.mock_calls == [
+            call(region='r1', account_id='123', account_role='myrole',
+                 check_version=False),
+            call().set_limit_overrides({'SvcA': {'limA': 60}}),
+            call().check_thresholds(use_ta=False)
+        ]
+
+    def test_no_role(self):
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            mock_alc.return_value.check_thresholds.return_value = {}
+            res = check_account_region(
+                '123', 'r1', threshold_overrides={'SvcA': {}}
+            )
+        assert res == ([], [])
+        assert mock_alc.mock_calls == [
+            call(region='r1'),
+            call().set_threshold_overrides({'SvcA': {}}),
+            call().check_thresholds(use_ta=True)
+        ]
+
+
+class TestMultiAccountChecker(object):
+
+    def setup(self):
+        self.conf = Mock(spec_set=MultiAccountConfig)
+        self.conf.list_account_ids = ['111', '222']
+        confs = {
+            '111': {
+                'account_id': '111',
+                'name': 'one',
+                'role_name': 'r',
+                'regions': {
+                    'us-west-2': {
+                        'limit_overrides': {}, 'threshold_overrides': {}
+                    },
+                    'us-east-1': {
+                        'limit_overrides': {'a': 1},
+                        'threshold_overrides': {'b': 2}
+                    }
+                }
+            },
+            '222': {
+                'account_id': '222',
+                'name': None,
+                'role_name': None,
+                'regions': {
+                    'eu-central-1': {
+                        'limit_overrides': {}, 'threshold_overrides': {}
+                    }
+                }
+            }
+        }
+        confs['one'] = confs['111']
+        self.conf.get_account_config.side_effect = lambda x: confs[x]
+
+    def test_work_units(self):
+        cls = MultiAccountChecker(self.conf)
+        assert cls.work_units() == [
+            {
+                'account_id': '111', 'account_name': 'one',
+                'region': 'us-east-1', 'role_name': 'r',
+                'limit_overrides': {'a': 1}, 'threshold_overrides': {'b': 2}
+            },
+            {
+                'account_id': '111', 'account_name': 'one',
+                'region': 'us-west-2', 'role_name': 'r',
+                'limit_overrides': {}, 'threshold_overrides': {}
+            },
+            {
+                'account_id': '222', 'account_name': None,
+                'region': 'eu-central-1', 'role_name': None,
+                'limit_overrides': {}, 'threshold_overrides': {}
+            }
+        ]
+
+    def test_work_units_account_region(self):
+        cls = MultiAccountChecker(self.conf)
+        with patch('%s.logger' % pbm) as mock_logger:
+            res = cls.work_units(accounts=['one', '222'], region='us-west-2')
+        assert res == [
+            {
+                'account_id': '111', 'account_name': 'one',
+                'region': 'us-west-2', 'role_name': 'r',
+                'limit_overrides': {}, 'threshold_overrides': {}
+            }
+        ]
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Account %s is not configured for region %s', '222',
+                'us-west-2'
+            )
+        ]
+
+    def test_check_sequential(self):
+        cls = MultiAccountChecker(
+            self.conf, checker_kwargs={'foo': 'bar'}, use_ta=False
+        )
+        with patch('%s.check_account_region' % pbm) as mock_car:
+            with patch('%s.ProcessPoolExecutor' % pbm) as mock_ppe:
+                with patch('%s.logger' % pbm) as mock_logger:
+                    mock_car.side_effect = [
+                        (['w1'], []),
+                        RuntimeError('foo'),
+                        ([], ['c1'])
+                    ]
+                    res = list(cls.check())
+        assert res == [
+            AccountRegionResult('111', 'one', 'us-east-1', ['w1'], [], None),
+            AccountRegionResult(
+                '111', 'one', 'us-west-2', [], [], 'RuntimeError: foo'
+            ),
+            AccountRegionResult('222', None, 'eu-central-1', [], ['c1'], None)
+        ]
+        assert mock_ppe.mock_calls == []
+        assert mock_car.mock_calls[0] == call(
+            account_id='111', region_name='us-east-1', role_name='r',
+            limit_overrides={'a': 1}, threshold_overrides={'b': 2},
+            checker_kwargs={'foo': 'bar'}, use_ta=False
+        )
+        assert len(mock_logger.error.mock_calls) == 1
+
+    def test_check_processes(self):
+        cls = MultiAccountChecker(self.conf, max_workers=4)
+        futs = [Mock(), Mock(), Mock()]
+        futs[0].result.return_value = (['w1'], [])
+        futs[1].result.side_effect = RuntimeError('foo')
+        futs[2].result.return_value = ([], [])
+        with patch('%s.ProcessPoolExecutor' % pbm) as mock_ppe:
+            with patch('%s.as_completed' % pbm) as mock_ac:
+                with patch('%s.logger' % pbm):
+                    pool = mock_ppe.return_value.__enter__.return_value
+                    pool.submit.side_effect = futs
+                    # complete in reverse order of submission
+                    mock_ac.side_effect = lambda d: reversed(futs)
+                    res = list(cls.check())
+        assert res == [
+            AccountRegionResult('222', None, 'eu-central-1', [], [], None),
+            AccountRegionResult(
+                '111', 'one', 'us-west-2', [], [], 'RuntimeError: foo'
+            ),
+            AccountRegionResult('111', 'one', 'us-east-1', ['w1'], [], None)
+        ]
+        assert mock_ppe.mock_calls[0] == call(max_workers=4)
+        assert pool.submit.mock_calls[2] == call(
+            check_account_region, account_id='222',
+            region_name='eu-central-1', role_name=None, limit_overrides={},
+            threshold_overrides={}, checker_kwargs={}, use_ta=True
+        )
+
+    def test_run_ok(self, capsys):
+        cls = MultiAccountChecker(self.conf)
+        with patch('%s.MultiAccountChecker.check' % pbm) as mock_check:
+            mock_check.return_value = [
+                AccountRegionResult('111', 'one', 'r1', [], [], None)
+            ]
+            res = cls.run(region='r1', accounts=['111'])
+        assert res == 0
+        assert mock_check.mock_calls == [call(accounts=['111'], region='r1')]
+        out, err = capsys.readouterr()
+        assert out == '\n111 (one) r1\n\tNo problems found.\n' \
+                      'All limits are within thresholds.\n'
+
+    def test_run_warning(self, capsys):
+        cls = MultiAccountChecker(self.conf)
+        with patch('%s.MultiAccountChecker.check' % pbm) as mock_check:
+            mock_check.return_value = [
+                AccountRegionResult('111', 'one', 'r1', ['w1'], [], None)
+            ]
+            assert cls.run(colorize=False) == 0
+            assert cls.run(colorize=False, error_on_warning=True) == 1
+
+    def test_run_problems(self, capsys):
+        cls = MultiAccountChecker(self.conf)
+        with patch('%s.MultiAccountChecker.check' % pbm) as mock_check:
+            mock_check.return_value = [
+                AccountRegionResult('111', 'one', 'r1', ['w1'], ['c1'], None),
+                AccountRegionResult('222', None, 'r2', [], [], 'Err: foo')
+            ]
+            res = cls.run(colorize=False)
+        assert res == 1
+        out, err = capsys.readouterr()
+        assert out == '\n111 (one) r1\n' \
+                      '\tWARNING: w1\n' \
+                      '\tCRITICAL: c1\n' \
+                      '\n222 (None) r2\n' \
+                      '\tERROR: Err: foo\n' \
+                      '\n1 limit(s) above CRITICAL threshold; 1 limit(s) ' \
+                      'above WARNING threshold; 1 account/region(s) could ' \
+                      'not be checked\n' \
+                      'PROBLEMS FOUND. See above output for details.\n'
+
+
+class TestConsoleEntryPoint(object):
+
+    def test_parse_args(self):
+        res = parse_args(['-j', '8', '-r', 'r1', '--skip-ta', 'one', 'two'])
+        assert res.jobs == 8
+        assert res.region_name == 'r1'
+        assert res.skip_ta is True
+        assert res.config_dir == 'config'
+        assert res.ACCOUNT == ['one', 'two']
+        assert res.error_on_warning is False
+        assert res.sts_cache_dir is None
+
+    def test_console_entry_point(self):
+        argv = ['awslimitchecker-multi-account', '-c', '/foo', '-j', '4',
+                '-w', '--no-color', '--default-role-name=foo', '111']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.MultiAccountConfig' % pbm) as mock_conf:
+                with patch('%s.MultiAccountChecker' % pbm) as mock_mac:
+                    mock_mac.return_value.run.return_value = 1
+                    with pytest.raises(SystemExit) as excinfo:
+                        console_entry_point()
+        assert excinfo.value.code == 1
+        assert mock_conf.mock_calls == [call('/foo', default_role_name='foo')]
+        assert mock_mac.mock_calls == [
+            call(mock_conf.return_value, max_workers=4,
+                 checker_kwargs={'check_version': False}, use_ta=True),
+            call().run(error_on_warning=True, region=None, accounts=['111'],
+                       colorize=False)
+        ]
+
+    def test_console_entry_point_sts_cache(self):
+        argv = ['awslimitchecker-multi-account', '--sts-cache-dir=/tmp/sts']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.MultiAccountConfig' % pbm):
+                with patch('%s.MultiAccountChecker' % pbm) as mock_mac:
+                    with patch('%s.StsCredentialCache' % pbm) as mock_sc:
+                        mock_mac.return_value.run.return_value = 0
+                        with pytest.raises(SystemExit) as excinfo:
+                            console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_sc.mock_calls == [call('/tmp/sts')]
+        assert mock_mac.mock_calls[0][2]['checker_kwargs'] == {
+            'check_version': False, 'sts_cache': mock_sc.return_value
+        }
@@ -0,0 +1,272 @@
+"""
+awslimitchecker/tests/test_multiregion.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import sys
+import pytest
+
+from awslimitchecker.checker import AwsLimitChecker
+from awslimitchecker.multiregion import MultiRegionChecker
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.multiregion'
+
+
+class TestMultiRegionChecker(object):
+
+    def setup(self):
+        self.mock_c1 = Mock(spec=AwsLimitChecker)
+        self.mock_c1.services = {'SvcFoo': Mock(), 'SvcGlobal': Mock()}
+        self.mock_c2 = Mock(spec=AwsLimitChecker)
+        self.mock_c2.services = {'SvcFoo': Mock()}
+        self.mock_c3 = Mock(spec=AwsLimitChecker)
+        self.mock_c3.services = {'SvcFoo': Mock()}
+        self.mock_c1.for_region.side_effect = [self.mock_c2, self.mock_c3]
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            mock_alc.return_value = self.mock_c1
+            self.cls = MultiRegionChecker(
+                ['r1', 'r2', 'r1', 'r3'], warning_threshold=50, parallelism=2
+            )
+        self.mock_alc = mock_alc
+
+    def test_init(self):
+        assert self.mock_alc.mock_calls == [
+            call(region='r1', warning_threshold=50, parallelism=2),
+            call().for_region('r2', skip_global=True),
+            call().for_region('r3', skip_global=True)
+        ]
+        assert self.cls.regions == ['r1', 'r2', 'r3']
+        assert list(self.cls.checkers.items()) == [
+            ('r1', self.mock_c1),
+            ('r2', self.mock_c2),
+            ('r3', self.mock_c3)
+        ]
+        assert self.cls.region_name == 'r1,r2,r3'
+        assert self.cls.region_parallelism == 2
+        for c in [self.mock_c1, self.mock_c2, self.mock_c3]:
+            assert c.parallelism == 1
+
+    def test_init_region_parallelism(self):
+        mock_c1 = Mock(spec=AwsLimitChecker)
+        mock_c2 = Mock(spec=AwsLimitChecker)
+        mock_c1.for_region.return_value = mock_c2
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            mock_alc.return_value = mock_c1
+            cls = MultiRegionChecker(
+                ['r1', 'r2'], region_parallelism=2, parallelism=9
+            )
+        assert mock_alc.mock_calls[0] == call(region='r1', parallelism=9)
+        assert cls.region_parallelism == 2
+        assert mock_c1.parallelism == 4
+        assert mock_c2.parallelism == 4
+
+    def test_init_default_parallelism(self):
+        mock_c1 = Mock(spec=AwsLimitChecker)
+        mock_c2 = Mock(spec=AwsLimitChecker)
+        mock_c1.for_region.return_value = mock_c2
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            mock_alc.return_value = mock_c1
+            cls = MultiRegionChecker(['r1', 'r2'])
+        assert cls.region_parallelism == 1
+        assert mock_c1.parallelism == 1
+        assert mock_c2.parallelism == 1
+
+    def test_init_no_regions(self):
+        with patch('%s.AwsLimitChecker' % pbm, autospec=True) as mock_alc:
+            with pytest.raises(ValueError):
+                MultiRegionChecker([])
+        assert mock_alc.mock_calls == []
+
+    def test_primary_methods(self):
+        self.mock_c1.get_version.return_value = '1.2.3'
+        self.mock_c1.get_project_url.return_value = 'http://url'
+        self.mock_c1.get_service_names.return_value = ['SvcFoo', 'SvcGlobal']
+        self.mock_c1.get_required_iam_policy.return_value = {'foo': 'bar'}
+        assert self.cls.get_version() == '1.2.3'
+        assert self.cls.get_project_url() == 'http://url'
+        assert self.cls.get_service_names() == ['SvcFoo', 'SvcGlobal']
+        assert self.cls.get_required_iam_policy() == {'foo': 'bar'}
+        self.mock_c1.client_registry = Mock()
+        assert self.cls.client_registry == self.mock_c1.client_registry
+        assert self.mock_c2.mock_calls == []
+        assert self.mock_c3.mock_calls == []
+
+    def test_remove_services(self):
+        self.cls.remove_services(['SvcFoo'])
+        for c in [self.mock_c1, self.mock_c2, self.mock_c3]:
+            assert call.remove_services(['SvcFoo']) in c.mock_calls
+
+    def test_get_limits(self):
+        self.mock_c1.get_limits.return_value = {'SvcFoo': 1, 'SvcGlobal': 2}
+        self.mock_c2.get_limits.return_value = {'SvcFoo': 3}
+        self.mock_c3.get_limits.return_value = {'SvcFoo': 4}
+        with patch('%s.run_concurrently' % pbm, autospec=True) as mock_rc:
+            mock_rc.side_effect = lambda f, items, n, item_type, errors: dict(
+                (k, f(v)) for k, v in items.items()
+            )
+            res = self.cls.get_limits(use_ta=False)
+        assert res == {
+            'r1': {'SvcFoo': 1, 'SvcGlobal': 2},
+            'r2': {'SvcFoo': 3},
+            'r3': {'SvcFoo': 4}
+        }
+        assert mock_rc.mock_calls[0][1][2] == 2
+        assert mock_rc.mock_calls[0][2] == {
+            'item_type': 'region', 'errors': None
+        }
+        for c in [self.mock_c1, self.mock_c2, self.mock_c3]:
+            assert c.get_limits.mock_calls == [
+                call(service=None, use_ta=False)
+            ]
+
+    def test_get_limits_global_service(self):
+        self.mock_c1.get_limits.return_value = {'SvcGlobal': 2}
+        res = self.cls.get_limits(service=['SvcGlobal'])
+        assert res == {'r1': {'SvcGlobal': 2}}
+        assert self.mock_c1.get_limits.mock_calls == [
+            call(service=['SvcGlobal'], use_ta=True)
+        ]
+        assert self.mock_c2.get_limits.mock_calls == []
+        assert self.mock_c3.get_limits.mock_calls == []
+
+    def test_find_usage(self):
+        self.cls.find_usage(service=['SvcFoo', 'SvcGlobal'], max_age=300)
+        assert self.mock_c1.find_usage.mock_calls == [
+            call(service=['SvcFoo', 'SvcGlobal'], use_ta=True, max_age=300)
+        ]
+        for c in [self.mock_c2, self.mock_c3]:
+            assert c.find_usage.mock_calls == [
+                call(service=['SvcFoo'], use_ta=True, max_age=300)
+            ]
+
+    def test_find_usage_exception(self):
+        self.mock_c2.find_usage.side_effect = RuntimeError('foo')
+        with patch('awslimitchecker.utils.logger'):
+            with pytest.raises(RuntimeError):
+                self.cls.find_usage()
+        assert self.mock_c1.find_usage.mock_calls == [
+            call(service=None, use_ta=True, max_age=None)
+        ]
+        assert self.mock_c3.find_usage.mock_calls == [
+            call(service=None, use_ta=True, max_age=None)
+        ]
+
+    def test_check_thresholds(self):
+        self.mock_c1.check_thresholds.return_value = {}
+        self.mock_c2.check_thresholds.return_value = {'SvcFoo': {'a': 1}}
+        self.mock_c3.check_thresholds.return_value = {}
+        res = self.cls.check_thresholds()
+        assert res == {'r2': {'SvcFoo': {'a': 1}}}
+        assert self.mock_c1.check_thresholds.mock_calls == [
+            call(service=None, use_ta=True, max_age=None)
+        ]
+
+    def test_check_thresholds_region_exception(self):
+        self.mock_c1.check_thresholds.return_value = {'SvcFoo': {'a': 1}}
+        ex = RuntimeError('foo')
+        self.mock_c2.check_thresholds.side_effect = ex
+        self.mock_c2.services['SvcFoo'].get_limits.return_value = {'b': 2}
+        self.mock_c3.check_thresholds.return_value = {'SvcFoo': {'c': 3}}
+        with patch('awslimitchecker.utils.logger') as mock_logger:
+            res = self.cls.check_thresholds(service=['SvcFoo'])
+        # the other regions' results are kept, and the failed region's
+        # limits are returned as incomplete
+        assert list(res.items()) == [
+            ('r1', {'SvcFoo': {'a': 1}}),
+            ('r2', {'SvcFoo': {'b': 2}}),
+            ('r3', {'SvcFoo': {'c': 3}})
+        ]
+        assert self.mock_c2._set_incomplete.mock_calls == [
+            call(
+                self.mock_c2.services['SvcFoo'],
+                'region check failed: foo'
+            )
+        ]
+        assert mock_logger.mock_calls[-1] == call.error(
+            'Error in %s %s: %s', 'region', 'r2', ex, exc_info=True
+        )
+
+    def test_set_limit_overrides(self):
+        overrides = {'SvcFoo': {'lim': 1}, 'SvcGlobal': {'lim2': 2}}
+        self.cls.set_limit_overrides(overrides, override_ta=False)
+        assert self.mock_c1.set_limit_overrides.mock_calls == [
+            call(overrides, override_ta=False)
+        ]
+        for c in [self.mock_c2, self.mock_c3]:
+            assert c.set_limit_overrides.mock_calls == [
+                call({'SvcFoo': {'lim': 1}}, override_ta=False)
+            ]
+
+    def test_set_limit_override(self):
+        self.cls.set_limit_override('SvcGlobal', 'lim', 5)
+        assert self.mock_c1.set_limit_override.mock_calls == [
+            call('SvcGlobal', 'lim', 5, override_ta=True)
+        ]
+        assert self.mock_c2.set_limit_override.mock_calls == []
+        assert self.mock_c3.set_limit_override.mock_calls == []
+
+    def test_set_threshold_overrides(self):
+        overrides = {
+            'SvcFoo': {'lim': {'warning': {'percent': 10}}},
+            'SvcGlobal': {'lim2': {'warning': {'count': 2}}}
+        }
+        self.cls.set_threshold_overrides(overrides)
+        assert self.mock_c1.set_threshold_overrides.mock_calls == [
+            call(overrides)
+        ]
+        for c in [self.mock_c2, self.mock_c3]:
+            assert c.set_threshold_overrides.mock_calls == [
+                call({'SvcFoo': overrides['SvcFoo']})
+            ]
+
+    def test_set_threshold_override(self):
+        self.cls.set_threshold_override('SvcFoo', 'lim', warn_percent=10)
+        for c in [self.mock_c1, self.mock_c2, self.mock_c3]:
+            assert c.set_threshold_override.mock_calls == [
+                call('SvcFoo', 'lim', warn_percent=10, warn_count=None,
+                     crit_percent=None, crit_count=None)
+            ]
@@ -42,6 +42,8 @@ from botocore.exceptions import ClientError
 import pytest
 
 from awslimitchecker.quotas import ServiceQuotasClient
+from awslimitchecker.connectable import ClientRegistry
+from awslimitchecker.snapshots import SqliteQuotasCache
 from awslimitchecker.tests.support import quotas_response
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -65,6 +67,12 @@ class TestConstructor(object):
         assert cls._boto3_connection_kwargs == {'foo': 'bar'}
         assert cls._cache == {}
         assert cls.conn is None
+        assert isinstance(cls._client_registry, ClientRegistry)
+
+    def test_init_client_registry(self):
+        m_reg = Mock(spec_set=ClientRegistry)
+        cls = ServiceQuotasClient({'foo': 'bar'}, client_registry=m_reg)
+        assert cls._client_registry == m_reg
 
 
 class TestQuotasForService(object):
@@ -171,6 +179,133 @@ class TestQuotasForService(object):
         ]
 
 
+class TestPersistentCache(object):
+
+    def setup(self):
+        self.m_cache = Mock(spec_set=SqliteQuotasCache)
+        self.cls = ServiceQuotasClient(
+            {'foo': 'bar'}, cache=self.m_cache, account_id='1234'
+        )
+        self.mock_conn = Mock()
+        self.mock_conn._client_config.region_name = 'rname'
+
+    def se_connect(self, cls):
+        cls.conn = self.mock_conn
+
+    def test_hit(self):
+        self.m_cache.get.return_value = {'q': {'Value': 1}}
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            m_connect.side_effect = self.se_connect
+            res = self.cls.quotas_for_service('scode')
+        assert res == {'q': {'Value': 1}}
+        assert self.cls._cache == {'scode': {'q': {'Value': 1}}}
+        assert self.m_cache.mock_calls == [call.get('1234', 'rname', 'scode')]
+        assert self.mock_conn.mock_calls == []
+
+    def test_miss(self):
+        resp, expected = quotas_response()
+        self.mock_conn.get_paginator.return_value.paginate.return_value = resp
+        self.m_cache.get.return_value = None
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            m_connect.side_effect = self.se_connect
+            res = self.cls.quotas_for_service('scode')
+        assert res == expected
+        assert self.m_cache.mock_calls == [
+            call.get('1234', 'rname', 'scode'),
+            call.put('1234', 'rname', 'scode', expected)
+        ]
+
+    def test_account_id_from_sts(self):
+        m_reg = Mock(spec_set=ClientRegistry)
+        m_reg.client.return_value.get_caller_identity.return_value = {
+            'Account': '5678'
+        }
+        self.cls = ServiceQuotasClient(
+            {'foo': 'bar'}, client_registry=m_reg, cache=self.m_cache
+        )
+        self.m_cache.get.return_value = {}
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            m_connect.side_effect = self.se_connect
+            self.cls.quotas_for_service('scode')
+            self.cls.quotas_for_service('other')
+        assert m_reg.mock_calls == [
+            call.client('sts', foo='bar'),
+            call.client().get_caller_identity()
+        ]
+        assert self.m_cache.mock_calls == [
+            call.get('5678', 'rname', 'scode'),
+            call.get('5678', 'rname', 'other')
+        ]
+
+    def test_errors(self):
+        resp, expected = quotas_response()
+        self.mock_conn.get_paginator.return_value.paginate.return_value = resp
+        self.m_cache.get.side_effect = RuntimeError('foo')
+        self.m_cache.put.side_effect = RuntimeError('bar')
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            m_connect.side_effect = self.se_connect
+            with patch('%s.logger' % pbm) as mock_logger:
+                res = self.cls.quotas_for_service('scode')
+        assert res == expected
+        assert mock_logger.warning.mock_calls == [
+            call('Unable to read cached Service Quotas for service code %s',
+                 'scode', exc_info=True),
+            call('Unable to cache Service Quotas for service code %s',
+                 'scode', exc_info=True)
+        ]
+
+
+class TestPrefetch(object):
+
+    def setup(self):
+        self.cls = ServiceQuotasClient({'foo': 'bar'})
+
+    def test_prefetch(self):
+        self.cls._cache = {'cached': {}}
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            with patch(
+                '%s.quotas_for_service' % pb, autospec=True
+            ) as m_qfs:
+                m_qfs.side_effect = [{}, RuntimeError('foo')]
+                with patch('%s.logger' % pbm) as mock_logger:
+                    self.cls.prefetch(['a', 'cached', 'b'], max_workers=1)
+        assert m_connect.mock_calls == [call(self.cls)]
+        assert m_qfs.mock_calls == [call(self.cls, 'a'), call(self.cls, 'b')]
+        assert mock_logger.mock_calls == [
+            call.debug(
+                'Prefetching Service Quotas for service codes: %s',
+                ['a', 'b']
+            ),
+            call.warning(
+                'Unable to prefetch Service Quotas for service code %s',
+                'b', exc_info=True
+            )
+        ]
+
+    def test_prefetch_all_cached(self):
+        self.cls._cache = {'a': {}}
+        with patch('%s.connect' % pb, autospec=True):
+            with patch(
+                '%s.quotas_for_service' % pb, autospec=True
+            ) as m_qfs:
+                self.cls.prefetch(['a'])
+        assert m_qfs.mock_calls == []
+
+    def test_concurrent(self):
+        resp, expected = quotas_response()
+        mock_conn = Mock()
+        mock_conn.get_paginator.return_value.paginate.return_value = resp
+
+        def se_connect(cls):
+            cls.conn = mock_conn
+
+        with patch('%s.connect' % pb, autospec=True) as m_connect:
+            m_connect.side_effect = se_connect
+            self.cls.prefetch(['a', 'b', 'c'], max_workers=3)
+        assert sorted(self.cls._cache.keys()) == ['a', 'b', 'c']
+        assert sorted(self.cls._code_locks.keys()) == ['a', 'b', 'c']
+
+
 class TestGetQuotaValue(object):
 
     def setup(self):
@@ -238,3 +373,46 @@ class TestGetQuotaValue(object):
         assert m_conv.mock_calls == [
             call(12.3, 'Foo', 'None')
         ]
+
+
+class TestGetUsageMetric(object):
+
+    def setup(self):
+        self.cls = ServiceQuotasClient({'foo': 'bar'})
+        self.metric = {
+            'MetricNamespace': 'AWS/Usage',
+            'MetricName': 'ResourceCount',
+            'MetricDimensions': {'Resource': 'vCPU', 'Type': 'Resource'},
+            'MetricStatisticRecommendation': 'Maximum'
+        }
+        self.cls._cache = {
+            'scode': {
+                'qname': {
+                    'QuotaName': 'qname',
+                    'Value': 12.3,
+                    'Unit': 'None',
+                    'UsageMetric': self.metric
+                },
+                'qname2': {
+                    'QuotaName': 'qname2',
+                    'Value': 12.3,
+                    'Unit': 'None',
+                    'UsageMetric': {}
+                },
+                'qname3': {
+                    'QuotaName': 'qname3',
+                    'Value': 12.3,
+                    'Unit': 'None'
+                }
+            }
+        }
+
+    def test_happy_path(self):
+        assert self.cls.get_usage_metric('scode', 'QName') == self.metric
+
+    def test_no_metric(self):
+        assert self.cls.get_usage_metric('scode', 'qname2') is None
+        assert self.cls.get_usage_metric('scode', 'qname3') is None
+
+    def test_no_quota(self):
+        assert self.cls.get_usage_metric('scode', 'OtherName') is None
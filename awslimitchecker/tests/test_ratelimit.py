@@ -0,0 +1,182 @@
+"""
+awslimitchecker/tests/test_ratelimit.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import logging
+import sys
+
+from awslimitchecker.ratelimit import TokenBucket, RateLimiter
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.ratelimit'
+
+
+class TestTokenBucket(object):
+
+    def test_acquire_burst(self):
+        with patch('%s.time.monotonic' % pbm) as m_mono:
+            m_mono.return_value = 100.0
+            cls = TokenBucket(rate=2, burst=3)
+            with patch('%s.time.sleep' % pbm) as m_sleep:
+                for _ in range(3):
+                    assert cls.acquire() == 0.0
+        assert m_sleep.mock_calls == []
+        assert cls.stats() == {
+            'rate': 2.0,
+            'requests': 3,
+            'waits': 0,
+            'wait_time': 0.0,
+            'throttles': 0
+        }
+
+    def test_acquire_wait(self):
+        clock = [100.0]
+
+        def se_sleep(secs):
+            clock[0] += secs
+
+        with patch('%s.time.monotonic' % pbm) as m_mono:
+            m_mono.side_effect = lambda: clock[0]
+            cls = TokenBucket(rate=4, burst=1)
+            with patch('%s.time.sleep' % pbm) as m_sleep:
+                m_sleep.side_effect = se_sleep
+                assert cls.acquire() == 0.0
+                assert cls.acquire() == 0.25
+        assert m_sleep.mock_calls == [call(0.25)]
+        assert cls.waits == 1
+        assert cls.wait_time == 0.25
+        assert cls.requests == 2
+
+    def test_aimd(self):
+        cls = TokenBucket(
+            rate=10, min_rate=2, max_rate=11, increase=0.5,
+            decrease_factor=0.5
+        )
+        cls.on_success()
+        assert cls.rate == 10.5
+        cls.on_success()
+        cls.on_success()
+        assert cls.rate == 11.0
+        cls.on_throttle()
+        assert cls.rate == 5.5
+        assert cls._tokens == 0.0
+        cls.on_throttle()
+        cls.on_throttle()
+        assert cls.rate == 2.0
+        assert cls.throttles == 3
+
+
+class TestRateLimiter(object):
+
+    def setup(self):
+        self.cls = RateLimiter(rate=5)
+
+    def test_bucket(self):
+        b1 = self.cls.bucket('ec2', 'us-east-1')
+        assert b1.rate == 5.0
+        assert self.cls.bucket('ec2', 'us-east-1') is b1
+        assert self.cls.bucket('ec2', 'us-west-2') is not b1
+        assert self.cls.bucket('elbv2', 'us-east-1') is not b1
+
+    def test_register(self):
+        client = Mock()
+        client.meta.service_model.service_name = 'ec2'
+        client.meta.region_name = 'us-east-1'
+        self.cls.register(client)
+        reg = client.meta.events.register
+        assert len(reg.mock_calls) == 2
+        assert reg.mock_calls[0][1][0] == 'before-send'
+        assert reg.mock_calls[1][1][0] == 'response-received'
+        bucket = self.cls.bucket('ec2', 'us-east-1')
+        with patch.object(bucket, 'acquire') as m_acq:
+            m_acq.return_value = 0.0
+            assert reg.mock_calls[0][1][1](request=Mock()) is None
+        assert m_acq.mock_calls == [call()]
+
+    def test_response_received(self):
+        bucket = Mock()
+        self.cls._response_received(
+            bucket, response_dict={'status_code': 200}, parsed_response={}
+        )
+        self.cls._response_received(
+            bucket, response_dict={'status_code': 400},
+            parsed_response={'Error': {'Code': 'RequestLimitExceeded'}}
+        )
+        self.cls._response_received(
+            bucket, response_dict={'status_code': 429}, parsed_response=None
+        )
+        self.cls._response_received(
+            bucket, response_dict={'status_code': 400},
+            parsed_response={'Error': {'Code': 'InvalidParameterValue'}}
+        )
+        self.cls._response_received(
+            bucket, response_dict=None, exception=Exception('foo')
+        )
+        assert bucket.mock_calls == [
+            call.on_success(),
+            call.on_throttle(),
+            call.on_throttle(),
+            call.on_success()
+        ]
+
+    def test_log_stats(self):
+        self.cls.bucket('ec2', 'us-east-1')
+        self.cls.bucket('elb', 'us-east-1').on_throttle()
+        with patch('%s.logger' % pbm) as mock_logger:
+            self.cls.log_stats()
+        assert mock_logger.mock_calls == [
+            call.log(
+                logging.DEBUG, 'Rate limiter for %s in %s: %d requests, %d '
+                'throttled, %d delayed (%.2fs total); current rate %.2f/s',
+                'ec2', 'us-east-1', 0, 0, 0, 0.0, 5.0
+            ),
+            call.log(
+                logging.INFO, 'Rate limiter for %s in %s: %d requests, %d '
+                'throttled, %d delayed (%.2fs total); current rate %.2f/s',
+                'elb', 'us-east-1', 0, 1, 0, 0.0, 2.5
+            )
+        ]
@@ -0,0 +1,163 @@
+"""
+awslimitchecker/tests/test_results.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+from awslimitchecker.limit import AwsLimit
+from awslimitchecker.results import CheckResult, LimitResult
+
+
+def make_limit(name, limit, usages):
+    lim = AwsLimit(name, 'SvcFoo', limit, 80, 99)
+    for args in usages:
+        lim._add_current_usage(*args)
+    return lim
+
+
+class TestLimitResult(object):
+
+    def test_basic(self):
+        lim = make_limit('lim1', 10, [
+            (3, None, 'i-1', 'AWS::EC2::Instance'),
+            (9, None, 'i-2', 'AWS::EC2::Instance'),
+            (9, None, 'i-3', 'AWS::EC2::Instance'),
+        ])
+        lim.check_thresholds()
+        r = LimitResult('SvcFoo', 'lim1', lim)
+        assert r.service_name == 'SvcFoo'
+        assert r.name == 'lim1'
+        assert r.limit is lim
+        assert [u.resource_id for u in r.sorted_usage] == ['i-1', 'i-2', 'i-3']
+        assert r.max_usage is max(lim.get_current_usage())
+        assert r.max_usage.resource_id == 'i-2'
+        assert r.max_usage_value == 9
+        assert r.usage_str == lim.get_current_usage_str()
+        assert r.utilization == 90.0
+        assert r.warnings == tuple(lim.get_warnings())
+        assert len(r.warnings) == 2
+        assert r.criticals == ()
+        assert r.has_problems is True
+        assert repr(r) == '<LimitResult SvcFoo/lim1>'
+
+    def test_cached(self):
+        lim = make_limit('lim1', 10, [(3,)])
+        r = LimitResult('SvcFoo', 'lim1', lim)
+        assert r.usage_str == '3'
+        assert r.sorted_usage is r.sorted_usage
+        lim._add_current_usage(4)
+        assert r.usage_str == '3'
+        assert r.max_usage_value == 3
+
+    def test_no_usage(self):
+        lim = make_limit('lim1', None, [])
+        r = LimitResult('SvcFoo', 'lim1', lim)
+        assert r.sorted_usage == ()
+        assert r.max_usage is None
+        assert r.max_usage_value == 0
+        assert r.usage_str == '<unknown>'
+        assert r.utilization is None
+        assert r.has_problems is False
+
+    def test_utilization_maximum(self):
+        lim = make_limit('lim1', None, [(2,), (3, 4), (1, 2)])
+        r = LimitResult('SvcFoo', 'lim1', lim)
+        assert r.utilization == 75.0
+
+
+class TestCheckResult(object):
+
+    def setup(self):
+        self.l1 = make_limit('lim1', 10, [(5, None, 'vpc-1', 'AWS::EC2::VPC')])
+        self.l2 = make_limit('lim2', 10, [
+            (9, None, 'vpc-1', 'AWS::EC2::VPC'),
+            (1, None, 'i-1', 'AWS::EC2::Instance'),
+        ])
+        self.l3 = make_limit('lim3', None, [])
+        self.l4 = make_limit('lim4', 4, [(4,)])
+        for lim in [self.l1, self.l2, self.l3, self.l4]:
+            lim.check_thresholds()
+        self.cls = CheckResult({
+            'SvcFoo': {'lim2': self.l2, 'lim1': self.l1},
+            'SvcBar': {'lim4': self.l4, 'lim3': self.l3},
+        })
+
+    def test_iter(self):
+        assert len(self.cls) == 4
+        assert [(r.service_name, r.name) for r in self.cls] == [
+            ('SvcBar', 'lim3'),
+            ('SvcBar', 'lim4'),
+            ('SvcFoo', 'lim1'),
+            ('SvcFoo', 'lim2'),
+        ]
+
+    def test_services(self):
+        assert self.cls.services() == ['SvcBar', 'SvcFoo']
+
+    def test_get(self):
+        assert self.cls.get('SvcFoo', 'lim2').limit is self.l2
+        assert self.cls.get('SvcFoo', 'lim3') is None
+        assert self.cls.get('SvcBaz', 'lim1') is None
+
+    def test_service_limits(self):
+        assert [r.limit for r in self.cls.service_limits('SvcFoo')] == [
+            self.l1, self.l2
+        ]
+        assert self.cls.service_limits('SvcBaz') == []
+
+    def test_by_resource_id(self):
+        res = self.cls.by_resource_id('vpc-1')
+        assert [(r.name, u.get_value()) for r, u in res] == [
+            ('lim1', 5), ('lim2', 9)
+        ]
+        assert self.cls.by_resource_id('i-2') == []
+
+    def test_by_aws_type(self):
+        res = self.cls.by_aws_type('AWS::EC2::Instance')
+        assert [(r.name, u.resource_id) for r, u in res] == [('lim2', 'i-1')]
+        assert self.cls.by_aws_type('AWS::EC2::Foo') == []
+
+    def test_ranked(self):
+        assert [r.name for r in self.cls.ranked()] == [
+            'lim4', 'lim2', 'lim1', 'lim3'
+        ]
+        assert [r.name for r in self.cls.ranked(count=2)] == ['lim4', 'lim2']
+
+    def test_problems(self):
+        assert [r.name for r in self.cls.problems()] == ['lim4', 'lim2']
+        crit = self.cls.get('SvcBar', 'lim4')
+        assert len(crit.criticals) == 1
+        assert crit.warnings == ()
@@ -46,9 +46,12 @@ import termcolor
 from freezegun import freeze_time
 
 from awslimitchecker.runner import Runner, console_entry_point
+from awslimitchecker.catalog import LimitsCatalog
 from awslimitchecker.checker import AwsLimitChecker
+from awslimitchecker.multiregion import MultiRegionChecker
 from awslimitchecker.limit import AwsLimit, AwsLimitUsage
 from awslimitchecker.utils import StoreKeyValuePair
+from awslimitchecker.services.base import _AwsService
 from .support import sample_limits, sample_limits_api
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -106,6 +109,7 @@ class TestInit(RunnerTester):
         assert self.cls.skip_ta is False
         assert self.cls.service_name is None
         assert len(self.cls.skip_check) == 0
+        assert self.cls.regions is None
 
 
 class TestParseArgs(RunnerTester):
@@ -128,6 +132,7 @@ class TestParseArgs(RunnerTester):
         assert res.role_partition == 'aws'
         assert res.ta_api_region == 'us-east-1'
         assert res.skip_quotas is False
+        assert res.parallelism == 1
 
     def test_parser(self):
         argv = ['-V']
@@ -228,10 +233,21 @@ class TestParseArgs(RunnerTester):
             call().add_argument('-T', '--mfa-token', action='store', type=str,
                                 default=None, help='MFA Token to use when '
                                 'assuming a role via STS'),
+            call().add_argument('--sts-cache-dir', action='store', type=str,
+                                default=None, metavar='PATH',
+                                help='directory to cache STS assumed role '
+                                     'credentials in until shortly before '
+                                     'they expire (created if it does not '
+                                     'exist)'),
             call().add_argument('-r', '--region', action='store',
                                 type=str, default=None,
                                 help='AWS region name to connect to; required '
                                 'for STS'),
+            call().add_argument('--regions', action='store', type=str,
+                                nargs='+', default=None,
+                                help='check multiple AWS regions in one run; '
+                                'output is prefixed with the region name '
+                                '(mutually exclusive with -r/--region)'),
             call().add_argument('--role-partition', action='store', type=str,
                                 default='aws',
                                 help='AWS partition name to use for '
@@ -250,6 +266,130 @@ class TestParseArgs(RunnerTester):
                                 help='Do not attempt to connect to Service '
                                      'Quotas service or use its data for '
                                      'current limits'),
+            call().add_argument('--parallelism', action='store', type=int,
+                                default=1,
+                                help='maximum number of services to query '
+                                     'concurrently (default: 1, query '
+                                     'services sequentially)'),
+            call().add_argument('--region-parallelism', action='store',
+                                type=int, default=None,
+                                help='with --regions, the maximum number of '
+                                     'regions to query concurrently; '
+                                     '--parallelism is split between them '
+                                     '(default: the lower of --parallelism '
+                                     'and the number of regions)'),
+            call().add_argument('--service-timeout', action='store',
+                                type=float, default=None, metavar='SECONDS',
+                                help='maximum number of seconds to spend '
+                                     'checking any one service; services that '
+                                     'take longer are abandoned and their '
+                                     'limits reported as incomplete (default:'
+                                     ' no limit)'),
+            call().add_argument('--service-timeout-override',
+                                action=StoreKeyValuePair,
+                                help='override --service-timeout for a single '
+                                     'service, specified in "service_name='
+                                     'seconds" format; can be specified '
+                                     'multiple times.'),
+            call().add_argument('--run-timeout', action='store', type=float,
+                                default=None, metavar='SECONDS',
+                                help='maximum number of seconds to spend '
+                                     'checking all services; services still '
+                                     'running or not yet started when it '
+                                     'expires are reported as incomplete '
+                                     '(default: no limit)'),
+            call().add_argument('--usage-snapshot-db', action='store',
+                                type=str, default=None, metavar='PATH',
+                                help='path to a SQLite database to store a '
+                                     'snapshot of each service\'s usage in '
+                                     'after checking it (created if it does '
+                                     'not exist)'),
+            call().add_argument('--max-usage-age', action='store', type=float,
+                                default=None, metavar='SECONDS',
+                                help='reuse usage from --usage-snapshot-db for'
+                                     ' services whose snapshot is no more than'
+                                     ' this many seconds old, instead of '
+                                     'querying AWS'),
+            call().add_argument('--scan-schedule', action='store_true',
+                                default=False,
+                                help='only scan services that are due '
+                                     'according to their utilization history '
+                                     'in --usage-snapshot-db (the closer to '
+                                     'their limits and the faster they are '
+                                     'growing, the more often); use the '
+                                     'stored usage for the rest'),
+            call().add_argument('--min-scan-interval', action='store',
+                                type=float, default=300, metavar='SECONDS',
+                                help='with --scan-schedule, the shortest '
+                                     'interval between scans of a service '
+                                     '(default: 300)'),
+            call().add_argument('--max-scan-interval', action='store',
+                                type=float, default=86400, metavar='SECONDS',
+                                help='with --scan-schedule, the longest '
+                                     'interval between scans of a service '
+                                     '(default: 86400)'),
+            call().add_argument('--usage-source', action='store', type=str,
+                                choices=['api', 'cloudwatch'], default='api',
+                                help='where to get current usage from; '
+                                     '"cloudwatch" reads it from the '
+                                     'CloudWatch AWS/Usage metrics published '
+                                     'for Service Quotas (in batched '
+                                     'requests), falling back to the service '
+                                     'APIs for limits without a metric '
+                                     '(default: api)'),
+            call().add_argument('--resource-detail', action='store_true',
+                                default=False,
+                                help='list individual resources to find usage '
+                                     'even when a service\'s API returns the '
+                                     'total (i.e. RDS and Auto Scaling), so '
+                                     'that the usage of each resource is '
+                                     'known'),
+            call().add_argument('--usage-retention', action='store', type=int,
+                                default=None, metavar='COUNT',
+                                help='for each limit, only keep the COUNT '
+                                     'resources with the highest utilization '
+                                     'that are below thresholds, plus all '
+                                     'resources that cross them, to bound '
+                                     'memory use in large accounts (default: '
+                                     'keep all)'),
+            call().add_argument('--daemon', action='store_true',
+                                default=False,
+                                help='run continuously, re-checking services '
+                                     'every --daemon-interval seconds and '
+                                     'serving the latest limits, usage and '
+                                     'threshold status over HTTP at /metrics '
+                                     '(Prometheus) and /json'),
+            call().add_argument('--daemon-interval', action='store',
+                                type=float, default=300, metavar='SECONDS',
+                                help='with --daemon, number of seconds '
+                                     'between checks of each service '
+                                     '(default: 300)'),
+            call().add_argument('--daemon-service-interval',
+                                action=StoreKeyValuePair,
+                                help='with --daemon, override '
+                                     '--daemon-interval for a single service, '
+                                     'specified in "service_name=seconds" '
+                                     'format; can be specified multiple '
+                                     'times.'),
+            call().add_argument('--listen-address', action='store', type=str,
+                                default='127.0.0.1',
+                                help='with --daemon, address to serve '
+                                     'results on (default: 127.0.0.1)'),
+            call().add_argument('--listen-port', action='store', type=int,
+                                default=9555,
+                                help='with --daemon, port to serve results '
+                                     'on (default: 9555)'),
+            call().add_argument('--quotas-cache-db', action='store',
+                                type=str, default=None, metavar='PATH',
+                                help='path to a SQLite database to cache '
+                                     'Service Quotas responses in (created if '
+                                     'it does not exist; may be the same as '
+                                     '--usage-snapshot-db)'),
+            call().add_argument('--quotas-cache-ttl', action='store',
+                                type=float, default=86400, metavar='SECONDS',
+                                help='number of seconds to use Service Quotas '
+                                     'responses from --quotas-cache-db for '
+                                     '(default: 86400)'),
             call().add_mutually_exclusive_group(),
             call().add_mutually_exclusive_group().add_argument(
                 '--ta-refresh-wait', action='store_true', default=False,
@@ -279,12 +419,36 @@ class TestParseArgs(RunnerTester):
                                      'wait up to this number of seconds '
                                      'before continuing on anyway.',
                                 type=int),
+            call().add_argument('--ta-poll-min-interval', type=float,
+                                action='store', default=5, metavar='SECONDS',
+                                help='If waiting for TA checks to refresh, '
+                                     'initial number of seconds between '
+                                     'refresh status polls; doubles after '
+                                     'each poll (default: 5)'),
+            call().add_argument('--ta-poll-max-interval', type=float,
+                                action='store', default=60, metavar='SECONDS',
+                                help='If waiting for TA checks to refresh, '
+                                     'maximum number of seconds between '
+                                     'refresh status polls (default: 60)'),
+            call().add_argument('--ta-cache-db', action='store', type=str,
+                                default=None, metavar='PATH',
+                                help='path to a SQLite database to cache '
+                                     'Trusted Advisor check results (for all '
+                                     'regions) in (created if it does not '
+                                     'exist; may be the same as '
+                                     '--usage-snapshot-db)'),
+            call().add_argument('--ta-cache-ttl', action='store', type=float,
+                                default=3600, metavar='SECONDS',
+                                help='number of seconds to use Trusted '
+                                     'Advisor check results from '
+                                     '--ta-cache-db for (default: 3600)'),
             call().add_argument('--no-color', action='store_true',
                                 default=False,
                                 help='do not colorize output'),
             call().add_argument('--no-check-version', action='store_false',
                                 default=True, dest='check_version',
-                                help='do not check latest version at startup'),
+                                help='do not check latest version before '
+                                     'finding usage'),
             call().add_argument('-v', '--verbose', dest='verbose',
                                 action='count',
                                 default=0,
@@ -351,6 +515,28 @@ class TestParseArgs(RunnerTester):
         assert isinstance(res, argparse.Namespace)
         assert res.skip_quotas is True
 
+    def test_parallelism(self):
+        argv = ['--parallelism=8']
+        res = self.cls.parse_args(argv)
+        assert isinstance(res, argparse.Namespace)
+        assert res.parallelism == 8
+
+    def test_timeouts(self):
+        argv = ['--service-timeout=30', '--run-timeout=120',
+                '--service-timeout-override=ec2=60']
+        res = self.cls.parse_args(argv)
+        assert isinstance(res, argparse.Namespace)
+        assert res.service_timeout == 30.0
+        assert res.run_timeout == 120.0
+        assert res.service_timeout_override == {'ec2': '60'}
+
+    def test_regions(self):
+        argv = ['--regions', 'us-east-1', 'us-west-2']
+        res = self.cls.parse_args(argv)
+        assert isinstance(res, argparse.Namespace)
+        assert res.regions == ['us-east-1', 'us-west-2']
+        assert res.region is None
+
     def test_ta_refresh_older(self):
         argv = ['--ta-refresh-older=123']
         res = self.cls.parse_args(argv)
@@ -468,18 +654,43 @@ class TestIamPolicy(RunnerTester):
 
 class TestListDefaults(RunnerTester):
 
+    def setup(self):
+        super(TestListDefaults, self).setup()
+        self.mock_cat = Mock(spec_set=LimitsCatalog)
+        self.mock_cat.has_region.return_value = True
+        self.mock_cat.service_names.return_value = ['SvcBar', 'SvcFoo']
+
+        def se_defaults(sname, region):
+            return {
+                k: v.default_limit
+                for k, v in sample_limits()[sname].items()
+            }
+
+        self.mock_cat.default_limits.side_effect = se_defaults
+
+    def run_list_defaults(self, env={}):
+        with patch.dict('os.environ', env, clear=True):
+            with patch('%s.LimitsCatalog.load' % pb) as mock_load:
+                mock_load.return_value = self.mock_cat
+                with patch('awslimitchecker.runner.dict2cols',
+                           autospec=True) as mock_d2c:
+                    mock_d2c.return_value = 'd2cval'
+                    self.cls.list_defaults()
+        return mock_load, mock_d2c
+
     def test_simple(self, capsys):
         mock_checker = Mock(spec_set=AwsLimitChecker)
-        mock_checker.get_limits.return_value = sample_limits()
+        mock_checker.get_service_names.return_value = ['SvcBar', 'SvcFoo']
+        mock_checker.region_name = 'rname'
         self.cls.checker = mock_checker
-        with patch('awslimitchecker.runner.dict2cols',
-                   autospec=True) as mock_d2c:
-            mock_d2c.return_value = 'd2cval'
-            self.cls.list_defaults()
+        mock_load, mock_d2c = self.run_list_defaults()
         out, err = capsys.readouterr()
         assert out == 'd2cval\n'
-        assert mock_checker.mock_calls == [
-            call.get_limits(service=None)
+        assert mock_checker.mock_calls == [call.get_service_names()]
+        assert mock_load.call_args_list == [call()]
+        assert self.mock_cat.default_limits.mock_calls == [
+            call('SvcBar', 'rname'),
+            call('SvcFoo', 'rname')
         ]
         assert mock_d2c.mock_calls == [
             call({
@@ -491,19 +702,16 @@ class TestListDefaults(RunnerTester):
 
     def test_one_service(self, capsys):
         mock_checker = Mock(spec_set=AwsLimitChecker)
-        mock_checker.get_limits.return_value = {
-            'SvcFoo': sample_limits()['SvcFoo'],
-        }
+        mock_checker.get_service_names.return_value = ['SvcBar', 'SvcFoo']
+        mock_checker.region_name = 'rname'
         self.cls.checker = mock_checker
         self.cls.service_name = ['SvcFoo']
-        with patch('awslimitchecker.runner.dict2cols',
-                   autospec=True) as mock_d2c:
-            mock_d2c.return_value = 'd2cval'
-            self.cls.list_defaults()
+        mock_load, mock_d2c = self.run_list_defaults()
         out, err = capsys.readouterr()
         assert out == 'd2cval\n'
-        assert mock_checker.mock_calls == [
-            call.get_limits(service=['SvcFoo'])
+        assert mock_checker.mock_calls == [call.get_service_names()]
+        assert self.mock_cat.default_limits.mock_calls == [
+            call('SvcFoo', 'rname')
         ]
         assert mock_d2c.mock_calls == [
             call({
@@ -511,6 +719,79 @@ class TestListDefaults(RunnerTester):
             })
         ]
 
+    def test_not_in_catalog(self, capsys):
+        self.mock_cat.has_region.side_effect = lambda r: r == 'rname'
+        self.mock_cat.service_names.return_value = ['SvcBar']
+        mock_checker = Mock(spec=AwsLimitChecker)
+        mock_checker.get_service_names.return_value = ['SvcBar', 'SvcFoo']
+        mock_svc = Mock()
+        mock_svc.get_limits.return_value = sample_limits()['SvcFoo']
+        mock_checker.services = {'SvcFoo': mock_svc}
+        mock_checker.region_name = 'rname'
+        self.cls.checker = mock_checker
+        mock_load, mock_d2c = self.run_list_defaults()
+        # no Trusted Advisor or Service Quotas calls
+        assert mock_checker.mock_calls == [call.get_service_names()]
+        assert mock_svc.mock_calls == [call.get_limits()]
+        assert self.mock_cat.default_limits.mock_calls == [
+            call('SvcBar', 'rname')
+        ]
+        assert mock_d2c.mock_calls == [
+            call({
+                'SvcBar/bar limit2': '2',
+                'SvcBar/barlimit1': '1',
+                'SvcFoo/foo limit3': '3',
+            })
+        ]
+
+    def test_multi_region(self, capsys):
+        self.mock_cat.has_region.side_effect = lambda r: r == 'r1'
+        mock_c1 = Mock(spec_set=AwsLimitChecker)
+        mock_c1.get_service_names.return_value = ['SvcBar', 'SvcFoo']
+        mock_c2 = Mock(spec=AwsLimitChecker)
+        mock_c2.get_service_names.return_value = ['SvcFoo']
+        mock_svc = Mock()
+        mock_svc.get_limits.return_value = sample_limits()['SvcFoo']
+        mock_c2.services = {'SvcFoo': mock_svc}
+        mock_checker = Mock(checkers={'r1': mock_c1, 'r2': mock_c2})
+        self.cls.checker = mock_checker
+        self.cls.regions = ['r1', 'r2']
+        mock_load, mock_d2c = self.run_list_defaults()
+        assert mock_c1.mock_calls == [call.get_service_names()]
+        assert mock_c2.mock_calls == [call.get_service_names()]
+        assert mock_svc.mock_calls == [call.get_limits()]
+        assert mock_d2c.mock_calls == [
+            call({
+                'r1/SvcBar/bar limit2': '2',
+                'r1/SvcBar/barlimit1': '1',
+                'r1/SvcFoo/foo limit3': '3',
+                'r2/SvcFoo/foo limit3': '3',
+            })
+        ]
+
+    def test_vcpu_limits(self, capsys):
+        mock_checker = Mock(spec=AwsLimitChecker)
+        mock_checker.get_service_names.return_value = ['SvcBar', 'SvcFoo']
+        mock_svc = Mock()
+        mock_svc.get_limits.return_value = sample_limits()['SvcFoo']
+        mock_checker.services = {'SvcFoo': mock_svc}
+        mock_checker.region_name = 'rname'
+        self.cls.checker = mock_checker
+        self.cls.service_name = ['SvcFoo']
+        mock_load, mock_d2c = self.run_list_defaults(
+            env={'USE_VCPU_LIMITS': 'true'}
+        )
+        out, err = capsys.readouterr()
+        assert out == 'd2cval\n'
+        assert mock_load.mock_calls == []
+        assert mock_checker.mock_calls == [call.get_service_names()]
+        assert mock_svc.mock_calls == [call.get_limits()]
+        assert mock_d2c.mock_calls == [
+            call({
+                'SvcFoo/foo limit3': '3',
+            })
+        ]
+
 
 class TestListLimits(RunnerTester):
 
@@ -537,6 +818,31 @@ class TestListLimits(RunnerTester):
             })
         ]
 
+    def test_regions(self, capsys):
+        mock_checker = Mock(spec_set=MultiRegionChecker)
+        mock_checker.get_limits.return_value = {
+            'us-east-1': {'SvcBar': sample_limits_api()['SvcBar']},
+            'us-west-2': {'SvcBar': sample_limits_api()['SvcBar']}
+        }
+        self.cls.checker = mock_checker
+        self.cls.regions = ['us-east-1', 'us-west-2']
+        with patch('awslimitchecker.runner.dict2cols') as mock_d2c:
+            mock_d2c.return_value = 'd2cval'
+            self.cls.list_limits()
+        out, err = capsys.readouterr()
+        assert out == 'd2cval\n'
+        assert mock_checker.mock_calls == [
+            call.get_limits(use_ta=True, service=None)
+        ]
+        assert mock_d2c.mock_calls == [
+            call({
+                'us-east-1/SvcBar/bar limit2': '99',
+                'us-east-1/SvcBar/barlimit1': '1',
+                'us-west-2/SvcBar/bar limit2': '99',
+                'us-west-2/SvcBar/barlimit1': '1'
+            })
+        ]
+
     def test_one_service(self, capsys):
         mock_checker = Mock(spec_set=AwsLimitChecker)
         mock_checker.get_limits.return_value = {
@@ -609,9 +915,10 @@ class TestLoadJson(RunnerTester):
         with patch(
             '%s.open' % pb, mock_open(read_data=data), create=True
         ) as m_open:
-            with patch('%s.boto3.client' % pb) as m_client:
-                m_client.return_value = mock_client
-                res = self.cls.load_json('/foo/bar/baz.json')
+            self.cls.checker = Mock()
+            m_client = self.cls.checker.client_registry.client
+            m_client.return_value = mock_client
+            res = self.cls.load_json('/foo/bar/baz.json')
         assert m_open.mock_calls == [
             call('/foo/bar/baz.json', 'r'),
             call().__enter__(),
@@ -633,11 +940,12 @@ class TestLoadJson(RunnerTester):
         with patch(
             '%s.open' % pb, mock_open(read_data=data), create=True
         ) as m_open:
-            with patch('%s.boto3.client' % pb) as m_client:
-                m_client.return_value = mock_client
-                res = self.cls.load_json(
-                    's3://bucketname/key/foo/bar/baz.json'
-                )
+            self.cls.checker = Mock()
+            m_client = self.cls.checker.client_registry.client
+            m_client.return_value = mock_client
+            res = self.cls.load_json(
+                's3://bucketname/key/foo/bar/baz.json'
+            )
         assert m_open.mock_calls == []
         assert m_client.mock_calls == [
             call('s3'),
@@ -657,9 +965,10 @@ class TestLoadJson(RunnerTester):
         with patch(
             '%s.open' % pb, mock_open(read_data=data), create=True
         ) as m_open:
-            with patch('%s.boto3.client' % pb) as m_client:
-                m_client.return_value = mock_client
-                res = self.cls.load_json('/foo/bar/baz.json')
+            self.cls.checker = Mock()
+            m_client = self.cls.checker.client_registry.client
+            m_client.return_value = mock_client
+            res = self.cls.load_json('/foo/bar/baz.json')
         assert m_open.mock_calls == [
             call('/foo/bar/baz.json', 'r'),
             call().__enter__(),
@@ -681,11 +990,12 @@ class TestLoadJson(RunnerTester):
         with patch(
             '%s.open' % pb, mock_open(read_data=data), create=True
         ) as m_open:
-            with patch('%s.boto3.client' % pb) as m_client:
-                m_client.return_value = mock_client
-                res = self.cls.load_json(
-                    's3://bucketname/key/foo/bar/baz.json'
-                )
+            self.cls.checker = Mock()
+            m_client = self.cls.checker.client_registry.client
+            m_client.return_value = mock_client
+            res = self.cls.load_json(
+                's3://bucketname/key/foo/bar/baz.json'
+            )
         assert m_open.mock_calls == []
         assert m_client.mock_calls == [
             call('s3'),
@@ -775,7 +1085,8 @@ class TestShowUsage(RunnerTester):
         out, err = capsys.readouterr()
         assert out == 'd2cval\n'
         assert mock_checker.mock_calls == [
-            call.find_usage(service=None, use_ta=True),
+            call.find_usage(service=None, use_ta=True,
+                            max_age=None),
             call.get_limits(service=None, use_ta=True)
         ]
         assert mock_d2c.mock_calls == [
@@ -802,7 +1113,8 @@ class TestShowUsage(RunnerTester):
         out, err = capsys.readouterr()
         assert out == 'd2cval\n'
         assert mock_checker.mock_calls == [
-            call.find_usage(service=['SvcFoo'], use_ta=False),
+            call.find_usage(service=['SvcFoo'], use_ta=False,
+                            max_age=None),
             call.get_limits(service=['SvcFoo'], use_ta=False)
         ]
         assert mock_d2c.mock_calls == [
@@ -812,6 +1124,33 @@ class TestShowUsage(RunnerTester):
         ]
 
 
+class TestRunDaemon(RunnerTester):
+
+    def test_run_daemon(self):
+        mock_checker = Mock(spec_set=AwsLimitChecker)
+        self.cls.checker = mock_checker
+        self.cls.service_name = ['SvcFoo']
+        self.cls.skip_ta = True
+        self.cls.max_usage_age = 600
+        args = self.cls.parse_args([
+            '--daemon', '--daemon-interval=120',
+            '--daemon-service-interval=SvcFoo=60', '--listen-port=9000'
+        ])
+        with patch('%s.LimitCheckerDaemon' % pb, autospec=True) as mock_d:
+            self.cls.run_daemon(args)
+        assert mock_d.mock_calls == [
+            call(
+                mock_checker,
+                interval=120.0,
+                service_intervals={'SvcFoo': 60.0},
+                service=['SvcFoo'],
+                use_ta=False,
+                max_age=600
+            ),
+            call().serve('127.0.0.1', 9000)
+        ]
+
+
 class TestCheckThresholds(RunnerTester):
 
     def test_ok(self, capsys):
@@ -826,7 +1165,7 @@ class TestCheckThresholds(RunnerTester):
         out, err = capsys.readouterr()
         assert out == '\n'
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=None)
+            call.check_thresholds(use_ta=True, service=None, max_age=None)
         ]
         assert res == (0, {}, '')
 
@@ -855,13 +1194,81 @@ class TestCheckThresholds(RunnerTester):
         out, err = capsys.readouterr()
         assert out == '\n'
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=['S1']),
+            call.check_thresholds(use_ta=True, service=['S1'], max_age=None),
             call.get_limits()
         ]
         assert res == (0, {}, '')
-        assert mock_metrics.mock_calls == [
-            call.add_limit(mock_lim1),
-            call.add_limit(mock_lim2)
+        assert len(mock_metrics.mock_calls) == 1
+        result = mock_metrics.add_result.mock_calls[0][1][0]
+        assert [(r.service_name, r.name, r.limit) for r in result] == [
+            ('S1', 'lim1', mock_lim1),
+            ('S1', 'lim2', mock_lim2)
+        ]
+
+    def test_metrics_regions(self, capsys):
+        mock_checker = Mock(spec_set=MultiRegionChecker)
+        mock_checker.check_thresholds.return_value = {}
+        mock_lim1 = Mock()
+        mock_lim2 = Mock()
+        mock_lim3 = Mock()
+        mock_checker.get_limits.return_value = {
+            'r2': {
+                'S1': {'lim1': mock_lim1},
+                'S2': {'lim2': mock_lim2}
+            },
+            'r1': {
+                'S1': {'lim3': mock_lim3}
+            }
+        }
+        mock_m1 = Mock()
+        mock_m2 = Mock()
+        self.cls.checker = mock_checker
+        self.cls.regions = ['r1', 'r2']
+        self.cls.service_name = ['S1']
+        with patch('awslimitchecker.runner.dict2cols') as mock_d2c:
+            mock_d2c.return_value = ''
+            res = self.cls.check_thresholds(
+                metrics={'r1': mock_m1, 'r2': mock_m2}
+            )
+        assert res == (0, {}, '')
+        assert mock_checker.mock_calls == [
+            call.check_thresholds(use_ta=True, service=['S1'], max_age=None),
+            call.get_limits()
+        ]
+        assert len(mock_m1.mock_calls) == 1
+        assert [
+            r.limit for r in mock_m1.add_result.mock_calls[0][1][0]
+        ] == [mock_lim3]
+        assert len(mock_m2.mock_calls) == 1
+        assert [
+            r.limit for r in mock_m2.add_result.mock_calls[0][1][0]
+        ] == [mock_lim1]
+
+    def test_regions_skip_check(self):
+        mock_limit = Mock(spec_set=AwsLimit)
+        mock_limit.get_warnings.return_value = []
+        mock_limit.get_criticals.return_value = [Mock()]
+        mock_checker = Mock(spec_set=MultiRegionChecker)
+        mock_checker.check_thresholds.return_value = {
+            'r1': {'svc1': {'lim1': mock_limit, 'lim2': mock_limit}},
+            'r2': {'svc1': {'lim1': mock_limit}}
+        }
+        self.cls.checker = mock_checker
+        self.cls.regions = ['r1', 'r2']
+        self.cls.skip_check = ['svc1/lim1']
+        with patch('%s.issue_string_tuple' % pb) as mock_ist:
+            mock_ist.return_value = ('k', 'v')
+            with patch('%s.dict2cols' % pb) as mock_d2c:
+                mock_d2c.return_value = 'd2cval'
+                res = self.cls.check_thresholds()
+        assert res[0] == 2
+        assert res[1] == {
+            'r1/svc1': {'lim1': mock_limit, 'lim2': mock_limit},
+            'r2/svc1': {'lim1': mock_limit}
+        }
+        assert mock_ist.mock_calls == [
+            call('r1/svc1', mock_limit, [mock_limit.get_criticals()[0]], [],
+                 colorize=True)
         ]
 
     def test_many_problems(self):
@@ -916,7 +1323,7 @@ class TestCheckThresholds(RunnerTester):
                 mock_d2c.return_value = 'd2cval'
                 res = self.cls.check_thresholds()
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=None)
+            call.check_thresholds(use_ta=True, service=None, max_age=None)
         ]
         assert mock_print.mock_calls == [
             call(
@@ -989,7 +1396,7 @@ class TestCheckThresholds(RunnerTester):
                 res = self.cls.check_thresholds()
 
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=None)
+            call.check_thresholds(use_ta=True, service=None, max_age=None)
         ]
         assert mock_print.mock_calls == [
             call(
@@ -1040,7 +1447,7 @@ class TestCheckThresholds(RunnerTester):
                 mock_d2c.return_value = 'd2cval'
                 res = self.cls.check_thresholds()
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=None)
+            call.check_thresholds(use_ta=True, service=None, max_age=None)
         ]
         assert mock_print.mock_calls == [
             call(
@@ -1090,7 +1497,7 @@ class TestCheckThresholds(RunnerTester):
                 mock_d2c.return_value = 'd2cval'
                 res = self.cls.check_thresholds()
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=True, service=['svc2'])
+            call.check_thresholds(use_ta=True, service=['svc2'], max_age=None)
         ]
         assert mock_print.mock_calls == [
             call(
@@ -1128,7 +1535,7 @@ class TestCheckThresholds(RunnerTester):
                 mock_d2c.return_value = 'd2cval'
             res = self.cls.check_thresholds()
         assert mock_checker.mock_calls == [
-            call.check_thresholds(use_ta=False, service=None)
+            call.check_thresholds(use_ta=False, service=None, max_age=None)
         ]
         assert mock_print.mock_calls == [
             call(
@@ -1142,6 +1549,25 @@ class TestCheckThresholds(RunnerTester):
             },
         }, '  \n')
 
+    def test_incomplete(self, capsys):
+        """service that timed out; return 3 and print its limits"""
+        mock_svc = Mock(spec_set=_AwsService)
+        type(mock_svc).service_name = 'svc1'
+        limit1 = AwsLimit('limit1', mock_svc, 10, 80, 99)
+        limit1._set_incomplete('usage check did not finish within 2 seconds')
+        mock_checker = Mock(spec_set=AwsLimitChecker)
+        mock_checker.check_thresholds.return_value = {
+            'svc1': {'limit1': limit1}
+        }
+        self.cls.checker = mock_checker
+        self.cls.colorize = False
+        res = self.cls.check_thresholds()
+        out, err = capsys.readouterr()
+        expected = 'svc1/limit1  (limit 10) INCOMPLETE: usage check did ' \
+                   'not finish within 2 seconds\n'
+        assert out == expected + '\n'
+        assert res == (3, {'svc1': {'limit1': limit1}}, expected)
+
 
 class TestConsoleEntryPoint(RunnerTester):
 
@@ -1174,7 +1600,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             ),
             call().get_project_url(),
             call().get_version()
@@ -1243,7 +1684,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='us-east-1', skip_quotas=False)
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
         ]
 
     def test_role_partition(self):
@@ -1262,7 +1715,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='foo',
-                 ta_api_region='us-east-1', skip_quotas=False)
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
         ]
 
     def test_ta_api_region_skip_quotas(self):
@@ -1281,7 +1746,321 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='foo', skip_quotas=True)
+                 ta_api_region='foo', skip_quotas=True,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
+        ]
+
+    def test_parallelism(self):
+        argv = ['awslimitchecker', '--parallelism=4']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls == [
+            call(account_id=None, account_role=None, critical_threshold=99,
+                 external_id=None, mfa_serial_number=None, mfa_token=None,
+                 profile_name=None, region=None, ta_refresh_mode=None,
+                 ta_refresh_timeout=None, warning_threshold=80,
+                 check_version=True, role_partition='aws',
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=4, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
+        ]
+
+    def test_timeouts(self):
+        argv = ['awslimitchecker', '--service-timeout=10', '--run-timeout=60',
+                '--service-timeout-override=EC2=30']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls == [
+            call(account_id=None, account_role=None, critical_threshold=99,
+                 external_id=None, mfa_serial_number=None, mfa_token=None,
+                 profile_name=None, region=None, ta_refresh_mode=None,
+                 ta_refresh_timeout=None, warning_threshold=80,
+                 check_version=True, role_partition='aws',
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=10.0,
+                 service_timeouts={'EC2': 30.0}, run_timeout=60.0,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
+        ]
+
+    def test_regions(self):
+        argv = ['awslimitchecker', '--regions', 'r1', 'r2', 'r1']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch(
+                        '%s.MultiRegionChecker' % pb, autospec=True
+                    ) as mock_mrc:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls == []
+        assert mock_mrc.mock_calls == [
+            call(account_id=None, account_role=None, critical_threshold=99,
+                 external_id=None, mfa_serial_number=None, mfa_token=None,
+                 profile_name=None, regions=['r1', 'r2'], ta_refresh_mode=None,
+                 region_parallelism=None,
+                 ta_refresh_timeout=None, warning_threshold=80,
+                 check_version=True, role_partition='aws',
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
+        ]
+        assert self.cls.regions == ['r1', 'r2']
+
+    def test_usage_snapshot_db(self):
+        argv = ['awslimitchecker', '--usage-snapshot-db=/tmp/u.db',
+                '--max-usage-age=300']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch(
+                        '%s.SqliteUsageSnapshotStore' % pb, autospec=True
+                    ) as mock_store:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_store.mock_calls == [call('/tmp/u.db')]
+        assert mock_c.mock_calls == [
+            call(account_id=None, account_role=None, critical_threshold=99,
+                 external_id=None, mfa_serial_number=None, mfa_token=None,
+                 profile_name=None, region=None, ta_refresh_mode=None,
+                 ta_refresh_timeout=None, warning_threshold=80,
+                 check_version=True, role_partition='aws',
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=mock_store.return_value,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None)
+        ]
+        assert self.cls.max_usage_age == 300.0
+
+    def test_quotas_cache_db(self):
+        argv = ['awslimitchecker', '--quotas-cache-db=/tmp/u.db',
+                '--quotas-cache-ttl=3600']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch(
+                        '%s.SqliteQuotasCache' % pb, autospec=True
+                    ) as mock_qc:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_qc.mock_calls == [call('/tmp/u.db', ttl=3600.0)]
+        assert mock_c.mock_calls[0][2]['quotas_cache'] == mock_qc.return_value
+
+    def test_ta_cache_db(self):
+        argv = ['awslimitchecker', '--ta-cache-db=/tmp/u.db',
+                '--ta-cache-ttl=600']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch(
+                        '%s.SqliteTrustedAdvisorCache' % pb, autospec=True
+                    ) as mock_tc:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_tc.mock_calls == [call('/tmp/u.db')]
+        assert mock_c.mock_calls[0][2]['ta_cache'] == mock_tc.return_value
+        assert mock_c.mock_calls[0][2]['ta_cache_ttl'] == 600.0
+
+    def test_sts_cache_dir(self):
+        argv = ['awslimitchecker', '--sts-cache-dir=/tmp/sts']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch(
+                        '%s.StsCredentialCache' % pb, autospec=True
+                    ) as mock_sc:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_sc.mock_calls == [call('/tmp/sts')]
+        assert mock_c.mock_calls[0][2]['sts_cache'] == mock_sc.return_value
+
+    def test_scan_schedule(self):
+        argv = ['awslimitchecker', '--usage-snapshot-db=/tmp/u.db',
+                '--scan-schedule', '--max-scan-interval=3600', '-C', '90']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with patch('%s.SqliteUsageSnapshotStore' % pb,
+                               autospec=True):
+                        with patch(
+                            '%s.ScanSchedule' % pb, autospec=True
+                        ) as mock_sched:
+                            with pytest.raises(SystemExit) as excinfo:
+                                self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_sched.mock_calls == [
+            call(min_interval=300, max_interval=3600.0, threshold=90)
+        ]
+        assert mock_c.mock_calls[0][2]['scan_schedule'] == \
+            mock_sched.return_value
+
+    def test_usage_source(self):
+        argv = ['awslimitchecker', '--usage-source=cloudwatch']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls[0][2]['usage_source'] == 'cloudwatch'
+
+    def test_resource_detail(self):
+        argv = ['awslimitchecker', '--resource-detail']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls[0][2]['resource_detail'] is True
+
+    def test_usage_retention(self):
+        argv = ['awslimitchecker', '--usage-retention', '10']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.check_thresholds' % pb,
+                       autospec=True) as mock_check:
+                mock_check.return_value = 0, {}, ''
+                with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_c.mock_calls[0][2]['usage_retention'] == 10
+
+    def test_scan_schedule_without_db(self):
+        argv = ['awslimitchecker', '--scan-schedule']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                with patch('%s.logger' % pb) as mock_logger:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 1
+        assert mock_c.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.error('--scan-schedule requires --usage-snapshot-db')
+        ]
+
+    def test_region_parallelism_without_regions(self):
+        argv = ['awslimitchecker', '--region-parallelism=2']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                with patch('%s.logger' % pb) as mock_logger:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 1
+        assert mock_c.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.error('--region-parallelism requires --regions')
+        ]
+
+    def test_max_usage_age_without_db(self):
+        argv = ['awslimitchecker', '--max-usage-age=300']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                with patch('%s.logger' % pb) as mock_logger:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 1
+        assert mock_c.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.error('--max-usage-age requires --usage-snapshot-db')
+        ]
+
+    def test_region_and_regions(self):
+        argv = ['awslimitchecker', '-r', 'r1', '--regions', 'r1', 'r2']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.AwsLimitChecker' % pb, autospec=True) as mock_c:
+                with patch(
+                    '%s.MultiRegionChecker' % pb, autospec=True
+                ) as mock_mrc:
+                    with patch('%s.logger' % pb) as mock_logger:
+                        with pytest.raises(SystemExit) as excinfo:
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 1
+        assert mock_c.mock_calls == []
+        assert mock_mrc.mock_calls == []
+        assert mock_logger.mock_calls == [
+            call.error('-r/--region and --regions may not be used together')
         ]
 
     def test_skip_service(self):
@@ -1300,7 +2079,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='us-east-1', skip_quotas=False),
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None),
             call().remove_services(['foo'])
         ]
 
@@ -1324,7 +2115,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='us-east-1', skip_quotas=False),
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None),
             call().remove_services(['foo', 'bar'])
         ]
 
@@ -1347,7 +2150,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='us-east-1', skip_quotas=False),
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None),
         ]
         assert self.cls.skip_check == [
             'EC2/Max launch specifications per spot fleet',
@@ -1373,7 +2188,19 @@ class TestConsoleEntryPoint(RunnerTester):
                  profile_name=None, region=None, ta_refresh_mode=None,
                  ta_refresh_timeout=None, warning_threshold=80,
                  check_version=True, role_partition='aws',
-                 ta_api_region='us-east-1', skip_quotas=False),
+                 ta_api_region='us-east-1', skip_quotas=False,
+                 parallelism=1, service_timeout=None,
+                 service_timeouts={}, run_timeout=None,
+                 usage_store=None,
+                 quotas_cache=None, ta_poll_min_interval=5,
+                 ta_poll_max_interval=60,
+                 ta_cache=None,
+                 ta_cache_ttl=3600,
+                 sts_cache=None,
+                 scan_schedule=None,
+                 usage_source='api',
+                 resource_detail=False,
+                 usage_retention=None),
         ]
         assert self.cls.skip_check == [
             'EC2/Max launch specifications per spot fleet',
@@ -1458,6 +2285,19 @@ class TestConsoleEntryPoint(RunnerTester):
             call(self.cls)
         ]
 
+    def test_daemon(self):
+        argv = ['awslimitchecker', '--daemon']
+        with patch.object(sys, 'argv', argv):
+            with patch('%s.Runner.run_daemon' % pb, autospec=True) as mock_d:
+                with patch('%s.Runner.check_thresholds' % pb,
+                           autospec=True) as mock_ct:
+                    with pytest.raises(SystemExit) as excinfo:
+                        self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert len(mock_d.mock_calls) == 1
+        assert mock_d.mock_calls[0][1][1].daemon is True
+        assert mock_ct.mock_calls == []
+
     def test_skip_ta(self, capsys):
         argv = ['awslimitchecker', '--skip-ta']
         with patch.object(sys, 'argv', argv):
@@ -1526,7 +2366,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
         assert self.cls.service_name is None
@@ -1568,7 +2423,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
         assert self.cls.service_name is None
@@ -1613,7 +2483,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=False,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
         assert self.cls.service_name is None
@@ -1674,7 +2559,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
 
@@ -1704,7 +2604,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
 
@@ -1734,7 +2649,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
 
@@ -1765,7 +2695,22 @@ class TestConsoleEntryPoint(RunnerTester):
                 check_version=True,
                 role_partition='aws',
                 ta_api_region='us-east-1',
-                skip_quotas=False
+                skip_quotas=False,
+                parallelism=1,
+                service_timeout=None,
+                service_timeouts={},
+                run_timeout=None,
+                usage_store=None,
+                quotas_cache=None,
+                ta_poll_min_interval=5,
+                ta_poll_max_interval=60,
+                ta_cache=None,
+                ta_cache_ttl=3600,
+                sts_cache=None,
+                scan_schedule=None,
+                usage_source='api',
+                resource_detail=False,
+                usage_retention=None
             )
         ]
 
@@ -1903,6 +2848,37 @@ class TestConsoleEntryPoint(RunnerTester):
             call()().on_warning({'Foo': 'bar'}, 'FooBar', duration=12)
         ]
 
+    @freeze_time("2016-12-16 10:40:42", tz_offset=0, auto_tick_seconds=6)
+    def test_check_thresholds_incomplete_with_alerter(self):
+        argv = [
+            'awslimitchecker',
+            '--alert-provider=MyAlerter',
+        ]
+        mock_alerter = Mock()
+        mock_rn = PropertyMock(return_value='rname')
+        with patch.object(sys, 'argv', argv):
+            with patch(
+                '%s.Runner.check_thresholds' % pb, autospec=True
+            ) as mock_ct:
+                with patch(
+                    '%s.AlertProvider.get_provider_by_name' % pb
+                ) as m_gpbn:
+                    m_gpbn.return_value = mock_alerter
+                    with pytest.raises(SystemExit) as excinfo:
+                        with patch(
+                                '%s.AwsLimitChecker' % pb,
+                                spec_set=AwsLimitChecker
+                        ) as mock_alc:
+                            type(mock_alc.return_value).region_name = mock_rn
+                            mock_ct.return_value = 3, {'Foo': 'bar'}, 'FooBar'
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert m_gpbn.mock_calls == [
+            call('MyAlerter'),
+            call()('rname'),
+            call()().on_warning({'Foo': 'bar'}, 'FooBar', duration=12)
+        ]
+
     @freeze_time("2016-12-16 10:40:42", tz_offset=0, auto_tick_seconds=6)
     def test_check_thresholds_crit_with_alerter(self):
         argv = [
@@ -1974,6 +2950,44 @@ class TestConsoleEntryPoint(RunnerTester):
             call().flush()
         ]
 
+    @freeze_time("2016-12-16 10:40:42", tz_offset=0, auto_tick_seconds=6)
+    def test_check_thresholds_with_metrics_regions(self):
+        argv = [
+            'awslimitchecker',
+            '--metrics-provider=FooProvider',
+            '--metrics-config=foo=bar',
+            '--regions', 'r1', 'r2'
+        ]
+        mock_prov = Mock()
+        mock_prov.side_effect = [Mock(), Mock()]
+        with patch.object(sys, 'argv', argv):
+            with patch(
+                '%s.Runner.check_thresholds' % pb, autospec=True
+            ) as mock_ct:
+                with patch(
+                    '%s.MetricsProvider.get_provider_by_name' % pb
+                ) as m_gpbn:
+                    m_gpbn.return_value = mock_prov
+                    with patch(
+                        '%s.MultiRegionChecker' % pb,
+                        spec_set=MultiRegionChecker
+                    ):
+                        with pytest.raises(SystemExit) as excinfo:
+                            mock_ct.return_value = 0, {}, 'foo'
+                            self.cls.console_entry_point()
+        assert excinfo.value.code == 0
+        assert mock_prov.mock_calls == [
+            call('r1', foo='bar'),
+            call('r2', foo='bar')
+        ]
+        metrics = mock_ct.mock_calls[0][1][1]
+        assert sorted(metrics.keys()) == ['r1', 'r2']
+        for m in metrics.values():
+            assert m.mock_calls == [
+                call.set_run_duration(6),
+                call.flush()
+            ]
+
     def test_list_metrics_providers(self, capsys):
         argv = ['awslimitchecker', '--list-metrics-providers']
         with patch.object(sys, 'argv', argv):
@@ -0,0 +1,79 @@
+"""
+awslimitchecker/tests/test_schedule.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+
+from awslimitchecker.schedule import ScanSchedule
+
+
+class TestScanSchedule(object):
+
+    def setup(self):
+        self.cls = ScanSchedule(
+            min_interval=100, max_interval=10000, threshold=100
+        )
+
+    def test_init_defaults(self):
+        cls = ScanSchedule()
+        assert cls.min_interval == 300
+        assert cls.max_interval == 86400
+        assert cls.threshold == 99
+        assert cls.safety_factor == 0.5
+        assert cls.window == 604800
+
+    def test_no_history(self):
+        assert self.cls.interval([]) == 0
+
+    def test_headroom(self):
+        assert self.cls.interval([(1.0, 0.0)]) == 10000
+        assert self.cls.interval([(1.0, 0.03)]) == 9700
+        assert self.cls.interval([(1.0, 0.75)]) == 2500
+
+    def test_min_interval(self):
+        assert self.cls.interval([(1.0, 0.999)]) == 100
+        assert self.cls.interval([(1.0, 1.5)]) == 100
+
+    def test_growth(self):
+        # 0.01 per 100s; 0.5 headroom reached in 5000s, half of that is 2500
+        assert self.cls.interval(
+            [(0.0, 0.49), (100.0, 0.5)]
+        ) == pytest.approx(2500)
+
+    def test_shrinking(self):
+        assert self.cls.interval([(0.0, 0.9), (100.0, 0.5)]) == 5000
@@ -0,0 +1,253 @@
+"""
+awslimitchecker/tests/test_snapshots.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import pytest
+import sqlite3
+import sys
+
+from awslimitchecker.limit import AwsLimit
+from awslimitchecker.snapshots import (
+    UsageSnapshotStore, SqliteUsageSnapshotStore, SqliteQuotasCache,
+    SqliteTrustedAdvisorCache
+)
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.snapshots'
+
+
+class TestUsageSnapshotStore(object):
+
+    def setup(self):
+        self.svc = Mock(service_name='SvcFoo', _have_usage=False)
+        self.lim1 = AwsLimit('lim1', self.svc, 10, 80, 99)
+        self.lim2 = AwsLimit('lim2', self.svc, 20, 80, 99)
+        self.svc.get_limits.return_value = {
+            'lim1': self.lim1, 'lim2': self.lim2
+        }
+        self.data = {
+            'lim1': {'limit': 10, 'usage': [[3, None, None, None]]},
+            'lim2': {
+                'limit': 20,
+                'usage': [[1, 5, 'i-1', 'AWS::EC2::Instance'],
+                          [2, None, 'i-2', 'AWS::EC2::Instance']]
+            }
+        }
+        self.cls = UsageSnapshotStore()
+
+    def test_abstract(self):
+        with pytest.raises(NotImplementedError):
+            self.cls.get('1', 'r', 'SvcFoo')
+        with pytest.raises(NotImplementedError):
+            self.cls.put('1', 'r', 'SvcFoo', {}, 1.0)
+
+    def test_save_service(self):
+        self.lim1._add_current_usage(3)
+        self.lim2._add_current_usage(
+            1, maximum=5, resource_id='i-1', aws_type='AWS::EC2::Instance'
+        )
+        self.lim2._add_current_usage(
+            2, resource_id='i-2', aws_type='AWS::EC2::Instance'
+        )
+        with patch.object(self.cls, 'put') as mock_put:
+            with patch.object(self.cls, 'add_history') as mock_hist:
+                with patch('%s.time.time' % pbm) as mock_time:
+                    mock_time.return_value = 1000.0
+                    self.cls.save_service('1', 'r', self.svc)
+        assert mock_put.mock_calls == [
+            call('1', 'r', 'SvcFoo', self.data, 1000.0)
+        ]
+        assert mock_hist.mock_calls == [
+            call('1', 'r', 'SvcFoo', 1000.0, 0.3)
+        ]
+
+    def test_save_service_unlimited(self):
+        self.lim1._set_ta_unlimited()
+        self.lim1._add_current_usage(3)
+        with patch.object(self.cls, 'put'):
+            with patch.object(self.cls, 'add_history') as mock_hist:
+                with patch('%s.time.time' % pbm) as mock_time:
+                    mock_time.return_value = 1000.0
+                    self.cls.save_service('1', 'r', self.svc)
+        assert mock_hist.mock_calls == [
+            call('1', 'r', 'SvcFoo', 1000.0, 0.0)
+        ]
+
+    def test_history_default(self):
+        self.cls.add_history('1', 'r', 'SvcFoo', 1.0, 0.5)
+        assert self.cls.get_history('1', 'r', 'SvcFoo', 0) == []
+
+    def test_load_service(self):
+        self.lim1._add_current_usage(8)
+        with patch.object(self.cls, 'get') as mock_get:
+            mock_get.return_value = (900.0, self.data)
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1000.0
+                res = self.cls.load_service('1', 'r', self.svc, 120)
+        assert res is True
+        assert mock_get.mock_calls == [call('1', 'r', 'SvcFoo')]
+        assert self.svc._have_usage is True
+        assert self.lim1.get_current_usage_str() == '3'
+        u = self.lim2.get_current_usage()
+        assert len(u) == 2
+        assert u[0].value == 1
+        assert u[0].maximum == 5
+        assert u[0].resource_id == 'i-1'
+        assert u[0].aws_type == 'AWS::EC2::Instance'
+        assert u[1].value == 2
+        assert u[1].maximum is None
+
+    def test_load_service_none(self):
+        with patch.object(self.cls, 'get') as mock_get:
+            mock_get.return_value = None
+            res = self.cls.load_service('1', 'r', self.svc, 120)
+        assert res is False
+        assert self.svc._have_usage is False
+
+    def test_load_service_too_old(self):
+        self.lim1._add_current_usage(8)
+        with patch.object(self.cls, 'get') as mock_get:
+            mock_get.return_value = (800.0, self.data)
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1000.0
+                res = self.cls.load_service('1', 'r', self.svc, 120)
+        assert res is False
+        assert self.svc._have_usage is False
+        assert self.lim1.get_current_usage_str() == '8'
+
+    def test_load_service_missing_limit(self):
+        del self.data['lim2']
+        with patch.object(self.cls, 'get') as mock_get:
+            mock_get.return_value = (900.0, self.data)
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1000.0
+                res = self.cls.load_service('1', 'r', self.svc, 120)
+        assert res is False
+        assert self.svc._have_usage is False
+        assert self.lim1.get_current_usage() == []
+
+
+class TestSqliteUsageSnapshotStore(object):
+
+    def test_roundtrip(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        cls = SqliteUsageSnapshotStore(path)
+        assert cls.get('1', 'r', 'SvcFoo') is None
+        cls.put('1', 'r', 'SvcFoo', {'lim': {'limit': 1, 'usage': []}}, 5.0)
+        cls.put('1', 'r2', 'SvcFoo', {}, 6.0)
+        cls.put('1', 'r', 'SvcFoo', {'lim': {'limit': 2, 'usage': []}}, 7.0)
+        assert cls.get('1', 'r', 'SvcFoo') == (
+            7.0, {'lim': {'limit': 2, 'usage': []}}
+        )
+        assert cls.get('1', 'r2', 'SvcFoo') == (6.0, {})
+        assert SqliteUsageSnapshotStore(path).get('1', 'r2', 'SvcFoo') == (
+            6.0, {}
+        )
+
+    def test_format(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        cls = SqliteUsageSnapshotStore(path)
+        cls.put('1', 'r', 'SvcFoo', {'b': 1, 'a': [1, None]}, 5.0)
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute('SELECT * FROM usage_snapshots').fetchall()
+            ver = conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+        assert rows == [('1', 'r', 'SvcFoo', 5.0, '{"a":[1,null],"b":1}')]
+        assert ver == 1
+
+    def test_history(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        cls = SqliteUsageSnapshotStore(path, history_retention=100)
+        assert cls.get_history('1', 'r', 'SvcFoo', 0) == []
+        cls.add_history('1', 'r', 'SvcFoo', 10.0, 0.1)
+        cls.add_history('1', 'r', 'SvcFoo', 50.0, 0.2)
+        cls.add_history('1', 'r', 'SvcBar', 60.0, 0.9)
+        cls.add_history('1', 'r', 'SvcFoo', 120.0, 0.4)
+        assert cls.get_history('1', 'r', 'SvcFoo', 0) == [
+            (50.0, 0.2), (120.0, 0.4)
+        ]
+        assert cls.get_history('1', 'r', 'SvcFoo', 100.0) == [(120.0, 0.4)]
+        assert SqliteUsageSnapshotStore(path).get_history(
+            '1', 'r', 'SvcBar', 0
+        ) == [(60.0, 0.9)]
+
+
+class TestSqliteQuotasCache(object):
+
+    def test_ttl(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        cls = SqliteQuotasCache(path, ttl=60)
+        assert cls.get('1', 'r', 'ec2') is None
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            cls.put('1', 'r', 'ec2', {'q': {'Value': 5.0}})
+            assert cls.get('1', 'r', 'ec2') == {'q': {'Value': 5.0}}
+            mock_time.return_value = 1061.0
+            assert cls.get('1', 'r', 'ec2') is None
+
+    def test_shared_file(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        SqliteQuotasCache(path).put('1', 'r', 'ec2', {'q': 1})
+        snaps = SqliteUsageSnapshotStore(path)
+        assert snaps.get('1', 'r', 'ec2') is None
+        snaps.put('1', 'r', 'ec2', {'lim': 2}, 5.0)
+        assert SqliteQuotasCache(path).get('1', 'r', 'ec2') == {'q': 1}
+
+
+class TestSqliteTrustedAdvisorCache(object):
+
+    def test_get_put(self, tmpdir):
+        path = str(tmpdir.join('usage.db'))
+        cls = SqliteTrustedAdvisorCache(path)
+        assert cls.get('1') is None
+        data = {'check_timestamp': 10.0, 'regions': {'r': {'EC2': {'a': 1}}}}
+        cls.put('1', data, 20.0)
+        assert SqliteTrustedAdvisorCache(path).get('1') == (20.0, data)
+        assert cls.get('2') is None
+        assert SqliteQuotasCache(path).get('1', '', 'Service Limits') is None
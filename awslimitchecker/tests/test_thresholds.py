@@ -0,0 +1,266 @@
+"""
+awslimitchecker/tests/test_thresholds.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import random
+import sys
+
+import pytest
+
+from awslimitchecker.limit import AwsLimit
+from awslimitchecker.services.base import _AwsService
+from awslimitchecker import thresholds
+from awslimitchecker.thresholds import ThresholdResults, evaluate_thresholds
+
+# https://code.google.com/p/mock/issues/detail?id=249
+# py>=3.4 should use unittest.mock not the mock package on pypi
+if (
+        sys.version_info[0] < 3 or
+        sys.version_info[0] == 3 and sys.version_info[1] < 4
+):
+    from mock import patch, call, Mock
+else:
+    from unittest.mock import patch, call, Mock
+
+pbm = 'awslimitchecker.thresholds'
+
+
+def make_limits(svc):
+    """
+    Return a list of limits covering each kind of threshold evaluation.
+    """
+    pct = AwsLimit('pct', svc, 100, 80, 99)
+    for i in [10, 85, 99, 50]:
+        pct._add_current_usage(i, resource_id='pct%d' % i)
+    counts = AwsLimit('counts', svc, 1000, 80, 99)
+    counts.set_threshold_override(warn_count=20, crit_count=30)
+    for i in [10, 25, 30]:
+        counts._add_current_usage(i, resource_id='count%d' % i)
+    maxima = AwsLimit('maxima', svc, 3, 80, 99)
+    maxima._add_current_usage(9, maximum=10, resource_id='max9')
+    maxima._add_current_usage(2, maximum=10, resource_id='max2')
+    maxima._add_current_usage(3, resource_id='max3')
+    unlimited = AwsLimit('unlimited', svc, None, 80, 99)
+    unlimited._add_current_usage(5)
+    zero = AwsLimit('zero', svc, 0, 80, 99)
+    zero._add_current_usage(5)
+    empty = AwsLimit('empty', svc, 10, 80, 99)
+    return [pct, counts, maxima, unlimited, zero, empty]
+
+
+def result_ids(limits):
+    return [
+        (
+            [u.resource_id for u in lim.get_warnings()],
+            [u.resource_id for u in lim.get_criticals()]
+        ) for lim in limits
+    ]
+
+
+class TestEvaluateThresholds(object):
+
+    def setup(self):
+        self.mock_svc = Mock(spec_set=_AwsService)
+        type(self.mock_svc).service_name = 'mysname'
+
+    def test_python(self):
+        limits = make_limits(self.mock_svc)
+        res = evaluate_thresholds(limits, use_numpy=False)
+        assert isinstance(res, ThresholdResults)
+        assert res.ok == [False, False, False, True, True, True]
+        assert result_ids(limits) == [
+            (['pct85'], ['pct99']),
+            (['count25'], ['count30']),
+            (['max9'], ['max3']),
+            ([], []),
+            ([], []),
+            ([], []),
+        ]
+        assert [(pct, lim.name, u.resource_id) for pct, lim, u in
+                res.offenders()] == [
+            (100.0, 'maxima', 'max3'),
+            (99.0, 'pct', 'pct99'),
+            (90.0, 'maxima', 'max9'),
+            (85.0, 'pct', 'pct85'),
+            (3.0, 'counts', 'count30'),
+            (2.5, 'counts', 'count25'),
+        ]
+        assert [(pct, lim.name, u.resource_id) for pct, lim, u in
+                res.offenders(count=2)] == [
+            (100.0, 'maxima', 'max3'),
+            (99.0, 'pct', 'pct99'),
+        ]
+
+    def test_python_same_as_check_thresholds(self):
+        limits = make_limits(self.mock_svc)
+        expected_ok = [lim.check_thresholds() for lim in limits]
+        expected = result_ids(limits)
+        res = evaluate_thresholds(limits, use_numpy=False)
+        assert res.ok == expected_ok
+        assert result_ids(limits) == expected
+
+    def test_replaces_previous_results(self):
+        limits = make_limits(self.mock_svc)
+        evaluate_thresholds(limits, use_numpy=False)
+        limits[0].set_threshold_override(warn_percent=90, crit_percent=100)
+        res = evaluate_thresholds(limits[:1], use_numpy=False)
+        assert res.ok == [False]
+        assert result_ids(limits[:1]) == [(['pct99'], [])]
+
+    def test_python_incremental(self):
+        limits = make_limits(self.mock_svc)
+        evaluate_thresholds(limits, use_numpy=False)
+        warnings = [lim.get_warnings() for lim in limits]
+        limits[1]._add_current_usage(40, resource_id='count40')
+        res = evaluate_thresholds(limits, use_numpy=False)
+        assert res.ok == [False, False, False, True, True, True]
+        assert [lim.get_warnings() for lim in limits][2:] == warnings[2:]
+        assert limits[0].get_warnings() is warnings[0]
+        assert limits[1].get_warnings() is not warnings[1]
+        assert result_ids(limits[1:2]) == [
+            (['count25'], ['count30', 'count40'])
+        ]
+
+    def test_default_without_numpy(self):
+        with patch('%s.numpy' % pbm, None):
+            with patch('%s._evaluate_python' % pbm) as mock_py:
+                with patch('%s._evaluate_numpy' % pbm) as mock_np:
+                    res = evaluate_thresholds(['a'])
+        assert res is mock_py.return_value
+        assert mock_py.mock_calls == [call(['a'])]
+        assert mock_np.mock_calls == []
+
+    def test_default_with_numpy(self):
+        with patch('%s.numpy' % pbm, Mock()):
+            with patch('%s._evaluate_python' % pbm) as mock_py:
+                with patch('%s._evaluate_numpy' % pbm) as mock_np:
+                    res = evaluate_thresholds(['a'])
+        assert res is mock_np.return_value
+        assert mock_py.mock_calls == []
+        assert mock_np.mock_calls == [call(['a'])]
+
+    def test_numpy_missing(self):
+        with patch('%s.numpy' % pbm, None):
+            with pytest.raises(RuntimeError) as excinfo:
+                evaluate_thresholds([], use_numpy=True)
+        assert 'numpy could not be imported' in str(excinfo.value)
+
+
+@pytest.mark.skipif(thresholds.numpy is None, reason='numpy not installed')
+class TestEvaluateNumpy(object):
+
+    def setup(self):
+        self.mock_svc = Mock(spec_set=_AwsService)
+        type(self.mock_svc).service_name = 'mysname'
+
+    def compare(self, make):
+        py_limits = make()
+        py_res = evaluate_thresholds(py_limits, use_numpy=False)
+        np_limits = make()
+        np_res = evaluate_thresholds(np_limits, use_numpy=True)
+        assert np_res.ok == py_res.ok
+        assert result_ids(np_limits) == result_ids(py_limits)
+        assert [(pct, lim.name, u.resource_id) for pct, lim, u in
+                np_res.offenders()] == [
+            (pct, lim.name, u.resource_id)
+            for pct, lim, u in py_res.offenders()
+        ]
+
+    def test_cases(self):
+        self.compare(lambda: make_limits(self.mock_svc))
+
+    def test_incremental(self):
+        limits = make_limits(self.mock_svc)
+        evaluate_thresholds(limits, use_numpy=True)
+        warnings = [lim.get_warnings() for lim in limits]
+        limits[0].set_threshold_override(warn_percent=90, crit_percent=100)
+        res = evaluate_thresholds(limits, use_numpy=True)
+        assert res.ok == [False, False, False, True, True, True]
+        assert limits[0].get_warnings() is not warnings[0]
+        for lim, lim_warnings in zip(limits[1:], warnings[1:]):
+            assert lim.get_warnings() is lim_warnings
+        assert result_ids(limits[:1]) == [(['pct99'], [])]
+        # unchanged limits are not evaluated again
+        with patch('%s._evaluate_arrays' % pbm) as mock_eval:
+            res = evaluate_thresholds(limits, use_numpy=True)
+        assert mock_eval.mock_calls == [call([], [], [], [])]
+        assert res.ok == [False, False, False, True, True, True]
+
+    def test_retention_limit_lowered(self):
+        def make():
+            lim = AwsLimit('retained', self.mock_svc, 100, 80, 99)
+            lim.set_usage_retention(1)
+            for i in [40, 10, 60, 50, 20]:
+                lim._add_current_usage(i, resource_id='r%02d' % i)
+            lim._set_ta_limit(55)
+            return [lim]
+
+        self.compare(make)
+        limits = make()
+        evaluate_thresholds(limits, use_numpy=True)
+        assert result_ids(limits) == [(['r50'], ['r60'])]
+
+    def test_empty(self):
+        res = evaluate_thresholds([], use_numpy=True)
+        assert res.ok == []
+        assert res.offenders() == []
+
+    def test_random(self):
+        def make():
+            rand = random.Random(1234)
+            limits = []
+            for i in range(50):
+                lim = AwsLimit(
+                    'lim%d' % i, self.mock_svc,
+                    rand.choice([None, 0, 10, 100, 1000]), 80, 99
+                )
+                if rand.random() < 0.3:
+                    lim.set_threshold_override(
+                        warn_count=rand.randint(1, 500),
+                        crit_count=rand.choice([None, 600])
+                    )
+                for j in range(rand.randint(0, 200)):
+                    lim._add_current_usage(
+                        rand.choice([rand.randint(0, 1000), rand.random()]),
+                        maximum=rand.choice([None, None, 50, 500]),
+                        resource_id='r%d' % j
+                    )
+                limits.append(lim)
+            return limits
+
+        self.compare(make)
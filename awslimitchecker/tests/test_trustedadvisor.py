@@ -39,9 +39,14 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import sys
 from botocore.exceptions import ClientError
-from awslimitchecker.trustedadvisor import TrustedAdvisor, datetime_now
+from awslimitchecker.trustedadvisor import (
+    TrustedAdvisor, TrustedAdvisorResultCache, datetime_now
+)
+from awslimitchecker.snapshots import SqliteTrustedAdvisorCache
 from awslimitchecker.services.base import _AwsService
 from awslimitchecker.limit import AwsLimit
+from awslimitchecker.connectable import ClientRegistry
+from awslimitchecker.services.registry import ServiceInstances
 import pytest
 from datetime import datetime
 from freezegun import freeze_time
@@ -89,6 +94,17 @@ class TestInit(object):
         assert cls.limits_updated is False
         assert cls.refresh_mode is None
         assert cls.refresh_timeout is None
+        assert cls.poll_min_interval == 5
+        assert cls.poll_max_interval == 60
+        assert cls._poll_thread is None
+        assert cls._result_cache is None
+        assert cls._account_id is None
+        assert isinstance(cls._client_registry, ClientRegistry)
+
+    def test_client_registry(self):
+        m_reg = Mock(spec_set=ClientRegistry)
+        cls = TrustedAdvisor({}, {}, client_registry=m_reg)
+        assert cls._client_registry == m_reg
 
     def test_boto_kwargs(self):
         mock_svc = Mock(spec_set=_AwsService)
@@ -179,6 +195,37 @@ class TestUpdateLimits(object):
         assert mocks['_update_services'].mock_calls == [
             call(self.cls, mock_results)
         ]
+        assert self.cls._ta_results == mock_results
+
+    def test_again_new_services(self):
+        mock_results = Mock()
+        mock_svc = Mock(spec_set=_AwsService)
+        mock_svc.get_limits.return_value = {}
+        services = ServiceInstances(['SvcFoo', 'SvcBar'], lambda n: mock_svc)
+        self.cls.all_services = services
+        self.cls.limits_updated = True
+        self.cls._ta_results = mock_results
+        services['SvcFoo']
+        with patch.multiple(
+            pb,
+            connect=DEFAULT,
+            _poll=DEFAULT,
+            _update_services=DEFAULT,
+            autospec=True
+        ) as mocks:
+            with patch('%s.logger' % pbm) as mock_logger:
+                self.cls.update_limits()
+                self.cls.update_limits()
+        assert mocks['connect'].mock_calls == []
+        assert mocks['_poll'].mock_calls == []
+        assert mocks['_update_services'].mock_calls == [
+            call(self.cls, mock_results)
+        ]
+        assert self.cls._ta_service_names == set(['SvcFoo'])
+        assert mock_logger.mock_calls == [
+            call.debug('Updating TA limits on new services'),
+            call.debug('Already polled TA; skipping update')
+        ]
 
     def test_again(self):
         mock_results = Mock()
@@ -202,6 +249,31 @@ class TestUpdateLimits(object):
             call.debug('Already polled TA; skipping update')
         ]
 
+    def test_expire_limits(self):
+        mock_results1 = Mock()
+        mock_results2 = Mock()
+        with patch.multiple(
+            pb,
+            connect=DEFAULT,
+            _poll=DEFAULT,
+            _update_services=DEFAULT,
+            _dont_use_ta=DEFAULT,
+            autospec=True
+        ) as mocks:
+            mocks['_poll'].side_effect = [mock_results1, mock_results2]
+            mocks['_dont_use_ta'].return_value = False
+            self.cls.update_limits()
+            self.cls.expire_limits()
+            assert self.cls.limits_updated is False
+            self.cls.update_limits()
+        assert mocks['_poll'].mock_calls == [call(self.cls), call(self.cls)]
+        assert mocks['_update_services'].mock_calls == [
+            call(self.cls, mock_results1),
+            call(self.cls, mock_results2)
+        ]
+        assert self.cls.limits_updated is True
+        assert self.cls._ta_results == mock_results2
+
     def test_dont_use(self):
         mock_results = Mock()
         with patch.multiple(
@@ -220,6 +292,73 @@ class TestUpdateLimits(object):
         assert mocks['_update_services'].mock_calls == []
 
 
+class TestBackgroundUpdateLimits(object):
+
+    def setup(self):
+        self.cls = TrustedAdvisor({}, {})
+
+    def test_background(self):
+        mock_results = Mock()
+        with patch.multiple(
+            pb,
+            connect=DEFAULT,
+            _poll=DEFAULT,
+            _update_services=DEFAULT,
+            _dont_use_ta=DEFAULT,
+            autospec=True
+        ) as mocks:
+            mocks['_poll'].return_value = mock_results
+            mocks['_dont_use_ta'].return_value = False
+            self.cls.start_update_limits()
+            # a second call while the first poll is running is a no-op
+            self.cls.start_update_limits()
+            self.cls.update_limits()
+            self.cls.update_limits()
+            self.cls.start_update_limits()
+        assert self.cls._poll_thread is None
+        assert self.cls.limits_updated is True
+        assert mocks['connect'].mock_calls == [call(self.cls)]
+        assert mocks['_poll'].mock_calls == [call(self.cls)]
+        assert mocks['_update_services'].mock_calls == [
+            call(self.cls, mock_results)
+        ]
+
+    def test_background_dont_use(self):
+        with patch.multiple(
+            pb,
+            connect=DEFAULT,
+            _poll=DEFAULT,
+            _update_services=DEFAULT,
+            _dont_use_ta=DEFAULT,
+            autospec=True
+        ) as mocks:
+            mocks['_dont_use_ta'].return_value = True
+            self.cls.start_update_limits()
+            self.cls.update_limits()
+        assert self.cls.limits_updated is False
+        assert mocks['_poll'].mock_calls == []
+        assert mocks['_update_services'].mock_calls == []
+
+    def test_background_exception(self):
+        with patch.multiple(
+            pb,
+            connect=DEFAULT,
+            _poll=DEFAULT,
+            _update_services=DEFAULT,
+            _dont_use_ta=DEFAULT,
+            autospec=True
+        ) as mocks:
+            mocks['_poll'].side_effect = RuntimeError('foo')
+            mocks['_dont_use_ta'].return_value = False
+            self.cls.start_update_limits()
+            with pytest.raises(RuntimeError) as excinfo:
+                self.cls.update_limits()
+        assert str(excinfo.value) == 'foo'
+        assert self.cls.limits_updated is False
+        assert self.cls._poll_exception is None
+        assert mocks['_update_services'].mock_calls == []
+
+
 class TestDontUseTa():
 
     def setup(self):
@@ -867,6 +1006,224 @@ class TestPoll(object):
         assert res == {}
 
 
+class TestCachedPoll(object):
+
+    def setup(self):
+        self.check_result = {
+            'result': {
+                'timestamp': '2015-06-15T20:27:42Z',
+                'flaggedResources': [
+                    {
+                        'region': 'us-west-2',
+                        'metadata': ['us-west-2', 'EC2', 'Foo', '20']
+                    },
+                    {
+                        'region': 'us-east-1',
+                        'metadata': ['us-east-1', 'EC2', 'Foo', '10']
+                    },
+                    {
+                        'metadata': ['-', 'IAM', 'Users', '5000']
+                    },
+                ]
+            }
+        }
+        self.check_id = (
+            'foo', ['Region', 'Service', 'Limit Name', 'Limit Amount']
+        )
+        self.cache = TrustedAdvisorResultCache()
+
+    def _make(self, region, **kwargs):
+        cls = TrustedAdvisor(
+            {}, {'region_name': region}, result_cache=self.cache, **kwargs
+        )
+        cls.conn = Mock()
+        return cls
+
+    def test_shared(self):
+        east = self._make('us-east-1')
+        west = self._make('us-west-2', ta_refresh_mode=600)
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            with patch('%s._get_refreshed_check_result' % pb,
+                       autospec=True) as mock_hr:
+                with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                    with patch('%s.time.time' % pbm) as mock_time:
+                        mock_time.return_value = 1434400000.0
+                        mock_hr.return_value = self.check_result
+                        mock_id.return_value = self.check_id
+                        res_east = east._poll()
+                        res_west = west._poll()
+        assert res_east == {'EC2': {'Foo': 10}, 'IAM': {'Users': 5000}}
+        assert res_west == {'EC2': {'Foo': 20}, 'IAM': {'Users': 5000}}
+        assert mock_id.mock_calls == [call(east)]
+        assert mock_hr.mock_calls == [call(east, 'foo')]
+        assert call.info(
+            'Using cached Trusted Advisor results for account %s', None
+        ) in mock_logger.mock_calls
+        assert self.cache._results[None] == (
+            1434400000.0,
+            1434400062,
+            {
+                'us-west-2': {'EC2': {'Foo': 20}},
+                'us-east-1': {'EC2': {'Foo': 10}},
+                '': {'IAM': {'Users': 5000}}
+            }
+        )
+
+    def test_check_too_old(self):
+        east = self._make('us-east-1')
+        west = self._make('us-west-2', ta_refresh_mode=60)
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            with patch('%s._get_refreshed_check_result' % pb,
+                       autospec=True) as mock_hr:
+                with patch('%s.time.time' % pbm) as mock_time:
+                    mock_time.return_value = 1434400200.0
+                    mock_hr.return_value = self.check_result
+                    mock_id.return_value = self.check_id
+                    east._poll()
+                    west._poll()
+        assert mock_hr.mock_calls == [call(east, 'foo'), call(west, 'foo')]
+
+    def test_not_available(self):
+        east = self._make('us-east-1')
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            mock_id.return_value = (None, None)
+            assert east._poll() == {}
+        assert self.cache._results == {}
+
+    def test_persistent(self):
+        store = Mock(spec_set=SqliteTrustedAdvisorCache)
+        store.get.return_value = (
+            1000.0,
+            {
+                'check_timestamp': 900.0,
+                'regions': {'us-east-1': {'EC2': {'Foo': 3}}}
+            }
+        )
+        self.cache = TrustedAdvisorResultCache(store=store)
+        east = self._make('us-east-1', account_id='123')
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            with patch('%s.time.time' % pbm) as mock_time:
+                mock_time.return_value = 1100.0
+                res = east._poll()
+        assert res == {'EC2': {'Foo': 3}}
+        assert mock_id.mock_calls == []
+        assert store.mock_calls == [call.get('123')]
+
+    def test_persistent_wait_mode(self):
+        store = Mock(spec_set=SqliteTrustedAdvisorCache)
+        self.cache = TrustedAdvisorResultCache(store=store)
+        east = self._make('us-east-1', account_id='123',
+                          ta_refresh_mode='wait')
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            with patch('%s._get_refreshed_check_result' % pb,
+                       autospec=True) as mock_hr:
+                with patch('%s.time.time' % pbm) as mock_time:
+                    mock_time.return_value = 1434400000.0
+                    mock_hr.return_value = self.check_result
+                    mock_id.return_value = self.check_id
+                    res = east._poll()
+        assert res == {'EC2': {'Foo': 10}, 'IAM': {'Users': 5000}}
+        assert store.mock_calls == [
+            call.put(
+                '123',
+                {
+                    'check_timestamp': 1434400062,
+                    'regions': {
+                        'us-west-2': {'EC2': {'Foo': 20}},
+                        'us-east-1': {'EC2': {'Foo': 10}},
+                        '': {'IAM': {'Users': 5000}}
+                    }
+                },
+                1434400000.0
+            )
+        ]
+
+    def test_account_id_lookup(self):
+        store = Mock(spec_set=SqliteTrustedAdvisorCache)
+        store.get.return_value = None
+        self.cache = TrustedAdvisorResultCache(store=store)
+        m_reg = Mock(spec_set=ClientRegistry)
+        sts = m_reg.client.return_value
+        sts.get_caller_identity.return_value = {'Account': '456'}
+        east = self._make('us-east-1', client_registry=m_reg)
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            mock_id.return_value = (None, None)
+            east._poll()
+            east._poll()
+        assert m_reg.mock_calls == [
+            call.client('sts', region_name='us-east-1'),
+            call.client().get_caller_identity()
+        ]
+        assert east._account_id == '456'
+        assert store.mock_calls == [call.get('456'), call.get('456')]
+
+    def test_account_id_lookup_fails(self):
+        store = Mock(spec_set=SqliteTrustedAdvisorCache)
+        self.cache = TrustedAdvisorResultCache(store=store)
+        m_reg = Mock(spec_set=ClientRegistry)
+        m_reg.client.side_effect = RuntimeError('foo')
+        east = self._make('us-east-1', client_registry=m_reg)
+        with patch('%s._get_limit_check_id' % pb, autospec=True) as mock_id:
+            with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+                mock_id.return_value = (None, None)
+                east._poll()
+        assert call.warning(
+            'Unable to determine account ID; not using persistent '
+            'Trusted Advisor cache', exc_info=True
+        ) in mock_logger.mock_calls
+        assert store.mock_calls == []
+
+
+class TestTrustedAdvisorResultCache(object):
+
+    def test_memory(self):
+        cls = TrustedAdvisorResultCache(ttl=60)
+        assert cls.get('1') is None
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1000.0
+            cls.put('1', 900.0, {'r': {}})
+            assert cls.get('1') == {'r': {}}
+            assert cls.get('1', max_check_age=100) == {'r': {}}
+            assert cls.get('1', max_check_age=99) is None
+            assert cls.get('1', fetched_only=True) == {'r': {}}
+            mock_time.return_value = 1061.0
+            assert cls.get('1') is None
+
+    def test_unknown_check_timestamp(self):
+        cls = TrustedAdvisorResultCache()
+        cls.put('1', None, {'r': {}})
+        assert cls.get('1') == {'r': {}}
+        assert cls.get('1', max_check_age=100) is None
+
+    def test_lock(self):
+        cls = TrustedAdvisorResultCache()
+        assert cls.lock('1') is cls.lock('1')
+        assert cls.lock('1') is not cls.lock('2')
+
+    def test_store(self, tmpdir):
+        store = SqliteTrustedAdvisorCache(str(tmpdir.join('ta.db')))
+        TrustedAdvisorResultCache(store=store).put('1', 5.0, {'r': {}})
+        TrustedAdvisorResultCache(store=store).put(None, 5.0, {'x': {}})
+        cls = TrustedAdvisorResultCache(store=store)
+        assert cls.get('1') == {'r': {}}
+        assert cls.get('1', fetched_only=True) is None
+        assert cls.get(None) is None
+
+    def test_store_exception(self):
+        store = Mock(spec_set=SqliteTrustedAdvisorCache)
+        store.put.side_effect = RuntimeError('foo')
+        cls = TrustedAdvisorResultCache(store=store)
+        with patch('%s.logger' % pbm, autospec=True) as mock_logger:
+            cls.put('1', 5.0, {'r': {}})
+        assert mock_logger.mock_calls == [
+            call.warning(
+                'Unable to cache Trusted Advisor results for account %s',
+                '1', exc_info=True
+            )
+        ]
+        assert cls.get('1') == {'r': {}}
+
+
 class TestGetRefreshedCheckResult(object):
 
     def setup(self):
@@ -1263,19 +1620,17 @@ class TestPollForRefresh(object):
         ]
         assert gcr.mock_calls == [call(self.cls, 'abc123')]
         assert mock_sleep.mock_calls == [
-            call(30), call(30), call(30)
-        ]
-        assert mock_dt_now.mock_calls == [
-            call(), call(), call(), call(), call()
+            call(5), call(10), call(20)
         ]
+        assert mock_dt_now.mock_calls == [call()] * 8
         assert mock_logger.mock_calls == [
             call.warning('Polling for TA check %s refresh...', 'abc123'),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'none'),
+            call.info('Refresh status: %s; sleeping %ss', 'none', 5),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'enqueued'),
+            call.info('Refresh status: %s; sleeping %ss', 'enqueued', 10),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'processing'),
+            call.info('Refresh status: %s; sleeping %ss', 'processing', 20),
             call.debug('Checking refresh status'),
             call.info('Refresh status: %s; done polling', 'success'),
             call.info('Done polling for check refresh'),
@@ -1284,12 +1639,15 @@ class TestPollForRefresh(object):
 
     def test_timeout(self):
         self.cls.refresh_timeout = 45
+        self.cls.poll_min_interval = 20
         check_dt = datetime(2016, 12, 16, hour=10, minute=30, second=12,
                             tzinfo=utc)
         now_dts = [
+            datetime(2016, 12, 16, hour=11, minute=30, second=0, tzinfo=utc),
             datetime(2016, 12, 16, hour=11, minute=30, second=0, tzinfo=utc),
             datetime(2016, 12, 16, hour=11, minute=30, second=0, tzinfo=utc),
             datetime(2016, 12, 16, hour=11, minute=30, second=30, tzinfo=utc),
+            datetime(2016, 12, 16, hour=11, minute=30, second=30, tzinfo=utc),
             datetime(2016, 12, 16, hour=11, minute=31, second=0, tzinfo=utc),
         ]
         status = {'statuses': [{'status': 'processing'}]}
@@ -1310,18 +1668,17 @@ class TestPollForRefresh(object):
                 checkIds=['abc123'])
         ]
         assert gcr.mock_calls == [call(self.cls, 'abc123')]
+        # backoff doubles the interval, but never sleeps past the timeout
         assert mock_sleep.mock_calls == [
-            call(30), call(30)
-        ]
-        assert mock_dt_now.mock_calls == [
-            call(), call(), call(), call()
+            call(20), call(15.0)
         ]
+        assert mock_dt_now.mock_calls == [call()] * 6
         assert mock_logger.mock_calls == [
             call.warning('Polling for TA check %s refresh...', 'abc123'),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'processing'),
+            call.info('Refresh status: %s; sleeping %ss', 'processing', 20),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'processing'),
+            call.info('Refresh status: %s; sleeping %ss', 'processing', 15.0),
             call.error('Timed out waiting for TA Check refresh; status=%s',
                        'processing'),
             call.info('Done polling for check refresh'),
@@ -1362,19 +1719,17 @@ class TestPollForRefresh(object):
         ]
         assert gcr.mock_calls == [call(self.cls, 'abc123')]
         assert mock_sleep.mock_calls == [
-            call(30), call(30), call(30)
-        ]
-        assert mock_dt_now.mock_calls == [
-            call(), call(), call(), call(), call()
+            call(5), call(10), call(20)
         ]
+        assert mock_dt_now.mock_calls == [call()] * 8
         assert mock_logger.mock_calls == [
             call.warning('Polling for TA check %s refresh...', 'abc123'),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'none'),
+            call.info('Refresh status: %s; sleeping %ss', 'none', 5),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'enqueued'),
+            call.info('Refresh status: %s; sleeping %ss', 'enqueued', 10),
             call.debug('Checking refresh status'),
-            call.info('Refresh status: %s; sleeping 30s', 'processing'),
+            call.info('Refresh status: %s; sleeping %ss', 'processing', 20),
             call.debug('Checking refresh status'),
             call.warning('Trusted Advisor check refresh status went '
                          'from "%s" to "%s"; refresh is either complete '
@@ -1532,6 +1887,21 @@ class TestMakeTAServiceDict(object):
         }
         self.cls.all_services = svcs
         assert self.cls._make_ta_service_dict() == expected
+        assert self.cls._ta_service_names == set(['EC2', 'VPC'])
+
+    def test_only_loaded(self):
+        mock_ec2 = Mock(spec_set=_AwsService)
+        mock_el1 = Mock(spec_set=AwsLimit)
+        type(mock_el1).ta_service_name = 'EC2'
+        type(mock_el1).ta_limit_name = 'el1'
+        mock_ec2.get_limits.return_value = {'mock_el1': mock_el1}
+        factory = Mock(return_value=mock_ec2)
+        svcs = ServiceInstances(['EC2', 'VPC'], factory)
+        svcs['EC2']
+        self.cls.all_services = svcs
+        assert self.cls._make_ta_service_dict() == {'EC2': {'el1': mock_el1}}
+        assert factory.mock_calls == [call('EC2')]
+        assert self.cls._ta_service_names == set(['EC2'])
 
 
 class TestDatetimeNow(object):
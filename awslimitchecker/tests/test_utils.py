@@ -38,15 +38,19 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import argparse
+import boto3
 import pytest
 import sys
 import termcolor
+import threading
 
+from awslimitchecker.connectable import ClientRegistry
 from awslimitchecker.limit import AwsLimit, AwsLimitUsage
 from awslimitchecker.utils import (
     StoreKeyValuePair, dict2cols, paginate_dict, _get_dict_value_by_path,
     _set_dict_value_by_path, _get_latest_version, color_output,
-    issue_string_tuple
+    issue_string_tuple, run_concurrently, paginate_items, count_paginated,
+    call_with_timeout, current_call_abandoned
 )
 
 # https://code.google.com/p/mock/issues/detail?id=249
@@ -58,6 +62,7 @@ if (
     from mock import call, Mock, patch
 else:
     from unittest.mock import call, Mock, patch
+from botocore.stub import Stubber
 
 pbm = 'awslimitchecker.utils'
 
@@ -151,6 +156,91 @@ class Test_dict2cols(object):
         assert res == ''
 
 
+class TestRunConcurrently(object):
+
+    def test_sequential(self):
+        seen = []
+
+        def func(x):
+            seen.append(x)
+            return x * 2
+
+        with patch('%s.ThreadPoolExecutor' % pbm) as mock_pool:
+            res = run_concurrently(func, {'a': 1, 'b': 2, 'c': 3}, 1)
+        assert res == {'a': 2, 'b': 4, 'c': 6}
+        assert seen == [1, 2, 3]
+        assert mock_pool.mock_calls == []
+
+    def test_single_item(self):
+        with patch('%s.ThreadPoolExecutor' % pbm) as mock_pool:
+            res = run_concurrently(lambda x: x + 1, {'a': 1}, 8)
+        assert res == {'a': 2}
+        assert mock_pool.mock_calls == []
+
+    def test_concurrent(self):
+        res = run_concurrently(
+            lambda x: x * 2, {'a': 1, 'b': 2, 'c': 3}, 2
+        )
+        assert res == {'a': 2, 'b': 4, 'c': 6}
+        assert list(res.keys()) == ['a', 'b', 'c']
+
+    def test_concurrent_exceptions(self):
+        seen = []
+        ex_b = RuntimeError('b')
+        ex_c = ValueError('c')
+
+        def func(x):
+            seen.append(x)
+            if x == 'b':
+                raise ex_b
+            if x == 'c':
+                raise ex_c
+            return x
+
+        with patch('%s.logger' % pbm) as mock_logger:
+            with pytest.raises(RuntimeError) as excinfo:
+                run_concurrently(
+                    func, {'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'}, 4,
+                    item_type='thing'
+                )
+        assert excinfo.value == ex_b
+        assert sorted(seen) == ['a', 'b', 'c', 'd']
+        assert mock_logger.mock_calls == [
+            call.debug('Running %d %ss with parallelism %d', 4, 'thing', 4),
+            call.error('Error in %s %s: %s', 'thing', 'b', ex_b,
+                       exc_info=True),
+            call.error('Error in %s %s: %s', 'thing', 'c', ex_c,
+                       exc_info=True)
+        ]
+
+    def test_errors(self):
+        ex_b = RuntimeError('b')
+
+        def func(x):
+            if x == 'b':
+                raise ex_b
+            return x
+
+        for workers in [1, 4]:
+            errors = {}
+            with patch('%s.logger' % pbm) as mock_logger:
+                res = run_concurrently(
+                    func, {'a': 'a', 'b': 'b', 'c': 'c'}, workers,
+                    item_type='thing', errors=errors
+                )
+            assert res == {'a': 'a', 'c': 'c'}
+            assert errors == {'b': ex_b}
+            assert mock_logger.error.mock_calls == [
+                call('Error in %s %s: %s', 'thing', 'b', ex_b, exc_info=True)
+            ]
+
+    def test_errors_none(self):
+        errors = {}
+        res = run_concurrently(lambda x: x, {'a': 1}, 1, errors=errors)
+        assert res == {'a': 1}
+        assert errors == {}
+
+
 class TestPaginateDict(object):
 
     def test_no_marker_path(self):
@@ -293,6 +383,167 @@ class TestPaginateDict(object):
         ]
 
 
+class TestPaginateItems(object):
+
+    def test_no_marker_param(self):
+        func = Mock()
+
+        with pytest.raises(Exception) as excinfo:
+            list(paginate_items(
+                func,
+                alc_marker_path=[],
+                alc_data_path=[]
+            ))
+        ex_str = "alc_marker_param must be specified for queries " \
+                 "that return a dict."
+        assert ex_str in str(excinfo.value)
+        assert func.mock_calls == []
+
+    def test_bad_path(self):
+        func = Mock()
+        func.return_value = {'k1': {'badpath': {}}}
+
+        res = list(paginate_items(
+            func,
+            alc_marker_path=['k1', 'k2', 'Marker'],
+            alc_data_path=['k1', 'k2', 'Data'],
+            alc_marker_param='Marker'
+        ))
+        assert res == []
+        assert func.mock_calls == [call()]
+
+    def test_multiple_pages(self):
+        func = Mock()
+        func.side_effect = [
+            {'k1': {'Data': ['a', 'b'], 'Marker': 'm1'}},
+            {'k1': {'Data': ['c'], 'Marker': 'm2'}},
+            {'k1': {'Data': ['d']}},
+        ]
+
+        gen = paginate_items(
+            func,
+            'foo',
+            bar='baz',
+            alc_marker_path=['k1', 'Marker'],
+            alc_data_path=['k1', 'Data'],
+            alc_marker_param='MarkerParam'
+        )
+        assert next(gen) == 'a'
+        # pages are only retrieved as they are consumed
+        assert func.mock_calls == [call('foo', bar='baz')]
+        assert list(gen) == ['b', 'c', 'd']
+        assert func.mock_calls == [
+            call('foo', bar='baz'),
+            call('foo', bar='baz', MarkerParam='m1'),
+            call('foo', bar='baz', MarkerParam='m2')
+        ]
+
+
+class TestCallWithTimeout(object):
+
+    def test_finished(self):
+        res = call_with_timeout(lambda x, y: x + y, (1, 2), 5, name='foo')
+        assert res == (True, 3)
+
+    def test_no_timeout(self):
+        res = call_with_timeout(lambda: 'x')
+        assert res == (True, 'x')
+
+    def test_exception(self):
+        def func():
+            raise RuntimeError('foo')
+
+        with pytest.raises(RuntimeError) as excinfo:
+            call_with_timeout(func, timeout=5)
+        assert str(excinfo.value) == 'foo'
+
+    def test_timeout(self):
+        release = threading.Event()
+        done = threading.Event()
+        seen = []
+
+        def func():
+            release.wait(5)
+            seen.append(current_call_abandoned())
+            done.set()
+            return 'late'
+
+        res = call_with_timeout(func, timeout=0.05)
+        assert res == (False, None)
+        release.set()
+        assert done.wait(5) is True
+        assert seen == [True]
+
+    def test_not_abandoned(self):
+        res = call_with_timeout(current_call_abandoned, timeout=5)
+        assert res == (True, False)
+        assert current_call_abandoned() is False
+
+
+class TestCountPaginated(object):
+
+    def test_count(self):
+        func = Mock()
+        func.side_effect = [
+            {'Data': [1, 2], 'Marker': 'm1'},
+            {'Data': [3]},
+        ]
+        res = count_paginated(
+            func,
+            alc_marker_path=['Marker'],
+            alc_data_path=['Data'],
+            alc_marker_param='Marker'
+        )
+        assert res == 3
+        assert func.mock_calls == [call(), call(Marker='m1')]
+
+    def test_filter(self):
+        func = Mock()
+        func.side_effect = [
+            {'Data': [1, 2], 'Marker': 'm1'},
+            {'Data': [3, 4]},
+        ]
+        res = count_paginated(
+            func,
+            alc_marker_path=['Marker'],
+            alc_data_path=['Data'],
+            alc_marker_param='Marker',
+            alc_filter=lambda x: x % 2 == 0
+        )
+        assert res == 2
+        assert func.mock_calls == [call(), call(Marker='m1')]
+
+    def test_pages_not_retained(self):
+        reg = ClientRegistry(session=boto3.session.Session(
+            aws_access_key_id='ak', aws_secret_access_key='sk'
+        ))
+        conn = reg.client('ec2', region_name='us-east-1')
+        with Stubber(conn) as stub:
+            for page in range(5):
+                resp = {
+                    'Snapshots': [
+                        {'SnapshotId': 'snap-%d-%d' % (page, i)}
+                        for i in range(100)
+                    ]
+                }
+                params = {'OwnerIds': ['self']}
+                if page > 0:
+                    params['NextToken'] = 't%d' % page
+                if page < 4:
+                    resp['NextToken'] = 't%d' % (page + 1)
+                stub.add_response('describe_snapshots', resp, params)
+            res = count_paginated(
+                conn.describe_snapshots,
+                OwnerIds=['self'],
+                alc_marker_path=['NextToken'],
+                alc_data_path=['Snapshots'],
+                alc_marker_param='NextToken'
+            )
+            stub.assert_no_pending_responses()
+        assert res == 500
+        assert reg.response_cache._responses == {}
+
+
 class TestDictFuncs(object):
 
     def test_get_dict_value_by_path(self):
@@ -481,10 +732,50 @@ class TestColorOutput(object):
 
 class TestIssueStringTuple(object):
 
+    def test_incomplete(self):
+        mock_limit = Mock(spec_set=AwsLimit)
+        type(mock_limit).name = 'limitname'
+        mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = True
+        mock_limit.get_incomplete_reason.return_value = 'timed out'
+
+        def se_color(s, c, colorize=True):
+            return 'xX%sXx' % s
+
+        with patch('%s.color_output' % pbm) as m_co:
+            m_co.side_effect = se_color
+            res = issue_string_tuple('svcname', mock_limit, [], [])
+        assert res == ('svcname/limitname',
+                       '(limit 12) xXINCOMPLETE: timed outXx')
+        assert m_co.mock_calls == [
+            call('INCOMPLETE: timed out', 'yellow', colorize=True)
+        ]
+
+    def test_incomplete_with_crit(self):
+        mock_limit = Mock(spec_set=AwsLimit)
+        type(mock_limit).name = 'limitname'
+        mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = True
+        mock_limit.get_incomplete_reason.return_value = 'some not retained'
+
+        c1 = AwsLimitUsage(mock_limit, 56)
+
+        def se_color(s, c, colorize=True):
+            return 'xX%sXx' % s
+
+        with patch('%s.color_output' % pbm) as m_co:
+            m_co.side_effect = se_color
+            res = issue_string_tuple('svcname', mock_limit, [c1], [])
+        assert res == (
+            'svcname/limitname',
+            '(limit 12) xXCRITICAL: 56Xx xXINCOMPLETE: some not retainedXx'
+        )
+
     def test_crit_one(self):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = False
 
         c1 = AwsLimitUsage(mock_limit, 56)
 
@@ -509,6 +800,7 @@ class TestIssueStringTuple(object):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 5
+        mock_limit.is_incomplete.return_value = False
 
         c1 = AwsLimitUsage(mock_limit, 10)
         c2 = AwsLimitUsage(mock_limit, 12, resource_id='c2id')
@@ -535,6 +827,7 @@ class TestIssueStringTuple(object):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = False
 
         w1 = AwsLimitUsage(mock_limit, 11)
 
@@ -558,6 +851,7 @@ class TestIssueStringTuple(object):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = False
 
         w1 = AwsLimitUsage(mock_limit, 11)
         w2 = AwsLimitUsage(mock_limit, 10, resource_id='w2id')
@@ -584,6 +878,7 @@ class TestIssueStringTuple(object):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = False
 
         c1 = AwsLimitUsage(mock_limit, 10)
         w1 = AwsLimitUsage(mock_limit, 10, resource_id='w3id')
@@ -611,6 +906,7 @@ class TestIssueStringTuple(object):
         mock_limit = Mock(spec_set=AwsLimit)
         type(mock_limit).name = 'limitname'
         mock_limit.get_limit.return_value = 12
+        mock_limit.is_incomplete.return_value = False
 
         c1 = AwsLimitUsage(mock_limit, 10)
         c2 = AwsLimitUsage(mock_limit, 12, resource_id='c2id')
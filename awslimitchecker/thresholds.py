@@ -0,0 +1,217 @@
+"""
+awslimitchecker/thresholds.py
+
+The latest version of this package is available at:
+<https://github.com/jantman/awslimitchecker>
+
+################################################################################
+Copyright 2015-2021 Jason Antman <jason@jasonantman.com>
+
+    This file is part of awslimitchecker, also known as awslimitchecker.
+
+    awslimitchecker is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    awslimitchecker is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with awslimitchecker.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/awslimitchecker> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+################################################################################
+"""
+
+import heapq
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+
+class ThresholdResults(object):
+    """
+    Results of :py:func:`~.evaluate_thresholds` for a list of limits.
+    """
+
+    def __init__(self, limits, ok):
+        """
+        :param limits: the limits that were checked
+        :type limits: :py:obj:`list` of :py:class:`~.AwsLimit`
+        :param ok: for each limit, whether it is within all thresholds
+        :type ok: :py:obj:`list` of :py:obj:`bool`
+        """
+        self.limits = limits
+        #: for each limit, in the order given, whether its usage is within
+        #: all thresholds (as returned by :py:meth:`.AwsLimit.check_thresholds`)
+        self.ok = ok
+
+    def offenders(self, count=None):
+        """
+        Return the usages that crossed a threshold, highest utilization first.
+
+        Ties are broken by the order of the limits, then criticals before
+        warnings, then the order of the usages.
+
+        :param count: if set, return only this many of the usages
+        :type count: int
+        :returns: list of (percent utilization, :py:class:`~.AwsLimit`,
+          :py:class:`~.AwsLimitUsage`) tuples
+        :rtype: list
+        """
+        res = []
+        for lim, ok in zip(self.limits, self.ok):
+            if ok:
+                continue
+            lim_value = lim.get_limit()
+            for u in lim.get_criticals() + lim.get_warnings():
+                limit = u.get_maximum() or lim_value
+                res.append(((u.get_value() / (limit * 1.0)) * 100, lim, u))
+        if count is not None:
+            return heapq.nlargest(count, res, key=lambda x: x[0])
+        res.sort(key=lambda x: x[0], reverse=True)
+        return res
+
+
+def evaluate_thresholds(limits, use_numpy=None):
+    """
+    Check the current usage of many limits against their thresholds at once.
+
+    This has the same effect on each limit as calling its
+    :py:meth:`~.AwsLimit.check_thresholds` method (which is what it does if
+    NumPy is not used), but when NumPy is used, the usage values, limits and
+    thresholds of all limits are evaluated together as arrays, which is
+    faster for large numbers of per-resource usages. Both give identical
+    results. Either way, limits whose usage, limit value and thresholds have
+    not changed since they were last checked keep their previous results
+    and are not evaluated again.
+
+    :param limits: the limits to check
+    :type limits: :py:obj:`list` of :py:class:`~.AwsLimit`
+    :param use_numpy: whether to evaluate with NumPy; if None (the default),
+      NumPy is used if it can be imported
+    :type use_numpy: bool
+    :rtype: :py:class:`~.ThresholdResults`
+    :raises: RuntimeError if ``use_numpy`` is True but NumPy cannot be
+      imported
+    """
+    if use_numpy is None:
+        use_numpy = numpy is not None
+    elif use_numpy and numpy is None:
+        raise RuntimeError('NumPy threshold evaluation requested, but numpy '
+                           'could not be imported')
+    if use_numpy:
+        return _evaluate_numpy(limits)
+    return _evaluate_python(limits)
+
+
+def _evaluate_python(limits):
+    """
+    Pure-Python implementation of :py:func:`~.evaluate_thresholds`.
+
+    :param limits: the limits to check
+    :type limits: :py:obj:`list` of :py:class:`~.AwsLimit`
+    :rtype: :py:class:`~.ThresholdResults`
+    """
+    return ThresholdResults(
+        limits, [lim.check_thresholds() for lim in limits]
+    )
+
+
+def _evaluate_numpy(limits):
+    """
+    NumPy implementation of :py:func:`~.evaluate_thresholds`; gives the same
+    results as :py:func:`~._evaluate_python`.
+
+    :param limits: the limits to check
+    :type limits: :py:obj:`list` of :py:class:`~.AwsLimit`
+    :rtype: :py:class:`~.ThresholdResults`
+    """
+    stale = []
+    keys = []
+    usages = []
+    counts = []
+    for lim in limits:
+        key = lim._threshold_key()
+        if lim._thresholds_current(key):
+            continue
+        stale.append(lim)
+        keys.append(key)
+        lim_usage = lim._usage_to_check()
+        usages.extend(lim_usage)
+        counts.append(len(lim_usage))
+    _evaluate_arrays(stale, keys, usages, counts)
+    return ThresholdResults(limits, [lim._thresholds_ok for lim in limits])
+
+
+def _evaluate_arrays(limits, keys, usages, counts):
+    """
+    Evaluate the thresholds of ``limits`` with NumPy and store the results
+    on each of them.
+
+    :param limits: the limits to check
+    :type limits: :py:obj:`list` of :py:class:`~.AwsLimit`
+    :param keys: each limit's :py:meth:`~.AwsLimit._threshold_key`, which
+      holds its limit value and thresholds
+    :type keys: list
+    :param usages: the current usage of all of the limits, in order
+    :type usages: :py:obj:`list` of :py:class:`~.AwsLimitUsage`
+    :param counts: the number of usages of each limit
+    :type counts: list
+    """
+    owner = numpy.repeat(numpy.arange(len(limits)), counts)
+    vals = numpy.array([u.value for u in usages], dtype=float)
+    # as in AwsLimit.check_thresholds, a usage's maximum takes precedence
+    # over the limit unless it is None or 0; converting a list containing
+    # None to an array is slow, so map both to 0 first.
+    maxs = numpy.array([u.maximum or 0 for u in usages], dtype=float)
+    # None (unknown limits, unset count thresholds) becomes NaN
+    lim_vals = numpy.repeat(
+        numpy.array([k[1] for k in keys], dtype=float), counts
+    )
+    maxs = numpy.where(maxs == 0, lim_vals, maxs)
+    # columns: warn count, warn percent, crit count, crit percent
+    th = numpy.repeat(
+        numpy.array([k[2] for k in keys], dtype=float).reshape(-1, 4),
+        counts, axis=0
+    )
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        valid = ~numpy.isnan(maxs) & (maxs != 0)
+        pct = (vals / maxs) * 100
+        # comparisons with NaN (unset count thresholds) are always False
+        crit = valid & ((vals >= th[:, 2]) | (pct >= th[:, 3]))
+        warn = valid & ~crit & ((vals >= th[:, 0]) | (pct >= th[:, 1]))
+    warnings = [[] for _ in limits]
+    criticals = [[] for _ in limits]
+    crossed = numpy.flatnonzero(crit | warn)
+    # convert to lists once; indexing arrays one element at a time is slow
+    for idx, is_crit, lim_idx in zip(
+        crossed.tolist(), crit[crossed].tolist(), owner[crossed].tolist()
+    ):
+        if is_crit:
+            criticals[lim_idx].append(usages[idx])
+        else:
+            warnings[lim_idx].append(usages[idx])
+    for lim, key, lim_warn, lim_crit in zip(
+        limits, keys, warnings, criticals
+    ):
+        lim._set_threshold_results(lim_warn, lim_crit, key)
@@ -37,11 +37,15 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ################################################################################
 """
 
+import calendar
 import os
+import time
 from botocore.exceptions import ClientError
 from dateutil import parser
 import logging
-from .connectable import Connectable
+import threading
+from .connectable import Connectable, ClientRegistry
+from .services.registry import loaded_services
 from datetime import datetime, timedelta
 from pytz import utc
 from time import sleep
@@ -50,6 +54,126 @@ from copy import deepcopy
 logger = logging.getLogger(__name__)
 
 
+class TrustedAdvisorResultCache(object):
+    """
+    Cache of the 'Service Limits' Trusted Advisor check results for *all*
+    regions of an account, as returned by a single check result request.
+    One instance is shared by the :py:class:`~.TrustedAdvisor` instances of
+    all per-region checkers created from the same
+    :py:class:`~.AwsLimitChecker` (see :py:meth:`~.AwsLimitChecker.for_region`)
+    so that the check is only fetched once for all regions, and can optionally
+    be backed by a persistent ``store`` (i.e.
+    :py:class:`~.SqliteTrustedAdvisorCache`) so that results are also reused
+    by later runs.
+
+    Results are kept as a dict of region name to the :py:meth:`~._poll`-style
+    dict of service name to limit name to value; limits that Trusted Advisor
+    returns without a region are stored under the empty string.
+    """
+
+    def __init__(self, ttl=3600, store=None):
+        """
+        :param ttl: number of seconds after fetching that cached results
+          remain valid for
+        :type ttl: float
+        :param store: persistent store to read results from and write results
+          to, in addition to memory. It must have ``get(account_id)`` and
+          ``put(account_id, data, timestamp)`` methods like
+          :py:class:`~.SqliteTrustedAdvisorCache`.
+        :type store: :py:class:`~.SqliteTrustedAdvisorCache`
+        """
+        self.ttl = ttl
+        self.store = store
+        # ``_lock`` guards ``_results`` and ``_account_locks``; the latter
+        # hold one lock per account, so that only one TrustedAdvisor instance
+        # fetches the check for an account at a time
+        self._lock = threading.Lock()
+        self._account_locks = {}
+        self._results = {}
+
+    def lock(self, account_id):
+        """
+        Return the lock to hold while looking up and fetching results for
+        ``account_id``.
+
+        :rtype: :py:class:`threading.Lock`
+        """
+        with self._lock:
+            return self._account_locks.setdefault(account_id, threading.Lock())
+
+    def get(self, account_id, max_check_age=None, fetched_only=False):
+        """
+        Return the cached results for ``account_id``, or None if there are
+        none that are still valid.
+
+        :param account_id: the account ID the results are for; if None, the
+          persistent store is not used.
+        :type account_id: str
+        :param max_check_age: if not None, also ignore results where the
+          check itself was last refreshed more than this number of seconds
+          ago (or its refresh time is unknown)
+        :type max_check_age: int
+        :param fetched_only: if True, only return results fetched by this
+          process, not ones read from the persistent store
+        :type fetched_only: bool
+        :returns: dict of region name to service name to limit name to value
+        :rtype: :py:obj:`dict` or :py:obj:`None`
+        """
+        with self._lock:
+            entry = self._results.get(account_id)
+        if (
+            entry is None and not fetched_only and
+            self.store is not None and account_id is not None
+        ):
+            row = self.store.get(account_id)
+            if row is not None:
+                entry = (
+                    row[0], row[1]['check_timestamp'], row[1]['regions']
+                )
+        if entry is None:
+            return None
+        fetched, check_timestamp, results = entry
+        now = time.time()
+        if now - fetched > self.ttl:
+            return None
+        if max_check_age is not None and (
+            check_timestamp is None or now - check_timestamp > max_check_age
+        ):
+            return None
+        return results
+
+    def put(self, account_id, check_timestamp, results):
+        """
+        Cache ``results`` for ``account_id``, in memory and (unless
+        ``account_id`` is None) in the persistent store, if there is one.
+
+        :param account_id: the account ID the results are for
+        :type account_id: str
+        :param check_timestamp: time the check was last refreshed, in seconds
+          since the epoch, or None if unknown
+        :type check_timestamp: float
+        :param results: dict of region name to service name to limit name to
+          value
+        :type results: dict
+        """
+        now = time.time()
+        with self._lock:
+            self._results[account_id] = (now, check_timestamp, results)
+        if self.store is None or account_id is None:
+            return
+        try:
+            self.store.put(
+                account_id,
+                {'check_timestamp': check_timestamp, 'regions': results},
+                now
+            )
+        except Exception:
+            logger.warning(
+                'Unable to cache Trusted Advisor results for account %s',
+                account_id, exc_info=True
+            )
+
+
 class TrustedAdvisor(Connectable):
     """
     Class to handle interaction with TrustedAdvisor API, polling TA and updating
@@ -61,12 +185,16 @@ class TrustedAdvisor(Connectable):
 
     def __init__(self, all_services, boto_connection_kwargs,
                  ta_refresh_mode=None, ta_refresh_timeout=None,
-                 ta_api_region='us-east-1'):
+                 ta_api_region='us-east-1', client_registry=None,
+                 ta_poll_min_interval=5, ta_poll_max_interval=60,
+                 result_cache=None, account_id=None):
         """
         Class to contain all TrustedAdvisor-related logic.
 
         :param all_services: :py:class:`~.checker.AwsLimitChecker` ``services``
-          dictionary.
+          dictionary. If this is a :py:class:`~.ServiceInstances`, only the
+          services created so far are updated; services created later are
+          updated by the next call to :py:meth:`~.update_limits`.
         :type all_services: dict
         :param profile_name: The name of a profile in the cross-SDK
           `shared credentials file <https://boto3.readthedocs.io/en/latest/
@@ -116,7 +244,28 @@ class TrustedAdvisor(Connectable):
           TrustedAdvisor API. This is always us-east-1 for
           non GovCloud accounts.
         :type ta_api_region: str
+        :param client_registry: registry to obtain boto3 clients from; if
+          None, a new one is created for this instance.
+        :type client_registry: :py:class:`~.ClientRegistry`
+        :param ta_poll_min_interval: When waiting for a Trusted Advisor check
+          refresh to complete, the number of seconds to wait before the first
+          status poll; the interval doubles after each poll, up to
+          ``ta_poll_max_interval``.
+        :type ta_poll_min_interval: float
+        :param ta_poll_max_interval: the maximum number of seconds to wait
+          between Trusted Advisor check refresh status polls
+        :type ta_poll_max_interval: float
+        :param result_cache: cache to share check results for all regions
+          through; if None, results are not cached.
+        :type result_cache: :py:class:`~.TrustedAdvisorResultCache`
+        :param account_id: ID of the account being checked, used as the
+          ``result_cache`` key. If None and ``result_cache`` has a persistent
+          store, it is looked up via STS when first needed.
+        :type account_id: str
         """
+        if client_registry is None:
+            client_registry = ClientRegistry()
+        self._client_registry = client_registry
         self.conn = None
         self.have_ta = True
         self.ta_region = boto_connection_kwargs.get('region_name')
@@ -126,8 +275,67 @@ class TrustedAdvisor(Connectable):
         self.refresh_mode = ta_refresh_mode
         self.refresh_timeout = ta_refresh_timeout
         self.all_services = all_services
+        #: names of the services in :py:attr:`~.ta_services`
+        self._ta_service_names = set()
         self.ta_services = self._make_ta_service_dict()
         self.limits_updated = False
+        #: the results that limits were last updated from
+        self._ta_results = None
+        self.poll_min_interval = ta_poll_min_interval
+        self.poll_max_interval = ta_poll_max_interval
+        self._result_cache = result_cache
+        self._account_id = account_id
+        # guards update_limits(), which may be called from several threads,
+        # and the background poll state below
+        self._lock = threading.Lock()
+        self._poll_thread = None
+        self._poll_result = None
+        self._poll_exception = None
+
+    def start_update_limits(self):
+        """
+        Start polling Trusted Advisor (including any refresh of the check,
+        according to ``ta_refresh_mode``) in a background thread, so that it
+        runs concurrently with finding usage. The next call to
+        :py:meth:`~.update_limits` waits for the poll to finish and updates
+        limits from its results.
+
+        Does nothing if limits have already been updated from TA or a
+        background poll has already been started.
+        """
+        with self._lock:
+            if self.limits_updated or self._poll_thread is not None:
+                return
+            logger.debug('Starting Trusted Advisor poll in background')
+            self._poll_result = None
+            self._poll_exception = None
+            self._poll_thread = threading.Thread(
+                target=self._background_poll, name='alc-trustedadvisor'
+            )
+            self._poll_thread.daemon = True
+            self._poll_thread.start()
+
+    def expire_limits(self):
+        """
+        Make the next :py:meth:`~.start_update_limits` or
+        :py:meth:`~.update_limits` poll Trusted Advisor again (subject to
+        ``ta_refresh_mode`` and any ``result_cache``), instead of keeping the
+        limits from the last poll. Used by :py:class:`~.LimitCheckerDaemon`
+        before each check.
+        """
+        with self._lock:
+            self.limits_updated = False
+
+    def _background_poll(self):
+        """
+        Target of the thread started by :py:meth:`~.start_update_limits`;
+        store the return value of :py:meth:`~._connect_and_poll`, or the
+        exception it raised.
+        """
+        try:
+            self._poll_result = self._connect_and_poll()
+        except Exception as ex:
+            self._poll_exception = ex
 
     def update_limits(self):
         """
@@ -135,23 +343,64 @@ class TrustedAdvisor(Connectable):
         Iterate over all :py:class:`~.AwsLimit` objects for the given services
         and update their limits from TA if present in TA checks.
 
-        :param services: dict of service name (string) to
-          :py:class:`~._AwsService` objects
-        :type services: dict
+        If a background poll was started with
+        :py:meth:`~.start_update_limits`, wait for it to finish and use its
+        results (re-raising any exception it raised) instead of polling again.
+        """
+        with self._lock:
+            if self.limits_updated:
+                if self._have_new_services():
+                    logger.debug('Updating TA limits on new services')
+                    self.ta_services = self._make_ta_service_dict()
+                    self._update_services(self._ta_results)
+                    return
+                logger.debug('Already polled TA; skipping update')
+                return
+            if self._poll_thread is not None:
+                logger.debug('Waiting for background Trusted Advisor poll')
+                self._poll_thread.join()
+                self._poll_thread = None
+                ex = self._poll_exception
+                self._poll_exception = None
+                if ex is not None:
+                    raise ex
+                ta_results = self._poll_result
+            else:
+                ta_results = self._connect_and_poll()
+            if ta_results is None:
+                return
+            if self._have_new_services():
+                self.ta_services = self._make_ta_service_dict()
+            self._update_services(ta_results)
+            self._ta_results = ta_results
+            self.limits_updated = True
+
+    def _have_new_services(self):
+        """
+        Return whether any services have been created since
+        :py:attr:`~.ta_services` was built (see :py:class:`~.ServiceInstances`).
+
+        :rtype: bool
+        """
+        return set(loaded_services(self.all_services)) != \
+            self._ta_service_names
+
+    def _connect_and_poll(self):
+        """
+        Connect and, unless :py:meth:`~._dont_use_ta`, return the results of
+        :py:meth:`~._poll`.
+
+        :return: return value of :py:meth:`~._poll`, or None if not using TA
+        :rtype: :py:obj:`dict` or :py:obj:`None`
         """
-        if self.limits_updated:
-            logger.debug('Already polled TA; skipping update')
-            return
         self.connect()
         if self._dont_use_ta():
             logger.info(
                 'Not using Trusted Advisor in regions outside of China or '
                 'GovCloud; export FORCE_USE_TA=true to override.'
             )
-            return
-        ta_results = self._poll()
-        self._update_services(ta_results)
-        self.limits_updated = True
+            return None
+        return self._poll()
 
     def _dont_use_ta(self):
         """
@@ -194,33 +443,118 @@ class TrustedAdvisor(Connectable):
 
         """
         logger.info("Beginning TrustedAdvisor poll")
+        if self._result_cache is None:
+            fetched = self._fetch_all_regions()
+            all_regions = None if fetched is None else fetched[1]
+        else:
+            all_regions = self._cached_fetch_all_regions()
+        if all_regions is None:
+            return {}
+        region = self.ta_region or self.conn._client_config.region_name
+        res = {}
+        for r in ['', region]:
+            for svc_name, limits in all_regions.get(r, {}).items():
+                res.setdefault(svc_name, {}).update(limits)
+        logger.info("Finished TrustedAdvisor poll")
+        return res
+
+    def _cached_fetch_all_regions(self):
+        """
+        Return the results of :py:meth:`~._fetch_all_regions` for all regions
+        from ``self._result_cache`` if they are there and still valid, or
+        otherwise fetch and cache them. Results are only reused if they would
+        not have been refreshed according to ``ta_refresh_mode``; with the
+        "wait" or "trigger" modes, only results fetched (and so refreshed) by
+        this process are reused.
+
+        :returns: dict of region name to service name to limit name to value,
+          or None if results are not available
+        :rtype: :py:obj:`dict` or :py:obj:`None`
+        """
+        account_id = self._cache_account_id()
+        max_check_age = None
+        if isinstance(self.refresh_mode, type(1)):
+            max_check_age = self.refresh_mode
+        fetched_only = self.refresh_mode in ['wait', 'trigger']
+        with self._result_cache.lock(account_id):
+            cached = self._result_cache.get(
+                account_id, max_check_age=max_check_age,
+                fetched_only=fetched_only
+            )
+            if cached is not None:
+                logger.info('Using cached Trusted Advisor results for '
+                            'account %s', account_id)
+                return cached
+            fetched = self._fetch_all_regions()
+            if fetched is None:
+                return None
+            self._result_cache.put(account_id, fetched[0], fetched[1])
+            return fetched[1]
+
+    def _cache_account_id(self):
+        """
+        Return the account ID to key ``self._result_cache`` by. If it was not
+        given to the constructor, it is only looked up (via STS) if the cache
+        has a persistent store; otherwise, and if the lookup fails, return
+        None, which is only cached in memory.
+
+        :rtype: :py:obj:`str` or :py:obj:`None`
+        """
+        if self._account_id is None and self._result_cache.store is not None:
+            try:
+                sts = self._client_registry.client(
+                    'sts', **self._boto3_connection_kwargs
+                )
+                self._account_id = sts.get_caller_identity()['Account']
+            except Exception:
+                logger.warning(
+                    'Unable to determine account ID; not using persistent '
+                    'Trusted Advisor cache', exc_info=True
+                )
+        return self._account_id
+
+    def _fetch_all_regions(self):
+        """
+        Retrieve the 'Service Limits' check result (refreshing it according to
+        ``ta_refresh_mode``) and return the limits in it for all regions.
+
+        :returns: 2-tuple of the time the check was last refreshed (seconds
+          since the epoch, or None if unknown) and a dict of region name
+          (the empty string for limits without a region) to service name to
+          limit name to value; or None if results are not available
+        :rtype: :py:obj:`tuple` or :py:obj:`None`
+        """
         tmp = self._get_limit_check_id()
         if not self.have_ta:
             logger.info('TrustedAdvisor.have_ta is False; not polling TA')
-            return {}
+            return None
         if tmp[0] is None:
             logger.critical("Unable to find 'Service Limits' Trusted Advisor "
                             "check; not using Trusted Advisor data.")
-            return {}
+            return None
         check_id, metadata = tmp
         checks = self._get_refreshed_check_result(check_id)
-        region = self.ta_region or self.conn._client_config.region_name
-        res = {}
         if checks['result'].get('status', '') == 'not_available':
             logger.warning(
                 'Trusted Advisor returned status "not_available" for '
                 'service limit check; cannot retrieve limits from TA.'
             )
-            return {}
+            return None
         if 'flaggedResources' not in checks['result']:
             logger.warning(
                 'Trusted Advisor returned no results for '
                 'service limit check; cannot retrieve limits from TA.'
             )
-            return {}
+            return None
+        try:
+            check_timestamp = calendar.timegm(
+                parser.parse(checks['result']['timestamp']).utctimetuple()
+            )
+        except (KeyError, TypeError, ValueError):
+            check_timestamp = None
+        all_regions = {}
         for check in checks['result']['flaggedResources']:
-            if 'region' in check and check['region'] != region:
-                continue
+            res = all_regions.setdefault(check.get('region', ''), {})
             data = dict(zip(metadata, check['metadata']))
             if data['Service'] not in res:
                 res[data['Service']] = {}
@@ -238,8 +572,7 @@ class TrustedAdvisor(Connectable):
                                  'limit for %s - %s', data['Service'],
                                  data['Limit Name'])
             res[data['Service']][data['Limit Name']] = val
-        logger.info("Finished TrustedAdvisor poll")
-        return res
+        return check_timestamp, all_regions
 
     def _get_limit_check_id(self):
         """
@@ -346,6 +679,7 @@ class TrustedAdvisor(Connectable):
         else:
             cutoff = datetime_now() + timedelta(seconds=self.refresh_timeout)
         last_status = None
+        interval = self.poll_min_interval
         while datetime_now() <= cutoff:
             logger.debug('Checking refresh status')
             status = self.conn.describe_trusted_advisor_check_refresh_statuses(
@@ -361,8 +695,13 @@ class TrustedAdvisor(Connectable):
                                last_status, status)
                 break
             last_status = status
-            logger.info('Refresh status: %s; sleeping 30s', status)
-            sleep(30)
+            # back off, but don't sleep past the cutoff
+            wait = max(min(
+                interval, (cutoff - datetime_now()).total_seconds()
+            ), 0)
+            logger.info('Refresh status: %s; sleeping %ss', status, wait)
+            sleep(wait)
+            interval = min(interval * 2, self.poll_max_interval)
         else:
             logger.error('Timed out waiting for TA Check refresh; status=%s',
                          status)
@@ -470,12 +809,14 @@ class TrustedAdvisor(Connectable):
         :return: dict of TA service names to TA limit names to AwsLimit objects.
         """
         res = {}
-        for svc_name in self.all_services:
-            svc_obj = self.all_services[svc_name]
+        services = loaded_services(self.all_services)
+        for svc_name in services:
+            svc_obj = services[svc_name]
             for lim_name, lim in svc_obj.get_limits().items():
                 if lim.ta_service_name not in res:
                     res[lim.ta_service_name] = {}
                 res[lim.ta_service_name][lim.ta_limit_name] = lim
+        self._ta_service_names = set(services)
         return res
 
 
@@ -39,6 +39,9 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import argparse
 import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 import json
 import urllib3
@@ -47,6 +50,10 @@ from awslimitchecker.version import _VERSION_TUP, _VERSION
 
 logger = logging.getLogger(__name__)
 
+#: Thread-local state for :py:func:`~.call_with_timeout`; ``ticket`` is the
+#: :py:class:`~._CallTicket` for the call running in the current thread, if any.
+_timeout_local = threading.local()
+
 
 class StoreKeyValuePair(argparse.Action):
     """
@@ -100,10 +107,160 @@ def dict2cols(d, spaces=2, separator=' '):
     return s
 
 
+def run_concurrently(func, items, max_workers, item_type='item',
+                     errors=None):
+    """
+    Call ``func`` with each value of the ``items`` dict, and return a dict of
+    the same keys to the return value of ``func``.
+
+    If ``max_workers`` is greater than 1 and there is more than one item, the
+    calls are made concurrently on a pool of up to ``max_workers`` threads;
+    otherwise they are made sequentially, in the order of ``items``. When
+    running concurrently, an exception raised for one item does not interrupt
+    the others; every item is run to completion, each failure is logged, and
+    then the first failure (in the order of ``items``) is re-raised.
+
+    If ``errors`` is a dict, exceptions are never re-raised (whether or not
+    the calls are made concurrently); every item is run, each failure is
+    logged and stored in ``errors`` under the item's name, and the returned
+    dict holds the results of the items that succeeded, so that the caller
+    can decide how to handle the failures.
+
+    :param func: callable taking one value of ``items`` as its only argument
+    :type func: ``callable``
+    :param items: dict of name to the value to call ``func`` with
+    :type items: dict
+    :param max_workers: maximum number of concurrent calls
+    :type max_workers: int
+    :param item_type: what the items are, for log messages
+    :type item_type: str
+    :param errors: if set, dict to store the exception raised for each item
+      that failed in, instead of re-raising it
+    :type errors: dict
+    :returns: dict of ``items`` keys to the return value of ``func``
+    :rtype: dict
+    """
+    res = {}
+    if errors is None and (max_workers <= 1 or len(items) < 2):
+        for name, item in items.items():
+            res[name] = func(item)
+        return res
+    failed = OrderedDict()
+    if max_workers <= 1 or len(items) < 2:
+        for name, item in items.items():
+            try:
+                res[name] = func(item)
+            except Exception as ex:
+                logger.error(
+                    'Error in %s %s: %s', item_type, name, ex, exc_info=True
+                )
+                failed[name] = ex
+    else:
+        logger.debug(
+            'Running %d %ss with parallelism %d', len(items), item_type,
+            max_workers
+        )
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                (name, pool.submit(func, item))
+                for name, item in items.items()
+            ]
+            for name, fut in futures:
+                try:
+                    res[name] = fut.result()
+                except Exception as ex:
+                    logger.error(
+                        'Error in %s %s: %s', item_type, name, ex,
+                        exc_info=True
+                    )
+                    failed[name] = ex
+    if errors is not None:
+        errors.update(failed)
+    elif len(failed) > 0:
+        raise list(failed.values())[0]
+    return res
+
+
+class _CallTicket(object):
+    """
+    State shared between a call made by :py:func:`~.call_with_timeout` and
+    the thread waiting for it.
+    """
+
+    def __init__(self):
+        #: set to True if the caller stopped waiting for the call
+        self.abandoned = False
+        self.result = None
+        self.exception = None
+
+
+def call_with_timeout(func, args=(), timeout=None, name=None):
+    """
+    Call ``func(*args)`` in a new daemon thread, and wait up to ``timeout``
+    seconds for it to finish. If it finishes in time, return
+    ``(True, result)``, or re-raise any exception it raised. Otherwise, stop
+    waiting and return ``(False, None)``.
+
+    Python threads cannot be killed, so a call that times out keeps running
+    in the background until it returns, but it is marked as abandoned; code
+    that records results (such as :py:meth:`.AwsLimit._add_current_usage`)
+    should check :py:func:`~.current_call_abandoned` and discard anything
+    produced by an abandoned call.
+
+    :param func: the callable to call
+    :type func: ``callable``
+    :param args: positional arguments for ``func``
+    :type args: tuple
+    :param timeout: maximum number of seconds to wait, or None to wait
+      forever
+    :type timeout: float
+    :param name: name for the thread
+    :type name: str
+    :returns: 2-tuple of whether the call finished, and its return value
+    :rtype: tuple
+    """
+    ticket = _CallTicket()
+
+    def _run():
+        _timeout_local.ticket = ticket
+        try:
+            ticket.result = func(*args)
+        except Exception as ex:
+            ticket.exception = ex
+        finally:
+            if ticket.abandoned:
+                logger.debug('Abandoned call %s finished', name)
+
+    t = threading.Thread(target=_run, name=name)
+    t.daemon = True
+    t.start()
+    t.join(timeout)
+    if t.is_alive():
+        ticket.abandoned = True
+        return False, None
+    if ticket.exception is not None:
+        raise ticket.exception
+    return True, ticket.result
+
+
+def current_call_abandoned():
+    """
+    Return whether the current thread is running a call made by
+    :py:func:`~.call_with_timeout` that timed out and was abandoned.
+
+    :rtype: bool
+    """
+    ticket = getattr(_timeout_local, 'ticket', None)
+    return ticket is not None and ticket.abandoned
+
+
 def paginate_dict(function_ref, *argv, **kwargs):
     """
     Paginate through a query that returns a dict result, and return the
-    combined result.
+    combined result. As this holds every page of results in memory at once,
+    callers that only need to iterate over, count or aggregate the results
+    should use :py:func:`~.paginate_items` or :py:func:`~.count_paginated`
+    instead.
 
     Note that this function requires some special kwargs to be passed in:
 
@@ -124,25 +281,9 @@ def paginate_dict(function_ref, *argv, **kwargs):
     :param kwargs: keyword arguments to pass to the function
     :type kwargs: dict
     """
-    if 'alc_marker_path' not in kwargs:
-        raise Exception("alc_marker_path must be specified for queries "
-                        "that return a dict.")
-    if 'alc_data_path' not in kwargs:
-        raise Exception("alc_data_path must be specified for queries "
-                        "that return a dict.")
-    if 'alc_marker_param' not in kwargs:
-        raise Exception("alc_marker_param must be specified for queries "
-                        "that return a dict.")
-
-    marker_path = kwargs['alc_marker_path']
-    data_path = kwargs['alc_data_path']
-    marker_param = kwargs['alc_marker_param']
-
-    # strip off "^alc_" args
-    pass_kwargs = {}
-    for k, v in kwargs.items():
-        if not k.startswith('alc_'):
-            pass_kwargs[k] = v
+    marker_path, data_path, marker_param, pass_kwargs = _pagination_kwargs(
+        kwargs
+    )
 
     # first function call
     result = function_ref(*argv, **pass_kwargs)
@@ -169,6 +310,95 @@ def paginate_dict(function_ref, *argv, **kwargs):
     return res
 
 
+def _pagination_kwargs(kwargs):
+    """
+    Validate the special ``alc_`` pagination kwargs in ``kwargs``, as used by
+    :py:func:`~.paginate_dict` and :py:func:`~.paginate_items`. Return a
+    3-tuple of the marker path, data path and marker parameter name, and a
+    dict of the remaining kwargs to pass to the paginated function.
+
+    :param kwargs: keyword arguments for the pagination function
+    :type kwargs: dict
+    :rtype: tuple
+    """
+    for k in ['alc_marker_path', 'alc_data_path', 'alc_marker_param']:
+        if k not in kwargs:
+            raise Exception("%s must be specified for queries "
+                            "that return a dict." % k)
+    pass_kwargs = dict(
+        (k, v) for k, v in kwargs.items() if not k.startswith('alc_')
+    )
+    return (
+        kwargs['alc_marker_path'], kwargs['alc_data_path'],
+        kwargs['alc_marker_param'], pass_kwargs
+    )
+
+
+def paginate_items(function_ref, *argv, **kwargs):
+    """
+    Paginate through a query that returns a dict result, yielding each item
+    of the list at ``alc_data_path`` in each page of results as it is
+    retrieved. Unlike :py:func:`~.paginate_dict`, only one page of results is
+    held in memory at a time; callers that only need to count or aggregate
+    the results should use this (or :py:func:`~.count_paginated`) instead.
+    Pages of paginated listings are not kept by the :py:class:`~.ResponseCache`
+    of the client that ``function_ref`` belongs to, so earlier pages can be
+    garbage-collected as soon as their items have been yielded.
+
+    This takes the same special ``alc_marker_path``, ``alc_data_path`` and
+    ``alc_marker_param`` kwargs as :py:func:`~.paginate_dict`; they are
+    validated when the first item is requested.
+
+    :param function_ref: the function to call
+    :type function_ref: ``function``
+    :param argv: the parameters to pass to the function
+    :type argv: tuple
+    :param kwargs: keyword arguments to pass to the function
+    :type kwargs: dict
+    :returns: generator of result items
+    """
+    marker_path, data_path, marker_param, pass_kwargs = _pagination_kwargs(
+        kwargs
+    )
+    while True:
+        result = function_ref(*argv, **pass_kwargs)
+        data = _get_dict_value_by_path(result, data_path)
+        if data is not None:
+            for item in data:
+                yield item
+        marker = _get_dict_value_by_path(result, marker_path)
+        if marker is None:
+            return
+        logger.debug("Querying %s with %s=%s", function_ref, marker_param,
+                     marker)
+        pass_kwargs[marker_param] = marker
+
+
+def count_paginated(function_ref, *argv, **kwargs):
+    """
+    Paginate through a query that returns a dict result with
+    :py:func:`~.paginate_items`, and return the number of items in the
+    results. If an ``alc_filter`` kwarg is given, it must be a callable
+    taking one result item; only items for which it returns True are counted.
+
+    :param function_ref: the function to call
+    :type function_ref: ``function``
+    :param argv: the parameters to pass to the function
+    :type argv: tuple
+    :param kwargs: keyword arguments to pass to the function, including the
+      special kwargs described in :py:func:`~.paginate_items`
+    :type kwargs: dict
+    :returns: number of (matching) items
+    :rtype: int
+    """
+    item_filter = kwargs.get('alc_filter', None)
+    count = 0
+    for item in paginate_items(function_ref, *argv, **kwargs):
+        if item_filter is None or item_filter(item):
+            count += 1
+    return count
+
+
 def _get_dict_value_by_path(d, path):
     """
     Given a dict (``d``) and a list specifying the hierarchical path to a key
@@ -258,7 +488,8 @@ def color_output(s, color, colorize=True):
 def issue_string_tuple(service_name, limit, crits, warns, colorize=True):
     """
     Return a 2-tuple of key (service/limit name)/value (usage) strings
-    describing a limit that has crossed its threshold.
+    describing a limit that has crossed its threshold, or whose usage is
+    incomplete (see :py:meth:`.AwsLimit.is_incomplete`).
 
     :param service_name: the name of the service
     :type service_name: str
@@ -289,6 +520,13 @@ def issue_string_tuple(service_name, limit, crits, warns, colorize=True):
         tmp = 'WARNING: '
         tmp += ', '.join([str(x) for x in sorted(warns)])
         usage_str += color_output(tmp, 'yellow', colorize=colorize)
+    if limit.is_incomplete():
+        if len(usage_str) > 0:
+            usage_str += ' '
+        usage_str += color_output(
+            'INCOMPLETE: %s' % limit.get_incomplete_reason(), 'yellow',
+            colorize=colorize
+        )
     k = "{s}/{l}".format(
         s=service_name,
         l=limit.name,
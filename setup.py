@@ -78,14 +78,17 @@ setup(
     author='Jason Antman',
     author_email='jason@jasonantman.com',
     packages=find_packages(),
+    package_data={'awslimitchecker': ['limits_catalog.json']},
     entry_points="""
     [console_scripts]
     awslimitchecker = awslimitchecker.runner:console_entry_point
+    awslimitchecker-multi-account = awslimitchecker.multiaccount:console_entry_point
     """,
     url=_PROJECT_URL,
     description='A script and python module to check your AWS service limits and usage, and warn when usage approaches limits.',
     long_description=long_description,
     install_requires=requires,
+    extras_require={'numpy': ['numpy']},
     keywords="AWS EC2 Amazon boto boto3 limits cloud",
     classifiers=classifiers
 )